@@ -1,5 +1,27 @@
-from django.contrib import admin
-from .models import Empresa, Configuracao
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+
+from . import perfil_consultas
+from .models import Empresa, Configuracao, RelatorioJob
+from .multiempresa import empresas_do_escopo
+
+
+class SelectRelatedListFilter(admin.RelatedFieldListFilter):
+    """Filtro por FK que carrega as opções com select_related.
+
+    Evita uma consulta por opção quando o ``__str__`` do model relacionado
+    acessa outras FKs (ex.: ``ContasBancarias`` mostra o nome do banco).
+    """
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        opcoes = field.related_model._default_manager.select_related()
+        if ordering:
+            opcoes = opcoes.order_by(*ordering)
+        return [(opcao.pk, str(opcao)) for opcao in opcoes]
 
 
 @admin.register(Empresa)
@@ -8,6 +30,7 @@ class EmpresaAdmin(admin.ModelAdmin):
     list_filter = ['matriz', 'is_active', 'created_at']
     search_fields = ['nome', 'cnpj', 'razao_social']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
+    filter_horizontal = ['usuarios']
     
     fieldsets = (
         ('Informações Básicas', {
@@ -22,6 +45,9 @@ class EmpresaAdmin(admin.ModelAdmin):
         ('Status', {
             'fields': ('is_active',)
         }),
+        ('Acesso', {
+            'fields': ('usuarios',)
+        }),
         ('Auditoria', {
             'fields': ('created_at', 'updated_at', 'created_by', 'updated_by'),
             'classes': ('collapse',)
@@ -59,4 +85,59 @@ class ConfiguracaoAdmin(admin.ModelAdmin):
         if not change:
             obj.created_by = request.user
         obj.updated_by = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(RelatorioJob)
+class RelatorioJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'empresa', 'situacao', 'linhas', 'tentativas', 'created_at', 'concluido_em']
+    list_select_related = ['empresa']
+    list_filter = ['situacao', 'tipo', 'empresa']
+    readonly_fields = ['tipo', 'parametros', 'empresa', 'situacao', 'arquivo', 'linhas', 'erro', 'tentativas',
+                       'worker', 'iniciado_em', 'concluido_em', 'created_at', 'updated_at', 'created_by',
+                       'updated_by', 'is_active']
+    actions = ['reenfileirar']
+
+    def has_add_permission(self, request):
+        # Jobs são criados pela API (core.relatorios.enfileirar)
+        return False
+
+    def get_queryset(self, request):
+        # RelatorioJob não usa o EmpresaManager (a fila é lida sem escopo pelos workers)
+        queryset = super().get_queryset(request)
+        empresas = empresas_do_escopo()
+        return queryset if empresas is None else queryset.filter(empresa_id__in=empresas)
+
+    @admin.action(description='Reenfileirar os jobs selecionados')
+    def reenfileirar(self, request, queryset):
+        total = queryset.exclude(situacao='processando').update(situacao='pendente', erro='', tentativas=0,
+                                                                 iniciado_em=None, concluido_em=None)
+        self.message_user(request, f'{total} job(s) devolvido(s) à fila.')
+
+
+def perfil_consultas_view(request):
+    """Página do admin com os endpoints ordenados pelo custo em SQL (ver ``core.perfil_consultas``)"""
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    if request.method == 'POST':
+        perfil_consultas.limpar()
+        messages.success(request, 'Perfis de consultas descartados.')
+        return redirect('perfil-consultas')
+
+    ordem = request.GET.get('ordem')
+    if ordem not in perfil_consultas.ORDENS:
+        ordem = 'tempo_banco'
+    registros = perfil_consultas.perfis()
+    return TemplateResponse(request, 'admin/core/perfil_consultas.html', {
+        **admin.site.each_context(request),
+        'title': 'Perfil de consultas SQL',
+        'ativo': settings.PERFIL_CONSULTAS_ATIVO,
+        'amostragem': settings.PERFIL_CONSULTAS_AMOSTRAGEM * 100,
+        'tamanho': settings.PERFIL_CONSULTAS_TAMANHO,
+        'registros': len(registros),
+        'ordens': perfil_consultas.ORDENS,
+        'ordem': ordem,
+        'endpoints': perfil_consultas.ranking(registros, ordem),
+        'repetidas': perfil_consultas.repetidas(registros),
+        'lentas': perfil_consultas.lentas(registros),
+    })
@@ -0,0 +1,198 @@
+"""
+Peças comuns das APIs REST: paginação por chave (keyset) e campos esparsos.
+"""
+
+import base64
+import binascii
+import json
+from urllib import parse
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import F, Func, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PaginacaoPorChave(BasePagination):
+    """Paginação por cursor sobre uma chave composta (campo, id).
+
+    A view define ``ordenacao_cursor``, por exemplo ``('data_vencimento', 'id')``
+    ou ``('-data', '-id')``. Cada página é um ``WHERE (campo, id) > (...)``
+    seguido de ``LIMIT``: o custo não depende da profundidade da página e não
+    há ``COUNT(*)``. O cursor é opaco para o cliente.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        ordenacao = view.ordenacao_cursor
+        self.campo = ordenacao[0].lstrip('-')
+        descendente = ordenacao[0].startswith('-')
+        self.tamanho = self._tamanho_pagina(request)
+
+        cursor = self._decodificar(queryset.model, request.query_params.get(self.cursor_query_param))
+        anterior = cursor is not None and cursor['anterior']
+        # Para voltar uma página, percorre a chave no sentido inverso e desfaz a inversão no fim
+        inverso = descendente != anterior
+        prefixo = '-' if inverso else ''
+        queryset = queryset.order_by(f'{prefixo}{self.campo}', f'{prefixo}pk')
+        if cursor is not None:
+            lookup = LessThan if inverso else GreaterThan
+            campo_modelo = queryset.model._meta.get_field(self.campo)
+            # Comparação de linha (campo, id) > (valor, id): o PostgreSQL a resolve direto no índice
+            queryset = queryset.filter(lookup(
+                Func(F(self.campo), F('pk'), function='ROW', output_field=campo_modelo),
+                Func(Value(cursor['valor']), Value(cursor['pk']), function='ROW', output_field=campo_modelo),
+            ))
+
+        itens = list(queryset[:self.tamanho + 1])
+        tem_mais = len(itens) > self.tamanho
+        itens = itens[:self.tamanho]
+        if anterior:
+            itens.reverse()
+            self.tem_anterior, self.tem_proxima = tem_mais, True
+        else:
+            self.tem_anterior, self.tem_proxima = cursor is not None, tem_mais
+        self.itens = itens
+        return itens
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.tem_proxima or not self.itens:
+            return None
+        return self._link(self.itens[-1], anterior=False)
+
+    def get_previous_link(self):
+        if not self.tem_anterior:
+            return None
+        if not self.itens:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._link(self.itens[0], anterior=True)
+
+    def _tamanho_pagina(self, request):
+        valor = request.query_params.get(self.page_size_query_param)
+        if not valor:
+            return self.page_size
+        if not valor.isdigit() or int(valor) == 0:
+            raise ValidationError({self.page_size_query_param: 'Informe um número inteiro positivo.'})
+        return min(int(valor), self.max_page_size)
+
+    def _link(self, item, anterior):
+        valor = getattr(item, self.campo)
+        dados = {'v': valor.isoformat() if hasattr(valor, 'isoformat') else valor, 'id': item.pk, 'a': int(anterior)}
+        cursor = base64.urlsafe_b64encode(json.dumps(dados, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def _decodificar(self, model, cursor):
+        if not cursor:
+            return None
+        try:
+            dados = json.loads(base64.urlsafe_b64decode(parse.unquote(cursor).encode()))
+            return {
+                'valor': model._meta.get_field(self.campo).to_python(dados['v']),
+                'pk': model._meta.pk.to_python(dados['id']),
+                'anterior': bool(dados['a']),
+            }
+        except (binascii.Error, TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound('Cursor inválido.')
+
+
+class CamposEsparsosSerializer(serializers.ModelSerializer):
+    """Serializer que devolve só os campos pedidos em ``context['campos']``.
+
+    ``Meta.dependencias`` lista, para campos calculados (properties), os campos
+    do model que eles leem.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        campos = self.context.get('campos')
+        if campos:
+            for nome in set(self.fields) - set(campos):
+                self.fields.pop(nome)
+
+
+class CamposEsparsosMixin:
+    """ViewSet com ``?fields=a,b,c``: serializa só esses campos e os lê com ``.only()``.
+
+    Cada FK percorrida pelos campos pedidos entra em ``select_related``; sem
+    ``?fields=`` todos os campos do serializer são usados.
+    """
+    campos_query_param = 'fields'
+
+    def campos_solicitados(self):
+        if not hasattr(self, '_campos'):
+            disponiveis = list(self.get_serializer_class()().fields)
+            valor = self.request.query_params.get(self.campos_query_param)
+            campos = [campo.strip() for campo in valor.split(',') if campo.strip()] if valor else disponiveis
+            invalidos = [campo for campo in campos if campo not in disponiveis]
+            if invalidos:
+                raise ValidationError({self.campos_query_param: f'Campos inválidos: {", ".join(invalidos)}.'})
+            self._campos = campos
+        return self._campos
+
+    def get_serializer_context(self):
+        contexto = super().get_serializer_context()
+        contexto['campos'] = self.campos_solicitados()
+        return contexto
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        campos_serializer = serializer_class().fields
+        dependencias = getattr(serializer_class.Meta, 'dependencias', {})
+
+        caminhos = {'pk'}
+        caminhos.update(campo.lstrip('-') for campo in getattr(self, 'ordenacao_cursor', ()))
+        for nome in self.campos_solicitados():
+            fonte = campos_serializer[nome].source
+            caminhos.update(dependencias.get(nome, [fonte.replace('.', '__')]))
+
+        apenas, relacionados = set(), set()
+        for caminho in caminhos:
+            apenas.update(self._resolver_caminho(queryset.model, caminho, relacionados))
+        return queryset.select_related(*sorted(relacionados)).only(*sorted(apenas))
+
+    def _resolver_caminho(self, model, caminho, relacionados):
+        """Campos para ``.only()`` de um caminho ``fk__fk__campo``; acumula os joins em ``relacionados``"""
+        if caminho == 'pk':
+            return [model._meta.pk.name]
+        partes = caminho.split('__')
+        apenas = []
+        for indice, parte in enumerate(partes):
+            try:
+                campo = model._meta.get_field(parte)
+            except FieldDoesNotExist:
+                raise ValueError(f'{model.__name__}.{parte} não é um campo; declare-o em Meta.dependencias.')
+            prefixo = '__'.join(partes[:indice + 1])
+            apenas.append(prefixo)
+            if indice < len(partes) - 1:
+                relacionados.add(prefixo)
+                model = campo.related_model
+        return apenas
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
-    verbose_name = 'Módulo Principal'
\ No newline at end of file
+    verbose_name = 'Módulo Principal'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,80 @@
+"""
+Leitura das configurações (``Configuracao``) com cache no próprio processo.
+
+Na primeira leitura todas as configurações ativas são carregadas em uma única
+consulta e convertidas para o tipo declarado; as leituras seguintes não vão
+ao banco. Cada alteração incrementa uma versão guardada no cache do Django:
+os demais processos (workers do gunicorn) comparam a versão local com a
+compartilhada no máximo a cada ``CONFIGURACOES_VERIFICAR_A_CADA`` segundos e
+recarregam quando ela muda. Para isso o ``CACHES['default']`` dos settings é
+compartilhado entre os processos (tabela no banco por padrão, ou Redis).
+
+``save``/``delete`` invalidam pelos signals; alterações em massa
+(``queryset.update``) precisam chamar ``invalidar()``.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+from . import versoes
+
+CHAVE_VERSAO = 'core:configuracoes:versao'
+
+_NAO_ENCONTRADA = object()
+_trava = threading.Lock()
+_estado = {'versao': None, 'valores': None, 'verificado_em': 0.0}
+
+
+def _intervalo_verificacao():
+    return getattr(settings, 'CONFIGURACOES_VERIFICAR_A_CADA', 5)
+
+
+def _versao_compartilhada():
+    return versoes.versao(CHAVE_VERSAO)
+
+
+def _carregar():
+    from .models import Configuracao
+
+    versao = _versao_compartilhada()
+    valores = {}
+    for configuracao in Configuracao.objects.filter(is_active=True).only('chave', 'valor', 'tipo'):
+        try:
+            valores[configuracao.chave] = configuracao.valor_convertido()
+        except ValueError:
+            # Valor incompatível com o tipo (gravado fora do admin): devolve o texto
+            valores[configuracao.chave] = configuracao.valor
+    _estado.update(versao=versao, valores=valores, verificado_em=time.monotonic())
+    return valores
+
+
+def _valores():
+    valores = _estado['valores']
+    agora = time.monotonic()
+    if valores is not None and agora - _estado['verificado_em'] < _intervalo_verificacao():
+        return valores
+    with _trava:
+        if _estado['valores'] is None or _versao_compartilhada() != _estado['versao']:
+            return _carregar()
+        _estado['verificado_em'] = agora
+        return _estado['valores']
+
+
+def obter(chave, padrao=None):
+    """Valor tipado da configuração ``chave``; ``padrao`` se ela não existir ou estiver inativa"""
+    valor = _valores().get(chave, _NAO_ENCONTRADA)
+    return padrao if valor is _NAO_ENCONTRADA else valor
+
+
+def todas():
+    """Cópia de todas as configurações ativas, já convertidas"""
+    return dict(_valores())
+
+
+def invalidar():
+    """Descarta o cache deste processo e avisa os demais incrementando a versão"""
+    versoes.incrementar(CHAVE_VERSAO)
+    with _trava:
+        _estado.update(versao=None, valores=None, verificado_em=0.0)
@@ -0,0 +1,85 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import perfil_consultas
+from core.models import Empresa
+from operacional.models import Categoria, Pessoa, Produto, UnidadeMedida
+
+
+class Command(BaseCommand):
+    help = ('Mede o custo do PerfilConsultasMiddleware em páginas do admin e da API: desligado, com a '
+            'amostragem configurada e medindo todas as requisições. Os dados gerados são descartados ao '
+            'final (rollback).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=300, help='Requisições por modo em cada rodada.')
+        parser.add_argument('--rodadas', type=int, default=5,
+                            help='Os modos se alternam a cada rodada, para diluir variações da máquina.')
+        parser.add_argument('--amostragem', type=float, default=settings.PERFIL_CONSULTAS_AMOSTRAGEM)
+        parser.add_argument('--produtos', type=int, default=200)
+
+    def handle(self, *args, **options):
+        modos = {
+            'desligado': dict(PERFIL_CONSULTAS_ATIVO=False),
+            f'amostragem {options["amostragem"]:.0%}': dict(PERFIL_CONSULTAS_ATIVO=True,
+                                                           PERFIL_CONSULTAS_AMOSTRAGEM=options['amostragem']),
+            'todas': dict(PERFIL_CONSULTAS_ATIVO=True, PERFIL_CONSULTAS_AMOSTRAGEM=1.0),
+        }
+        # DEBUG desligado: o registro de consultas do modo debug pesaria igual em todos os modos
+        with transaction.atomic(), override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            urls = self._gerar_dados(options)
+            usuario = User.objects.create_superuser(f'benchmark-{time.time_ns()}', password='-')
+            clientes = {}
+            for nome, configuracao in modos.items():
+                # O middleware lê a configuração quando o handler do cliente é montado, na primeira requisição
+                with override_settings(**configuracao):
+                    clientes[nome] = Client()
+                    clientes[nome].force_login(usuario)
+                    for url in urls:
+                        clientes[nome].get(url)
+
+            tempos = dict.fromkeys(modos, 0.0)
+            for _ in range(options['rodadas']):
+                for nome, cliente in clientes.items():
+                    inicio = time.perf_counter()
+                    for indice in range(options['requisicoes']):
+                        cliente.get(urls[indice % len(urls)])
+                    tempos[nome] += time.perf_counter() - inicio
+            perfis = len(perfil_consultas.perfis())
+            perfil_consultas.limpar()
+            transaction.set_rollback(True)
+
+        total = options['requisicoes'] * options['rodadas']
+        base = tempos['desligado'] / total
+        self.stdout.write(f'Requisições por modo: {total}  perfis registrados: {perfis}')
+        for nome, tempo in tempos.items():
+            media = tempo / total
+            self.stdout.write(f'{nome:>16}: {media * 1000:.3f}ms por requisição  '
+                              f'({(media / base - 1) * 100:+.1f}%)')
+
+    def _gerar_dados(self, options):
+        empresa = Empresa.objects.create(nome='Benchmark', cnpj=f'BM{time.time_ns() % 10**12}',
+                                         razao_social='Benchmark', endereco='-')
+        categoria = Categoria.objects.create(nome='Benchmark')
+        unidade = UnidadeMedida.objects.create(nome='Benchmark', sigla=f'B{time.time_ns() % 10**8}')
+        sufixo = time.time_ns()
+        Produto.objects.bulk_create([
+            Produto(codigo=f'BENCH-{sufixo}-{i}', nome=f'Produto {i}', categoria=categoria, unidade_medida=unidade)
+            for i in range(options['produtos'])
+        ])
+        Pessoa.objects.bulk_create([
+            Pessoa(nome=f'Pessoa {i}', tipo_pessoa='fisica', cpf_cnpj=f'{sufixo % 10**8}{i:06d}', empresa=empresa)
+            for i in range(options['produtos'])
+        ])
+        return [
+            reverse('admin:operacional_produto_changelist'),
+            reverse('admin:operacional_pessoa_changelist'),
+            reverse('core:empresa-ativa'),
+            reverse('operacional:busca-produtos') + '?q=Produto',
+        ]
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core.particoes import (
+    MESES_FUTUROS, PARTICIONADAS, SCHEMA_ARQUIVO, criar_particao, desanexar_particao, nome_particao, particoes,
+    primeiro_dia, somar_meses
+)
+
+
+class Command(BaseCommand):
+    help = ('Mantém as partições mensais das movimentações financeiras e de estoque: cria as partições dos '
+            'próximos meses e, com --reter-meses, desanexa as mais antigas e as guarda no schema '
+            f'"{SCHEMA_ARQUIVO}" (ou as exclui com --excluir). Rode mensalmente, por exemplo pelo cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses-futuros', type=int, default=MESES_FUTUROS,
+                            help='Meses à frente do atual com partição criada.')
+        parser.add_argument('--reter-meses', type=int,
+                            help='Meses anteriores ao atual mantidos na tabela; os mais antigos são desanexados.')
+        parser.add_argument('--excluir', action='store_true',
+                            help='Exclui as partições desanexadas em vez de arquivá-las.')
+        parser.add_argument('--tabela', choices=sorted(PARTICIONADAS), action='append',
+                            help='Tabela a manter (padrão: todas); pode ser repetido.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O particionamento requer PostgreSQL.')
+        if options['excluir'] and options['reter_meses'] is None:
+            raise CommandError('--excluir requer --reter-meses.')
+
+        mes_atual = primeiro_dia(timezone.now())
+        with connection.cursor() as cursor:
+            for tabela in options['tabela'] or PARTICIONADAS:
+                for meses in range(options['meses_futuros'] + 1):
+                    mes = somar_meses(mes_atual, meses)
+                    if criar_particao(cursor, tabela, mes):
+                        self.stdout.write(f'Partição criada: {nome_particao(tabela, mes)}')
+                if options['reter_meses'] is None:
+                    continue
+                limite = somar_meses(mes_atual, -options['reter_meses'])
+                for mes in particoes(cursor, tabela):
+                    if mes >= limite:
+                        break
+                    desanexar_particao(cursor, tabela, mes, excluir=options['excluir'])
+                    destino = 'excluída' if options['excluir'] else f'arquivada em {SCHEMA_ARQUIVO}'
+                    self.stdout.write(self.style.WARNING(f'Partição desanexada e {destino}: '
+                                                         f'{nome_particao(tabela, mes)}'))
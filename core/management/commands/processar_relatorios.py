@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+
+from core.relatorios import executar, reservar
+
+
+class Command(BaseCommand):
+    help = ('Processa a fila de relatórios (RelatorioJob) em um pool de processos. Vários workers podem '
+            'rodar ao mesmo tempo: cada job é reservado por um só, com FOR UPDATE SKIP LOCKED.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processos', type=int, default=os.cpu_count() or 1,
+                            help='Tamanho do pool. 0 executa os jobs no próprio processo do worker.')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos entre as consultas à fila quando não há jobs.')
+        parser.add_argument('--uma-vez', action='store_true',
+                            help='Esvazia a fila e termina, em vez de aguardar novos jobs.')
+
+    def handle(self, *args, **options):
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        if options['processos'] == 0:
+            self._processar_no_proprio_processo(options['intervalo'], options['uma_vez'])
+        else:
+            self._processar_no_pool(options['processos'], options['intervalo'], options['uma_vez'])
+
+    def _registrar(self, job_id, situacao):
+        estilo = self.style.SUCCESS if situacao == 'concluido' else self.style.ERROR
+        self.stdout.write(estilo(f'Job {job_id}: {situacao}'))
+
+    def _processar_no_proprio_processo(self, intervalo, uma_vez):
+        while True:
+            ids = reservar(1, self.worker)
+            if not ids:
+                if uma_vez:
+                    return
+                time.sleep(intervalo)
+                continue
+            self._registrar(ids[0], executar(ids[0], self.worker))
+
+    def _processar_no_pool(self, processos, intervalo, uma_vez):
+        # spawn: cada processo abre as próprias conexões em vez de herdar as do worker
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(processos, mp_context=contexto, initializer=django.setup) as pool:
+            em_execucao = {}
+            while True:
+                livres = processos - len(em_execucao)
+                if livres:
+                    for job_id in reservar(livres, self.worker):
+                        em_execucao[pool.submit(executar, job_id, self.worker)] = job_id
+                if not em_execucao:
+                    if uma_vez:
+                        return
+                    time.sleep(intervalo)
+                    continue
+                concluidos, _ = wait(em_execucao, timeout=intervalo, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    job_id = em_execucao.pop(futuro)
+                    try:
+                        situacao = futuro.result()
+                    except Exception as erro:
+                        # O job continua em processamento e volta à fila após o tempo máximo
+                        situacao = f'falha no processo ({erro!r})'
+                    self._registrar(job_id, situacao)
@@ -0,0 +1,61 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import perfil_consultas
+from .multiempresa import EscopoRequisicao, ativar_escopo, desativar_escopo
+
+
+class EmpresaMiddleware:
+    """Ativa, durante a requisição, o escopo de empresa do usuário (ver ``core.multiempresa``).
+
+    Deve vir depois do ``AuthenticationMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = ativar_escopo(EscopoRequisicao(request))
+        try:
+            return self.get_response(request)
+        finally:
+            desativar_escopo(token)
+
+
+class PerfilConsultasMiddleware:
+    """Mede as consultas SQL de uma amostra das requisições (ver ``core.perfil_consultas``).
+
+    Com ``PERFIL_CONSULTAS_ATIVO`` desligado, sai da cadeia de middlewares.
+    Deve vir no início da lista, para medir também as consultas de sessão e
+    autenticação.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFIL_CONSULTAS_ATIVO:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.amostragem = settings.PERFIL_CONSULTAS_AMOSTRAGEM
+
+    def __call__(self, request):
+        if random.random() >= self.amostragem:
+            return self.get_response(request)
+        medidor = perfil_consultas.Medidor()
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(medidor))
+            inicio = time.perf_counter()
+            resposta = self.get_response(request)
+            duracao = time.perf_counter() - inicio
+        perfil_consultas.registrar(self._endpoint(request), resposta.status_code, duracao, medidor.consultas)
+        return resposta
+
+    def _endpoint(self, request):
+        # O nome da rota agrupa /produtos/1/ e /produtos/2/; caminhos sem rota ficariam um por URL
+        rota = getattr(request, 'resolver_match', None)
+        nome = (rota.view_name or rota.route) if rota is not None else '(sem rota)'
+        return f'{request.method} {nome}'
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatorioJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('tipo', models.CharField(max_length=50, verbose_name='Tipo')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parâmetros')),
+                ('situacao', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluido', 'Concluído'), ('erro', 'Erro')], default='pendente', max_length=20, verbose_name='Situação')),
+                ('arquivo', models.FileField(blank=True, upload_to='relatorios/%Y/%m/', verbose_name='Arquivo')),
+                ('linhas', models.PositiveIntegerField(blank=True, null=True, verbose_name='Linhas')),
+                ('erro', models.TextField(blank=True, verbose_name='Erro')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado em')),
+                ('concluido_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluído em')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_created', to=settings.AUTH_USER_MODEL, verbose_name='Criado por')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Empresa')),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_updated', to=settings.AUTH_USER_MODEL, verbose_name='Atualizado por')),
+            ],
+            options={
+                'verbose_name': 'Job de Relatório',
+                'verbose_name_plural': 'Jobs de Relatórios',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('situacao__in', ['pendente', 'processando'])), fields=['created_at', 'id'], name='relatoriojob_fila_idx')],
+            },
+        ),
+    ]
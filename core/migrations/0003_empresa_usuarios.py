@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def dar_acesso_aos_usuarios_existentes(apps, schema_editor):
+    """Mantém o acesso de hoje: cada usuário ativo passa a ter acesso a todas as empresas"""
+    Empresa = apps.get_model('core', 'Empresa')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Acesso = Empresa.usuarios.through
+    usuarios = list(User.objects.filter(is_active=True, is_superuser=False).values_list('pk', flat=True))
+    Acesso.objects.bulk_create(
+        [Acesso(empresa_id=empresa_id, user_id=usuario_id)
+         for empresa_id in Empresa.objects.values_list('pk', flat=True) for usuario_id in usuarios],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_relatorio_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='usuarios',
+            field=models.ManyToManyField(blank=True, help_text='Usuários com acesso aos dados da empresa.',
+                                         related_name='empresas', to=settings.AUTH_USER_MODEL,
+                                         verbose_name='Usuários'),
+        ),
+        migrations.RunPython(dar_acesso_aos_usuarios_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:02
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def criar_tabela_cache(apps, schema_editor):
+    """Tabela do ``DatabaseCache`` (settings ``CACHES``); não faz nada com outros backends ou se ela já existe"""
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_empresa_usuarios'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_tabela_cache, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,14 @@
-from django.db import models
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .multiempresa import EmpresaManager, ModeloPorEmpresa  # noqa: F401 (usados pelos models dos apps)
+
 
 class BaseModel(models.Model):
     """Modelo base com campos comuns para todos os modelos"""
@@ -17,6 +24,85 @@ class BaseModel(models.Model):
         abstract = True
 
 
+class ArvoreMaterializada(models.Model):
+    """Árvore (``pai``) com o caminho materializado de cada nó: ``"1/7/42/"``.
+
+    O caminho é composto pelos ids dos ancestrais e do próprio nó, de modo que
+    os descendentes de um nó são ``caminho__startswith=no.caminho`` — uma única
+    consulta por prefixo, sem recursão. ``save()`` mantém o caminho (e o nível,
+    se ``campo_nivel`` for definido) do nó e da subárvore ao mover um nó.
+    Gravações em massa (``bulk_create``, ``update``) não passam pelo ``save()``:
+    depois delas, chame ``reconstruir_caminhos()``.
+
+    As subclasses declaram o FK ``pai`` para o próprio model.
+    """
+    caminho = models.CharField(max_length=255, blank=True, default='', editable=False, verbose_name='Caminho')
+
+    campo_nivel = None
+
+    class Meta:
+        abstract = True
+
+    def clean(self):
+        super().clean()
+        if self.pk and self.pai_id and self.caminho:
+            caminho_pai = (type(self)._base_manager.filter(pk=self.pai_id)
+                           .values_list('caminho', flat=True).first() or '')
+            if caminho_pai.startswith(self.caminho) or self.pai_id == self.pk:
+                raise ValidationError({'pai': 'O pai não pode ser o próprio registro nem um de seus descendentes.'})
+
+    def descendentes(self, incluir_proprio=False):
+        descendentes = type(self).objects.filter(caminho__startswith=self.caminho)
+        return descendentes if incluir_proprio else descendentes.exclude(pk=self.pk)
+
+    def save(self, *args, **kwargs):
+        # _base_manager: o caminho é mantido sem o filtro por empresa do manager padrão
+        registros = type(self)._base_manager
+        with transaction.atomic(using=kwargs.get('using')):
+            anterior = registros.filter(pk=self.pk).values_list('caminho', flat=True).first() if self.pk else None
+            prefixo = ''
+            if self.pai_id:
+                prefixo = registros.filter(pk=self.pai_id).values_list('caminho', flat=True).first() or ''
+                if anterior and prefixo.startswith(anterior):
+                    raise ValidationError('O pai não pode ser o próprio registro nem um de seus descendentes.')
+            if self.campo_nivel:
+                setattr(self, self.campo_nivel, prefixo.count('/') + 1)
+            super().save(*args, **kwargs)
+
+            caminho = f'{prefixo}{self.pk}/'
+            if caminho != anterior:
+                registros.filter(pk=self.pk).update(caminho=caminho)
+                if anterior:
+                    # Nó movido: reescreve o prefixo (e o nível) de toda a subárvore
+                    atualizacao = {'caminho': Concat(Value(caminho), Substr('caminho', len(anterior) + 1))}
+                    if self.campo_nivel:
+                        atualizacao[self.campo_nivel] = F(self.campo_nivel) + caminho.count('/') - anterior.count('/')
+                    registros.filter(caminho__startswith=anterior).exclude(pk=self.pk).update(**atualizacao)
+            self.caminho = caminho
+
+    @classmethod
+    def reconstruir_caminhos(cls):
+        """Recalcula caminho (e nível) de todos os nós a partir de ``pai`` em uma consulta recursiva"""
+        tabela = connection.ops.quote_name(cls._meta.db_table)
+        nivel = ''
+        if cls.campo_nivel:
+            coluna = connection.ops.quote_name(cls._meta.get_field(cls.campo_nivel).column)
+            nivel = f', {coluna} = arvore.nivel'
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                WITH RECURSIVE arvore (id, caminho, nivel) AS (
+                    SELECT id, CAST(CAST(id AS VARCHAR(20)) || '/' AS VARCHAR(255)), 1
+                    FROM {tabela} WHERE pai_id IS NULL
+                    UNION ALL
+                    SELECT filho.id, CAST(arvore.caminho || CAST(filho.id AS VARCHAR(20)) || '/' AS VARCHAR(255)),
+                           arvore.nivel + 1
+                    FROM {tabela} filho JOIN arvore ON filho.pai_id = arvore.id
+                )
+                UPDATE {tabela} SET caminho = arvore.caminho{nivel}
+                FROM arvore WHERE {tabela}.id = arvore.id
+            """)
+
+
 class Empresa(BaseModel):
     """Modelo para representar a empresa/filiais"""
     nome = models.CharField(max_length=200, verbose_name='Nome da Empresa')
@@ -29,6 +115,8 @@ class Empresa(BaseModel):
     email = models.EmailField(blank=True, verbose_name='E-mail')
     site = models.URLField(blank=True, verbose_name='Site')
     matriz = models.BooleanField(default=False, verbose_name='É Matriz')
+    usuarios = models.ManyToManyField(User, blank=True, related_name='empresas', verbose_name='Usuários',
+                                      help_text='Usuários com acesso aos dados da empresa.')
 
     class Meta:
         verbose_name = 'Empresa'
@@ -58,4 +146,64 @@ class Configuracao(BaseModel):
         ordering = ['chave']
 
     def __str__(self):
-        return f"{self.chave}: {self.valor}"
\ No newline at end of file
+        return f"{self.chave}: {self.valor}"
+
+    def clean(self):
+        try:
+            self.valor_convertido()
+        except ValueError as e:
+            raise ValidationError({'valor': f'Valor inválido para o tipo {self.get_tipo_display()}: {e}'})
+
+    def valor_convertido(self):
+        """Valor convertido conforme o ``tipo``; levanta ``ValueError`` se incompatível"""
+        if self.tipo == 'integer':
+            return int(self.valor)
+        if self.tipo == 'float':
+            return float(self.valor.replace(',', '.'))
+        if self.tipo == 'boolean':
+            texto = self.valor.strip().lower()
+            if texto in ('1', 'true', 'sim', 's', 'verdadeiro'):
+                return True
+            if texto in ('0', 'false', 'nao', 'não', 'n', 'falso', ''):
+                return False
+            raise ValueError(f'"{self.valor}" não é verdadeiro/falso')
+        if self.tipo == 'json':
+            return json.loads(self.valor)
+        return self.valor
+
+
+class RelatorioJob(BaseModel):
+    """Relatório gerado em segundo plano pelo comando ``processar_relatorios``.
+
+    A fila é a própria tabela: os workers reservam os jobs pendentes com
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` (ver ``core.relatorios``).
+    """
+    tipo = models.CharField(max_length=50, verbose_name='Tipo')
+    parametros = models.JSONField(default=dict, blank=True, verbose_name='Parâmetros')
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name='Empresa')
+    situacao = models.CharField(max_length=20, choices=[
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ], default='pendente', verbose_name='Situação')
+    arquivo = models.FileField(upload_to='relatorios/%Y/%m/', blank=True, verbose_name='Arquivo')
+    linhas = models.PositiveIntegerField(null=True, blank=True, verbose_name='Linhas')
+    erro = models.TextField(blank=True, verbose_name='Erro')
+    tentativas = models.PositiveIntegerField(default=0, verbose_name='Tentativas')
+    worker = models.CharField(max_length=100, blank=True, verbose_name='Worker')
+    iniciado_em = models.DateTimeField(null=True, blank=True, verbose_name='Iniciado em')
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name='Concluído em')
+
+    class Meta:
+        verbose_name = 'Job de Relatório'
+        verbose_name_plural = 'Jobs de Relatórios'
+        ordering = ['-created_at']
+        indexes = [
+            # Fila: só os jobs ainda não concluídos, na ordem de chegada
+            models.Index(fields=['created_at', 'id'], name='relatoriojob_fila_idx',
+                         condition=models.Q(situacao__in=['pendente', 'processando'])),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.get_situacao_display()})"
@@ -0,0 +1,172 @@
+"""
+Isolamento dos dados por empresa.
+
+O escopo ativo — as empresas cujos dados podem ser lidos — fica em uma
+``ContextVar``, isolada por thread e por tarefa assíncrona:
+
+- nas requisições, ``core.middleware.EmpresaMiddleware`` ativa o escopo do
+  usuário: a empresa escolhida (cabeçalho ``X-Empresa`` ou sessão), se ele
+  tiver acesso a ela, ou todas as empresas a que tem acesso
+  (``Empresa.usuarios``). Superusuários sem empresa escolhida ficam sem
+  escopo;
+- em comandos e workers, ``escopo_empresa(empresa_id)`` ativa uma empresa.
+  Sem escopo ativo, o padrão fora das requisições, nada é filtrado.
+
+Os models por empresa usam ``EmpresaManager`` como manager padrão: todo
+queryset — inclusive os do admin e dos relacionamentos reversos — já sai
+filtrado por ``empresa_id`` e usa os índices que começam por ``empresa``.
+``sem_escopo()`` desliga o filtro nas rotinas que, de propósito, enxergam
+mais de uma empresa (transferências de estoque, validação de unicidade).
+
+Todas as empresas ficam no mesmo banco. Levar uma empresa para um banco ou
+schema próprio exigiria que as transações, o SQL escrito à mão
+(``connection.cursor()``) e as tabelas sem ``empresa`` (saldos diários, custo
+do estoque) usassem o mesmo alias que os models por empresa; sem isso, uma
+baixa ou um lançamento gravaria parte das tabelas em cada banco.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.exceptions import PermissionDenied
+from django.db import models
+
+CABECALHO_EMPRESA = 'X-Empresa'
+SESSAO_EMPRESA = 'empresa_id'
+
+# None: sem escopo; frozenset: ids das empresas; callable: escopo da requisição, resolvido no primeiro uso
+_escopo = ContextVar('escopo_empresa', default=None)
+
+
+def empresas_do_escopo():
+    """Ids das empresas visíveis no escopo ativo; ``None`` quando não há escopo"""
+    escopo = _escopo.get()
+    return escopo() if callable(escopo) else escopo
+
+
+def ativar_escopo(escopo):
+    """Ativa o escopo (ids ou callable) e retorna o token para ``desativar_escopo``"""
+    return _escopo.set(escopo)
+
+
+def desativar_escopo(token):
+    _escopo.reset(token)
+
+
+@contextmanager
+def escopo_empresa(*empresa_ids):
+    """Restringe as consultas dos models por empresa às empresas informadas"""
+    token = ativar_escopo(frozenset(empresa_ids))
+    try:
+        yield
+    finally:
+        desativar_escopo(token)
+
+
+@contextmanager
+def sem_escopo():
+    """Desliga o filtro por empresa; também serve de decorador"""
+    token = ativar_escopo(None)
+    try:
+        yield
+    finally:
+        desativar_escopo(token)
+
+
+class EscopoRequisicao:
+    """Escopo de uma requisição, resolvido na primeira consulta.
+
+    A resolução fica para o primeiro uso porque a autenticação do DRF (Basic,
+    por exemplo) só identifica o usuário dentro da view, depois dos
+    middlewares. Levanta ``PermissionDenied`` se a empresa escolhida não for
+    do usuário; usuário anônimo não enxerga nenhuma empresa.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._resolvido = None
+
+    def __call__(self):
+        usuario = getattr(self.request, 'user', None)
+        if usuario is None or not usuario.is_authenticated:
+            return frozenset()
+        if self._resolvido is None or self._resolvido[0] != usuario.pk:
+            self._resolvido = (usuario.pk, self._resolver(usuario))
+        return self._resolvido[1]
+
+    def escolhida(self):
+        empresa = self.request.headers.get(CABECALHO_EMPRESA)
+        if not empresa and hasattr(self.request, 'session'):
+            empresa = self.request.session.get(SESSAO_EMPRESA)
+        return empresa or None
+
+    def _resolver(self, usuario):
+        permitidas = empresas_do_usuario(usuario)
+        escolhida = self.escolhida()
+        if escolhida is None:
+            return permitidas
+        if not str(escolhida).isdigit() or (permitidas is not None and int(escolhida) not in permitidas):
+            raise PermissionDenied('Usuário sem acesso à empresa informada.')
+        return frozenset({int(escolhida)})
+
+
+def exigir_empresa(empresa_id):
+    """Levanta ``PermissionDenied`` se a empresa estiver fora do escopo ativo.
+
+    Para as rotinas que recebem o id da empresa e não passam pelo manager —
+    relatórios em cache, jobs enfileirados, importações.
+    """
+    empresas = empresas_do_escopo()
+    if empresas is not None and int(empresa_id) not in empresas:
+        raise PermissionDenied('Usuário sem acesso à empresa informada.')
+
+
+def empresas_do_usuario(usuario):
+    """Ids das empresas a que o usuário tem acesso; ``None`` (todas) para superusuários"""
+    if usuario.is_superuser:
+        return None
+    from .models import Empresa
+    return frozenset(Empresa.usuarios.through.objects.filter(user_id=usuario.pk)
+                     .values_list('empresa_id', flat=True))
+
+
+class EmpresaManager(models.Manager):
+    """Manager padrão dos models por empresa: filtra pelo escopo ativo.
+
+    ``campo`` é o caminho até o FK da empresa (``'pessoa__empresa'`` nos
+    papéis de ``Pessoa``).
+    """
+
+    def __init__(self, campo='empresa'):
+        super().__init__()
+        self.campo = campo
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        empresas = empresas_do_escopo()
+        if empresas is None:
+            return queryset
+        if len(empresas) == 1:
+            return queryset.filter(**{f'{self.campo}_id': next(iter(empresas))})
+        return queryset.filter(**{f'{self.campo}_id__in': sorted(empresas)})
+
+
+class ModeloPorEmpresa(models.Model):
+    """Base dos models com dados de uma empresa: manager com escopo.
+
+    A unicidade é validada sem escopo: um CPF/CNPJ ou código já usado em outra
+    empresa tem de aparecer como erro de validação, não como ``IntegrityError``.
+    """
+    objects = EmpresaManager()
+
+    class Meta:
+        abstract = True
+
+    def validate_unique(self, exclude=None):
+        with sem_escopo():
+            super().validate_unique(exclude=exclude)
+
+    def validate_constraints(self, exclude=None):
+        with sem_escopo():
+            super().validate_constraints(exclude=exclude)
+
@@ -0,0 +1,214 @@
+"""
+Particionamento mensal por intervalo (PostgreSQL) das tabelas de movimentações.
+
+``MovimentacaoFinanceira`` (por ``data``) e ``MovimentacaoEstoque`` (por
+``data_movimentacao``) só recebem inserções e crescem sem limite. Particionadas
+por mês, cada mês fica em uma tabela própria (``<tabela>_p<AAAAMM>``): o VACUUM
+e os índices trabalham em partições pequenas, as consultas com filtro de data
+leem só as partições do período (partition pruning) e os meses antigos saem da
+tabela com um ``DETACH``, sem ``DELETE``.
+
+- ``particionar`` converte a tabela (migrações ``financeiro.0009`` e
+  ``operacional.0006``): recria a tabela particionada com as mesmas colunas,
+  índices e chaves estrangeiras e copia os dados. A chave primária passa a ser
+  (id, coluna da partição), exigência do PostgreSQL para tabelas
+  particionadas, e o id sai de uma sequência própria, porque o PostgreSQL 16
+  não aceita coluna identity em tabela particionada;
+- ``criar_particao`` cria a partição de um mês e move para ela as linhas do
+  mês que estavam na partição padrão (``<tabela>_padrao``, que recebe as
+  datas sem partição);
+- ``desanexar_particao`` tira um mês da tabela e o guarda no schema
+  ``arquivo``, sem as chaves estrangeiras, ou o exclui. Os saldos diários
+  das contas bancárias desse mês continuam gravados: ``reconstruir_saldos`` e
+  ``verificar_saldos`` (``financeiro.saldos``) partem da movimentação mais
+  antiga que restou, com o último saldo anterior a ela como abertura.
+
+O comando ``gerenciar_particoes`` cria as partições dos próximos meses e
+desanexa as antigas. Índices novos nessas tabelas usam ``AddIndex``: o
+PostgreSQL não cria índices com CONCURRENTLY em tabelas particionadas.
+"""
+
+import datetime
+import re
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+MESES_FUTUROS = 3
+SCHEMA_ARQUIVO = 'arquivo'
+
+# tabela: coluna da partição
+PARTICIONADAS = {
+    'financeiro_movimentacaofinanceira': 'data',
+    'operacional_movimentacaoestoque': 'data_movimentacao',
+}
+
+_SUFIXO_MES = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+def primeiro_dia(data):
+    if isinstance(data, datetime.datetime):
+        data = timezone.localtime(data).date()
+    return data.replace(day=1)
+
+
+def somar_meses(mes, meses):
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return datetime.date(indice // 12, indice % 12 + 1, 1)
+
+
+def nome_particao(tabela, mes):
+    return f'{tabela}_p{mes:%Y%m}'
+
+
+def _limites(cursor, tabela, mes):
+    """Início e fim (exclusivo) do mês no tipo da coluna: datas ou meia-noite no fuso do sistema"""
+    cursor.execute(
+        'SELECT format_type(atttypid, atttypmod) FROM pg_attribute WHERE attrelid = %s::regclass AND attname = %s',
+        [tabela, PARTICIONADAS[tabela]],
+    )
+    limites = (mes, somar_meses(mes, 1))
+    if cursor.fetchone()[0] != 'timestamp with time zone':
+        return limites
+    fuso = ZoneInfo(settings.TIME_ZONE)
+    return tuple(datetime.datetime(dia.year, dia.month, 1, tzinfo=fuso) for dia in limites)
+
+
+def _existe(cursor, nome):
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [nome])
+    return cursor.fetchone()[0]
+
+
+def particoes(cursor, tabela):
+    """Meses (primeiro dia) das partições mensais anexadas à tabela, em ordem"""
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass',
+        [tabela],
+    )
+    meses = (_SUFIXO_MES.search(nome) for nome, in cursor.fetchall())
+    return sorted(datetime.date(int(m[1]), int(m[2]), 1) for m in meses if m)
+
+
+def criar_particao(cursor, tabela, mes):
+    """Cria a partição do mês, se ainda não existir; retorna se criou"""
+    nome = nome_particao(tabela, mes)
+    if _existe(cursor, nome):
+        return False
+    coluna, padrao = PARTICIONADAS[tabela], f'{tabela}_padrao'
+    inicio, fim = _limites(cursor, tabela, mes)
+    criacao = f'CREATE TABLE {nome} PARTITION OF {tabela} FOR VALUES FROM (%s) TO (%s)'
+    with transaction.atomic(using=cursor.db.alias):
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {padrao} WHERE {coluna} >= %s AND {coluna} < %s)',
+                       [inicio, fim])
+        if not cursor.fetchone()[0]:
+            cursor.execute(criacao, [inicio, fim])
+            return True
+        # Com linhas do mês na partição padrão, o PostgreSQL não cria a partição: a padrão sai da
+        # tabela durante a troca e as linhas são movidas
+        cursor.execute(f'ALTER TABLE {tabela} DETACH PARTITION {padrao}')
+        cursor.execute(criacao, [inicio, fim])
+        cursor.execute(
+            f'WITH movidas AS (DELETE FROM {padrao} WHERE {coluna} >= %s AND {coluna} < %s RETURNING *) '
+            f'INSERT INTO {tabela} SELECT * FROM movidas',
+            [inicio, fim],
+        )
+        cursor.execute(f'ALTER TABLE {tabela} ATTACH PARTITION {padrao} DEFAULT')
+    return True
+
+
+def desanexar_particao(cursor, tabela, mes, excluir=False):
+    """Tira a partição do mês da tabela e a move para o schema ``arquivo`` (ou a exclui)"""
+    nome = nome_particao(tabela, mes)
+    with transaction.atomic(using=cursor.db.alias):
+        # Verificações de chave estrangeira adiadas na transação impedem o ALTER TABLE da partição
+        cursor.db.check_constraints()
+        cursor.execute(f'ALTER TABLE {tabela} DETACH PARTITION {nome}')
+        if excluir:
+            cursor.execute(f'DROP TABLE {nome}')
+            return
+        # Sem as chaves estrangeiras, o arquivo não impede excluir os cadastros
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [nome])
+        for restricao, in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {nome} DROP CONSTRAINT {restricao}')
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {SCHEMA_ARQUIVO}')
+        cursor.execute(f'ALTER TABLE {nome} SET SCHEMA {SCHEMA_ARQUIVO}')
+
+
+def _recriar(cursor, tabela, particionada, meses_futuros=MESES_FUTUROS):
+    """Recria a tabela, particionada por mês ou não, com as mesmas colunas, índices, chaves e dados"""
+    coluna, antiga = PARTICIONADAS[tabela], f'{tabela}_antiga'
+    cursor.execute(
+        'SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid '
+        'WHERE x.indrelid = %s::regclass AND NOT x.indisprimary ORDER BY i.relname',
+        [tabela],
+    )
+    # Na tabela particionada a definição vem com ON ONLY, que não cria os índices das partições
+    indices = [(nome, definicao.replace(' ON ONLY ', ' ON ')) for nome, definicao in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('f', 'p') ORDER BY conname",
+        [tabela],
+    )
+    restricoes = cursor.fetchall()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [tabela])
+    sequencia = cursor.fetchone()[0]
+    cursor.execute(f'SELECT last_value, is_called FROM {sequencia}')
+    ultimo_id, chamado = cursor.fetchone()
+    cursor.execute(f'SELECT min({coluna}), max({coluna}) FROM {tabela}')
+    primeira, ultima = cursor.fetchone()
+
+    cursor.execute(f'ALTER TABLE {tabela} RENAME TO {antiga}')
+    for nome, _ in indices:
+        cursor.execute(f'DROP INDEX {nome}')
+    for nome, tipo, _ in restricoes:
+        if tipo == 'p':
+            cursor.execute(f'ALTER TABLE {antiga} DROP CONSTRAINT {nome}')
+    if particionada:
+        cursor.execute(f'ALTER TABLE {antiga} ALTER COLUMN id DROP IDENTITY')
+    else:
+        cursor.execute(f'ALTER TABLE {antiga} ALTER COLUMN id DROP DEFAULT')
+        cursor.execute(f'DROP SEQUENCE {sequencia}')
+
+    cursor.execute(
+        f'CREATE TABLE {tabela} (LIKE {antiga} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)'
+        + (f' PARTITION BY RANGE ({coluna})' if particionada else '')
+    )
+    if particionada:
+        cursor.execute(f'CREATE SEQUENCE {tabela}_id_seq OWNED BY {tabela}.id')
+        cursor.execute(f"ALTER TABLE {tabela} ALTER COLUMN id SET DEFAULT nextval('{tabela}_id_seq')")
+        cursor.execute(f'ALTER TABLE {tabela} ADD PRIMARY KEY (id, {coluna})')
+    else:
+        cursor.execute(f'ALTER TABLE {tabela} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(f'ALTER TABLE {tabela} ADD PRIMARY KEY (id)')
+    cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, %s)", [tabela, ultimo_id, chamado])
+
+    if particionada:
+        cursor.execute(f'CREATE TABLE {tabela}_padrao PARTITION OF {tabela} DEFAULT')
+        hoje = primeiro_dia(timezone.now())
+        mes = min(primeiro_dia(primeira), hoje) if primeira else hoje
+        while mes <= somar_meses(max(primeiro_dia(ultima), hoje) if ultima else hoje, meses_futuros):
+            criar_particao(cursor, tabela, mes)
+            mes = somar_meses(mes, 1)
+
+    # Índices e chaves depois da cópia: construir o índice uma vez é mais rápido que mantê-lo linha a linha
+    cursor.execute(f'INSERT INTO {tabela} SELECT * FROM {antiga}')
+    for _, definicao in indices:
+        cursor.execute(definicao)
+    for nome, tipo, definicao in restricoes:
+        if tipo == 'f':
+            cursor.execute(f'ALTER TABLE {tabela} ADD CONSTRAINT {nome} {definicao}')
+    cursor.execute(f'DROP TABLE {antiga}')
+    cursor.execute(f'ANALYZE {tabela}')
+
+
+def particionar(cursor, tabela, meses_futuros=MESES_FUTUROS):
+    """Converte a tabela em particionada por mês, com partições do primeiro mês com dados até
+    ``meses_futuros`` depois do mês atual"""
+    _recriar(cursor, tabela, particionada=True, meses_futuros=meses_futuros)
+
+
+def desparticionar(cursor, tabela):
+    """Volta a tabela particionada a uma tabela comum; partições arquivadas ficam de fora"""
+    _recriar(cursor, tabela, particionada=False)
@@ -0,0 +1,187 @@
+"""
+Perfil das consultas SQL por requisição.
+
+Com ``PERFIL_CONSULTAS_ATIVO``, o ``core.middleware.PerfilConsultasMiddleware``
+sorteia uma fração ``PERFIL_CONSULTAS_AMOSTRAGEM`` das requisições e, só nelas,
+instala um ``execute_wrapper`` nas conexões de banco que mede cada consulta.
+Requisições fora da amostra custam um sorteio. No fim da requisição é guardado
+um ``PerfilRequisicao`` com o endpoint (nome da rota), o número de consultas,
+o tempo no banco, as consultas repetidas e as mais lentas.
+
+Consultas repetidas têm a mesma impressão digital: o SQL sem literais, com os
+parâmetros como ``?`` e as listas ``IN (?, ?, ...)`` resumidas — o padrão de
+N+1 aparece como uma impressão digital executada N vezes. Os parâmetros nunca
+são guardados.
+
+Os perfis ficam em um buffer circular de ``PERFIL_CONSULTAS_TAMANHO``
+posições na memória do processo: cada worker do gunicorn tem o seu, e
+reiniciar o processo o esvazia. ``ranking`` agrega o buffer por endpoint para
+a página ``admin/perfil-consultas/``.
+"""
+
+import functools
+import heapq
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+# Critérios de ordenação do ranking, do mais custoso para o menos
+ORDENS = {
+    'tempo_banco': 'Tempo no banco',
+    'consultas': 'Consultas',
+    'repetidas': 'Consultas repetidas',
+    'requisicoes': 'Requisições',
+}
+
+_LITERAIS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|%s|\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\?(?:\s*,\s*\?)+'), '?, ...'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+@functools.lru_cache(maxsize=1024)
+def impressao_digital(sql):
+    """SQL normalizado: literais e parâmetros como ``?``, listas resumidas e espaços simples"""
+    for padrao, troca in _LITERAIS:
+        sql = padrao.sub(troca, sql)
+    return sql.strip()
+
+
+@dataclass
+class PerfilRequisicao:
+    endpoint: str
+    status: int
+    # Tempos em milissegundos
+    duracao: float
+    consultas: int
+    tempo_banco: float
+    # [(impressão digital, vezes, tempo)] das executadas mais de uma vez
+    repetidas: list = field(default_factory=list)
+    # [(tempo, sql)] das mais lentas, da mais lenta para a menos
+    lentas: list = field(default_factory=list)
+    registrado_em: float = 0.0
+
+    @property
+    def consultas_repetidas(self):
+        """Consultas que sobrariam se cada impressão digital executasse uma vez só"""
+        return sum(vezes - 1 for _, vezes, _ in self.repetidas)
+
+
+@dataclass
+class ResumoEndpoint:
+    endpoint: str
+    requisicoes: int = 0
+    consultas: int = 0
+    repetidas: int = 0
+    tempo_banco: float = 0.0
+    maior_tempo_banco: float = 0.0
+    duracao: float = 0.0
+
+    @property
+    def media_consultas(self):
+        return self.consultas / self.requisicoes
+
+    @property
+    def media_tempo_banco(self):
+        return self.tempo_banco / self.requisicoes
+
+    @property
+    def fracao_banco(self):
+        return self.tempo_banco / self.duracao if self.duracao else 0.0
+
+
+class Medidor:
+    """``execute_wrapper`` que anota ``(sql, tempo)`` de cada consulta executada"""
+
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append((sql, (time.perf_counter() - inicio) * 1000))
+
+
+_trava = threading.Lock()
+# Criado no primeiro registro, com o tamanho configurado
+_buffer = None
+
+
+def limpar():
+    """Esvazia o buffer; o próximo registro o recria com o tamanho configurado"""
+    global _buffer
+    with _trava:
+        _buffer = None
+
+
+def registrar(endpoint, status, duracao, consultas):
+    """Monta o perfil da requisição a partir das ``(sql, tempo)`` do ``Medidor`` e o guarda no buffer"""
+    global _buffer
+    por_impressao = {}
+    for sql, tempo in consultas:
+        chave = impressao_digital(sql)
+        vezes, total = por_impressao.get(chave, (0, 0.0))
+        por_impressao[chave] = (vezes + 1, total + tempo)
+    perfil = PerfilRequisicao(
+        endpoint=endpoint, status=status, duracao=duracao * 1000, consultas=len(consultas),
+        tempo_banco=sum(tempo for _, tempo in consultas),
+        repetidas=sorted(((chave, vezes, total) for chave, (vezes, total) in por_impressao.items() if vezes > 1),
+                         key=lambda item: -item[1]),
+        lentas=[(tempo, sql) for sql, tempo in
+                heapq.nlargest(settings.PERFIL_CONSULTAS_LENTAS, consultas, key=lambda item: item[1])],
+        registrado_em=time.time(),
+    )
+    with _trava:
+        if _buffer is None:
+            _buffer = deque(maxlen=settings.PERFIL_CONSULTAS_TAMANHO)
+        _buffer.append(perfil)
+    return perfil
+
+
+def perfis():
+    """Cópia do buffer, do perfil mais antigo para o mais recente"""
+    with _trava:
+        return list(_buffer or ())
+
+
+def ranking(registros=None, ordem='tempo_banco'):
+    """Endpoints agregados, do mais custoso para o menos segundo ``ordem`` (ver ``ORDENS``)"""
+    resumos = {}
+    for perfil in perfis() if registros is None else registros:
+        resumo = resumos.get(perfil.endpoint)
+        if resumo is None:
+            resumo = resumos[perfil.endpoint] = ResumoEndpoint(perfil.endpoint)
+        resumo.requisicoes += 1
+        resumo.consultas += perfil.consultas
+        resumo.repetidas += perfil.consultas_repetidas
+        resumo.tempo_banco += perfil.tempo_banco
+        resumo.maior_tempo_banco = max(resumo.maior_tempo_banco, perfil.tempo_banco)
+        resumo.duracao += perfil.duracao
+    return sorted(resumos.values(), key=lambda resumo: (-getattr(resumo, ordem), resumo.endpoint))
+
+
+def repetidas(registros=None, limite=20):
+    """Impressões digitais mais repetidas: ``[(endpoint, impressão digital, requisições, vezes, tempo)]``"""
+    somas = {}
+    for perfil in perfis() if registros is None else registros:
+        for chave, vezes, tempo in perfil.repetidas:
+            requisicoes, total_vezes, total_tempo = somas.get((perfil.endpoint, chave), (0, 0, 0.0))
+            somas[perfil.endpoint, chave] = (requisicoes + 1, total_vezes + vezes, total_tempo + tempo)
+    return heapq.nlargest(limite, ((endpoint, chave, *valores) for (endpoint, chave), valores in somas.items()),
+                          key=lambda item: item[3])
+
+
+def lentas(registros=None, limite=20):
+    """Consultas mais lentas do buffer: ``[(tempo, endpoint, sql)]``"""
+    return heapq.nlargest(limite, (
+        (tempo, perfil.endpoint, sql)
+        for perfil in (perfis() if registros is None else registros) for tempo, sql in perfil.lentas
+    ), key=lambda item: item[0])
@@ -0,0 +1,144 @@
+"""
+Fila de relatórios gerados em segundo plano.
+
+Um relatório pesado vira um ``RelatorioJob`` pendente; o comando
+``processar_relatorios`` reserva os jobs com ``SELECT ... FOR UPDATE SKIP
+LOCKED`` — vários workers, em uma ou mais máquinas, nunca pegam o mesmo job e
+nem esperam uns pelos outros — e os executa em um pool de processos. O
+resultado é gravado como CSV no storage de mídia (``MEDIA_ROOT``).
+
+Cada tipo de relatório é uma função que recebe ``empresa_id`` e os parâmetros
+do job e gera as linhas, a primeira sendo o cabeçalho. As funções ficam nos
+apps e são referenciadas por caminho, para o ``core`` não importar os apps.
+"""
+
+import csv
+import datetime
+import io
+import tempfile
+import traceback
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Empresa, RelatorioJob
+from .multiempresa import escopo_empresa
+
+# tipo: (descrição, função que gera as linhas, parâmetros obrigatórios)
+RELATORIOS = {
+    'dre': ('Demonstração do Resultado', 'financeiro.relatorios.linhas_dre', ['data_inicio', 'data_fim']),
+    'fluxo-caixa': ('Fluxo de Caixa Realizado', 'financeiro.relatorios.linhas_fluxo_caixa',
+                    ['data_inicio', 'data_fim']),
+    'estoque-valorizado': ('Estoque Valorizado', 'operacional.estoque.linhas_estoque_valorizado', []),
+}
+
+MAX_TENTATIVAS = 3
+
+
+def _converter_parametros(tipo, parametros):
+    """Valida os parâmetros obrigatórios do tipo; ``data_*`` viram ``date``"""
+    convertidos = {}
+    for nome in RELATORIOS[tipo][2]:
+        valor = parametros.get(nome)
+        if valor in (None, ''):
+            raise ValueError(f'Informe o parâmetro {nome}.')
+        if nome.startswith('data_'):
+            try:
+                valor = datetime.date.fromisoformat(str(valor))
+            except ValueError:
+                raise ValueError(f'{nome} deve ser uma data no formato AAAA-MM-DD.')
+        convertidos[nome] = valor
+    return convertidos
+
+
+def enfileirar(tipo, empresa_id, parametros=None, usuario=None):
+    """Cria o job pendente; levanta ``ValueError`` para tipo ou parâmetros inválidos"""
+    if tipo not in RELATORIOS:
+        raise ValueError(f'Tipo de relatório inválido: {tipo}.')
+    parametros = parametros or {}
+    _converter_parametros(tipo, parametros)
+    if not Empresa.objects.filter(pk=empresa_id).exists():
+        raise ValueError(f'Empresa {empresa_id} não encontrada.')
+    return RelatorioJob.objects.create(
+        tipo=tipo, empresa_id=empresa_id,
+        parametros={nome: parametros[nome] for nome in RELATORIOS[tipo][2]},
+        created_by=usuario, updated_by=usuario,
+    )
+
+
+def reservar(quantidade, worker):
+    """Reserva até ``quantidade`` jobs para ``worker`` e devolve os ids.
+
+    Além dos pendentes, retoma os que ficaram em processamento por mais de
+    ``RELATORIOS_TEMPO_MAXIMO`` segundos (worker que morreu no meio), até
+    ``MAX_TENTATIVAS`` vezes.
+    """
+    agora = timezone.now()
+    limite = agora - datetime.timedelta(seconds=settings.RELATORIOS_TEMPO_MAXIMO)
+    abandonados = Q(situacao='processando', iniciado_em__lt=limite)
+    with transaction.atomic():
+        RelatorioJob.objects.filter(abandonados, tentativas__gte=MAX_TENTATIVAS).update(
+            situacao='erro', erro='Tempo máximo de processamento excedido.', concluido_em=agora,
+        )
+        ids = list(
+            RelatorioJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(situacao='pendente') | abandonados)
+            .order_by('created_at', 'pk').values_list('pk', flat=True)[:quantidade]
+        )
+        RelatorioJob.objects.filter(pk__in=ids).update(
+            situacao='processando', worker=worker, iniciado_em=agora, tentativas=F('tentativas') + 1,
+        )
+    return ids
+
+
+def formatar_csv(valor):
+    """Valor como texto para CSV no padrão brasileiro: vírgula decimal e datas em DD/MM/AAAA"""
+    if valor is None:
+        return ''
+    if isinstance(valor, Decimal):
+        return str(valor).replace('.', ',')
+    if hasattr(valor, 'strftime'):
+        return valor.strftime('%d/%m/%Y')
+    return valor
+
+
+def _gravar_csv(linhas, destino):
+    """Escreve as linhas em ``destino`` (arquivo binário) e retorna quantas linhas de dados foram gravadas"""
+    texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+    escritor = csv.writer(texto, delimiter=';')
+    total = -1
+    for linha in linhas:
+        escritor.writerow([formatar_csv(valor) for valor in linha])
+        total += 1
+    texto.flush()
+    texto.detach()
+    return max(total, 0)
+
+
+def executar(job_id, worker=''):
+    """Gera o arquivo do job; roda no processo do pool. Retorna a situação final"""
+    job = RelatorioJob.objects.get(pk=job_id)
+    meus = RelatorioJob.objects.filter(pk=job.pk, worker=worker, situacao='processando')
+    try:
+        funcao = import_string(RELATORIOS[job.tipo][1])
+        parametros = _converter_parametros(job.tipo, job.parametros)
+        with tempfile.TemporaryFile() as temporario:
+            with escopo_empresa(job.empresa_id):
+                linhas = _gravar_csv(funcao(job.empresa_id, **parametros), temporario)
+            temporario.seek(0)
+            job.arquivo.save(f'{job.tipo}-{job.pk}.csv', File(temporario), save=False)
+    except Exception:
+        meus.update(situacao='erro', erro=traceback.format_exc(limit=5), concluido_em=timezone.now())
+        return 'erro'
+
+    if not meus.update(situacao='concluido', arquivo=job.arquivo.name, linhas=linhas, erro='',
+                       concluido_em=timezone.now()):
+        # Outro worker retomou o job depois do tempo máximo; este arquivo fica sem dono
+        job.arquivo.delete(save=False)
+        return 'descartado'
+    return 'concluido'
@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import configuracoes
+from .models import Configuracao
+
+
+@receiver(post_save, sender=Configuracao)
+@receiver(post_delete, sender=Configuracao)
+def invalidar_configuracoes(sender, **kwargs):
+    # Só depois do commit: antes disso os outros processos recarregariam o valor antigo
+    transaction.on_commit(configuracoes.invalidar)
@@ -1,3 +1,473 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import tempfile
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from financeiro.models import (
+    Banco, CentroCusto, ContasBancarias, ContasPagar, ContasReceber, FormaPagamento,
+    MovimentacaoFinanceira, PlanoContas
+)
+from financeiro.saldos import saldo_em, verificar_saldos
+from operacional import categorias
+from operacional.models import (
+    Categoria, Cliente, Estoque, Fornecedor, Funcionario, MovimentacaoEstoque, Pessoa, Produto,
+    UnidadeMedida
+)
+from . import configuracoes, particoes, perfil_consultas, relatorios
+from .multiempresa import escopo_empresa, sem_escopo
+from .models import Configuracao, Empresa, RelatorioJob
+
+
+def popular_cadastros(quantidade):
+    """Cria ``quantidade`` registros de cada model, cada um com suas próprias FKs"""
+    hoje = datetime.date(2025, 6, 30)
+    categoria_pai = plano_pai = centro_pai = None
+    for i in range(quantidade):
+        empresa = Empresa.objects.create(nome=f'Empresa {i}', cnpj=f'{i:014d}', razao_social=f'Empresa {i}',
+                                         endereco='-')
+        Configuracao.objects.create(chave=f'chave_{i}', valor=str(i), tipo='integer')
+
+        pessoas = [
+            Pessoa.objects.create(nome=f'Pessoa {i}-{papel}', tipo_pessoa='fisica', cpf_cnpj=f'{i:08d}{indice}',
+                                  empresa=empresa)
+            for indice, papel in enumerate(('C', 'F', 'U'))
+        ]
+        cliente = Cliente.objects.create(pessoa=pessoas[0], codigo=f'C{i}')
+        fornecedor = Fornecedor.objects.create(pessoa=pessoas[1], codigo=f'F{i}')
+        Funcionario.objects.create(pessoa=pessoas[2], codigo=f'U{i}', cargo='Cargo', setor='Setor',
+                                   salario=Decimal('1000.00'), data_admissao=hoje)
+
+        categoria_pai = Categoria.objects.create(nome=f'Categoria {i}', pai=categoria_pai)
+        unidade = UnidadeMedida.objects.create(nome=f'Unidade {i}', sigla=f'U{i}')
+        produto = Produto.objects.create(codigo=f'P{i}', nome=f'Produto {i}', categoria=categoria_pai,
+                                         unidade_medida=unidade)
+        Estoque.objects.create(produto=produto, quantidade=Decimal('10'), empresa=empresa)
+        MovimentacaoEstoque.objects.create(produto=produto, tipo='entrada', quantidade=Decimal('10'),
+                                           valor_unitario=Decimal('1.00'), motivo='Compra', empresa=empresa)
+
+        banco = Banco.objects.create(codigo=f'{i:03d}', nome=f'Banco {i}')
+        conta = ContasBancarias.objects.create(banco=banco, agencia='1', conta=str(i), digito='0',
+                                               tipo='corrente', empresa=empresa)
+        plano_pai = PlanoContas.objects.create(codigo=f'{i}', nome=f'Conta {i}', tipo='receita', pai=plano_pai,
+                                               empresa=empresa)
+        centro_pai = CentroCusto.objects.create(codigo=f'{i}', nome=f'Centro {i}', pai=centro_pai,
+                                                empresa=empresa)
+        forma = FormaPagamento.objects.create(nome=f'Forma {i}', tipo='pix')
+        classificacao = dict(conta_contabil=plano_pai, centro_custo=centro_pai, empresa=empresa)
+        titulo = dict(data_emissao=hoje, data_vencimento=hoje - datetime.timedelta(days=i),
+                      valor_original=Decimal('100.00'), forma_pagamento=forma, conta_bancaria=conta,
+                      **classificacao)
+        receber = ContasReceber.objects.create(numero_documento=f'R{i}', cliente=cliente, **titulo)
+        ContasPagar.objects.create(numero_documento=f'P{i}', fornecedor=fornecedor, **titulo)
+        MovimentacaoFinanceira.objects.create(data=hoje, tipo='entrada', valor=Decimal('100.00'), descricao='-',
+                                              conta_bancaria=conta, conta_receber=receber, **classificacao)
+
+
+class ChangelistOrcamentoConsultasTests(TestCase):
+    """Toda listagem do admin deve usar um número fixo de consultas, qualquer que seja a página"""
+
+    APPS = ('core', 'financeiro', 'operacional')
+    ORCAMENTO = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        popular_cadastros(25)
+        cls.usuario = User.objects.create_superuser('admin', 'admin@erp.com', 'admin')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        categorias.invalidar()
+
+    def contar_consultas(self, model, model_admin, por_pagina):
+        url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        # Aquece os caches em processo (ex.: árvore de categorias dos filtros)
+        self.client.get(url)
+        with mock.patch.object(model_admin, 'list_per_page', por_pagina), \
+                CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return len(consultas)
+
+    def test_listagens_com_orcamento_fixo_de_consultas(self):
+        admins = [(model, model_admin) for model, model_admin in admin.site._registry.items()
+                  if model._meta.app_label in self.APPS]
+        self.assertTrue(admins)
+        for model, model_admin in admins:
+            with self.subTest(model._meta.label):
+                pagina_pequena = self.contar_consultas(model, model_admin, 2)
+                pagina_grande = self.contar_consultas(model, model_admin, 100)
+                self.assertEqual(pagina_pequena, pagina_grande,
+                                 f'{model._meta.label}: consultas crescem com o tamanho da página')
+                self.assertLessEqual(pagina_grande, self.ORCAMENTO)
+
+
+class ConfiguracoesEmCacheTests(TestCase):
+    def setUp(self):
+        configuracoes.invalidar()
+        Configuracao.objects.bulk_create([
+            Configuracao(chave='parcelas', valor='12', tipo='integer'),
+            Configuracao(chave='taxa', valor='2,5', tipo='float'),
+            Configuracao(chave='ativo', valor='sim', tipo='boolean'),
+            Configuracao(chave='bancos', valor='{"padrao": "001"}', tipo='json'),
+            Configuracao(chave='inativa', valor='x', is_active=False),
+        ])
+
+    # Sem as consultas do cache compartilhado (tabela no banco, por padrão)
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_valores_tipados_sem_consultas_apos_a_carga(self):
+        configuracoes.invalidar()
+        with self.assertNumQueries(1):
+            self.assertEqual(configuracoes.obter('parcelas'), 12)
+        with self.assertNumQueries(0):
+            self.assertEqual(configuracoes.obter('taxa'), 2.5)
+            self.assertIs(configuracoes.obter('ativo'), True)
+            self.assertEqual(configuracoes.obter('bancos'), {'padrao': '001'})
+            self.assertEqual(configuracoes.obter('inativa', 'padrão'), 'padrão')
+
+    def test_alteracao_invalida_o_cache(self):
+        self.assertEqual(configuracoes.obter('parcelas'), 12)
+        with self.captureOnCommitCallbacks(execute=True):
+            configuracao = Configuracao.objects.get(chave='parcelas')
+            configuracao.valor = '6'
+            configuracao.save()
+        self.assertEqual(configuracoes.obter('parcelas'), 6)
+
+    def test_versao_alterada_por_outro_processo(self):
+        self.assertEqual(configuracoes.obter('parcelas'), 12)
+        Configuracao.objects.filter(chave='parcelas').update(valor='24')
+        # Outro processo incrementou a versão compartilhada; o intervalo de verificação já passou
+        cache.incr(configuracoes.CHAVE_VERSAO)
+        with self.settings(CONFIGURACOES_VERIFICAR_A_CADA=0):
+            self.assertEqual(configuracoes.obter('parcelas'), 24)
+
+    @skipUnless(settings.CACHES['default']['BACKEND'].endswith('.DatabaseCache'), 'Cache em outro backend')
+    def test_versao_no_cache_compartilhado(self):
+        configuracoes.invalidar()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT cache_key FROM {settings.CACHES["default"]["LOCATION"]}')
+            self.assertIn(f':1:{configuracoes.CHAVE_VERSAO}', [linha[0] for linha in cursor.fetchall()])
+
+    def test_valor_incompativel_com_o_tipo(self):
+        with self.assertRaises(ValidationError):
+            Configuracao(chave='x', valor='abc', tipo='integer').full_clean()
+
+
+class RelatoriosEmSegundoPlanoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        conta = ContasBancarias.objects.create(banco=Banco.objects.create(codigo='001', nome='Banco'),
+                                               agencia='1', conta='1', digito='0', tipo='corrente',
+                                               empresa=cls.empresa)
+        centro = CentroCusto.objects.create(codigo='1', nome='Centro', empresa=cls.empresa)
+        vendas = PlanoContas.objects.create(codigo='3.1', nome='Vendas', tipo='receita', empresa=cls.empresa)
+        aluguel = PlanoContas.objects.create(codigo='4.1', nome='Aluguel', tipo='despesa', empresa=cls.empresa)
+        for dia, tipo, valor, plano in ((2, 'entrada', '1000.00', vendas), (3, 'saida', '300.00', aluguel),
+                                        (4, 'saida', '50.00', vendas)):
+            MovimentacaoFinanceira.objects.create(
+                data=datetime.date(2025, 3, dia), tipo=tipo, valor=Decimal(valor), descricao='-',
+                conta_contabil=plano, centro_custo=centro, conta_bancaria=conta, empresa=cls.empresa)
+        cls.usuario = User.objects.create_user('usuario', password='senha')
+        cls.usuario.empresas.add(cls.empresa)
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = self.settings(MEDIA_ROOT=diretorio.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.client.force_login(self.usuario)
+
+    def test_enfileira_processa_e_baixa_o_arquivo(self):
+        resposta = self.client.post(reverse('core:relatorio-jobs'), {
+            'tipo': 'dre', 'empresa': self.empresa.pk,
+            'parametros': {'data_inicio': '2025-03-01', 'data_fim': '2025-03-31'},
+        }, content_type='application/json')
+        self.assertEqual(resposta.status_code, 202)
+        self.assertEqual(resposta.json()['situacao'], 'pendente')
+
+        call_command('processar_relatorios', processos=0, uma_vez=True, stdout=io.StringIO())
+
+        job = self.client.get(resposta['Location']).json()
+        self.assertEqual((job['situacao'], job['linhas']), ('concluido', 5))
+        arquivo = self.client.get(job['arquivo'])
+        conteudo = b''.join(arquivo.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(conteudo[1:3], ['3.1;Vendas;Receita;950,00', '4.1;Aluguel;Despesa;300,00'])
+        self.assertEqual(conteudo[-1], ';Resultado do Período;;650,00')
+
+    def test_parametros_invalidos(self):
+        resposta = self.client.post(reverse('core:relatorio-jobs'), {
+            'tipo': 'fluxo-caixa', 'empresa': self.empresa.pk, 'parametros': {'data_inicio': '01/03/2025'},
+        }, content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(RelatorioJob.objects.exists())
+
+    def test_reserva_nao_repete_jobs_e_retoma_os_abandonados(self):
+        jobs = [relatorios.enfileirar('estoque-valorizado', self.empresa.pk) for _ in range(3)]
+        self.assertEqual(relatorios.reservar(2, 'a'), [jobs[0].pk, jobs[1].pk])
+        self.assertEqual(relatorios.reservar(2, 'b'), [jobs[2].pk])
+        self.assertEqual(relatorios.reservar(2, 'b'), [])
+
+        RelatorioJob.objects.filter(pk=jobs[0].pk).update(
+            iniciado_em=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(relatorios.reservar(2, 'c'), [jobs[0].pk])
+        # O worker original não sobrescreve o resultado de quem retomou o job
+        self.assertEqual(relatorios.executar(jobs[0].pk, 'a'), 'descartado')
+        self.assertEqual(relatorios.executar(jobs[0].pk, 'c'), 'concluido')
+
+    def test_job_de_outro_usuario_nao_e_visivel(self):
+        job = relatorios.enfileirar('estoque-valorizado', self.empresa.pk,
+                                    usuario=User.objects.create_user('outro'))
+        self.assertEqual(self.client.get(reverse('core:relatorio-job', args=[job.pk])).status_code, 404)
+
+    def test_equipe_nao_ve_jobs_de_outra_empresa(self):
+        outra = Empresa.objects.create(nome='Outra', cnpj='2', razao_social='Outra', endereco='-')
+        job = relatorios.enfileirar('estoque-valorizado', outra.pk)
+        relatorios.reservar(1, 'a')
+        self.assertEqual(relatorios.executar(job.pk, 'a'), 'concluido')
+        proprio = relatorios.enfileirar('estoque-valorizado', self.empresa.pk)
+        equipe = User.objects.create_user('equipe', is_staff=True)
+        equipe.empresas.add(self.empresa)
+        equipe.user_permissions.add(Permission.objects.get(codename='view_relatoriojob'))
+        self.client.force_login(equipe)
+
+        self.assertEqual(self.client.get(reverse('core:relatorio-job', args=[job.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('core:relatorio-arquivo', args=[job.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('core:relatorio-job', args=[proprio.pk])).status_code, 200)
+        resposta = self.client.get(reverse('admin:core_relatoriojob_changelist'))
+        self.assertEqual([j.pk for j in resposta.context['cl'].result_list], [proprio.pk])
+
+
+class EscopoPorEmpresaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresas = [Empresa.objects.create(nome=f'Empresa {i}', cnpj=str(i), razao_social=f'Empresa {i}',
+                                               endereco='-') for i in range(2)]
+        cls.pessoas = [Pessoa.objects.create(nome=f'Pessoa {i}', tipo_pessoa='fisica', cpf_cnpj=f'{i}00',
+                                             empresa=empresa) for i, empresa in enumerate(cls.empresas)]
+        for i, pessoa in enumerate(cls.pessoas):
+            Cliente.objects.create(codigo=f'C{i}', pessoa=pessoa)
+        cls.usuario = User.objects.create_user('usuario', password='senha')
+        cls.usuario.empresas.add(cls.empresas[0])
+
+    def test_manager_filtra_pela_empresa_do_escopo(self):
+        primeira, segunda = self.empresas
+        self.assertEqual(Pessoa.objects.count(), 2)
+        with escopo_empresa(primeira.pk):
+            self.assertEqual(list(Pessoa.objects.all()), [self.pessoas[0]])
+            self.assertEqual([c.codigo for c in Cliente.objects.all()], ['C0'])
+            self.assertFalse(Pessoa.objects.filter(empresa=segunda).exists())
+            with CaptureQueriesContext(connection) as capturadas:
+                list(Pessoa.objects.filter(nome__startswith='P'))
+            self.assertIn('"empresa_id" = %s' % primeira.pk, capturadas[0]['sql'])
+            with sem_escopo():
+                self.assertEqual(Pessoa.objects.count(), 2)
+        with escopo_empresa(*[empresa.pk for empresa in self.empresas]):
+            self.assertEqual(Pessoa.objects.count(), 2)
+
+    def test_unicidade_considera_as_outras_empresas(self):
+        with escopo_empresa(self.empresas[0].pk):
+            with self.assertRaises(ValidationError):
+                Pessoa(nome='Outra', tipo_pessoa='fisica', cpf_cnpj='100', empresa=self.empresas[0]).full_clean()
+
+    def test_requisicao_enxerga_so_as_empresas_do_usuario(self):
+        self.client.force_login(self.usuario)
+        url = reverse('operacional:busca-pessoas')
+        resposta = self.client.get(url, {'q': 'pessoa'})
+        self.assertEqual([p['id'] for p in resposta.json()['resultados']], [self.pessoas[0].pk])
+        resposta = self.client.get(url, {'q': 'pessoa'}, HTTP_X_EMPRESA=str(self.empresas[1].pk))
+        self.assertEqual(resposta.status_code, 403)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@erp.com', 'admin'))
+        self.assertEqual(len(self.client.get(url, {'q': 'pessoa'}).json()['resultados']), 2)
+        resposta = self.client.get(url, {'q': 'pessoa'}, HTTP_X_EMPRESA=str(self.empresas[1].pk))
+        self.assertEqual([p['id'] for p in resposta.json()['resultados']], [self.pessoas[1].pk])
+
+    def test_empresa_ativa_da_sessao(self):
+        self.client.force_login(self.usuario)
+        url = reverse('core:empresa-ativa')
+        self.assertEqual([e['id'] for e in self.client.get(url).json()['empresas']], [self.empresas[0].pk])
+        self.assertEqual(self.client.post(url, {'empresa': self.empresas[1].pk}).status_code, 403)
+        self.assertEqual(self.client.post(url, {'empresa': self.empresas[0].pk}).status_code, 200)
+        self.assertEqual(self.client.get(url).json()['empresa'], self.empresas[0].pk)
+
+
+class ParticionamentoMensalTests(TestCase):
+    FINANCEIRO = MovimentacaoFinanceira._meta.db_table
+    ESTOQUE = MovimentacaoEstoque._meta.db_table
+    MARCO = datetime.date(2025, 3, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@erp.com', 'admin')
+        empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        cls.classificacao = dict(
+            conta_contabil=PlanoContas.objects.create(codigo='1', nome='Conta', tipo='receita', empresa=empresa),
+            centro_custo=CentroCusto.objects.create(codigo='1', nome='Centro', empresa=empresa),
+            conta_bancaria=ContasBancarias.objects.create(banco=Banco.objects.create(codigo='001', nome='Banco'),
+                                                          agencia='1', conta='1', digito='0', tipo='corrente',
+                                                          empresa=empresa),
+            empresa=empresa,
+        )
+
+    def movimentar(self, data):
+        return MovimentacaoFinanceira.objects.create(data=data, tipo='entrada', valor=Decimal('10.00'),
+                                                     descricao='-', **self.classificacao)
+
+    def linhas(self, tabela):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {tabela}')
+            return cursor.fetchone()[0]
+
+    def test_criar_particao_move_as_linhas_da_particao_padrao(self):
+        movimentacao = self.movimentar(datetime.date(2025, 3, 15))
+        self.assertEqual(self.linhas(f'{self.FINANCEIRO}_padrao'), 1)
+        with connection.cursor() as cursor:
+            self.assertTrue(particoes.criar_particao(cursor, self.FINANCEIRO, self.MARCO))
+            self.assertFalse(particoes.criar_particao(cursor, self.FINANCEIRO, self.MARCO))
+        self.assertEqual(self.linhas(f'{self.FINANCEIRO}_padrao'), 0)
+        self.assertEqual(self.linhas(f'{self.FINANCEIRO}_p202503'), 1)
+        self.assertEqual(MovimentacaoFinanceira.objects.get(), movimentacao)
+
+    def test_comando_cria_meses_futuros_e_arquiva_os_antigos(self):
+        with connection.cursor() as cursor:
+            particoes.criar_particao(cursor, self.FINANCEIRO, datetime.date(2020, 1, 1))
+        self.movimentar(datetime.date(2020, 1, 10))
+        atual = self.movimentar(timezone.localdate())
+        saida = io.StringIO()
+        call_command('gerenciar_particoes', reter_meses=24, tabela=[self.FINANCEIRO], stdout=saida)
+
+        self.assertIn(f'{self.FINANCEIRO}_p202001', saida.getvalue())
+        self.assertEqual(list(MovimentacaoFinanceira.objects.all()), [atual])
+        self.assertEqual(self.linhas(f'{particoes.SCHEMA_ARQUIVO}.{self.FINANCEIRO}_p202001'), 1)
+        with connection.cursor() as cursor:
+            meses = particoes.particoes(cursor, self.FINANCEIRO)
+        mes_atual = timezone.localdate().replace(day=1)
+        self.assertEqual(meses[-1], particoes.somar_meses(mes_atual, particoes.MESES_FUTUROS))
+        self.assertNotIn(datetime.date(2020, 1, 1), meses)
+
+    def test_saldos_diarios_depois_de_desanexar_meses(self):
+        with connection.cursor() as cursor:
+            for mes in (1, 2, 3):
+                particoes.criar_particao(cursor, self.FINANCEIRO, datetime.date(2025, mes, 1))
+        for data in (datetime.date(2025, 1, 20), datetime.date(2025, 2, 10), datetime.date(2025, 3, 5)):
+            self.movimentar(data)
+        conta = self.classificacao['conta_bancaria']
+        with connection.cursor() as cursor:
+            for mes in (1, 2):
+                particoes.desanexar_particao(cursor, self.FINANCEIRO, datetime.date(2025, mes, 1))
+
+        # Os saldos dos meses desanexados ficam e são o saldo de abertura do recálculo
+        self.assertEqual(verificar_saldos(), [])
+        call_command('reconstruir_saldos', stdout=io.StringIO())
+        self.assertEqual(saldo_em(conta.pk, datetime.date(2025, 3, 31)), Decimal('30.00'))
+        self.assertEqual(saldo_em(conta.pk, datetime.date(2025, 2, 15)), Decimal('20.00'))
+        saida = io.StringIO()
+        call_command('reconstruir_saldos', verificar=True, stdout=saida)
+        self.assertIn('conferem', saida.getvalue())
+
+    def particoes_lidas(self, model, params):
+        """Tabelas lidas pela listagem do admin com os filtros ``params``"""
+        request = RequestFactory().get('/', params)
+        request.user = self.usuario
+        changelist = admin.site._registry[model].get_changelist_instance(request)
+        plano = json.loads(changelist.get_queryset(request).explain(format='json'))[0]['Plan']
+        nos = [plano]
+        for no in nos:
+            nos.extend(no.get('Plans', []))
+        return {no['Relation Name'] for no in nos if no.get('Relation Name', '').startswith(model._meta.db_table)}
+
+    def test_filtros_de_data_do_admin_leem_so_a_particao_do_periodo(self):
+        with connection.cursor() as cursor:
+            for tabela in (self.FINANCEIRO, self.ESTOQUE):
+                for meses in (-1, 0, 1):
+                    particoes.criar_particao(cursor, tabela, particoes.somar_meses(self.MARCO, meses))
+        casos = [
+            (MovimentacaoFinanceira, {'data__year': '2025', 'data__month': '3'}),
+            (MovimentacaoFinanceira, {'data__year': '2025', 'data__month': '3', 'data__day': '15'}),
+            (MovimentacaoFinanceira, {'data__gte': '2025-03-01', 'data__lt': '2025-04-01'}),
+            (MovimentacaoEstoque, {'data_movimentacao__year': '2025', 'data_movimentacao__month': '3'}),
+            (MovimentacaoEstoque, {'data_movimentacao__gte': '2025-03-01 00:00:00-03:00',
+                                   'data_movimentacao__lt': '2025-04-01 00:00:00-03:00'}),
+        ]
+        for model, params in casos:
+            with self.subTest(model=model.__name__, params=params):
+                self.assertEqual(self.particoes_lidas(model, params), {f'{model._meta.db_table}_p202503'})
+
+
+@override_settings(PERFIL_CONSULTAS_ATIVO=True, PERFIL_CONSULTAS_AMOSTRAGEM=1.0, PERFIL_CONSULTAS_TAMANHO=3)
+class PerfilConsultasTests(TestCase):
+    def setUp(self):
+        perfil_consultas.limpar()
+        self.addCleanup(perfil_consultas.limpar)
+        self.usuario = User.objects.create_superuser('admin', password='senha')
+        self.client.force_login(self.usuario)
+
+    def test_impressao_digital(self):
+        self.assertEqual(
+            perfil_consultas.impressao_digital('SELECT "a"."id" FROM "a"\n  WHERE "a"."id" IN (%s, %s, %s) '
+                                               "AND b = 'x' AND c = %(c)s LIMIT 21"),
+            'SELECT "a"."id" FROM "a" WHERE "a"."id" IN (?, ...) AND b = ? AND c = ? LIMIT ?',
+        )
+
+    def test_registra_requisicoes_e_ranking_no_admin(self):
+        for empresa in range(3):
+            Empresa.objects.create(nome=f'Empresa {empresa}', cnpj=str(empresa), razao_social='-', endereco='-')
+        self.client.get(reverse('admin:core_empresa_changelist'))
+        self.client.get(reverse('core:empresa-ativa'))
+
+        perfis = perfil_consultas.perfis()
+        self.assertEqual([perfil.endpoint for perfil in perfis],
+                         ['GET admin:core_empresa_changelist', 'GET core:empresa-ativa'])
+        self.assertTrue(all(perfil.consultas > 0 and perfil.tempo_banco > 0 for perfil in perfis))
+        self.assertLessEqual(len(perfis[0].lentas), 5)
+
+        resposta = self.client.get(reverse('perfil-consultas'), {'ordem': 'consultas'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([resumo.endpoint for resumo in resposta.context['endpoints']],
+                         ['GET admin:core_empresa_changelist', 'GET core:empresa-ativa'])
+
+        # Buffer circular: guarda só as últimas PERFIL_CONSULTAS_TAMANHO requisições
+        self.client.get(reverse('core:empresa-ativa'))
+        self.assertEqual([perfil.endpoint for perfil in perfil_consultas.perfis()],
+                         ['GET core:empresa-ativa', 'GET perfil-consultas', 'GET core:empresa-ativa'])
+
+        self.client.post(reverse('perfil-consultas'))
+        self.assertEqual([perfil.endpoint for perfil in perfil_consultas.perfis()], ['POST perfil-consultas'])
+
+    def test_consultas_repetidas(self):
+        medidor = perfil_consultas.Medidor()
+        with connection.execute_wrapper(medidor):
+            for empresa in ('1', '2', '3'):
+                Empresa.objects.filter(cnpj=empresa).exists()
+            Configuracao.objects.count()
+        perfil = perfil_consultas.registrar('GET teste', 200, 0.01, medidor.consultas)
+        self.assertEqual((perfil.consultas, perfil.consultas_repetidas), (4, 2))
+        self.assertEqual([vezes for _, vezes, _ in perfil.repetidas], [3])
+
+    def test_apenas_superusuario_e_desligado_por_padrao(self):
+        self.usuario.is_superuser = False
+        self.usuario.save()
+        self.assertEqual(self.client.get(reverse('perfil-consultas')).status_code, 403)
+        perfil_consultas.limpar()
+        with self.settings(PERFIL_CONSULTAS_ATIVO=False):
+            # O middleware é carregado junto com o handler do cliente: um cliente novo lê a configuração
+            cliente = Client()
+            cliente.force_login(self.usuario)
+            cliente.get(reverse('core:empresa-ativa'))
+        self.assertEqual(perfil_consultas.perfis(), [])
 
-# Create your tests here.
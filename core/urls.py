@@ -1,11 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from . import views
+
 app_name = 'core'
 
 # Router para ViewSets da API REST
 router = DefaultRouter()
 
 urlpatterns = [
+    path('empresa-ativa/', views.EmpresaAtivaView.as_view(), name='empresa-ativa'),
+    path('relatorios/', views.RelatorioJobsView.as_view(), name='relatorio-jobs'),
+    path('relatorios/<int:pk>/', views.RelatorioJobView.as_view(), name='relatorio-job'),
+    path('relatorios/<int:pk>/arquivo/', views.RelatorioArquivoView.as_view(), name='relatorio-arquivo'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,23 @@
+"""
+Versões no cache compartilhado para invalidar dados guardados em cache.
+
+Quem guarda algo em cache (no processo ou no próprio cache do Django) anota a
+versão lida com ``versao`` e descarta o que tem quando ela muda; quem altera os
+dados de origem chama ``incrementar``. As versões não expiram.
+"""
+
+from django.core.cache import cache
+
+
+def versao(chave):
+    """Versão atual de ``chave``; 1 enquanto nunca foi incrementada"""
+    return cache.get_or_set(chave, 1, None)
+
+
+def incrementar(chave):
+    """Incrementa a versão de ``chave``, invalidando o que foi guardado com a anterior"""
+    try:
+        cache.incr(chave)
+    except ValueError:
+        # Ainda não existia (ou foi descartada): qualquer valor guardado era da versão 1
+        cache.set(chave, 2, None)
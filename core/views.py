@@ -1,3 +1,117 @@
-from django.shortcuts import render
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .models import Empresa, RelatorioJob
+from .multiempresa import SESSAO_EMPRESA, empresas_do_escopo, empresas_do_usuario, exigir_empresa
+from .relatorios import RELATORIOS, enfileirar
+
+
+def _jobs_visiveis(request):
+    """Jobs das empresas do escopo; quem não é da equipe vê só os que criou"""
+    jobs = RelatorioJob.objects.all()
+    empresas = empresas_do_escopo()
+    if empresas is not None:
+        jobs = jobs.filter(empresa_id__in=empresas)
+    return jobs if request.user.is_staff else jobs.filter(created_by=request.user)
+
+
+def _job_como_dict(request, job):
+    arquivo = None
+    if job.situacao == 'concluido':
+        arquivo = request.build_absolute_uri(reverse('core:relatorio-arquivo', args=[job.pk]))
+    return {
+        'id': job.pk,
+        'tipo': job.tipo,
+        'empresa': job.empresa_id,
+        'parametros': job.parametros,
+        'situacao': job.situacao,
+        'linhas': job.linhas,
+        'erro': job.erro or None,
+        'criado_em': job.created_at,
+        'iniciado_em': job.iniciado_em,
+        'concluido_em': job.concluido_em,
+        'arquivo': arquivo,
+    }
+
+
+class RelatorioJobsView(APIView):
+    """Enfileira um relatório para ser gerado em segundo plano.
+
+    Recebe ``tipo`` (ver ``core.relatorios.RELATORIOS``), ``empresa`` (id) e
+    ``parametros`` (ex.: ``{"data_inicio": "2025-01-01", "data_fim": "2025-12-31"}``).
+    Responde 202 com o job; a situação é consultada em ``relatorios/<id>/``.
+    """
+
+    def get(self, request):
+        return Response({'tipos': {tipo: descricao for tipo, (descricao, _, _) in RELATORIOS.items()}})
+
+    def post(self, request):
+        empresa = request.data.get('empresa')
+        if not str(empresa or '').isdigit():
+            raise ValidationError({'empresa': 'Informe o id da empresa.'})
+        exigir_empresa(empresa)
+        parametros = request.data.get('parametros') or {}
+        if not isinstance(parametros, dict):
+            raise ValidationError({'parametros': 'Informe um objeto com os parâmetros do relatório.'})
+        try:
+            job = enfileirar(request.data.get('tipo'), int(empresa), parametros, usuario=request.user)
+        except ValueError as erro:
+            raise ValidationError({'detail': str(erro)})
+        resposta = Response(_job_como_dict(request, job), status=status.HTTP_202_ACCEPTED)
+        resposta['Location'] = reverse('core:relatorio-job', args=[job.pk])
+        return resposta
+
+
+class RelatorioJobView(APIView):
+    """Situação de um job de relatório e, quando concluído, o link do arquivo"""
+
+    def get(self, request, pk):
+        return Response(_job_como_dict(request, get_object_or_404(_jobs_visiveis(request), pk=pk)))
+
+
+class RelatorioArquivoView(APIView):
+    """Download do CSV gerado por um job concluído"""
+
+    def get(self, request, pk):
+        job = get_object_or_404(_jobs_visiveis(request), pk=pk)
+        if job.situacao != 'concluido' or not job.arquivo:
+            raise NotFound('O relatório ainda não foi gerado.')
+        return FileResponse(job.arquivo.open('rb'), as_attachment=True,
+                            filename=f'{job.tipo}-{job.pk}.csv', content_type='text/csv; charset=utf-8')
+
+
+class EmpresaAtivaView(APIView):
+    """Empresa ativa da sessão.
+
+    GET devolve a empresa ativa e as empresas a que o usuário tem acesso; POST
+    com ``empresa`` (id, ou vazio para todas) troca a empresa da sessão. Nas
+    chamadas à API, o cabeçalho ``X-Empresa`` tem precedência sobre a sessão.
+    """
+
+    def get(self, request):
+        permitidas = empresas_do_usuario(request.user)
+        empresas = Empresa.objects.filter(is_active=True).order_by('nome')
+        if permitidas is not None:
+            empresas = empresas.filter(pk__in=permitidas)
+        return Response({
+            'empresa': request.session.get(SESSAO_EMPRESA),
+            'empresas': [{'id': empresa.pk, 'nome': empresa.nome} for empresa in empresas],
+        })
+
+    def post(self, request):
+        empresa = str(request.data.get('empresa') or '')
+        if not empresa:
+            request.session.pop(SESSAO_EMPRESA, None)
+            return Response({'empresa': None})
+        if not empresa.isdigit():
+            raise ValidationError({'empresa': 'Informe o id da empresa.'})
+        permitidas = empresas_do_usuario(request.user)
+        if permitidas is not None and int(empresa) not in permitidas:
+            raise PermissionDenied('Usuário sem acesso à empresa informada.')
+        request.session[SESSAO_EMPRESA] = int(empresa)
+        return Response({'empresa': int(empresa)})
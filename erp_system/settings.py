@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -51,10 +52,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.PerfilConsultasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.EmpresaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -93,6 +96,21 @@ DATABASES = {
     }
 }
 
+# Cache compartilhado entre os processos (workers do gunicorn, comandos): as versões que
+# invalidam as configurações e os relatórios em cache (core.configuracoes, financeiro.relatorios)
+# só valem entre processos com um backend compartilhado. O padrão é a tabela CACHE_LOCATION no
+# banco, criada pelo migrate (core 0004); com Redis, CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# e CACHE_LOCATION=redis://host:6379/0
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CACHE_LOCATION', default='erp_cache'),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('.DatabaseCache'):
+    # Entradas antes do descarte: o padrão do Django (300) descartaria versões ainda em uso
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -151,3 +169,30 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
+
+# Configurações (core.Configuracao): intervalo, em segundos, entre as
+# verificações da versão compartilhada no cache feitas por cada processo
+CONFIGURACOES_VERIFICAR_A_CADA = config('CONFIGURACOES_VERIFICAR_A_CADA', default=5, cast=int)
+
+# Árvore de categorias (operacional.categorias): o mesmo intervalo para a versão da árvore
+CATEGORIAS_VERIFICAR_A_CADA = config('CATEGORIAS_VERIFICAR_A_CADA', default=5, cast=int)
+
+# Relatórios em segundo plano (core.RelatorioJob): tempo, em segundos, após o qual
+# um job em processamento é considerado abandonado e volta para a fila
+RELATORIOS_TEMPO_MAXIMO = config('RELATORIOS_TEMPO_MAXIMO', default=3600, cast=int)
+
+# Arquivamento de títulos (financeiro.arquivo): idade, em meses de vencimento, a partir da
+# qual os títulos encerrados saem da tabela ativa no comando arquivar_titulos
+ARQUIVO_TITULOS_MESES = config('ARQUIVO_TITULOS_MESES', default=24, cast=int)
+
+# Custo do estoque (operacional.custos): 'medio' (custo médio ponderado móvel) ou 'peps'
+# (primeiro a entrar, primeiro a sair); trocar o método recalcula o custo desde o início
+CUSTO_ESTOQUE_METODO = config('CUSTO_ESTOQUE_METODO', default='medio')
+
+# Perfil das consultas SQL por requisição (core.perfil_consultas): liga o middleware, fração das
+# requisições medidas (0 a 1), perfis guardados por processo e consultas mais lentas guardadas por
+# requisição. Ranking dos endpoints em /admin/perfil-consultas/
+PERFIL_CONSULTAS_ATIVO = config('PERFIL_CONSULTAS_ATIVO', default=False, cast=bool)
+PERFIL_CONSULTAS_AMOSTRAGEM = config('PERFIL_CONSULTAS_AMOSTRAGEM', default=0.05, cast=float)
+PERFIL_CONSULTAS_TAMANHO = config('PERFIL_CONSULTAS_TAMANHO', default=2000, cast=int)
+PERFIL_CONSULTAS_LENTAS = config('PERFIL_CONSULTAS_LENTAS', default=5, cast=int)
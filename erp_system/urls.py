@@ -19,12 +19,15 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.admin import perfil_consultas_view
+
 # Customizando o admin
 admin.site.site_header = 'Sistema ERP'
 admin.site.site_title = 'ERP Admin'
 admin.site.index_title = 'Administração do Sistema ERP'
 
 urlpatterns = [
+    path('admin/perfil-consultas/', admin.site.admin_view(perfil_consultas_view), name='perfil-consultas'),
     path('admin/', admin.site.urls),
     path('api/', include('core.urls')),
     path('api/financeiro/', include('financeiro.urls')),
@@ -1,17 +1,49 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
 from django.utils.html import format_html
+from core.admin import SelectRelatedListFilter
+from .baixas import baixar_em_lote
+from .exportacao import exportar_csv, exportar_xlsx
 from .models import (
     PlanoContas, CentroCusto, ContasBancarias, FormaPagamento,
-    ContasReceber, ContasPagar, MovimentacaoFinanceira
+    ContasReceber, ContasPagar, ContasReceberArquivada, ContasPagarArquivada, MovimentacaoFinanceira
 )
 
 
+class ExportacaoTitulosMixin:
+    """Ações de exportação (em streaming) dos títulos selecionados"""
+    actions = ['exportar_csv', 'exportar_xlsx']
+
+    @admin.action(description='Exportar selecionados para CSV')
+    def exportar_csv(self, request, queryset):
+        return exportar_csv(queryset)
+
+    @admin.action(description='Exportar selecionados para XLSX')
+    def exportar_xlsx(self, request, queryset):
+        return exportar_xlsx(queryset)
+
+
+class BaixaEmLoteMixin:
+    """Ação de baixa dos títulos selecionados, hoje, pelo saldo em aberto"""
+
+    @admin.action(description='Baixar selecionados (hoje, pelo saldo em aberto)')
+    def baixar_em_lote(self, request, queryset):
+        try:
+            resultado = baixar_em_lote(queryset, usuario=request.user)
+        except ValidationError as e:
+            self.message_user(request, '; '.join(e.messages), messages.ERROR)
+        else:
+            self.message_user(request, f'{resultado.titulos} título(s) baixado(s), total R$ {resultado.valor:.2f}.',
+                              messages.SUCCESS)
+
+
 @admin.register(PlanoContas)
 class PlanoContasAdmin(admin.ModelAdmin):
     list_display = ['codigo', 'nome', 'tipo', 'nivel', 'aceita_lancamento', 'is_active']
     list_filter = ['tipo', 'nivel', 'aceita_lancamento', 'is_active']
     search_fields = ['codigo', 'nome']
-    readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
+    # O nível acompanha a posição na árvore (calculado no save)
+    readonly_fields = ['nivel', 'created_at', 'updated_at', 'created_by', 'updated_by']
     
     def save_model(self, request, obj, form, change):
         if not change:
@@ -23,6 +55,7 @@ class PlanoContasAdmin(admin.ModelAdmin):
 @admin.register(CentroCusto)
 class CentroCustoAdmin(admin.ModelAdmin):
     list_display = ['codigo', 'nome', 'empresa', 'is_active']
+    list_select_related = ['empresa']
     list_filter = ['empresa', 'is_active']
     search_fields = ['codigo', 'nome']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
@@ -37,8 +70,9 @@ class CentroCustoAdmin(admin.ModelAdmin):
 @admin.register(ContasBancarias)
 class ContasBancariasAdmin(admin.ModelAdmin):
     list_display = ['banco', 'agencia', 'conta', 'digito', 'tipo', 'saldo_inicial', 'empresa']
+    list_select_related = ['banco', 'empresa']
     list_filter = ['tipo', 'empresa', 'is_active']
-    search_fields = ['banco', 'agencia', 'conta']
+    search_fields = ['banco__nome', 'agencia', 'conta']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
     
     def save_model(self, request, obj, form, change):
@@ -63,12 +97,14 @@ class FormaPagamentoAdmin(admin.ModelAdmin):
 
 
 @admin.register(ContasReceber)
-class ContasReceberAdmin(admin.ModelAdmin):
+class ContasReceberAdmin(BaixaEmLoteMixin, ExportacaoTitulosMixin, admin.ModelAdmin):
     list_display = ['numero_documento', 'cliente', 'data_vencimento', 'valor_original', 'situacao', 'empresa']
+    list_select_related = ['cliente__pessoa', 'empresa']
     list_filter = ['situacao', 'data_vencimento', 'empresa', 'forma_pagamento']
-    search_fields = ['numero_documento', 'cliente']
+    search_fields = ['numero_documento', 'cliente__codigo', 'cliente__pessoa__nome']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
     date_hierarchy = 'data_vencimento'
+    actions = ['baixar_em_lote', *ExportacaoTitulosMixin.actions]
     
     fieldsets = (
         ('Documento', {
@@ -81,7 +117,7 @@ class ContasReceberAdmin(admin.ModelAdmin):
             'fields': ('valor_recebido', 'data_recebimento', 'situacao')
         }),
         ('Classificação', {
-            'fields': ('conta_contabil', 'centro_custo', 'forma_pagamento', 'empresa')
+            'fields': ('conta_contabil', 'centro_custo', 'forma_pagamento', 'conta_bancaria', 'empresa')
         }),
         ('Auditoria', {
             'fields': ('created_at', 'updated_at', 'created_by', 'updated_by'),
@@ -97,12 +133,14 @@ class ContasReceberAdmin(admin.ModelAdmin):
 
 
 @admin.register(ContasPagar)
-class ContasPagarAdmin(admin.ModelAdmin):
+class ContasPagarAdmin(BaixaEmLoteMixin, ExportacaoTitulosMixin, admin.ModelAdmin):
     list_display = ['numero_documento', 'fornecedor', 'data_vencimento', 'valor_original', 'situacao', 'empresa']
+    list_select_related = ['fornecedor__pessoa', 'empresa']
     list_filter = ['situacao', 'data_vencimento', 'empresa', 'forma_pagamento']
-    search_fields = ['numero_documento', 'fornecedor']
+    search_fields = ['numero_documento', 'fornecedor__codigo', 'fornecedor__pessoa__nome']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
     date_hierarchy = 'data_vencimento'
+    actions = ['baixar_em_lote', *ExportacaoTitulosMixin.actions]
     
     fieldsets = (
         ('Documento', {
@@ -130,20 +168,51 @@ class ContasPagarAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+class TituloArquivadoAdmin(admin.ModelAdmin):
+    """Consulta dos títulos arquivados; entram só pelo comando ``arquivar_titulos``"""
+    list_filter = ['situacao', 'data_vencimento', 'empresa']
+    date_hierarchy = 'data_vencimento'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ContasReceberArquivada)
+class ContasReceberArquivadaAdmin(TituloArquivadoAdmin):
+    list_display = ['numero_documento', 'cliente', 'data_vencimento', 'valor_original', 'situacao', 'empresa']
+    list_select_related = ['cliente__pessoa', 'empresa']
+    search_fields = ['numero_documento', 'cliente__codigo', 'cliente__pessoa__nome']
+
+
+@admin.register(ContasPagarArquivada)
+class ContasPagarArquivadaAdmin(TituloArquivadoAdmin):
+    list_display = ['numero_documento', 'fornecedor', 'data_vencimento', 'valor_original', 'situacao', 'empresa']
+    list_select_related = ['fornecedor__pessoa', 'empresa']
+    search_fields = ['numero_documento', 'fornecedor__codigo', 'fornecedor__pessoa__nome']
+
+
 @admin.register(MovimentacaoFinanceira)
 class MovimentacaoFinanceiraAdmin(admin.ModelAdmin):
     list_display = ['data', 'tipo', 'valor_formatado', 'descricao', 'conta_bancaria', 'empresa']
-    list_filter = ['tipo', 'data', 'conta_bancaria', 'empresa']
+    list_select_related = ['conta_bancaria__banco', 'empresa']
+    list_filter = ['tipo', 'data', ('conta_bancaria', SelectRelatedListFilter), 'empresa']
     search_fields = ['descricao']
-    readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
+    readonly_fields = ['conta_receber_arquivada', 'conta_pagar_arquivada', 'created_at', 'updated_at', 'created_by',
+                       'updated_by']
     date_hierarchy = 'data'
     
     def valor_formatado(self, obj):
         cor = 'green' if obj.tipo == 'entrada' else 'red'
         return format_html(
-            '<span style="color: {};">R$ {:.2f}</span>',
+            '<span style="color: {};">R$ {}</span>',
             cor,
-            obj.valor
+            f'{obj.valor:.2f}'
         )
     valor_formatado.short_description = 'Valor'
     
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class FinanceiroConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'financeiro'
-    verbose_name = 'Módulo Financeiro'
\ No newline at end of file
+    verbose_name = 'Módulo Financeiro'
+
+    def ready(self):
+        from . import signals  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""
+Arquivamento de títulos encerrados.
+
+Contas a receber/pagar recebidas, pagas ou canceladas com vencimento anterior a
+um corte saem da tabela ativa para a tabela de arquivo do mesmo tipo
+(``ContasReceberArquivada``/``ContasPagarArquivada``, mesmas colunas e mesmo
+id). Cada lote, em uma transação, copia os títulos para o arquivo, passa as
+movimentações financeiras deles de ``conta_receber``/``conta_pagar`` para
+``conta_receber_arquivada``/``conta_pagar_arquivada`` e os exclui da tabela
+ativa, que fica com os títulos em aberto e os recentes — listagens, contagens
+do admin e índices menores.
+
+Leitura: ``titulos_do_periodo`` devolve a tabela ativa ou, quando há títulos
+arquivados com vencimento no período consultado, o histórico — uma view com as
+duas tabelas em ``UNION ALL``, em que o PostgreSQL leva os filtros e a
+ordenação aos índices de cada tabela. Consultas sem período ficam na tabela
+ativa.
+"""
+
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import (
+    ContasPagar, ContasPagarArquivada, ContasPagarHistorico, ContasReceber, ContasReceberArquivada,
+    ContasReceberHistorico, MovimentacaoFinanceira
+)
+
+LOTE = 5000
+
+# model: (arquivo, histórico, FK na movimentação, situações encerradas)
+ARQUIVOS = {
+    ContasReceber: (ContasReceberArquivada, ContasReceberHistorico, 'conta_receber', ('recebido', 'cancelado')),
+    ContasPagar: (ContasPagarArquivada, ContasPagarHistorico, 'conta_pagar', ('pago', 'cancelado')),
+}
+
+
+@dataclass
+class ResultadoArquivamento:
+    titulos: int = 0
+    movimentacoes: int = 0
+
+
+def arquivar_titulos(model, vencimento_antes_de, lote=LOTE):
+    """Move para o arquivo os títulos encerrados com vencimento anterior à data, em lotes.
+
+    Respeita o escopo de empresa ativo. Títulos bloqueados por outra transação
+    ficam para a próxima execução. Retorna ``ResultadoArquivamento``.
+    """
+    arquivo, _, campo_movimentacao, situacoes = ARQUIVOS[model]
+    colunas = ', '.join(campo.column for campo in model._meta.concrete_fields)
+    encerrados = (model.objects.filter(situacao__in=situacoes, data_vencimento__lt=vencimento_antes_de)
+                  .select_for_update(skip_locked=True).order_by('pk'))
+    resultado = ResultadoArquivamento()
+    while True:
+        with transaction.atomic():
+            ids = list(encerrados.values_list('pk', flat=True)[:lote])
+            if not ids:
+                return resultado
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {arquivo._meta.db_table} ({colunas}) '
+                    f'SELECT {colunas} FROM {model._meta.db_table} WHERE id = ANY(%s)',
+                    [ids],
+                )
+                resultado.movimentacoes += MovimentacaoFinanceira._base_manager.filter(
+                    **{f'{campo_movimentacao}_id__in': ids}
+                ).update(**{f'{campo_movimentacao}_arquivada_id': F(f'{campo_movimentacao}_id'),
+                            campo_movimentacao: None})
+                # DELETE direto: sem o coletor do ORM, que carregaria os títulos para os signals e o SET_NULL
+                # das movimentações, já desligadas acima. Títulos encerrados não entram nos relatórios em cache.
+                cursor.execute(f'DELETE FROM {model._meta.db_table} WHERE id = ANY(%s)', [ids])
+            resultado.titulos += len(ids)
+
+
+def titulos_do_periodo(model, inicio=None, fim=None):
+    """Queryset para consultar os títulos de ``model`` com vencimento entre ``inicio`` e ``fim``.
+
+    O histórico (ativos e arquivados) só é usado quando há títulos arquivados
+    no período; sem período, a tabela ativa.
+    """
+    arquivo, historico, *_ = ARQUIVOS[model]
+    if inicio is None and fim is None:
+        return model.objects.all()
+    arquivados = arquivo.objects.all()
+    if inicio is not None:
+        arquivados = arquivados.filter(data_vencimento__gte=inicio)
+    if fim is not None:
+        arquivados = arquivados.filter(data_vencimento__lte=fim)
+    return historico.objects.all() if arquivados.exists() else model.objects.all()
@@ -0,0 +1,91 @@
+"""
+Baixa em lote de contas a receber e a pagar.
+
+Os títulos em aberto são bloqueados, quitados com um único ``UPDATE`` (valor
+recebido/pago = valor total, data da baixa e situação) e ganham as
+movimentações financeiras correspondentes em ``bulk_create``. Como
+``bulk_create`` e ``update`` não disparam os signals, os saldos diários das
+contas bancárias são atualizados aqui, com uma variação por (conta, data), e
+os relatórios em cache das empresas envolvidas são invalidados.
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ContasPagar, ContasReceber, MovimentacaoFinanceira
+from .relatorios import invalidar_titulos, valor_total_titulo
+from .saldos import acumular_delta, aplicar_deltas
+
+ZERO = Decimal('0.00')
+
+# model: (campo do valor baixado, campo da data da baixa, situação quitada,
+#         FK na movimentação, tipo da movimentação, descrição)
+BAIXAS = {
+    ContasReceber: ('valor_recebido', 'data_recebimento', 'recebido', 'conta_receber', 'entrada', 'Recebimento'),
+    ContasPagar: ('valor_pago', 'data_pagamento', 'pago', 'conta_pagar', 'saida', 'Pagamento'),
+}
+
+
+@dataclass
+class ResultadoBaixa:
+    titulos: int = 0
+    valor: Decimal = ZERO
+
+
+def baixar_em_lote(titulos, data=None, conta_bancaria=None, usuario=None, batch_size=1000):
+    """Quita pelo saldo em aberto os títulos do queryset que estão em aberto, em uma transação.
+
+    ``conta_bancaria`` é usada nos títulos sem conta bancária; se algum ficar
+    sem conta, nada é baixado e ``ValidationError`` é levantada. ``data`` é a
+    data da baixa (padrão hoje).
+    """
+    model = titulos.model
+    campo_valor, campo_data, situacao, campo_movimentacao, tipo, descricao = BAIXAS[model]
+    data = data or timezone.localdate()
+    conta_padrao = getattr(conta_bancaria, 'pk', conta_bancaria)
+
+    with transaction.atomic():
+        abertos = list(
+            titulos.filter(situacao='aberto').select_for_update(of=('self',)).order_by('pk')
+            .annotate(saldo=valor_total_titulo() - F(campo_valor))
+            .values_list('pk', 'numero_documento', 'saldo', 'conta_bancaria_id', 'conta_contabil_id',
+                         'centro_custo_id', 'empresa_id')
+        )
+        if not abertos:
+            return ResultadoBaixa()
+        sem_conta = [numero for _, numero, _, conta_id, *_ in abertos if conta_id is None]
+        if sem_conta and conta_padrao is None:
+            raise ValidationError(f'{len(sem_conta)} título(s) sem conta bancária, informe a conta da baixa: '
+                                  f'{", ".join(sem_conta[:10])}{"..." if len(sem_conta) > 10 else ""}')
+
+        ids = [linha[0] for linha in abertos]
+        atualizacao = {campo_valor: valor_total_titulo(), campo_data: data, 'situacao': situacao,
+                       'updated_by': usuario, 'updated_at': timezone.now()}
+        if sem_conta:
+            model.objects.filter(pk__in=ids, conta_bancaria__isnull=True).update(conta_bancaria=conta_padrao)
+        model.objects.filter(pk__in=ids).update(**atualizacao)
+
+        movimentacoes, deltas, resultado = [], {}, ResultadoBaixa(titulos=len(abertos))
+        for pk, numero, saldo, conta_id, conta_contabil_id, centro_custo_id, empresa_id in abertos:
+            if saldo <= 0:
+                continue
+            conta_id = conta_id or conta_padrao
+            movimentacoes.append(MovimentacaoFinanceira(
+                data=data, tipo=tipo, valor=saldo, descricao=f'{descricao} {numero}',
+                conta_contabil_id=conta_contabil_id, centro_custo_id=centro_custo_id,
+                conta_bancaria_id=conta_id, empresa_id=empresa_id, created_by=usuario, updated_by=usuario,
+                **{f'{campo_movimentacao}_id': pk},
+            ))
+            acumular_delta(deltas, conta_id, data, tipo, saldo)
+            resultado.valor += saldo
+        MovimentacaoFinanceira.objects.bulk_create(movimentacoes, batch_size=batch_size)
+        aplicar_deltas(deltas)
+
+        for empresa_id in {linha[-1] for linha in abertos}:
+            invalidar_titulos(empresa_id)
+    return resultado
@@ -0,0 +1,216 @@
+"""
+Conciliação automática de extratos bancários.
+
+As linhas do extrato (``financeiro.extratos``) são conciliadas em blocos. Para
+cada bloco, poucas consultas carregam os candidatos — títulos em aberto com o
+documento de alguma linha ou com o mesmo valor e vencimento próximo, e as
+movimentações já lançadas na conta no período — em índices na memória (por
+documento, por valor e por data/tipo/valor), e cada linha é resolvida sem
+consultar o banco, na ordem:
+
+1. título em aberto com o número do documento (ou nosso número) da linha e
+   saldo igual ao valor: é quitado;
+2. movimentação já lançada na conta com a mesma data, tipo e valor: a linha
+   já está conciliada, de modo que reimportar um extrato não duplica nada;
+3. título em aberto com saldo igual ao valor e vencimento a até
+   ``tolerancia_dias`` da data da linha, se houver um único mais próximo: é
+   quitado.
+
+Créditos são procurados nas contas a receber e débitos nas contas a pagar,
+entre os títulos da empresa da conta bancária que estão nessa conta ou sem
+conta. Como na baixa em lote, os títulos são quitados com um ``UPDATE`` por
+data, as movimentações criadas em ``bulk_create`` e os saldos diários
+atualizados com uma variação por dia. As linhas sem correspondência voltam no
+resultado, com o motivo, para a conciliação manual.
+"""
+
+import datetime
+import itertools
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .baixas import BAIXAS
+from .models import ContasPagar, ContasReceber, MovimentacaoFinanceira
+from .relatorios import invalidar_titulos, valor_total_titulo
+from .saldos import acumular_delta, aplicar_deltas
+
+BLOCO = 5000
+TOLERANCIA_DIAS = 5
+ZERO = Decimal('0.00')
+
+
+@dataclass
+class ResultadoConciliacao:
+    linhas: int = 0
+    titulos_baixados: int = 0
+    ja_lancadas: int = 0
+    valor_baixado: Decimal = ZERO
+    # (LinhaExtrato, motivo)
+    nao_conciliadas: list = field(default_factory=list)
+
+
+class _Conciliador:
+    def __init__(self, conta_bancaria, tolerancia_dias, usuario):
+        self.conta = conta_bancaria
+        self.tolerancia = datetime.timedelta(days=tolerancia_dias)
+        self.usuario = usuario
+        self.resultado = ResultadoConciliacao()
+        self.deltas = {}
+        # (data, tipo, valor) das movimentações criadas ou já casadas com linhas de blocos anteriores
+        self.usadas = Counter()
+
+    def _titulos(self, model, linhas):
+        """Índices dos títulos candidatos do bloco: ``{documento: [títulos]}`` e ``{saldo: [títulos]}``"""
+        por_documento, por_valor = {}, {}
+        if not linhas:
+            return por_documento, por_valor
+        documentos = {chave for linha in linhas for chave in (linha.documento, linha.identificador) if chave}
+        datas = [linha.data for linha in linhas]
+        abertos = (
+            model.objects.filter(empresa_id=self.conta.empresa_id, situacao='aberto')
+            .filter(Q(conta_bancaria=self.conta) | Q(conta_bancaria__isnull=True))
+            .annotate(saldo=valor_total_titulo() - F(BAIXAS[model][0]))
+            .select_for_update(of=('self',)).order_by('pk')
+            .values_list('pk', 'numero_documento', 'data_vencimento', 'saldo', 'conta_contabil_id',
+                         'centro_custo_id', named=True)
+        )
+        # Duas consultas em vez de um OR: com o OR o PostgreSQL deixa de usar hash nos IN com milhares de valores
+        candidatos = {} if not documentos else {
+            titulo.pk: titulo for titulo in abertos.filter(numero_documento__in=documentos)
+        }
+        candidatos.update((titulo.pk, titulo) for titulo in abertos.filter(
+            data_vencimento__range=(min(datas) - self.tolerancia, max(datas) + self.tolerancia),
+            saldo__in={abs(linha.valor) for linha in linhas},
+        ))
+        for titulo in sorted(candidatos.values()):
+            por_documento.setdefault(titulo.numero_documento, []).append(titulo)
+            por_valor.setdefault(titulo.saldo, []).append(titulo)
+        return por_documento, por_valor
+
+    def _lancadas(self, linhas):
+        """``Counter`` de (data, tipo, valor) das movimentações da conta ainda não casadas com o extrato"""
+        datas = [linha.data for linha in linhas]
+        lancadas = Counter({
+            (mov['data'], mov['tipo'], mov['valor']): mov['quantidade']
+            for mov in MovimentacaoFinanceira.objects.filter(
+                conta_bancaria=self.conta, data__range=(min(datas), max(datas)),
+                valor__in={abs(linha.valor) for linha in linhas},
+            ).values('data', 'tipo', 'valor').annotate(quantidade=Count('pk')).order_by()
+        })
+        return lancadas - self.usadas
+
+    def _por_documento(self, linha, por_documento, usados):
+        """Título com o documento da linha e saldo igual ao valor; senão, o título de valor divergente"""
+        divergente = None
+        for chave in filter(None, (linha.documento, linha.identificador)):
+            for titulo in por_documento.get(chave, ()):
+                if titulo.pk in usados:
+                    continue
+                if titulo.saldo == abs(linha.valor):
+                    return titulo, None
+                divergente = titulo
+        return None, divergente
+
+    def _por_valor(self, linha, por_valor, usados):
+        """Título de mesmo saldo com vencimento mais próximo da data; ``None`` se não houver ou houver empate"""
+        proximos = sorted(
+            (abs((titulo.data_vencimento - linha.data).days), titulo.pk, titulo)
+            for titulo in por_valor.get(abs(linha.valor), ())
+            if titulo.pk not in usados and abs(titulo.data_vencimento - linha.data) <= self.tolerancia
+        )
+        if len(proximos) > 1 and proximos[0][0] == proximos[1][0]:
+            return None, True
+        return (proximos[0][2] if proximos else None), False
+
+    def conciliar_bloco(self, linhas):
+        self.resultado.linhas += len(linhas)
+        por_model = {ContasReceber: [], ContasPagar: []}
+        for linha in linhas:
+            if linha.valor:
+                por_model[ContasReceber if linha.valor > 0 else ContasPagar].append(linha)
+            else:
+                self.resultado.nao_conciliadas.append((linha, 'Linha com valor zero.'))
+        lancadas = self._lancadas(linhas) if linhas else Counter()
+
+        for model, linhas_model in por_model.items():
+            tipo = BAIXAS[model][4]
+            por_documento, por_valor = self._titulos(model, linhas_model)
+            usados, baixas = set(), []
+            for linha in linhas_model:
+                titulo, divergente = self._por_documento(linha, por_documento, usados)
+                chave = (linha.data, tipo, abs(linha.valor))
+                if titulo is None and lancadas[chave] > 0:
+                    lancadas[chave] -= 1
+                    self.usadas[chave] += 1
+                    self.resultado.ja_lancadas += 1
+                    continue
+                empate = False
+                if titulo is None:
+                    titulo, empate = self._por_valor(linha, por_valor, usados)
+                if titulo is not None:
+                    usados.add(titulo.pk)
+                    baixas.append((titulo, linha))
+                elif divergente is not None:
+                    self.resultado.nao_conciliadas.append((linha, (
+                        f'Título {divergente.numero_documento} com saldo {divergente.saldo} diferente do valor.'
+                    )))
+                elif empate:
+                    self.resultado.nao_conciliadas.append((
+                        linha, 'Mais de um título em aberto com o mesmo valor e vencimento.'
+                    ))
+                else:
+                    self.resultado.nao_conciliadas.append((linha, 'Nenhum título ou movimentação correspondente.'))
+            self._baixar(model, baixas)
+
+    def _baixar(self, model, baixas):
+        if not baixas:
+            return
+        campo_valor, campo_data, situacao, campo_movimentacao, tipo, descricao = BAIXAS[model]
+        # Um UPDATE por data de baixa, como na baixa em lote (bulk_update com CASE é lento em blocos grandes)
+        por_data = {}
+        for titulo, linha in baixas:
+            por_data.setdefault(linha.data, []).append(titulo.pk)
+        for data, ids in por_data.items():
+            model.objects.filter(pk__in=ids).update(**{
+                campo_valor: valor_total_titulo(), campo_data: data, 'situacao': situacao,
+                'conta_bancaria': self.conta, 'updated_by': self.usuario, 'updated_at': timezone.now(),
+            })
+        movimentacoes = []
+        for titulo, linha in baixas:
+            valor = abs(linha.valor)
+            movimentacoes.append(MovimentacaoFinanceira(
+                data=linha.data, tipo=tipo, valor=valor, descricao=f'{descricao} {titulo.numero_documento}',
+                conta_contabil_id=titulo.conta_contabil_id, centro_custo_id=titulo.centro_custo_id,
+                conta_bancaria=self.conta, empresa_id=self.conta.empresa_id,
+                created_by=self.usuario, updated_by=self.usuario,
+                **{f'{campo_movimentacao}_id': titulo.pk},
+            ))
+            acumular_delta(self.deltas, self.conta.pk, linha.data, tipo, valor)
+            self.usadas[(linha.data, tipo, valor)] += 1
+            self.resultado.valor_baixado += valor
+        MovimentacaoFinanceira.objects.bulk_create(movimentacoes, batch_size=1000)
+        self.resultado.titulos_baixados += len(baixas)
+
+
+def conciliar_extrato(linhas, conta_bancaria, tolerancia_dias=TOLERANCIA_DIAS, usuario=None, bloco=BLOCO):
+    """Concilia as ``LinhaExtrato`` com os títulos e movimentações da conta bancária.
+
+    ``linhas`` é consumido em blocos de ``bloco`` linhas, tudo em uma
+    transação: um erro de leitura no meio do arquivo desfaz as baixas já
+    feitas. Retorna ``ResultadoConciliacao``.
+    """
+    conciliador = _Conciliador(conta_bancaria, tolerancia_dias, usuario)
+    linhas = iter(linhas)
+    with transaction.atomic():
+        while lote := list(itertools.islice(linhas, bloco)):
+            conciliador.conciliar_bloco(lote)
+        aplicar_deltas(conciliador.deltas)
+        conciliador.resultado.nao_conciliadas.sort(key=lambda pendencia: pendencia[0].linha)
+        if conciliador.resultado.titulos_baixados:
+            invalidar_titulos(conta_bancaria.empresa_id)
+    return conciliador.resultado
@@ -0,0 +1,116 @@
+"""
+Exportação de contas a receber/pagar em CSV e XLSX.
+
+As linhas são lidas com ``values_list(...).iterator()`` (cursor no servidor),
+já com os nomes das tabelas relacionadas resolvidos por JOIN, e escritas
+conforme são lidas: o consumo de memória não depende do tamanho da exportação.
+"""
+
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from core.relatorios import formatar_csv
+from .models import ContasPagar, ContasPagarHistorico, ContasReceber, ContasReceberHistorico
+
+CHUNK_SIZE = 2000
+
+
+def _colunas(campo_pessoa, campo_valor_baixa, campo_data_baixa):
+    return [
+        ('Documento', 'numero_documento'),
+        ('Código', f'{campo_pessoa}__codigo'),
+        ('Nome', f'{campo_pessoa}__pessoa__nome'),
+        ('CPF/CNPJ', f'{campo_pessoa}__pessoa__cpf_cnpj'),
+        ('Emissão', 'data_emissao'),
+        ('Vencimento', 'data_vencimento'),
+        ('Valor Original', 'valor_original'),
+        ('Desconto', 'valor_desconto'),
+        ('Juros', 'valor_juros'),
+        ('Multa', 'valor_multa'),
+        ('Valor Baixado', campo_valor_baixa),
+        ('Data da Baixa', campo_data_baixa),
+        ('Situação', 'situacao'),
+        ('Conta Contábil', 'conta_contabil__codigo'),
+        ('Centro de Custo', 'centro_custo__codigo'),
+        ('Forma de Pagamento', 'forma_pagamento__nome'),
+        ('Empresa', 'empresa__nome'),
+    ]
+
+
+EXPORTACOES = {
+    ContasReceber: _colunas('cliente', 'valor_recebido', 'data_recebimento'),
+    ContasPagar: _colunas('fornecedor', 'valor_pago', 'data_pagamento'),
+}
+# Exportações de períodos com títulos arquivados leem o histórico (ver financeiro.arquivo)
+EXPORTACOES[ContasReceberHistorico] = EXPORTACOES[ContasReceber]
+EXPORTACOES[ContasPagarHistorico] = EXPORTACOES[ContasPagar]
+
+
+def linhas_exportacao(queryset, chunk_size=CHUNK_SIZE):
+    """Cabeçalho seguido das linhas do queryset como tuplas de valores"""
+    colunas = EXPORTACOES[queryset.model]
+    campos = [campo for _, campo in colunas]
+    situacoes = dict(queryset.model._meta.get_field('situacao').choices)
+    indice_situacao = campos.index('situacao')
+
+    yield [titulo for titulo, _ in colunas]
+    for linha in queryset.values_list(*campos).iterator(chunk_size=chunk_size):
+        linha = list(linha)
+        linha[indice_situacao] = situacoes.get(linha[indice_situacao], linha[indice_situacao])
+        yield linha
+
+
+class _Eco:
+    """Arquivo fictício: ``csv.writer`` devolve a linha formatada em vez de gravá-la"""
+
+    def write(self, valor):
+        return valor
+
+
+def _nome_arquivo(queryset, extensao):
+    return f'{queryset.model._meta.model_name}_{timezone.localdate():%Y%m%d}.{extensao}'
+
+
+def gerar_csv(queryset, chunk_size=CHUNK_SIZE):
+    """Gera o CSV (separador ``;``, padrão do Excel em português) linha a linha"""
+    escritor = csv.writer(_Eco(), delimiter=';')
+    bloco = ['\ufeff']
+    for linha in linhas_exportacao(queryset, chunk_size):
+        bloco.append(escritor.writerow([formatar_csv(valor) for valor in linha]))
+        if len(bloco) >= 500:
+            yield ''.join(bloco)
+            bloco = []
+    yield ''.join(bloco)
+
+
+def exportar_csv(queryset):
+    resposta = StreamingHttpResponse(gerar_csv(queryset), content_type='text/csv; charset=utf-8')
+    resposta['Content-Disposition'] = f'attachment; filename="{_nome_arquivo(queryset, "csv")}"'
+    return resposta
+
+
+def exportar_xlsx(queryset):
+    """Gera o XLSX em modo ``write_only`` num arquivo temporário e o envia em blocos"""
+    from openpyxl import Workbook
+
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(queryset.model._meta.verbose_name_plural[:31])
+    for linha in linhas_exportacao(queryset):
+        aba.append(linha)
+
+    arquivo = tempfile.TemporaryFile()
+    planilha.save(arquivo)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo, as_attachment=True, filename=_nome_arquivo(queryset, 'xlsx'),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+FORMATOS = {
+    'csv': exportar_csv,
+    'xlsx': exportar_xlsx,
+}
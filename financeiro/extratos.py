@@ -0,0 +1,194 @@
+"""
+Leitura de extratos bancários e arquivos de retorno: OFX e CNAB 240/400.
+
+Os leitores percorrem o arquivo linha a linha (ou registro a registro) e geram
+``LinhaExtrato`` à medida que leem, sem carregar o arquivo em memória. Recebem
+um iterável de linhas em bytes — um arquivo aberto em ``'rb'`` ou um upload —
+e decodificam cada linha como UTF-8, com Windows-1252 (o padrão dos bancos)
+quando não for UTF-8 válido.
+
+Valores positivos são créditos na conta e negativos, débitos.
+
+- OFX 1.x (SGML, sem tags de fechamento) e 2.x (XML): cada ``<STMTTRN>``.
+- CNAB 240: segmento E (extrato de conta corrente) e o par de segmentos T/U
+  do retorno de cobrança, este só nas ocorrências de liquidação.
+- CNAB 400: registro de detalhe do retorno de cobrança nas ocorrências de
+  liquidação. O layout de 400 posições varia por banco; as posições usadas são
+  as do padrão Bradesco, adotado também por vários outros bancos.
+"""
+
+import datetime
+import html
+import itertools
+import re
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+
+
+@dataclass
+class LinhaExtrato:
+    linha: int
+    data: datetime.date
+    valor: Decimal
+    documento: str = ''
+    # FITID no OFX, nosso número no retorno de cobrança
+    identificador: str = ''
+    descricao: str = ''
+
+
+# Liquidação, liquidação em cartório e liquidação após baixa
+OCORRENCIAS_LIQUIDACAO_240 = {'06', '17'}
+OCORRENCIAS_LIQUIDACAO_400 = {'06', '15', '17'}
+
+_TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def _decodificar(linha):
+    if not isinstance(linha, str):
+        try:
+            linha = linha.decode('utf-8')
+        except UnicodeDecodeError:
+            linha = linha.decode('cp1252', errors='replace')
+    return linha.lstrip('\ufeff')
+
+
+def _data(aaaammdd, numero):
+    # fromisoformat aceita AAAAMMDD e é bem mais rápido que strptime
+    try:
+        return datetime.date.fromisoformat(aaaammdd)
+    except ValueError:
+        raise ValueError(f'Linha {numero}: data inválida "{aaaammdd}".')
+
+
+def _data_cnab(ddmmaaaa, numero):
+    """Data DDMMAAAA (CNAB 240) ou DDMMAA (CNAB 400, século 2000)"""
+    ano = ddmmaaaa[4:] if len(ddmmaaaa) == 8 else f'20{ddmmaaaa[4:]}'
+    return _data(f'{ano}{ddmmaaaa[2:4]}{ddmmaaaa[:2]}', numero)
+
+
+def _valor_cnab(texto, numero):
+    """Valor em centavos, só dígitos e com zeros à esquerda"""
+    if not texto.isdigit():
+        raise ValueError(f'Linha {numero}: valor inválido "{texto}".')
+    return Decimal(int(texto)).scaleb(-2)
+
+
+def _linha_ofx(campos, numero):
+    if 'DTPOSTED' not in campos or 'TRNAMT' not in campos:
+        raise ValueError(f'Linha {numero}: transação sem DTPOSTED ou TRNAMT.')
+    try:
+        valor = Decimal(campos['TRNAMT'].replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f'Linha {numero}: valor inválido "{campos["TRNAMT"]}".')
+    return LinhaExtrato(
+        linha=numero,
+        # AAAAMMDD[HHMMSS[.XXX][[-3:BRT]]]: só a data interessa
+        data=_data(campos['DTPOSTED'][:8], numero),
+        valor=valor.quantize(Decimal('0.01')),
+        documento=campos.get('CHECKNUM') or campos.get('REFNUM', ''),
+        identificador=campos.get('FITID', ''),
+        descricao=campos.get('MEMO') or campos.get('NAME', ''),
+    )
+
+
+def ler_ofx(linhas):
+    transacao, inicio = None, 0
+    for numero, linha in enumerate(linhas, 1):
+        for fechamento, tag, valor in _TAG_OFX.findall(_decodificar(linha)):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if fechamento and transacao is not None:
+                    yield _linha_ofx(transacao, inicio)
+                    transacao = None
+                elif not fechamento:
+                    transacao, inicio = {}, numero
+            elif transacao is not None and not fechamento:
+                transacao[tag] = html.unescape(valor.strip())
+
+
+def _registros(linhas, tamanho):
+    """Registros de ``tamanho`` posições, com o número da linha; ignora linhas em branco"""
+    for numero, linha in enumerate(linhas, 1):
+        registro = _decodificar(linha).rstrip('\r\n')
+        if not registro.strip():
+            continue
+        if len(registro) < tamanho:
+            raise ValueError(f'Linha {numero}: registro com {len(registro)} posições, esperado {tamanho}.')
+        yield numero, registro
+
+
+def ler_cnab240(linhas):
+    segmento_t = None
+    for numero, registro in _registros(linhas, 240):
+        if registro[7] != '3':
+            continue
+        segmento = registro[13]
+        if segmento == 'E':
+            valor = _valor_cnab(registro[150:168], numero)
+            yield LinhaExtrato(
+                linha=numero,
+                data=_data_cnab(registro[142:150], numero),
+                valor=-valor if registro[168] == 'D' else valor,
+                documento=registro[201:240].strip(),
+                descricao=registro[176:201].strip(),
+            )
+        elif segmento == 'T':
+            segmento_t = (numero, registro)
+        elif segmento == 'U' and segmento_t is not None:
+            numero_t, t = segmento_t
+            segmento_t = None
+            if registro[15:17] not in OCORRENCIAS_LIQUIDACAO_240:
+                continue
+            # Data do crédito; sem ela, a data da ocorrência
+            data = registro[145:153] if registro[145:153].strip('0 ') else registro[137:145]
+            yield LinhaExtrato(
+                linha=numero_t,
+                data=_data_cnab(data, numero),
+                valor=_valor_cnab(registro[77:92], numero),
+                documento=t[58:73].strip(),
+                identificador=t[37:57].strip(),
+                descricao=t[148:188].strip(),
+            )
+
+
+def ler_cnab400(linhas):
+    for numero, registro in _registros(linhas, 400):
+        if registro[0] != '1' or registro[108:110] not in OCORRENCIAS_LIQUIDACAO_400:
+            continue
+        data = registro[295:301] if registro[295:301].strip('0 ') else registro[110:116]
+        yield LinhaExtrato(
+            linha=numero,
+            data=_data_cnab(data, numero),
+            valor=_valor_cnab(registro[253:266], numero),
+            documento=registro[116:126].strip(),
+            identificador=registro[70:82].strip(),
+        )
+
+
+LEITORES = {
+    'ofx': ler_ofx,
+    'cnab240': ler_cnab240,
+    'cnab400': ler_cnab400,
+}
+
+
+def detectar_formato(primeira_linha):
+    texto = _decodificar(primeira_linha).rstrip('\r\n')
+    if texto.lstrip().upper().startswith(('OFXHEADER', '<?XML', '<OFX')):
+        return 'ofx'
+    if len(texto) in (240, 400):
+        return f'cnab{len(texto)}'
+    raise ValueError('Formato de extrato não reconhecido; informe ofx, cnab240 ou cnab400.')
+
+
+def ler_extrato(linhas, formato=None):
+    """Gera as ``LinhaExtrato`` do arquivo; sem ``formato``, detecta pela primeira linha.
+
+    Levanta ``ValueError`` para formato desconhecido ou registro inválido.
+    """
+    linhas = iter(linhas)
+    primeira = next(linhas, b'')
+    formato = formato or detectar_formato(primeira)
+    if formato not in LEITORES:
+        raise ValueError(f'Formato de extrato inválido: {formato}.')
+    return LEITORES[formato](itertools.chain([primeira], linhas))
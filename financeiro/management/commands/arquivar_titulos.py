@@ -0,0 +1,37 @@
+import contextlib
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.multiempresa import escopo_empresa
+from core.particoes import primeiro_dia, somar_meses
+from financeiro.arquivo import LOTE, arquivar_titulos
+from financeiro.relatorios import TITULOS
+
+
+class Command(BaseCommand):
+    help = ('Move para as tabelas de arquivo as contas a receber e a pagar encerradas (recebidas, pagas ou '
+            'canceladas) com vencimento anterior ao corte, em lotes, mantendo as movimentações financeiras '
+            'ligadas a elas.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=settings.ARQUIVO_TITULOS_MESES,
+                            help='Idade mínima: arquiva os vencimentos anteriores ao primeiro dia do mês '
+                                 'atual menos esse número de meses.')
+        parser.add_argument('--tipo', choices=sorted(TITULOS), action='append',
+                            help='receber ou pagar (padrão: ambos); pode ser repetido.')
+        parser.add_argument('--empresa', type=int, help='Arquiva só os títulos desta empresa.')
+        parser.add_argument('--lote', type=int, default=LOTE, help='Títulos movidos por transação.')
+
+    def handle(self, *args, **options):
+        corte = somar_meses(primeiro_dia(timezone.localdate()), -options['meses'])
+        escopo = escopo_empresa(options['empresa']) if options['empresa'] else contextlib.nullcontext()
+        with escopo:
+            for tipo in options['tipo'] or sorted(TITULOS):
+                model = TITULOS[tipo][0]
+                resultado = arquivar_titulos(model, corte, lote=options['lote'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'{model._meta.verbose_name_plural}: {resultado.titulos} título(s) com vencimento antes de '
+                    f'{corte:%d/%m/%Y} arquivado(s), {resultado.movimentacoes} movimentação(ões) religada(s).'
+                ))
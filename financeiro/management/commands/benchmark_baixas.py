@@ -0,0 +1,78 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Empresa
+from financeiro.baixas import baixar_em_lote
+from financeiro.models import (
+    Banco, CentroCusto, ContasBancarias, ContasReceber, FormaPagamento, PlanoContas
+)
+from financeiro.saldos import verificar_saldos
+from operacional.models import Cliente, Pessoa
+
+
+class Command(BaseCommand):
+    help = ('Mede a baixa em lote de contas a receber. '
+            'Requer PostgreSQL; os dados gerados são descartados ao final (rollback).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titulos', type=int, default=10_000)
+        parser.add_argument('--contas', type=int, default=5,
+                            help='Contas bancárias entre as quais os títulos se dividem.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O benchmark de baixas requer PostgreSQL.')
+
+        with transaction.atomic():
+            empresa, contas = self._gerar_dados(options['titulos'], options['contas'])
+            inicio = time.perf_counter()
+            resultado = baixar_em_lote(ContasReceber.objects.filter(empresa=empresa),
+                                       data=datetime.date(2025, 6, 30))
+            duracao = time.perf_counter() - inicio
+            divergencias = verificar_saldos(contas)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'Títulos baixados: {resultado.titulos}  valor: R$ {resultado.valor:.2f}')
+        situacao_saldos = f'{len(divergencias)} divergência(s)' if divergencias else 'conferem'
+        self.stdout.write(f'Saldos diários: {situacao_saldos}')
+        self.stdout.write(self.style.SUCCESS(f'Tempo: {duracao:.2f}s ({resultado.titulos / duracao:,.0f} títulos/s)'))
+
+    def _gerar_dados(self, titulos, contas):
+        """Cria os cadastros mínimos e replica um título em aberto no banco com generate_series"""
+        sufixo = time.time_ns() % 10**8
+        empresa = Empresa.objects.create(nome='Benchmark', cnpj=f'BM{sufixo}', razao_social='Benchmark',
+                                         endereco='-')
+        banco = Banco.objects.create(codigo=f'B{sufixo}', nome='Benchmark')
+        contas_bancarias = [
+            ContasBancarias.objects.create(banco=banco, agencia='1', conta=str(n), digito='0', tipo='corrente',
+                                           empresa=empresa).pk
+            for n in range(contas)
+        ]
+        titulo = ContasReceber.objects.create(
+            numero_documento='BM-0', data_emissao=datetime.date(2025, 1, 1),
+            data_vencimento=datetime.date(2025, 6, 1), valor_original='123.45',
+            cliente=Cliente.objects.create(codigo=f'BM{sufixo}', pessoa=Pessoa.objects.create(
+                nome='Cliente Benchmark', tipo_pessoa='juridica', cpf_cnpj=f'BM{sufixo}', empresa=empresa)),
+            conta_contabil=PlanoContas.objects.create(codigo=f'BM{sufixo}', nome='Benchmark', tipo='receita',
+                                                      empresa=empresa),
+            centro_custo=CentroCusto.objects.create(codigo=f'BM{sufixo}', nome='Benchmark', empresa=empresa),
+            forma_pagamento=FormaPagamento.objects.create(nome='Benchmark', tipo='boleto'),
+            conta_bancaria_id=contas_bancarias[0], empresa=empresa,
+        )
+
+        campos = [f.column for f in ContasReceber._meta.concrete_fields if not f.primary_key]
+        valores = {
+            'numero_documento': "'BM-' || g",
+            'conta_bancaria_id': f"(ARRAY[{', '.join(map(str, contas_bancarias))}])[1 + g %% {contas}]",
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {ContasReceber._meta.db_table} ({", ".join(campos)}) '
+                f'SELECT {", ".join(valores.get(coluna, coluna) for coluna in campos)} '
+                f'FROM {ContasReceber._meta.db_table}, generate_series(1, %s) AS g WHERE id = %s',
+                [titulos - 1, titulo.pk],
+            )
+        return empresa, contas_bancarias
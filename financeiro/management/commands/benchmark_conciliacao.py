@@ -0,0 +1,135 @@
+import datetime
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Empresa
+from financeiro.conciliacao import conciliar_extrato
+from financeiro.extratos import ler_extrato
+from financeiro.models import (
+    Banco, CentroCusto, ContasBancarias, ContasPagar, ContasReceber, FormaPagamento, PlanoContas
+)
+from financeiro.saldos import verificar_saldos
+from operacional.models import Cliente, Fornecedor, Pessoa
+
+HOJE = datetime.date(2025, 6, 30)
+
+
+class Command(BaseCommand):
+    help = ('Mede a importação e conciliação de um extrato OFX grande: metade créditos casados por valor e '
+            'data com contas a receber, 30% débitos casados pelo documento com contas a pagar e 20% sem '
+            'correspondência; depois reimporta o mesmo arquivo. '
+            'Requer PostgreSQL; os dados gerados são descartados ao final (rollback).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O benchmark de conciliação requer PostgreSQL.')
+
+        linhas = options['linhas']
+        receber, pagar = linhas // 2, linhas * 3 // 10
+        with tempfile.TemporaryFile() as arquivo:
+            self._gerar_ofx(arquivo, receber, pagar, linhas - receber - pagar)
+
+            arquivo.seek(0)
+            inicio = time.perf_counter()
+            lidas = sum(1 for _ in ler_extrato(arquivo))
+            leitura = time.perf_counter() - inicio
+
+            with transaction.atomic():
+                conta = self._gerar_dados(receber, pagar)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ANALYZE {ContasReceber._meta.db_table}')
+                    cursor.execute(f'ANALYZE {ContasPagar._meta.db_table}')
+
+                arquivo.seek(0)
+                inicio = time.perf_counter()
+                resultado = conciliar_extrato(ler_extrato(arquivo), conta)
+                primeira = time.perf_counter() - inicio
+
+                arquivo.seek(0)
+                inicio = time.perf_counter()
+                reimportacao = conciliar_extrato(ler_extrato(arquivo), conta)
+                segunda = time.perf_counter() - inicio
+
+                divergencias = verificar_saldos([conta.pk])
+                transaction.set_rollback(True)
+
+        self.stdout.write(f'Linhas: {lidas}  leitura do OFX: {leitura:.2f}s ({lidas / leitura:,.0f} linhas/s)')
+        self.stdout.write(f'Importação: {resultado.titulos_baixados} título(s) baixado(s), '
+                          f'{resultado.ja_lancadas} já lançada(s), '
+                          f'{len(resultado.nao_conciliadas)} não conciliada(s) em {primeira:.2f}s')
+        self.stdout.write(f'Reimportação: {reimportacao.titulos_baixados} título(s) baixado(s), '
+                          f'{reimportacao.ja_lancadas} já lançada(s) em {segunda:.2f}s')
+        self.stdout.write(f'Saldos diários: {f"{len(divergencias)} divergência(s)" if divergencias else "conferem"}')
+        self.stdout.write(self.style.SUCCESS(f'Tempo total da importação: {primeira:.2f}s '
+                                             f'({lidas / primeira:,.0f} linhas/s)'))
+
+    def _gerar_ofx(self, arquivo, receber, pagar, sem_titulo):
+        """Créditos com o valor dos títulos a receber ``g`` (1 a 3 dias após o vencimento), débitos com o
+        documento dos títulos a pagar e créditos de valores sem título"""
+        def escrever(numero, data, valor, documento=''):
+            arquivo.write(
+                f'<STMTTRN>\n<TRNTYPE>{"CREDIT" if valor > 0 else "DEBIT"}\n<DTPOSTED>{data:%Y%m%d}120000[-3:BRT]\n'
+                f'<TRNAMT>{valor:.2f}\n<FITID>{numero}\n<CHECKNUM>{documento}\n<MEMO>Lançamento {numero}\n'
+                f'</STMTTRN>\n'.encode()
+            )
+
+        arquivo.write(b'OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\nCHARSET:1252\n\n'
+                      b'<OFX>\n<BANKMSGSRSV1>\n<STMTTRNRS>\n<STMTRS>\n<BANKTRANLIST>\n')
+        numero = 0
+        for g in range(1, receber + 1):
+            numero += 1
+            escrever(numero, HOJE + datetime.timedelta(days=g % 60 + g % 3), g / 100 + 1)
+        for g in range(1, pagar + 1):
+            numero += 1
+            escrever(numero, HOJE + datetime.timedelta(days=g % 60), -(g / 100 + 1), f'BP-{g}')
+        for g in range(1, sem_titulo + 1):
+            numero += 1
+            escrever(numero, HOJE + datetime.timedelta(days=g % 60), 900_000 + g / 100)
+        arquivo.write(b'</BANKTRANLIST>\n</STMTRS>\n</STMTTRNRS>\n</BANKMSGSRSV1>\n</OFX>\n')
+
+    def _gerar_dados(self, receber, pagar):
+        """Cria os cadastros e replica um título a receber e um a pagar com generate_series"""
+        sufixo = time.time_ns() % 10**8
+        empresa = Empresa.objects.create(nome='Benchmark', cnpj=f'BM{sufixo}', razao_social='Benchmark',
+                                         endereco='-')
+        conta = ContasBancarias.objects.create(banco=Banco.objects.create(codigo=f'B{sufixo}', nome='Benchmark'),
+                                               agencia='1', conta='1', digito='0', tipo='corrente', empresa=empresa)
+        comuns = dict(
+            data_emissao=HOJE, data_vencimento=HOJE, valor_original='0.01',
+            forma_pagamento=FormaPagamento.objects.create(nome='Boleto', tipo='boleto'),
+            conta_contabil=PlanoContas.objects.create(codigo=f'BM{sufixo}', nome='Benchmark', tipo='receita',
+                                                      empresa=empresa),
+            centro_custo=CentroCusto.objects.create(codigo=f'BM{sufixo}', nome='Benchmark', empresa=empresa),
+            conta_bancaria=conta, empresa=empresa,
+        )
+        titulo_receber = ContasReceber.objects.create(
+            numero_documento='BR-0', **comuns, cliente=Cliente.objects.create(
+                codigo=f'BM{sufixo}', pessoa=Pessoa.objects.create(nome='Cliente', tipo_pessoa='juridica',
+                                                                   cpf_cnpj=f'1{sufixo}', empresa=empresa)))
+        titulo_pagar = ContasPagar.objects.create(
+            numero_documento='BP-0', **comuns, fornecedor=Fornecedor.objects.create(
+                codigo=f'BM{sufixo}', pessoa=Pessoa.objects.create(nome='Fornecedor', tipo_pessoa='juridica',
+                                                                   cpf_cnpj=f'2{sufixo}', empresa=empresa)))
+
+        with connection.cursor() as cursor:
+            for model, titulo, prefixo, quantidade in ((ContasReceber, titulo_receber, 'BR', receber),
+                                                       (ContasPagar, titulo_pagar, 'BP', pagar)):
+                valores = {
+                    'numero_documento': f"'{prefixo}-' || g",
+                    'data_vencimento': 'data_vencimento + g %% 60',
+                    'valor_original': 'g / 100.0 + 1',
+                }
+                campos = [f.column for f in model._meta.concrete_fields if not f.primary_key]
+                cursor.execute(
+                    f'INSERT INTO {model._meta.db_table} ({", ".join(campos)}) '
+                    f'SELECT {", ".join(valores.get(coluna, coluna) for coluna in campos)} '
+                    f'FROM {model._meta.db_table}, generate_series(1, %s) AS g WHERE id = %s',
+                    [quantidade, titulo.pk],
+                )
+        return conta
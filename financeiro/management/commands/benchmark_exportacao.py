@@ -0,0 +1,94 @@
+import datetime
+import resource
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Empresa
+from financeiro.exportacao import gerar_csv, linhas_exportacao
+from financeiro.models import (
+    Banco, CentroCusto, ContasBancarias, ContasReceber, FormaPagamento, PlanoContas
+)
+from operacional.models import Cliente, Pessoa
+
+
+class Command(BaseCommand):
+    help = ('Mede linhas/s e pico de memória da exportação de contas a receber. '
+            'Requer PostgreSQL; os dados gerados são descartados ao final (rollback).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1_000_000)
+        parser.add_argument('--formato', choices=['csv', 'linhas'], default='csv',
+                            help='csv mede a geração completa do arquivo; linhas mede só a leitura.')
+        parser.add_argument('--tracemalloc', action='store_true',
+                            help='Mede também o pico de memória Python (deixa a exportação mais lenta).')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O benchmark de exportação requer PostgreSQL.')
+
+        with transaction.atomic():
+            empresa = self._gerar_dados(options['linhas'])
+            titulos = ContasReceber.objects.filter(empresa=empresa)
+            gerador = gerar_csv(titulos) if options['formato'] == 'csv' else linhas_exportacao(titulos)
+
+            rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if options['tracemalloc']:
+                tracemalloc.start()
+            inicio = time.perf_counter()
+            for _ in gerador:
+                pass
+            duracao = time.perf_counter() - inicio
+            if options['tracemalloc']:
+                _, pico_python = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            rss_final = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+            transaction.set_rollback(True)
+
+        linhas = options['linhas']
+        self.stdout.write(f'Linhas: {linhas}  formato: {options["formato"]}')
+        self.stdout.write(f'Tempo: {duracao:.2f}s')
+        if options['tracemalloc']:
+            self.stdout.write(f'Pico de memória Python (tracemalloc): {pico_python / 1024 / 1024:.1f} MiB')
+        self.stdout.write(f'Pico de RSS do processo: {rss_final / 1024:.1f} MiB '
+                          f'(+{(rss_final - rss_inicial) / 1024:.1f} MiB durante a exportação)')
+        self.stdout.write(self.style.SUCCESS(f'Vazão: {linhas / duracao:,.0f} linhas/s'))
+
+    def _gerar_dados(self, linhas):
+        """Cria os cadastros mínimos e replica um título no banco com generate_series"""
+        sufixo = time.time_ns() % 10**8
+        empresa = Empresa.objects.create(nome='Benchmark', cnpj=f'BM{sufixo}', razao_social='Benchmark',
+                                         endereco='-')
+        pessoa = Pessoa.objects.create(nome='Cliente Benchmark', tipo_pessoa='juridica',
+                                       cpf_cnpj=f'BM{sufixo}', empresa=empresa)
+        cliente = Cliente.objects.create(pessoa=pessoa, codigo=f'BM{sufixo}')
+        titulo = ContasReceber.objects.create(
+            numero_documento='BM-0', cliente=cliente, data_emissao=datetime.date(2025, 1, 1),
+            data_vencimento=datetime.date(2025, 1, 1), valor_original='123.45',
+            conta_contabil=PlanoContas.objects.create(codigo=f'BM{sufixo}', nome='Benchmark',
+                                                      tipo='receita', empresa=empresa),
+            centro_custo=CentroCusto.objects.create(codigo=f'BM{sufixo}', nome='Benchmark', empresa=empresa),
+            forma_pagamento=FormaPagamento.objects.create(nome='Benchmark', tipo='boleto'),
+            conta_bancaria=ContasBancarias.objects.create(
+                banco=Banco.objects.create(codigo=f'B{sufixo}', nome='Benchmark'),
+                agencia='1', conta='1', digito='0', tipo='corrente', empresa=empresa,
+            ),
+            empresa=empresa,
+        )
+
+        campos = [f.column for f in ContasReceber._meta.concrete_fields if not f.primary_key]
+        valores = {
+            'numero_documento': "'BM-' || g",
+            'data_vencimento': 'data_vencimento + (g %% 365)',
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {ContasReceber._meta.db_table} ({", ".join(campos)}) '
+                f'SELECT {", ".join(valores.get(coluna, coluna) for coluna in campos)} '
+                f'FROM {ContasReceber._meta.db_table}, generate_series(1, %s) AS g WHERE id = %s',
+                [linhas - 1, titulo.pk],
+            )
+        return empresa
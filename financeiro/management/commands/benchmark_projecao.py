@@ -0,0 +1,100 @@
+import datetime
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Empresa
+from financeiro.models import (
+    Banco, CentroCusto, ContasBancarias, ContasPagar, ContasReceber, FormaPagamento, PlanoContas
+)
+from financeiro.projecao import projetar
+from operacional.models import Cliente, Fornecedor, Pessoa
+
+
+class Command(BaseCommand):
+    help = ('Mede o tempo da projeção de fluxo de caixa com muitos títulos em aberto (metade a receber, '
+            'metade a pagar). Requer PostgreSQL; os dados gerados são descartados ao final (rollback).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titulos', type=int, default=1_000_000)
+        parser.add_argument('--contas', type=int, default=5, help='Contas bancárias da empresa.')
+        parser.add_argument('--dias', type=int, default=90)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O benchmark da projeção requer PostgreSQL.')
+
+        hoje = datetime.date(2025, 6, 30)
+        with transaction.atomic():
+            empresa = self._gerar_dados(options['titulos'], options['contas'], hoje)
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {ContasReceber._meta.db_table}')
+                cursor.execute(f'ANALYZE {ContasPagar._meta.db_table}')
+
+            cache.clear()
+            inicio = time.perf_counter()
+            contas = projetar(empresa.pk, hoje, options['dias'])
+            frio = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            projetar(empresa.pk, hoje, options['dias'])
+            quente = time.perf_counter() - inicio
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'Títulos em aberto: {options["titulos"]}  contas: {len(contas)}  dias: {options["dias"]}')
+        self.stdout.write(f'Sem cache: {frio:.2f}s')
+        self.stdout.write(self.style.SUCCESS(f'Com cache: {quente * 1000:.1f} ms'))
+
+    def _gerar_dados(self, titulos, contas, hoje):
+        """Cria os cadastros e replica um título a receber e um a pagar com generate_series"""
+        sufixo = time.time_ns() % 10**8
+        empresa = Empresa.objects.create(nome='Benchmark', cnpj=f'BM{sufixo}', razao_social='Benchmark',
+                                         endereco='-')
+        banco = Banco.objects.create(codigo=f'B{sufixo}', nome='Benchmark')
+        contas_bancarias = [
+            ContasBancarias.objects.create(banco=banco, agencia='1', conta=str(n), digito='0', tipo='corrente',
+                                           empresa=empresa)
+            for n in range(contas)
+        ]
+        formas = [
+            FormaPagamento.objects.create(nome='Boleto', tipo='boleto'),
+            FormaPagamento.objects.create(nome='Cartão', tipo='cartao_credito', prazo_recebimento=30, taxa='2.50'),
+        ]
+        comuns = dict(
+            data_emissao=hoje, data_vencimento=hoje, valor_original='123.45', forma_pagamento=formas[0],
+            conta_contabil=PlanoContas.objects.create(codigo=f'BM{sufixo}', nome='Benchmark', tipo='receita',
+                                                      empresa=empresa),
+            centro_custo=CentroCusto.objects.create(codigo=f'BM{sufixo}', nome='Benchmark', empresa=empresa),
+            conta_bancaria=contas_bancarias[0], empresa=empresa,
+        )
+        receber = ContasReceber.objects.create(numero_documento='BM-0', **comuns, cliente=Cliente.objects.create(
+            codigo=f'BM{sufixo}', pessoa=Pessoa.objects.create(nome='Cliente', tipo_pessoa='juridica',
+                                                               cpf_cnpj=f'1{sufixo}', empresa=empresa)))
+        pagar = ContasPagar.objects.create(numero_documento='BM-0', **comuns, fornecedor=Fornecedor.objects.create(
+            codigo=f'BM{sufixo}', pessoa=Pessoa.objects.create(nome='Fornecedor', tipo_pessoa='juridica',
+                                                               cpf_cnpj=f'2{sufixo}', empresa=empresa)))
+
+        ids_contas = ', '.join(str(conta.pk) for conta in contas_bancarias)
+        ids_formas = ', '.join(str(forma.pk) for forma in formas)
+        valores = {
+            'numero_documento': "'BM-' || g",
+            # Vencimentos de 30 dias atrás a 120 dias à frente, espalhados pelas contas e formas
+            'data_vencimento': 'data_vencimento + (g %% 151) - 30',
+            'valor_original': '(g %% 100000) / 100.0 + 1',
+            'conta_bancaria_id': f"(ARRAY[{ids_contas}])[1 + g %% {contas}]",
+            'forma_pagamento_id': f"(ARRAY[{ids_formas}])[1 + g %% 2]",
+        }
+        with connection.cursor() as cursor:
+            for model, titulo, quantidade in ((ContasReceber, receber, titulos // 2 - 1),
+                                              (ContasPagar, pagar, titulos - titulos // 2 - 1)):
+                campos = [f.column for f in model._meta.concrete_fields if not f.primary_key]
+                cursor.execute(
+                    f'INSERT INTO {model._meta.db_table} ({", ".join(campos)}) '
+                    f'SELECT {", ".join(valores.get(coluna, coluna) for coluna in campos)} '
+                    f'FROM {model._meta.db_table}, generate_series(1, %s) AS g WHERE id = %s',
+                    [quantidade, titulo.pk],
+                )
+        return empresa
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from financeiro.conciliacao import BLOCO, TOLERANCIA_DIAS, conciliar_extrato
+from financeiro.extratos import LEITORES, ler_extrato
+from financeiro.models import ContasBancarias
+
+
+class Command(BaseCommand):
+    help = ('Importa um extrato OFX ou arquivo de retorno CNAB 240/400 e concilia as linhas com os títulos em '
+            'aberto e as movimentações da conta bancária')
+
+    def add_arguments(self, parser):
+        parser.add_argument('conta_bancaria', type=int, help='Id da conta bancária do extrato.')
+        parser.add_argument('arquivo')
+        parser.add_argument('--formato', choices=sorted(LEITORES), help='Padrão: detectar pela primeira linha.')
+        parser.add_argument('--tolerancia-dias', type=int, default=TOLERANCIA_DIAS,
+                            help='Diferença máxima entre o vencimento do título e a data da linha.')
+        parser.add_argument('--bloco', type=int, default=BLOCO, help='Linhas conciliadas por vez.')
+
+    def handle(self, *args, **options):
+        try:
+            conta = ContasBancarias.objects.get(pk=options['conta_bancaria'])
+        except ContasBancarias.DoesNotExist:
+            raise CommandError(f'Conta bancária {options["conta_bancaria"]} não encontrada.')
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                resultado = conciliar_extrato(
+                    ler_extrato(arquivo, options['formato']), conta,
+                    tolerancia_dias=options['tolerancia_dias'], bloco=options['bloco'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for linha, motivo in resultado.nao_conciliadas:
+            self.stderr.write(f'Linha {linha.linha} ({linha.data:%d/%m/%Y} {linha.valor} {linha.documento}): {motivo}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.linhas} linha(s): {resultado.titulos_baixados} título(s) baixado(s) '
+            f'(R$ {resultado.valor_baixado}), {resultado.ja_lancadas} já lançada(s), '
+            f'{len(resultado.nao_conciliadas)} não conciliada(s).'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from financeiro.saldos import reconstruir_saldos, verificar_saldos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os saldos diários das contas bancárias a partir das movimentações financeiras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conta', type=int, action='append', dest='contas',
+                            help='Id da conta bancária (pode ser repetido). Padrão: todas.')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Apenas compara os saldos gravados com o histórico, sem alterar nada.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        contas = options['contas']
+
+        if options['verificar']:
+            divergencias = verificar_saldos(contas)
+            for (conta_id, data), esperado in divergencias:
+                if esperado is None:
+                    self.stdout.write(f'Conta {conta_id} em {data}: saldo gravado sem movimentações')
+                else:
+                    entradas, saidas, saldo = esperado
+                    self.stdout.write(f'Conta {conta_id} em {data}: esperado entradas={entradas} '
+                                      f'saidas={saidas} saldo={saldo}')
+            if divergencias:
+                self.stdout.write(self.style.ERROR(f'{len(divergencias)} divergência(s) encontrada(s).'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Saldos diários conferem com as movimentações.'))
+            return
+
+        total = reconstruir_saldos(contas, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{total} saldo(s) diário(s) recalculado(s).'))
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('financeiro', '0001_initial'),
+        ('operacional', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='contasbancarias',
+            options={'ordering': ['banco__nome', 'agencia', 'conta'], 'verbose_name': 'Conta Bancária', 'verbose_name_plural': 'Contas Bancárias'},
+        ),
+        migrations.AddField(
+            model_name='centrocusto',
+            name='pai',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='filhos', to='financeiro.centrocusto', verbose_name='Centro Pai'),
+        ),
+        migrations.AddField(
+            model_name='contasreceber',
+            name='conta_bancaria',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='financeiro.contasbancarias', verbose_name='Conta Bancária'),
+        ),
+        migrations.AddField(
+            model_name='planocontas',
+            name='empresa',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Empresa'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='contaspagar',
+            name='fornecedor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='operacional.fornecedor', verbose_name='Fornecedor'),
+        ),
+        migrations.AlterField(
+            model_name='contasreceber',
+            name='cliente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='operacional.cliente', verbose_name='Cliente'),
+        ),
+        migrations.CreateModel(
+            name='Banco',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('codigo', models.CharField(max_length=10, unique=True, verbose_name='Código')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_created', to=settings.AUTH_USER_MODEL, verbose_name='Criado por')),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_updated', to=settings.AUTH_USER_MODEL, verbose_name='Atualizado por')),
+            ],
+            options={
+                'verbose_name': 'Banco',
+                'verbose_name_plural': 'Bancos',
+                'ordering': ['codigo'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='contasbancarias',
+            name='banco',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='financeiro.banco', verbose_name='Banco'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:38
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0002_alter_contasbancarias_options_centrocusto_pai_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoContaBancaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('total_entradas', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=17, verbose_name='Total de Entradas')),
+                ('total_saidas', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=17, verbose_name='Total de Saídas')),
+                ('saldo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=17, verbose_name='Saldo Acumulado')),
+                ('conta_bancaria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_diarios', to='financeiro.contasbancarias', verbose_name='Conta Bancária')),
+            ],
+            options={
+                'verbose_name': 'Saldo Diário da Conta Bancária',
+                'verbose_name_plural': 'Saldos Diários das Contas Bancárias',
+                'ordering': ['conta_bancaria', 'data'],
+                'unique_together': {('conta_bancaria', 'data')},
+            },
+        ),
+    ]
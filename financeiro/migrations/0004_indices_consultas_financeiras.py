@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:46
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Índices criados com CONCURRENTLY para não bloquear escritas nas tabelas
+    atomic = False
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('financeiro', '0003_saldocontabancaria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='contaspagar',
+            index=models.Index(fields=['empresa', 'situacao', '-data_vencimento'], name='cp_emp_sit_venc_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='contaspagar',
+            index=models.Index(condition=models.Q(('situacao', 'aberto')), fields=['empresa', 'data_vencimento'], include=('fornecedor', 'valor_original', 'valor_juros', 'valor_multa', 'valor_desconto'), name='cp_aberto_emp_venc_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='contasreceber',
+            index=models.Index(fields=['empresa', 'situacao', '-data_vencimento'], name='cr_emp_sit_venc_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='contasreceber',
+            index=models.Index(condition=models.Q(('situacao', 'aberto')), fields=['empresa', 'data_vencimento'], include=('cliente', 'valor_original', 'valor_juros', 'valor_multa', 'valor_desconto'), name='cr_aberto_emp_venc_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='movimentacaofinanceira',
+            index=models.Index(fields=['empresa', '-data'], name='movfin_emp_data_idx'),
+        ),
+    ]
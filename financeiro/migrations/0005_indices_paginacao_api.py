@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:04
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Índices criados com CONCURRENTLY para não bloquear escritas nas tabelas
+    atomic = False
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('financeiro', '0004_indices_consultas_financeiras'),
+        ('operacional', '0002_lancamento_estoque'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='contaspagar',
+            index=models.Index(fields=['empresa', 'data_vencimento', 'id'], name='cp_emp_venc_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='contaspagar',
+            index=models.Index(fields=['data_vencimento', 'id'], name='cp_venc_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='contasreceber',
+            index=models.Index(fields=['empresa', 'data_vencimento', 'id'], name='cr_emp_venc_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='contasreceber',
+            index=models.Index(fields=['data_vencimento', 'id'], name='cr_venc_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='movimentacaofinanceira',
+            index=models.Index(fields=['-data', '-id'], name='movfin_data_id_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def preencher_caminhos(apps, schema_editor):
+    """Calcula caminho (e nível do plano de contas) dos registros existentes, raiz a raiz"""
+    for nome, campo_nivel in (('PlanoContas', 'nivel'), ('CentroCusto', None)):
+        model = apps.get_model('financeiro', nome)
+        filhos = {}
+        for no in model.objects.only('pk', 'pai_id'):
+            filhos.setdefault(no.pai_id, []).append(no)
+        alterados, pendentes = [], [(no, '', 1) for no in filhos.get(None, [])]
+        while pendentes:
+            no, prefixo, nivel = pendentes.pop()
+            no.caminho = f'{prefixo}{no.pk}/'
+            if campo_nivel:
+                setattr(no, campo_nivel, nivel)
+            alterados.append(no)
+            pendentes.extend((filho, no.caminho, nivel + 1) for filho in filhos.get(no.pk, []))
+        model.objects.bulk_update(alterados, ['caminho'] + ([campo_nivel] if campo_nivel else []), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('financeiro', '0005_indices_paginacao_api'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='centrocusto',
+            name='caminho',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Caminho'),
+        ),
+        migrations.AddField(
+            model_name='planocontas',
+            name='caminho',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Caminho'),
+        ),
+        migrations.AddIndex(
+            model_name='centrocusto',
+            index=models.Index(fields=['caminho'], name='centro_caminho_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='planocontas',
+            index=models.Index(fields=['caminho'], name='plano_caminho_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(preencher_caminhos, migrations.RunPython.noop),
+    ]
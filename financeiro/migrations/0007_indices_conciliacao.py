@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:36
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Índices criados com CONCURRENTLY para não bloquear escritas nas tabelas
+    atomic = False
+
+    dependencies = [
+        ('core', '0002_relatorio_job'),
+        ('financeiro', '0006_caminho_arvores'),
+        ('operacional', '0004_documento_pessoa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='contaspagar',
+            index=models.Index(condition=models.Q(('situacao', 'aberto')), fields=['empresa', 'numero_documento'],
+                               name='cp_aberto_emp_doc_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='contasreceber',
+            index=models.Index(condition=models.Q(('situacao', 'aberto')), fields=['empresa', 'numero_documento'],
+                               name='cr_aberto_emp_doc_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='movimentacaofinanceira',
+            index=models.Index(fields=['conta_bancaria', 'data'], name='movfin_conta_data_idx'),
+        ),
+    ]
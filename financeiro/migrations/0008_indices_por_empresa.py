@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:51
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Índices criados com CONCURRENTLY para não bloquear escritas nas tabelas
+    atomic = False
+
+
+    dependencies = [
+        ('core', '0003_empresa_usuarios'),
+        ('financeiro', '0007_indices_conciliacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='centrocusto',
+            index=models.Index(fields=['empresa', 'codigo'], name='centro_emp_codigo_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='planocontas',
+            index=models.Index(fields=['empresa', 'codigo'], name='plano_emp_codigo_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from core.particoes import desparticionar, particionar
+
+TABELA = 'financeiro_movimentacaofinanceira'
+
+
+def particionar_por_mes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            particionar(cursor, TABELA)
+
+
+def desfazer_particionamento(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            desparticionar(cursor, TABELA)
+
+
+class Migration(migrations.Migration):
+    # Particionamento por mês de data (ver core.particoes); a chave primária no banco passa a ser (id, data)
+
+    dependencies = [
+        ('financeiro', '0008_indices_por_empresa'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar_por_mes, desfazer_particionamento),
+    ]
@@ -0,0 +1,178 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:02
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _historico(tabela, pessoa, campos_baixa):
+    """View do histórico: tabela ativa e arquivo com as mesmas colunas, em UNION ALL"""
+    colunas = ', '.join([
+        'id', 'created_at', 'updated_at', 'created_by_id', 'updated_by_id', 'is_active', 'numero_documento',
+        f'{pessoa}_id', 'data_vencimento', 'data_emissao', 'valor_original', 'valor_desconto', 'valor_juros',
+        'valor_multa', *campos_baixa, 'situacao', 'conta_contabil_id', 'centro_custo_id', 'forma_pagamento_id',
+        'conta_bancaria_id', 'empresa_id',
+    ])
+    return migrations.RunSQL(
+        f'CREATE VIEW {tabela}_historico AS SELECT {colunas} FROM {tabela} '
+        f'UNION ALL SELECT {colunas} FROM {tabela}arquivada',
+        f'DROP VIEW {tabela}_historico',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_empresa_usuarios'),
+        ('financeiro', '0009_particionar_movimentacoes'),
+        ('operacional', '0006_particionar_movimentacoes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContasPagarHistorico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('numero_documento', models.CharField(max_length=50, verbose_name='Número do Documento')),
+                ('data_vencimento', models.DateField(verbose_name='Data de Vencimento')),
+                ('data_emissao', models.DateField(verbose_name='Data de Emissão')),
+                ('valor_original', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Valor Original')),
+                ('valor_desconto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Desconto')),
+                ('valor_juros', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Juros')),
+                ('valor_multa', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Multa')),
+                ('valor_pago', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Pago')),
+                ('data_pagamento', models.DateField(blank=True, null=True, verbose_name='Data de Pagamento')),
+                ('situacao', models.CharField(choices=[('aberto', 'Aberto'), ('pago', 'Pago'), ('cancelado', 'Cancelado')], default='aberto', max_length=20, verbose_name='Situação')),
+            ],
+            options={
+                'verbose_name': 'Histórico de Contas a Pagar',
+                'verbose_name_plural': 'Histórico de Contas a Pagar',
+                'db_table': 'financeiro_contaspagar_historico',
+                'ordering': ['-data_vencimento'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ContasReceberHistorico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('numero_documento', models.CharField(max_length=50, verbose_name='Número do Documento')),
+                ('data_vencimento', models.DateField(verbose_name='Data de Vencimento')),
+                ('data_emissao', models.DateField(verbose_name='Data de Emissão')),
+                ('valor_original', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Valor Original')),
+                ('valor_desconto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Desconto')),
+                ('valor_juros', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Juros')),
+                ('valor_multa', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Multa')),
+                ('valor_recebido', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Recebido')),
+                ('data_recebimento', models.DateField(blank=True, null=True, verbose_name='Data de Recebimento')),
+                ('situacao', models.CharField(choices=[('aberto', 'Aberto'), ('recebido', 'Recebido'), ('cancelado', 'Cancelado')], default='aberto', max_length=20, verbose_name='Situação')),
+            ],
+            options={
+                'verbose_name': 'Histórico de Contas a Receber',
+                'verbose_name_plural': 'Histórico de Contas a Receber',
+                'db_table': 'financeiro_contasreceber_historico',
+                'ordering': ['-data_vencimento'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ContasPagarArquivada',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('numero_documento', models.CharField(max_length=50, verbose_name='Número do Documento')),
+                ('data_vencimento', models.DateField(verbose_name='Data de Vencimento')),
+                ('data_emissao', models.DateField(verbose_name='Data de Emissão')),
+                ('valor_original', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Valor Original')),
+                ('valor_desconto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Desconto')),
+                ('valor_juros', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Juros')),
+                ('valor_multa', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Multa')),
+                ('valor_pago', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Pago')),
+                ('data_pagamento', models.DateField(blank=True, null=True, verbose_name='Data de Pagamento')),
+                ('situacao', models.CharField(choices=[('aberto', 'Aberto'), ('pago', 'Pago'), ('cancelado', 'Cancelado')], default='aberto', max_length=20, verbose_name='Situação')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('centro_custo', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='financeiro.centrocusto', verbose_name='Centro de Custo')),
+                ('conta_bancaria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='financeiro.contasbancarias', verbose_name='Conta Bancária')),
+                ('conta_contabil', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='financeiro.planocontas', verbose_name='Conta Contábil')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_created', to=settings.AUTH_USER_MODEL, verbose_name='Criado por')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Empresa')),
+                ('forma_pagamento', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='financeiro.formapagamento', verbose_name='Forma de Pagamento')),
+                ('fornecedor', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='operacional.fornecedor', verbose_name='Fornecedor')),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_updated', to=settings.AUTH_USER_MODEL, verbose_name='Atualizado por')),
+            ],
+            options={
+                'verbose_name': 'Conta a Pagar Arquivada',
+                'verbose_name_plural': 'Contas a Pagar Arquivadas',
+                'ordering': ['-data_vencimento'],
+            },
+        ),
+        migrations.AddField(
+            model_name='movimentacaofinanceira',
+            name='conta_pagar_arquivada',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='financeiro.contaspagararquivada', verbose_name='Conta a Pagar Arquivada'),
+        ),
+        migrations.CreateModel(
+            name='ContasReceberArquivada',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('numero_documento', models.CharField(max_length=50, verbose_name='Número do Documento')),
+                ('data_vencimento', models.DateField(verbose_name='Data de Vencimento')),
+                ('data_emissao', models.DateField(verbose_name='Data de Emissão')),
+                ('valor_original', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Valor Original')),
+                ('valor_desconto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Desconto')),
+                ('valor_juros', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Juros')),
+                ('valor_multa', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Multa')),
+                ('valor_recebido', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Valor Recebido')),
+                ('data_recebimento', models.DateField(blank=True, null=True, verbose_name='Data de Recebimento')),
+                ('situacao', models.CharField(choices=[('aberto', 'Aberto'), ('recebido', 'Recebido'), ('cancelado', 'Cancelado')], default='aberto', max_length=20, verbose_name='Situação')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('centro_custo', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='financeiro.centrocusto', verbose_name='Centro de Custo')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='operacional.cliente', verbose_name='Cliente')),
+                ('conta_bancaria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='financeiro.contasbancarias', verbose_name='Conta Bancária')),
+                ('conta_contabil', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='financeiro.planocontas', verbose_name='Conta Contábil')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_created', to=settings.AUTH_USER_MODEL, verbose_name='Criado por')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Empresa')),
+                ('forma_pagamento', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='financeiro.formapagamento', verbose_name='Forma de Pagamento')),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(class)s_updated', to=settings.AUTH_USER_MODEL, verbose_name='Atualizado por')),
+            ],
+            options={
+                'verbose_name': 'Conta a Receber Arquivada',
+                'verbose_name_plural': 'Contas a Receber Arquivadas',
+                'ordering': ['-data_vencimento'],
+            },
+        ),
+        migrations.AddField(
+            model_name='movimentacaofinanceira',
+            name='conta_receber_arquivada',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='financeiro.contasreceberarquivada', verbose_name='Conta a Receber Arquivada'),
+        ),
+        migrations.AddIndex(
+            model_name='contaspagararquivada',
+            index=models.Index(fields=['empresa', 'data_vencimento', 'id'], name='cpa_emp_venc_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contaspagararquivada',
+            index=models.Index(fields=['data_vencimento', 'id'], name='cpa_venc_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contasreceberarquivada',
+            index=models.Index(fields=['empresa', 'data_vencimento', 'id'], name='cra_emp_venc_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contasreceberarquivada',
+            index=models.Index(fields=['data_vencimento', 'id'], name='cra_venc_id_idx'),
+        ),
+        _historico('financeiro_contasreceber', 'cliente', ['valor_recebido', 'data_recebimento']),
+        _historico('financeiro_contaspagar', 'fornecedor', ['valor_pago', 'data_pagamento']),
+    ]
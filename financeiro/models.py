@@ -1,9 +1,10 @@
-from django.db import models
+from django.contrib.auth.models import User
+from django.db import models, transaction
 from decimal import Decimal
-from core.models import BaseModel, Empresa
+from core.models import ArvoreMaterializada, BaseModel, Empresa, ModeloPorEmpresa
 
 
-class PlanoContas(BaseModel):
+class PlanoContas(ModeloPorEmpresa, ArvoreMaterializada, BaseModel):
     """Plano de Contas"""
     codigo = models.CharField(max_length=20, unique=True, verbose_name='Código')
     nome = models.CharField(max_length=200, verbose_name='Nome')
@@ -20,16 +21,23 @@ class PlanoContas(BaseModel):
     aceita_lancamento = models.BooleanField(default=True, verbose_name='Aceita Lançamento')
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name='Empresa')
 
+    campo_nivel = 'nivel'
+
     class Meta:
         verbose_name = 'Plano de Contas'
         verbose_name_plural = 'Planos de Contas'
         ordering = ['codigo']
+        indexes = [
+            # Subárvore por prefixo do caminho (LIKE 'prefixo%')
+            models.Index(fields=['caminho'], name='plano_caminho_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['empresa', 'codigo'], name='plano_emp_codigo_idx'),
+        ]
 
     def __str__(self):
         return f"{self.codigo} - {self.nome}"
 
 
-class CentroCusto(BaseModel):
+class CentroCusto(ModeloPorEmpresa, ArvoreMaterializada, BaseModel):
     """Centro de Custo"""
     codigo = models.CharField(max_length=20, unique=True, verbose_name='Código')
     nome = models.CharField(max_length=200, verbose_name='Nome')
@@ -42,6 +50,10 @@ class CentroCusto(BaseModel):
         verbose_name = 'Centro de Custo'
         verbose_name_plural = 'Centros de Custo'
         ordering = ['codigo']
+        indexes = [
+            models.Index(fields=['caminho'], name='centro_caminho_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['empresa', 'codigo'], name='centro_emp_codigo_idx'),
+        ]
 
     def __str__(self):
         return f"{self.codigo} - {self.nome}"
@@ -61,7 +73,7 @@ class Banco(BaseModel):
         return f"{self.codigo} - {self.nome}"
 
 
-class ContasBancarias(BaseModel):
+class ContasBancarias(ModeloPorEmpresa, BaseModel):
     """Contas Bancárias"""
     banco = models.ForeignKey(Banco, on_delete=models.PROTECT, verbose_name='Banco')
     agencia = models.CharField(max_length=10, verbose_name='Agência')
@@ -110,8 +122,8 @@ class FormaPagamento(BaseModel):
         return self.nome
 
 
-class ContasReceber(BaseModel):
-    """Contas a Receber"""
+class TituloReceber(ModeloPorEmpresa, BaseModel):
+    """Campos das contas a receber: tabela ativa, arquivo e histórico (ver ``financeiro.arquivo``)"""
     numero_documento = models.CharField(max_length=50, verbose_name='Número do Documento')
     cliente = models.ForeignKey('operacional.Cliente', on_delete=models.PROTECT, verbose_name='Cliente')
     data_vencimento = models.DateField(verbose_name='Data de Vencimento')
@@ -139,9 +151,7 @@ class ContasReceber(BaseModel):
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name='Empresa')
 
     class Meta:
-        verbose_name = 'Conta a Receber'
-        verbose_name_plural = 'Contas a Receber'
-        ordering = ['-data_vencimento']
+        abstract = True
 
     def __str__(self):
         return f"{self.numero_documento} - {self.cliente.pessoa.nome}"
@@ -151,8 +161,66 @@ class ContasReceber(BaseModel):
         return self.valor_original + self.valor_juros + self.valor_multa - self.valor_desconto
 
 
-class ContasPagar(BaseModel):
-    """Contas a Pagar"""
+class ContasReceber(TituloReceber):
+    """Contas a Receber"""
+
+    class Meta:
+        verbose_name = 'Conta a Receber'
+        verbose_name_plural = 'Contas a Receber'
+        ordering = ['-data_vencimento']
+        indexes = [
+            # Listagens filtradas por empresa + situação, ordenadas por vencimento
+            models.Index(fields=['empresa', 'situacao', '-data_vencimento'], name='cr_emp_sit_venc_idx'),
+            # Títulos em aberto: cobre os totais por vencimento sem ler a tabela
+            models.Index(fields=['empresa', 'data_vencimento'], condition=models.Q(situacao='aberto'),
+                         include=['cliente', 'valor_original', 'valor_juros', 'valor_multa', 'valor_desconto'],
+                         name='cr_aberto_emp_venc_idx'),
+            # Paginação por chave (data_vencimento, id) da API
+            models.Index(fields=['empresa', 'data_vencimento', 'id'], name='cr_emp_venc_id_idx'),
+            models.Index(fields=['data_vencimento', 'id'], name='cr_venc_id_idx'),
+            # Conciliação de extratos: títulos em aberto pelo número do documento
+            models.Index(fields=['empresa', 'numero_documento'], condition=models.Q(situacao='aberto'),
+                         name='cr_aberto_emp_doc_idx'),
+        ]
+
+
+class ContasReceberArquivada(TituloReceber):
+    """Contas a receber encerradas e antigas, movidas da tabela ativa pelo comando ``arquivar_titulos``.
+
+    Mantém o id original, referenciado pelas movimentações financeiras em
+    ``conta_receber_arquivada``.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID')
+
+    class Meta:
+        verbose_name = 'Conta a Receber Arquivada'
+        verbose_name_plural = 'Contas a Receber Arquivadas'
+        ordering = ['-data_vencimento']
+        indexes = [
+            models.Index(fields=['empresa', 'data_vencimento', 'id'], name='cra_emp_venc_id_idx'),
+            models.Index(fields=['data_vencimento', 'id'], name='cra_venc_id_idx'),
+        ]
+
+
+class ContasReceberHistorico(TituloReceber):
+    """Somente leitura: view com as contas a receber ativas e as arquivadas (``UNION ALL``)"""
+    # A view não aceita DELETE/UPDATE: ao excluir empresa ou usuário, quem responde são as tabelas de origem
+    empresa = models.ForeignKey(Empresa, on_delete=models.DO_NOTHING, verbose_name='Empresa')
+    created_by = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True,
+                                   related_name='%(class)s_created', verbose_name='Criado por')
+    updated_by = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True,
+                                   related_name='%(class)s_updated', verbose_name='Atualizado por')
+
+    class Meta:
+        managed = False
+        db_table = 'financeiro_contasreceber_historico'
+        verbose_name = 'Histórico de Contas a Receber'
+        verbose_name_plural = 'Histórico de Contas a Receber'
+        ordering = ['-data_vencimento']
+
+
+class TituloPagar(ModeloPorEmpresa, BaseModel):
+    """Campos das contas a pagar: tabela ativa, arquivo e histórico (ver ``financeiro.arquivo``)"""
     numero_documento = models.CharField(max_length=50, verbose_name='Número do Documento')
     fornecedor = models.ForeignKey('operacional.Fornecedor', on_delete=models.PROTECT, verbose_name='Fornecedor')
     data_vencimento = models.DateField(verbose_name='Data de Vencimento')
@@ -180,9 +248,7 @@ class ContasPagar(BaseModel):
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name='Empresa')
 
     class Meta:
-        verbose_name = 'Conta a Pagar'
-        verbose_name_plural = 'Contas a Pagar'
-        ordering = ['-data_vencimento']
+        abstract = True
 
     def __str__(self):
         return f"{self.numero_documento} - {self.fornecedor.pessoa.nome}"
@@ -192,8 +258,66 @@ class ContasPagar(BaseModel):
         return self.valor_original + self.valor_juros + self.valor_multa - self.valor_desconto
 
 
-class MovimentacaoFinanceira(BaseModel):
-    """Movimentações Financeiras"""
+class ContasPagar(TituloPagar):
+    """Contas a Pagar"""
+
+    class Meta:
+        verbose_name = 'Conta a Pagar'
+        verbose_name_plural = 'Contas a Pagar'
+        ordering = ['-data_vencimento']
+        indexes = [
+            # Listagens filtradas por empresa + situação, ordenadas por vencimento
+            models.Index(fields=['empresa', 'situacao', '-data_vencimento'], name='cp_emp_sit_venc_idx'),
+            # Títulos em aberto: cobre os totais por vencimento sem ler a tabela
+            models.Index(fields=['empresa', 'data_vencimento'], condition=models.Q(situacao='aberto'),
+                         include=['fornecedor', 'valor_original', 'valor_juros', 'valor_multa', 'valor_desconto'],
+                         name='cp_aberto_emp_venc_idx'),
+            # Paginação por chave (data_vencimento, id) da API
+            models.Index(fields=['empresa', 'data_vencimento', 'id'], name='cp_emp_venc_id_idx'),
+            models.Index(fields=['data_vencimento', 'id'], name='cp_venc_id_idx'),
+            # Conciliação de extratos: títulos em aberto pelo número do documento
+            models.Index(fields=['empresa', 'numero_documento'], condition=models.Q(situacao='aberto'),
+                         name='cp_aberto_emp_doc_idx'),
+        ]
+
+
+class ContasPagarArquivada(TituloPagar):
+    """Contas a pagar encerradas e antigas, movidas da tabela ativa pelo comando ``arquivar_titulos``.
+
+    Mantém o id original, referenciado pelas movimentações financeiras em
+    ``conta_pagar_arquivada``.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID')
+
+    class Meta:
+        verbose_name = 'Conta a Pagar Arquivada'
+        verbose_name_plural = 'Contas a Pagar Arquivadas'
+        ordering = ['-data_vencimento']
+        indexes = [
+            models.Index(fields=['empresa', 'data_vencimento', 'id'], name='cpa_emp_venc_id_idx'),
+            models.Index(fields=['data_vencimento', 'id'], name='cpa_venc_id_idx'),
+        ]
+
+
+class ContasPagarHistorico(TituloPagar):
+    """Somente leitura: view com as contas a pagar ativas e as arquivadas (``UNION ALL``)"""
+    # A view não aceita DELETE/UPDATE: ao excluir empresa ou usuário, quem responde são as tabelas de origem
+    empresa = models.ForeignKey(Empresa, on_delete=models.DO_NOTHING, verbose_name='Empresa')
+    created_by = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True,
+                                   related_name='%(class)s_created', verbose_name='Criado por')
+    updated_by = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True,
+                                   related_name='%(class)s_updated', verbose_name='Atualizado por')
+
+    class Meta:
+        managed = False
+        db_table = 'financeiro_contaspagar_historico'
+        verbose_name = 'Histórico de Contas a Pagar'
+        verbose_name_plural = 'Histórico de Contas a Pagar'
+        ordering = ['-data_vencimento']
+
+
+class MovimentacaoFinanceira(ModeloPorEmpresa, BaseModel):
+    """Movimentações Financeiras; tabela particionada por mês de ``data`` (ver ``core.particoes``)"""
     data = models.DateField(verbose_name='Data')
     tipo = models.CharField(max_length=20, choices=[
         ('entrada', 'Entrada'),
@@ -208,12 +332,55 @@ class MovimentacaoFinanceira(BaseModel):
                                     verbose_name='Conta a Receber')
     conta_pagar = models.ForeignKey(ContasPagar, on_delete=models.SET_NULL, null=True, blank=True,
                                   verbose_name='Conta a Pagar')
+    conta_receber_arquivada = models.ForeignKey(ContasReceberArquivada, on_delete=models.SET_NULL, null=True,
+                                                blank=True, verbose_name='Conta a Receber Arquivada')
+    conta_pagar_arquivada = models.ForeignKey(ContasPagarArquivada, on_delete=models.SET_NULL, null=True,
+                                              blank=True, verbose_name='Conta a Pagar Arquivada')
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name='Empresa')
 
     class Meta:
         verbose_name = 'Movimentação Financeira'
         verbose_name_plural = 'Movimentações Financeiras'
         ordering = ['-data']
+        indexes = [
+            models.Index(fields=['empresa', '-data'], name='movfin_emp_data_idx'),
+            # Paginação por chave (data, id) da API; com empresa, usa o índice acima
+            models.Index(fields=['-data', '-id'], name='movfin_data_id_idx'),
+            # Movimentações de uma conta bancária em um período (conciliação de extratos)
+            models.Index(fields=['conta_bancaria', 'data'], name='movfin_conta_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.data} - {self.tipo} - R$ {self.valor}"
+
+    def save(self, *args, **kwargs):
+        # Os saldos diários são atualizados nos signals; a transação garante
+        # que movimentação e saldo sejam gravados juntos.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class SaldoContaBancaria(models.Model):
+    """Saldo diário consolidado por conta bancária.
+
+    Mantido a partir das movimentações financeiras (ver ``financeiro.saldos``);
+    ``saldo`` é o acumulado das movimentações até o fim do dia, sem o saldo inicial.
+    """
+    conta_bancaria = models.ForeignKey(ContasBancarias, on_delete=models.CASCADE,
+                                       related_name='saldos_diarios', verbose_name='Conta Bancária')
+    data = models.DateField(verbose_name='Data')
+    total_entradas = models.DecimalField(max_digits=17, decimal_places=2, default=Decimal('0.00'),
+                                         verbose_name='Total de Entradas')
+    total_saidas = models.DecimalField(max_digits=17, decimal_places=2, default=Decimal('0.00'),
+                                       verbose_name='Total de Saídas')
+    saldo = models.DecimalField(max_digits=17, decimal_places=2, default=Decimal('0.00'),
+                                verbose_name='Saldo Acumulado')
+
+    class Meta:
+        verbose_name = 'Saldo Diário da Conta Bancária'
+        verbose_name_plural = 'Saldos Diários das Contas Bancárias'
+        ordering = ['conta_bancaria', 'data']
+        unique_together = ['conta_bancaria', 'data']
 
     def __str__(self):
-        return f"{self.data} - {self.tipo} - R$ {self.valor}"
\ No newline at end of file
+        return f"{self.conta_bancaria_id} - {self.data} - R$ {self.saldo}"
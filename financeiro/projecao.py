@@ -0,0 +1,116 @@
+"""
+Fluxo de caixa projetado por conta bancária.
+
+A posição de cada conta parte do saldo atual (``saldo_em``) e recebe, dia a
+dia, os títulos em aberto:
+
+- contas a receber entram em ``vencimento + FormaPagamento.prazo_recebimento``,
+  descontada a ``taxa`` da forma de pagamento;
+- contas a pagar saem no vencimento;
+- títulos vencidos (ou com data prevista já passada) entram no primeiro dia.
+
+Os títulos são agregados no banco por (conta bancária, data prevista) — no
+máximo uma linha por conta e dia do horizonte, qualquer que seja o número de
+títulos — e esses totais ficam em cache por empresa até algum título mudar
+(``versao_titulos``). Os saldos atuais são lidos a cada chamada, então
+movimentações financeiras novas aparecem sem invalidar o cache.
+"""
+
+import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import DateField, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Greatest
+
+from .models import ContasBancarias, ContasPagar, ContasReceber
+from .relatorios import CACHE_TIMEOUT, CENTAVO, valor_total_titulo, versao_titulos
+from .saldos import com_saldo_em
+
+DIAS_PADRAO = 90
+MAX_DIAS = 366
+ZERO = Decimal('0.00')
+
+
+def _totais_por_dia(titulos, data_prevista, valor, inicio, fim):
+    """``{(conta_id, data): total}`` dos títulos com data prevista até ``fim`` (as anteriores viram ``inicio``)"""
+    linhas = titulos.annotate(
+        data_prevista=Greatest(data_prevista, Value(inicio), output_field=DateField()),
+    ).filter(data_prevista__lte=fim).values('conta_bancaria_id', 'data_prevista').annotate(
+        total=Sum(valor, output_field=DecimalField(max_digits=20, decimal_places=6)),
+    ).order_by()
+    return {(linha['conta_bancaria_id'], linha['data_prevista']): linha['total'] for linha in linhas}
+
+
+def calcular_previstos(empresa_id, inicio, fim):
+    """Entradas e saídas previstas por (conta bancária, data) entre ``inicio`` e ``fim``.
+
+    Duas consultas agregadas, uma para cada tipo de título. Títulos sem conta
+    bancária ficam com a conta ``None``.
+    """
+    # O prazo de recebimento nunca antecipa o vencimento: o filtro no vencimento usa o índice parcial
+    receber = ContasReceber.objects.filter(empresa_id=empresa_id, situacao='aberto', data_vencimento__lte=fim)
+    entradas = _totais_por_dia(
+        receber,
+        ExpressionWrapper(F('data_vencimento') + F('forma_pagamento__prazo_recebimento'), output_field=DateField()),
+        (valor_total_titulo() - F('valor_recebido')) * (Value(100) - F('forma_pagamento__taxa')) / Value(100),
+        inicio, fim,
+    )
+    pagar = ContasPagar.objects.filter(empresa_id=empresa_id, situacao='aberto', data_vencimento__lte=fim)
+    saidas = _totais_por_dia(pagar, F('data_vencimento'), valor_total_titulo() - F('valor_pago'), inicio, fim)
+
+    return {
+        chave: (entradas.get(chave, ZERO).quantize(CENTAVO), saidas.get(chave, ZERO).quantize(CENTAVO))
+        for chave in entradas.keys() | saidas.keys()
+    }
+
+
+def previstos(empresa_id, inicio, fim):
+    """``calcular_previstos`` com cache por empresa e período, invalidado quando um título muda"""
+    chave = f'financeiro:projecao:{empresa_id}:{inicio.isoformat()}:{fim.isoformat()}:v{versao_titulos(empresa_id)}'
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = calcular_previstos(empresa_id, inicio, fim)
+        cache.set(chave, resultado, CACHE_TIMEOUT)
+    return resultado
+
+
+def _saldos_atuais(empresa_id, data):
+    """``{conta_id: (conta, saldo)}`` das contas bancárias da empresa ao final de ``data``, em uma consulta"""
+    contas = com_saldo_em(ContasBancarias.objects.filter(empresa_id=empresa_id), data)
+    return {conta.pk: (conta, conta.saldo) for conta in contas.select_related('banco').order_by('pk')}
+
+
+def projetar(empresa_id, data_base, dias=DIAS_PADRAO):
+    """Posição diária projetada de cada conta bancária da empresa, de ``data_base`` a ``data_base + dias``.
+
+    Retorna uma lista com, por conta, o saldo atual e a série diária
+    ``{'data', 'entradas', 'saidas', 'saldo'}`` (saldo ao final do dia).
+    """
+    fim = data_base + datetime.timedelta(days=dias)
+    saldos = _saldos_atuais(empresa_id, data_base)
+    por_conta = {}
+    for (conta_id, data), valores in previstos(empresa_id, data_base, fim).items():
+        por_conta.setdefault(conta_id, {})[data] = valores
+
+    contas = list(saldos)
+    # Títulos sem conta bancária (ou de conta de outra empresa) formam uma série à parte
+    avulsas = [conta_id for conta_id in por_conta if conta_id not in saldos]
+    contas += sorted(avulsas, key=lambda conta_id: (conta_id is not None, conta_id))
+    datas = [data_base + datetime.timedelta(days=n) for n in range(dias + 1)]
+
+    resultado = []
+    for conta_id in contas:
+        conta, saldo = saldos.get(conta_id, (None, ZERO))
+        saldo_atual, movimentos, serie = saldo, por_conta.get(conta_id, {}), []
+        for data in datas:
+            entradas, saidas = movimentos.get(data, (ZERO, ZERO))
+            saldo += entradas - saidas
+            serie.append({'data': data, 'entradas': entradas, 'saidas': saidas, 'saldo': saldo})
+        resultado.append({
+            'conta_bancaria': conta_id,
+            'descricao': f'{conta.banco.nome} {conta.agencia}/{conta.conta}-{conta.digito}' if conta else None,
+            'saldo_atual': saldo_atual,
+            'serie': serie,
+        })
+    return resultado
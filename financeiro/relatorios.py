@@ -0,0 +1,219 @@
+"""
+Relatórios financeiros calculados no banco de dados.
+"""
+
+import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from core import versoes
+from .models import (
+    CentroCusto, ContasBancarias, ContasPagar, ContasReceber, MovimentacaoFinanceira, PlanoContas,
+    SaldoContaBancaria
+)
+from .saldos import saldo_em
+
+CACHE_TIMEOUT = 60 * 10
+
+FAIXAS_AGING = ['a_vencer', 'vencido_1_30', 'vencido_31_60', 'vencido_61_90', 'vencido_90_mais']
+
+TITULOS = {
+    'receber': (ContasReceber, 'cliente'),
+    'pagar': (ContasPagar, 'fornecedor'),
+}
+
+
+def versao_titulos(empresa_id):
+    """Versão dos títulos da empresa no cache; muda sempre que um título é alterado"""
+    return versoes.versao(f'financeiro:titulos:versao:{empresa_id}')
+
+
+def invalidar_titulos(empresa_id):
+    """Invalida os relatórios em cache que dependem dos títulos da empresa"""
+    versoes.incrementar(f'financeiro:titulos:versao:{empresa_id}')
+
+
+def valor_total_titulo():
+    """Expressão SQL equivalente à property ``valor_total`` dos títulos"""
+    return F('valor_original') + F('valor_juros') + F('valor_multa') - F('valor_desconto')
+
+
+def _faixas_aging(data_base):
+    dias_30, dias_60, dias_90 = (data_base - datetime.timedelta(days=n) for n in (30, 60, 90))
+    return {
+        'a_vencer': Q(data_vencimento__gte=data_base),
+        'vencido_1_30': Q(data_vencimento__lt=data_base, data_vencimento__gte=dias_30),
+        'vencido_31_60': Q(data_vencimento__lt=dias_30, data_vencimento__gte=dias_60),
+        'vencido_61_90': Q(data_vencimento__lt=dias_60, data_vencimento__gte=dias_90),
+        'vencido_90_mais': Q(data_vencimento__lt=dias_90),
+    }
+
+
+def calcular_aging(tipo, empresa_id, data_base, por_pessoa=False):
+    """Saldo em aberto por faixa de vencimento, em uma única consulta agregada.
+
+    ``tipo`` é ``'receber'`` ou ``'pagar'``. Com ``por_pessoa`` o resultado é
+    agrupado por cliente/fornecedor; caso contrário, é uma única linha com os
+    totais da empresa.
+    """
+    model, campo_pessoa = TITULOS[tipo]
+    valor = DecimalField(max_digits=17, decimal_places=2)
+    total = valor_total_titulo()
+    somas = {
+        faixa: Coalesce(Sum(total, filter=condicao, output_field=valor), Value(Decimal('0.00')), output_field=valor)
+        for faixa, condicao in _faixas_aging(data_base).items()
+    }
+    somas['total'] = Coalesce(Sum(total, output_field=valor), Value(Decimal('0.00')), output_field=valor)
+
+    titulos = model.objects.filter(empresa_id=empresa_id, situacao='aberto')
+    if por_pessoa:
+        linhas = titulos.values(campo_pessoa).annotate(
+            nome=F(f'{campo_pessoa}__pessoa__nome'), **somas,
+        ).order_by('nome')
+        return [
+            {'id': linha[campo_pessoa], 'nome': linha['nome'],
+             **{faixa: linha[faixa] for faixa in FAIXAS_AGING + ['total']}}
+            for linha in linhas
+        ]
+    return titulos.aggregate(**somas)
+
+
+def aging(tipo, empresa_id, data_base, por_pessoa=False):
+    """``calcular_aging`` com cache por empresa, data base e agrupamento"""
+    chave = (f'financeiro:aging:{tipo}:{empresa_id}:{data_base.isoformat()}:'
+             f'{int(por_pessoa)}:v{versao_titulos(empresa_id)}')
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = calcular_aging(tipo, empresa_id, data_base, por_pessoa)
+        cache.set(chave, resultado, CACHE_TIMEOUT)
+    return resultado
+
+
+ARVORES = {
+    'plano-contas': (PlanoContas, 'conta_contabil'),
+    'centros-custo': (CentroCusto, 'centro_custo'),
+}
+
+CENTAVO = Decimal('0.01')
+
+COLUNAS_BALANCETE = ['entradas', 'saidas', 'saldo', 'a_receber', 'a_pagar']
+
+
+def balancete(arvore, empresa_id, data_inicio, data_fim):
+    """Balancete do plano de contas (ou dos centros de custo) da empresa em uma única consulta.
+
+    Para cada nó soma, dele e de toda a subárvore, as movimentações financeiras
+    do período (entradas, saídas e saldo) e os títulos em aberto com vencimento
+    no período (a receber e a pagar). As somas são feitas primeiro por nó e
+    depois propagadas aos ancestrais pelo prefixo do caminho materializado.
+    """
+    model, campo = ARVORES[arvore]
+    nos = model._meta.db_table
+    tabelas = {m: m._meta.db_table for m in (MovimentacaoFinanceira, ContasReceber, ContasPagar)}
+    total_titulo = 'valor_original + valor_juros + valor_multa - valor_desconto'
+    nivel = ', a.nivel' if model is PlanoContas else ''
+    sql = f"""
+        WITH movimentos AS (
+            SELECT {campo}_id AS no_id,
+                   SUM(CASE WHEN tipo = 'entrada' THEN valor ELSE 0 END) AS entradas,
+                   SUM(CASE WHEN tipo = 'entrada' THEN 0 ELSE valor END) AS saidas
+            FROM {tabelas[MovimentacaoFinanceira]}
+            WHERE empresa_id = %(empresa)s AND data BETWEEN %(inicio)s AND %(fim)s
+            GROUP BY {campo}_id
+        ), receber AS (
+            SELECT {campo}_id AS no_id, SUM({total_titulo}) AS total
+            FROM {tabelas[ContasReceber]}
+            WHERE empresa_id = %(empresa)s AND situacao = 'aberto'
+              AND data_vencimento BETWEEN %(inicio)s AND %(fim)s
+            GROUP BY {campo}_id
+        ), pagar AS (
+            SELECT {campo}_id AS no_id, SUM({total_titulo}) AS total
+            FROM {tabelas[ContasPagar]}
+            WHERE empresa_id = %(empresa)s AND situacao = 'aberto'
+              AND data_vencimento BETWEEN %(inicio)s AND %(fim)s
+            GROUP BY {campo}_id
+        ), por_no AS (
+            SELECT n.caminho,
+                   COALESCE(m.entradas, 0) AS entradas, COALESCE(m.saidas, 0) AS saidas,
+                   COALESCE(r.total, 0) AS a_receber, COALESCE(p.total, 0) AS a_pagar
+            FROM {nos} n
+            LEFT JOIN movimentos m ON m.no_id = n.id
+            LEFT JOIN receber r ON r.no_id = n.id
+            LEFT JOIN pagar p ON p.no_id = n.id
+            WHERE m.no_id IS NOT NULL OR r.no_id IS NOT NULL OR p.no_id IS NOT NULL
+        )
+        SELECT a.id, a.codigo, a.nome, a.pai_id{nivel},
+               COALESCE(SUM(d.entradas), 0), COALESCE(SUM(d.saidas), 0),
+               COALESCE(SUM(d.entradas - d.saidas), 0),
+               COALESCE(SUM(d.a_receber), 0), COALESCE(SUM(d.a_pagar), 0)
+        FROM {nos} a
+        LEFT JOIN por_no d ON d.caminho LIKE a.caminho || '%%'
+        WHERE a.empresa_id = %(empresa)s
+        GROUP BY a.id, a.codigo, a.nome, a.pai_id{nivel}
+        ORDER BY a.codigo
+    """
+    parametros = {'empresa': empresa_id, 'inicio': data_inicio, 'fim': data_fim}
+    colunas = ['id', 'codigo', 'nome', 'pai'] + (['nivel'] if nivel else []) + COLUNAS_BALANCETE
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return [
+            {coluna: Decimal(valor).quantize(CENTAVO) if coluna in COLUNAS_BALANCETE else valor
+             for coluna, valor in zip(colunas, linha)}
+            for linha in cursor.fetchall()
+        ]
+
+
+ZERO = Decimal('0.00')
+
+
+def linhas_dre(empresa_id, data_inicio, data_fim):
+    """DRE do período: resultado das movimentações por conta de receita e despesa, seguido dos totais.
+
+    Gerador usado pelos relatórios em segundo plano (``core.relatorios``); a
+    primeira linha é o cabeçalho.
+    """
+    valor = DecimalField(max_digits=17, decimal_places=2)
+    contas = MovimentacaoFinanceira.objects.filter(
+        empresa_id=empresa_id, data__range=(data_inicio, data_fim),
+        conta_contabil__tipo__in=['receita', 'despesa'],
+    ).values('conta_contabil__codigo', 'conta_contabil__nome', 'conta_contabil__tipo').annotate(
+        entradas=Coalesce(Sum('valor', filter=Q(tipo='entrada')), Value(ZERO), output_field=valor),
+        saidas=Coalesce(Sum('valor', filter=Q(tipo='saida')), Value(ZERO), output_field=valor),
+    ).order_by('-conta_contabil__tipo', 'conta_contabil__codigo')
+
+    yield ['Código', 'Conta', 'Tipo', 'Valor']
+    totais = {'receita': ZERO, 'despesa': ZERO}
+    for linha in contas.iterator():
+        tipo = linha['conta_contabil__tipo']
+        resultado = linha['entradas'] - linha['saidas']
+        if tipo == 'despesa':
+            resultado = -resultado
+        totais[tipo] += resultado
+        yield [linha['conta_contabil__codigo'], linha['conta_contabil__nome'], tipo.capitalize(), resultado]
+    yield ['', 'Total de Receitas', '', totais['receita']]
+    yield ['', 'Total de Despesas', '', totais['despesa']]
+    yield ['', 'Resultado do Período', '', totais['receita'] - totais['despesa']]
+
+
+def linhas_fluxo_caixa(empresa_id, data_inicio, data_fim):
+    """Fluxo de caixa realizado, dia a dia, das contas bancárias da empresa.
+
+    Lê os saldos diários (``SaldoContaBancaria``), já agregados por conta e dia.
+    """
+    contas = list(ContasBancarias.objects.filter(empresa_id=empresa_id).values_list('pk', flat=True))
+    saldo = sum((saldo_em(conta, data_inicio - datetime.timedelta(days=1)) for conta in contas), ZERO)
+    dias = SaldoContaBancaria.objects.filter(
+        conta_bancaria_id__in=contas, data__range=(data_inicio, data_fim),
+    ).values('data').annotate(
+        entradas=Sum('total_entradas'), saidas=Sum('total_saidas'),
+    ).order_by('data')
+
+    yield ['Data', 'Entradas', 'Saídas', 'Saldo']
+    yield [data_inicio - datetime.timedelta(days=1), None, None, saldo]
+    for dia in dias.iterator():
+        saldo += dia['entradas'] - dia['saidas']
+        yield [dia['data'], dia['entradas'], dia['saidas'], saldo]
@@ -0,0 +1,189 @@
+"""
+Saldos diários das contas bancárias.
+
+Cada movimentação financeira altera o ``SaldoContaBancaria`` do seu dia e o
+saldo acumulado dos dias seguintes, de modo que o saldo de uma conta em uma
+data qualquer é obtido com uma única consulta indexada.
+
+Os meses desanexados da tabela de movimentações (``core.particoes``) deixam de
+ser lidos, mas os saldos diários deles ficam. ``verificar_saldos`` e
+``reconstruir_saldos`` trabalham a partir da movimentação mais antiga ainda
+na tabela: os saldos anteriores a ela são mantidos e o último de cada conta é
+o saldo de abertura do recálculo.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Min, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import ContasBancarias, MovimentacaoFinanceira, SaldoContaBancaria
+
+ZERO = Decimal('0.00')
+
+
+def acumular_delta(deltas, conta_bancaria_id, data, tipo, valor, sinal=1):
+    """Soma uma movimentação em ``deltas[(conta, data)] = [entradas, saidas]``"""
+    valor = Decimal(valor)
+    entradas_saidas = deltas.setdefault((conta_bancaria_id, data), [ZERO, ZERO])
+    if tipo == 'entrada':
+        entradas_saidas[0] += sinal * valor
+    else:
+        entradas_saidas[1] += sinal * valor
+    return deltas
+
+
+def aplicar_deltas(deltas):
+    """Aplica variações de entradas/saídas por (conta bancária, data) aos saldos diários.
+
+    As contas envolvidas são bloqueadas (``SELECT ... FOR UPDATE``) em ordem de
+    id, serializando atualizações concorrentes da mesma conta sem deadlocks.
+    """
+    deltas = {chave: valores for chave, valores in deltas.items() if any(valores)}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        conta_ids = sorted({conta_id for conta_id, _ in deltas})
+        list(ContasBancarias.objects.select_for_update().filter(pk__in=conta_ids)
+             .order_by('pk').values_list('pk', flat=True))
+
+        for (conta_id, data), (entradas, saidas) in sorted(deltas.items()):
+            atualizados = SaldoContaBancaria.objects.filter(
+                conta_bancaria_id=conta_id, data=data
+            ).update(
+                total_entradas=F('total_entradas') + entradas,
+                total_saidas=F('total_saidas') + saidas,
+            )
+            if not atualizados:
+                saldo_anterior = SaldoContaBancaria.objects.filter(
+                    conta_bancaria_id=conta_id, data__lt=data
+                ).order_by('-data').values_list('saldo', flat=True).first()
+                SaldoContaBancaria.objects.create(
+                    conta_bancaria_id=conta_id, data=data,
+                    total_entradas=entradas, total_saidas=saidas,
+                    saldo=saldo_anterior or ZERO,
+                )
+            SaldoContaBancaria.objects.filter(
+                conta_bancaria_id=conta_id, data__gte=data
+            ).update(saldo=F('saldo') + (entradas - saidas))
+            if entradas < 0 or saidas < 0:
+                # Dia que ficou sem movimentações deixa de ter saldo próprio
+                SaldoContaBancaria.objects.filter(
+                    conta_bancaria_id=conta_id, data=data, total_entradas=0, total_saidas=0
+                ).delete()
+
+
+def com_saldo_em(contas, data):
+    """Anota ``saldo`` (saldo inicial + movimentações até o fim de ``data``) nas contas bancárias"""
+    ultimo_saldo = SaldoContaBancaria.objects.filter(
+        conta_bancaria=OuterRef('pk'), data__lte=data
+    ).order_by('-data').values('saldo')[:1]
+    valor_decimal = DecimalField(max_digits=17, decimal_places=2)
+    return contas.annotate(saldo=ExpressionWrapper(
+        F('saldo_inicial') + Coalesce(Subquery(ultimo_saldo), Value(ZERO), output_field=valor_decimal),
+        output_field=valor_decimal,
+    ))
+
+
+def saldo_em(conta_bancaria_id, data):
+    """Saldo da conta bancária ao final do dia ``data`` (inclui o saldo inicial)"""
+    return com_saldo_em(ContasBancarias.objects.filter(pk=conta_bancaria_id), data).values_list(
+        'saldo', flat=True).get()
+
+
+def _inicio_historico():
+    """Data da movimentação financeira mais antiga ainda na tabela; ``None`` se não houver nenhuma"""
+    return MovimentacaoFinanceira._base_manager.aggregate(inicio=Min('data'))['inicio']
+
+
+def _saldos_recalculaveis(inicio, conta_ids=None):
+    """Saldos diários cobertos pelas movimentações da tabela: do ``inicio`` do histórico em diante"""
+    saldos = SaldoContaBancaria.objects.all()
+    if conta_ids is not None:
+        saldos = saldos.filter(conta_bancaria_id__in=conta_ids)
+    return saldos.none() if inicio is None else saldos.filter(data__gte=inicio)
+
+
+def _saldos_de_abertura(inicio, conta_ids=None):
+    """{conta: saldo acumulado no último dia antes de ``inicio``}, dos meses já desanexados"""
+    if inicio is None:
+        return {}
+    anteriores = SaldoContaBancaria.objects.filter(data__lt=inicio)
+    if conta_ids is not None:
+        anteriores = anteriores.filter(conta_bancaria_id__in=conta_ids)
+    return dict(anteriores.order_by('conta_bancaria_id', '-data').distinct('conta_bancaria_id')
+                .values_list('conta_bancaria_id', 'saldo'))
+
+
+def _calcular_saldos(conta_ids=None, inicio=None):
+    """Gera os saldos diários a partir do histórico, agregando no banco por conta/dia"""
+    movimentacoes = MovimentacaoFinanceira.objects.all()
+    if conta_ids is not None:
+        movimentacoes = movimentacoes.filter(conta_bancaria_id__in=conta_ids)
+    abertura = _saldos_de_abertura(inicio, conta_ids)
+
+    valor_decimal = DecimalField(max_digits=17, decimal_places=2)
+    totais = movimentacoes.values('conta_bancaria_id', 'data').annotate(
+        entradas=Coalesce(Sum(Case(When(tipo='entrada', then=F('valor')), output_field=valor_decimal)),
+                          Value(ZERO), output_field=valor_decimal),
+        saidas=Coalesce(Sum(Case(When(tipo='saida', then=F('valor')), output_field=valor_decimal)),
+                        Value(ZERO), output_field=valor_decimal),
+    ).order_by('conta_bancaria_id', 'data')
+
+    conta_atual, saldo = None, ZERO
+    for linha in totais.iterator(chunk_size=5000):
+        if linha['conta_bancaria_id'] != conta_atual:
+            conta_atual = linha['conta_bancaria_id']
+            saldo = abertura.get(conta_atual, ZERO)
+        saldo += linha['entradas'] - linha['saidas']
+        yield SaldoContaBancaria(
+            conta_bancaria_id=conta_atual, data=linha['data'],
+            total_entradas=linha['entradas'], total_saidas=linha['saidas'], saldo=saldo,
+        )
+
+
+def verificar_saldos(conta_ids=None):
+    """Compara os saldos gravados com o histórico e retorna as divergências encontradas"""
+    inicio = _inicio_historico()
+    gravados = _saldos_recalculaveis(inicio, conta_ids)
+    atuais = {
+        (s['conta_bancaria_id'], s['data']): (s['total_entradas'], s['total_saidas'], s['saldo'])
+        for s in gravados.values('conta_bancaria_id', 'data', 'total_entradas', 'total_saidas', 'saldo')
+    }
+
+    divergencias = []
+    for esperado in _calcular_saldos(conta_ids, inicio):
+        chave = (esperado.conta_bancaria_id, esperado.data)
+        valores = (esperado.total_entradas, esperado.total_saidas, esperado.saldo)
+        if atuais.pop(chave, None) != valores:
+            divergencias.append((chave, valores))
+    # Saldos gravados para dias que não têm movimentação
+    divergencias.extend((chave, None) for chave in atuais)
+    return divergencias
+
+
+def reconstruir_saldos(conta_ids=None, batch_size=1000):
+    """Recalcula em lote os saldos diários a partir das movimentações financeiras.
+
+    Os saldos anteriores à movimentação mais antiga da tabela (meses
+    desanexados) não são recalculados e servem de saldo de abertura.
+    """
+    with transaction.atomic():
+        contas = ContasBancarias.objects.select_for_update().order_by('pk')
+        if conta_ids is not None:
+            contas = contas.filter(pk__in=conta_ids)
+        conta_ids = list(contas.values_list('pk', flat=True))
+
+        inicio = _inicio_historico()
+        _saldos_recalculaveis(inicio, conta_ids).delete()
+        lote, total = [], 0
+        for saldo in _calcular_saldos(conta_ids, inicio):
+            lote.append(saldo)
+            if len(lote) >= batch_size:
+                SaldoContaBancaria.objects.bulk_create(lote)
+                total += len(lote)
+                lote = []
+        SaldoContaBancaria.objects.bulk_create(lote)
+        return total + len(lote)
@@ -0,0 +1,59 @@
+from rest_framework import serializers
+
+from core.api import CamposEsparsosSerializer
+from .models import ContasPagar, ContasReceber, MovimentacaoFinanceira
+
+DEPENDENCIAS_VALOR_TOTAL = ['valor_original', 'valor_juros', 'valor_multa', 'valor_desconto']
+
+
+class ContasReceberSerializer(CamposEsparsosSerializer):
+    cliente_codigo = serializers.CharField(source='cliente.codigo', read_only=True)
+    cliente_nome = serializers.CharField(source='cliente.pessoa.nome', read_only=True)
+    valor_total = serializers.DecimalField(max_digits=17, decimal_places=2, read_only=True)
+    conta_contabil_codigo = serializers.CharField(source='conta_contabil.codigo', read_only=True)
+    centro_custo_codigo = serializers.CharField(source='centro_custo.codigo', read_only=True)
+    forma_pagamento_nome = serializers.CharField(source='forma_pagamento.nome', read_only=True)
+
+    class Meta:
+        model = ContasReceber
+        fields = [
+            'id', 'numero_documento', 'cliente', 'cliente_codigo', 'cliente_nome', 'data_emissao',
+            'data_vencimento', 'valor_original', 'valor_desconto', 'valor_juros', 'valor_multa', 'valor_total',
+            'valor_recebido', 'data_recebimento', 'situacao', 'conta_contabil', 'conta_contabil_codigo',
+            'centro_custo', 'centro_custo_codigo', 'forma_pagamento', 'forma_pagamento_nome', 'conta_bancaria',
+            'empresa',
+        ]
+        dependencias = {'valor_total': DEPENDENCIAS_VALOR_TOTAL}
+
+
+class ContasPagarSerializer(CamposEsparsosSerializer):
+    fornecedor_codigo = serializers.CharField(source='fornecedor.codigo', read_only=True)
+    fornecedor_nome = serializers.CharField(source='fornecedor.pessoa.nome', read_only=True)
+    valor_total = serializers.DecimalField(max_digits=17, decimal_places=2, read_only=True)
+    conta_contabil_codigo = serializers.CharField(source='conta_contabil.codigo', read_only=True)
+    centro_custo_codigo = serializers.CharField(source='centro_custo.codigo', read_only=True)
+    forma_pagamento_nome = serializers.CharField(source='forma_pagamento.nome', read_only=True)
+
+    class Meta:
+        model = ContasPagar
+        fields = [
+            'id', 'numero_documento', 'fornecedor', 'fornecedor_codigo', 'fornecedor_nome', 'data_emissao',
+            'data_vencimento', 'valor_original', 'valor_desconto', 'valor_juros', 'valor_multa', 'valor_total',
+            'valor_pago', 'data_pagamento', 'situacao', 'conta_contabil', 'conta_contabil_codigo',
+            'centro_custo', 'centro_custo_codigo', 'forma_pagamento', 'forma_pagamento_nome', 'conta_bancaria',
+            'empresa',
+        ]
+        dependencias = {'valor_total': DEPENDENCIAS_VALOR_TOTAL}
+
+
+class MovimentacaoFinanceiraSerializer(CamposEsparsosSerializer):
+    conta_contabil_codigo = serializers.CharField(source='conta_contabil.codigo', read_only=True)
+    centro_custo_codigo = serializers.CharField(source='centro_custo.codigo', read_only=True)
+
+    class Meta:
+        model = MovimentacaoFinanceira
+        fields = [
+            'id', 'data', 'tipo', 'valor', 'descricao', 'conta_contabil', 'conta_contabil_codigo', 'centro_custo',
+            'centro_custo_codigo', 'conta_bancaria', 'conta_receber', 'conta_pagar', 'conta_receber_arquivada',
+            'conta_pagar_arquivada', 'empresa',
+        ]
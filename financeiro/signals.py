@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import ContasPagar, ContasReceber, MovimentacaoFinanceira
+from .relatorios import invalidar_titulos
+from .saldos import acumular_delta, aplicar_deltas
+
+
+@receiver(pre_save, sender=MovimentacaoFinanceira)
+def guardar_movimentacao_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda os valores gravados da movimentação para estornar no saldo ao editar"""
+    instance._movimentacao_anterior = None
+    if instance.pk and not raw:
+        instance._movimentacao_anterior = sender.objects.select_for_update().filter(
+            pk=instance.pk
+        ).values_list('conta_bancaria_id', 'data', 'tipo', 'valor').first()
+
+
+@receiver(post_save, sender=MovimentacaoFinanceira)
+def atualizar_saldo_movimentacao_salva(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = {}
+    anterior = getattr(instance, '_movimentacao_anterior', None)
+    if anterior:
+        acumular_delta(deltas, *anterior, sinal=-1)
+    acumular_delta(deltas, instance.conta_bancaria_id, instance.data, instance.tipo, instance.valor)
+    aplicar_deltas(deltas)
+    instance._movimentacao_anterior = None
+
+
+@receiver(post_delete, sender=MovimentacaoFinanceira)
+def atualizar_saldo_movimentacao_excluida(sender, instance, **kwargs):
+    aplicar_deltas(acumular_delta(
+        {}, instance.conta_bancaria_id, instance.data, instance.tipo, instance.valor, sinal=-1
+    ))
+
+
+@receiver(post_save, sender=ContasReceber)
+@receiver(post_save, sender=ContasPagar)
+@receiver(post_delete, sender=ContasReceber)
+@receiver(post_delete, sender=ContasPagar)
+def invalidar_relatorios_titulos(sender, instance, **kwargs):
+    invalidar_titulos(instance.empresa_id)
\ No newline at end of file
@@ -1,3 +1,867 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import random
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Empresa
+from operacional.models import Cliente, Fornecedor, Pessoa
+from .models import (
+    Banco, CentroCusto, ContasBancarias, ContasPagar, ContasReceber, ContasReceberArquivada, ContasReceberHistorico,
+    FormaPagamento, MovimentacaoFinanceira, PlanoContas, SaldoContaBancaria
+)
+from .arquivo import arquivar_titulos, titulos_do_periodo
+from .baixas import baixar_em_lote
+from .conciliacao import conciliar_extrato
+from .extratos import ler_extrato
+from .projecao import projetar
+from .relatorios import aging, balancete
+from .saldos import saldo_em, verificar_saldos
+
+# Para as contagens de consultas não incluírem as do cache compartilhado (tabela no banco, por padrão)
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def criar_dados_financeiros(empresas=2, titulos_por_empresa=10000, seed=42):
+    """Popula empresas com títulos a receber/pagar e movimentações financeiras"""
+    rnd = random.Random(seed)
+    hoje = datetime.date(2025, 6, 30)
+    banco = Banco.objects.create(codigo='999', nome='Banco Teste')
+    forma = FormaPagamento.objects.create(nome='Boleto', tipo='boleto')
+
+    for e in range(empresas):
+        empresa = Empresa.objects.create(nome=f'Empresa {e}', cnpj=f'00.000.000/{e:04d}-00',
+                                         razao_social=f'Empresa {e}', endereco='-')
+        conta_contabil = PlanoContas.objects.create(codigo=f'{e}.1', nome='Conta', tipo='ativo', empresa=empresa)
+        centro = CentroCusto.objects.create(codigo=f'{e}.1', nome='Centro', empresa=empresa)
+        conta = ContasBancarias.objects.create(banco=banco, agencia='1', conta=str(e), digito='0',
+                                               tipo='corrente', empresa=empresa)
+        pessoas = Pessoa.objects.bulk_create([
+            Pessoa(nome=f'Pessoa {e}-{i}', tipo_pessoa='juridica', cpf_cnpj=f'{e:04d}{i:06d}', empresa=empresa)
+            for i in range(20)
+        ])
+        clientes = Cliente.objects.bulk_create([
+            Cliente(pessoa=p, codigo=f'C{p.cpf_cnpj}') for p in pessoas[:10]
+        ])
+        fornecedores = Fornecedor.objects.bulk_create([
+            Fornecedor(pessoa=p, codigo=f'F{p.cpf_cnpj}') for p in pessoas[10:]
+        ])
+
+        comuns = dict(conta_contabil=conta_contabil, centro_custo=centro, forma_pagamento=forma, empresa=empresa)
+        receber, pagar, movimentacoes = [], [], []
+        for i in range(titulos_por_empresa):
+            vencimento = hoje + datetime.timedelta(days=rnd.randint(-365, 120))
+            aberto = vencimento >= hoje or rnd.random() < 0.2
+            valor = Decimal(rnd.randint(100, 100000)) / 100
+            receber.append(ContasReceber(
+                numero_documento=f'R{i}', cliente=rnd.choice(clientes), data_emissao=vencimento,
+                data_vencimento=vencimento, valor_original=valor,
+                situacao='aberto' if aberto else 'recebido', **comuns,
+            ))
+            pagar.append(ContasPagar(
+                numero_documento=f'P{i}', fornecedor=rnd.choice(fornecedores), data_emissao=vencimento,
+                data_vencimento=vencimento, valor_original=valor,
+                situacao='aberto' if aberto else 'pago', **comuns,
+            ))
+            movimentacoes.append(MovimentacaoFinanceira(
+                data=vencimento, tipo=rnd.choice(['entrada', 'saida']), valor=valor, descricao='-',
+                conta_contabil=conta_contabil, centro_custo=centro, conta_bancaria=conta, empresa=empresa,
+            ))
+        ContasReceber.objects.bulk_create(receber, batch_size=2000)
+        ContasPagar.objects.bulk_create(pagar, batch_size=2000)
+        MovimentacaoFinanceira.objects.bulk_create(movimentacoes, batch_size=2000)
+
+
+def _nos_do_plano(no):
+    yield no
+    for filho in no.get('Plans', []):
+        yield from _nos_do_plano(filho)
+
+
+def _indices_do_plano(nos):
+    """Índices usados no plano; os das partições aparecem como o índice da tabela particionada"""
+    indices = {no['Index Name'] for no in nos if 'Index Name' in no}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, p.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'JOIN pg_class p ON p.oid = i.inhparent WHERE c.relname = ANY(%s)',
+            [list(indices)],
+        )
+        raizes = dict(cursor.fetchall())
+    return {raizes.get(indice, indice) for indice in indices}
+
+
+class SaldosDiariosTests(TestCase):
+    D1, D2, D3 = datetime.date(2025, 3, 10), datetime.date(2025, 3, 11), datetime.date(2025, 3, 12)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        banco = Banco.objects.create(codigo='001', nome='Banco')
+        cls.contas = [ContasBancarias.objects.create(banco=banco, agencia='1', conta=str(n), digito='0',
+                                                     tipo='corrente', saldo_inicial=Decimal('1000.00'),
+                                                     empresa=cls.empresa) for n in range(2)]
+        cls.comuns = dict(
+            conta_contabil=PlanoContas.objects.create(codigo='1', nome='Conta', tipo='receita', empresa=cls.empresa),
+            centro_custo=CentroCusto.objects.create(codigo='1', nome='Centro', empresa=cls.empresa),
+            descricao='-', empresa=cls.empresa,
+        )
+
+    def movimentar(self, conta, data, tipo, valor):
+        return MovimentacaoFinanceira.objects.create(conta_bancaria=self.contas[conta], data=data, tipo=tipo,
+                                                     valor=Decimal(valor), **self.comuns)
+
+    def saldos(self):
+        return {(self.contas.index(saldo.conta_bancaria), saldo.data): saldo.saldo
+                for saldo in SaldoContaBancaria.objects.select_related('conta_bancaria')}
+
+    def test_edicao_estorna_o_valor_anterior(self):
+        entrada = self.movimentar(0, self.D1, 'entrada', '100.00')
+        self.movimentar(0, self.D2, 'saida', '30.00')
+
+        entrada.valor = Decimal('150.00')
+        entrada.save()
+        self.assertEqual(self.saldos(), {(0, self.D1): Decimal('150.00'), (0, self.D2): Decimal('120.00')})
+
+        # Mudar a data tira o saldo próprio do dia que ficou sem movimentações
+        entrada.data = self.D3
+        entrada.save()
+        self.assertEqual(self.saldos(), {(0, self.D2): Decimal('-30.00'), (0, self.D3): Decimal('120.00')})
+
+        entrada.conta_bancaria = self.contas[1]
+        entrada.tipo = 'saida'
+        entrada.save()
+        self.assertEqual(self.saldos(), {(0, self.D2): Decimal('-30.00'), (1, self.D3): Decimal('-150.00')})
+        self.assertEqual(saldo_em(self.contas[1].pk, self.D3), Decimal('850.00'))
+        self.assertEqual(verificar_saldos(), [])
+
+    def test_exclusao_e_movimentacao_retroativa(self):
+        self.movimentar(0, self.D2, 'entrada', '100.00')
+        self.movimentar(0, self.D3, 'saida', '40.00')
+
+        retroativa = self.movimentar(0, self.D1, 'entrada', '10.00')
+        self.assertEqual(self.saldos(), {(0, self.D1): Decimal('10.00'), (0, self.D2): Decimal('110.00'),
+                                         (0, self.D3): Decimal('70.00')})
+
+        retroativa.delete()
+        self.assertEqual(self.saldos(), {(0, self.D2): Decimal('100.00'), (0, self.D3): Decimal('60.00')})
+        self.assertEqual(saldo_em(self.contas[0].pk, self.D1), Decimal('1000.00'))
+        self.assertEqual(verificar_saldos(), [])
+
+    def test_comando_verifica_e_reconstroi(self):
+        self.movimentar(0, self.D1, 'entrada', '100.00')
+        self.movimentar(0, self.D2, 'saida', '30.00')
+        self.movimentar(1, self.D2, 'entrada', '5.00')
+        SaldoContaBancaria.objects.filter(conta_bancaria=self.contas[0], data=self.D2).update(saldo=Decimal('1.00'))
+        SaldoContaBancaria.objects.create(conta_bancaria=self.contas[1], data=self.D3)
+
+        saida = io.StringIO()
+        call_command('reconstruir_saldos', verificar=True, stdout=saida)
+        self.assertIn('2 divergência(s)', saida.getvalue())
+        self.assertIn(f'Conta {self.contas[1].pk} em {self.D3}: saldo gravado sem movimentações', saida.getvalue())
+        self.assertEqual(SaldoContaBancaria.objects.get(conta_bancaria=self.contas[0], data=self.D2).saldo,
+                         Decimal('1.00'))
+
+        call_command('reconstruir_saldos', stdout=io.StringIO())
+        saida = io.StringIO()
+        call_command('reconstruir_saldos', verificar=True, stdout=saida)
+        self.assertIn('conferem', saida.getvalue())
+        self.assertEqual(self.saldos(), {(0, self.D1): Decimal('100.00'), (0, self.D2): Decimal('70.00'),
+                                         (1, self.D2): Decimal('5.00')})
+
+
+class AgingTests(TestCase):
+    HOJE = datetime.date(2025, 6, 30)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        cls.clientes = [
+            Cliente.objects.create(codigo=f'C{n}', pessoa=Pessoa.objects.create(
+                nome=nome, tipo_pessoa='fisica', cpf_cnpj=str(n), empresa=cls.empresa))
+            for n, nome in enumerate(['Beta', 'Alfa'])
+        ]
+        cls.comuns = dict(
+            conta_contabil=PlanoContas.objects.create(codigo='1', nome='Conta', tipo='receita', empresa=cls.empresa),
+            centro_custo=CentroCusto.objects.create(codigo='1', nome='Centro', empresa=cls.empresa),
+            forma_pagamento=FormaPagamento.objects.create(nome='Boleto', tipo='boleto'),
+            data_emissao=cls.HOJE, empresa=cls.empresa,
+        )
+        for n, (cliente, dias, situacao) in enumerate([(0, 0, 'aberto'), (0, 30, 'aberto'), (1, 31, 'aberto'),
+                                                       (1, 90, 'aberto'), (1, 91, 'aberto'), (0, 5, 'recebido')]):
+            ContasReceber.objects.create(
+                numero_documento=f'R{n}', cliente=cls.clientes[cliente], situacao=situacao,
+                data_vencimento=cls.HOJE - datetime.timedelta(days=dias), valor_original=Decimal('100.00'),
+                valor_juros=Decimal('10.00'), valor_desconto=Decimal('5.00'), **cls.comuns,
+            )
+
+    def setUp(self):
+        # Com o cache fora do banco, a versão dos títulos sobrevive ao rollback entre os testes
+        cache.clear()
+
+    def test_faixas_de_vencimento(self):
+        self.assertEqual(aging('receber', self.empresa.pk, self.HOJE), {
+            'a_vencer': Decimal('105.00'), 'vencido_1_30': Decimal('105.00'), 'vencido_31_60': Decimal('105.00'),
+            'vencido_61_90': Decimal('105.00'), 'vencido_90_mais': Decimal('105.00'), 'total': Decimal('525.00'),
+        })
+        self.assertEqual(aging('pagar', self.empresa.pk, self.HOJE)['total'], Decimal('0.00'))
+
+    def test_agrupado_por_pessoa(self):
+        linhas = aging('receber', self.empresa.pk, self.HOJE, por_pessoa=True)
+        self.assertEqual([(linha['nome'], linha['id'], linha['total']) for linha in linhas], [
+            ('Alfa', self.clientes[1].pk, Decimal('315.00')), ('Beta', self.clientes[0].pk, Decimal('210.00')),
+        ])
+        self.assertEqual((linhas[0]['vencido_31_60'], linhas[0]['a_vencer']), (Decimal('105.00'), Decimal('0.00')))
+
+    def test_cache_invalidado_ao_salvar_e_excluir_titulo(self):
+        aging('receber', self.empresa.pk, self.HOJE)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(aging('receber', self.empresa.pk, self.HOJE)['total'], Decimal('525.00'))
+        # Só as leituras do cache, sem ler os títulos
+        self.assertFalse([c for c in consultas if ContasReceber._meta.db_table in c['sql']])
+
+        titulo = ContasReceber.objects.get(numero_documento='R0')
+        titulo.situacao = 'recebido'
+        titulo.save()
+        self.assertEqual(aging('receber', self.empresa.pk, self.HOJE)['a_vencer'], Decimal('0.00'))
+
+        ContasReceber.objects.get(numero_documento='R4').delete()
+        self.assertEqual(aging('receber', self.empresa.pk, self.HOJE)['total'], Decimal('315.00'))
+
+    def test_api(self):
+        usuario = User.objects.create_user('usuario', password='senha')
+        usuario.empresas.add(self.empresa)
+        self.client.force_login(usuario)
+        url = reverse('financeiro:aging', args=['receber'])
+        resposta = self.client.get(url, {'empresa': self.empresa.pk, 'data': '2025-06-30', 'agrupar': 'pessoa'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([(linha['nome'], linha['total']) for linha in resposta.json()['resultado']],
+                         [('Alfa', '315.00'), ('Beta', '210.00')])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(reverse('financeiro:aging', args=['outro']),
+                                         {'empresa': self.empresa.pk}).status_code, 404)
+
+
+class ExportacaoTitulosTests(TestCase):
+    CABECALHO = ['Documento', 'Código', 'Nome', 'CPF/CNPJ', 'Emissão', 'Vencimento', 'Valor Original', 'Desconto',
+                 'Juros', 'Multa', 'Valor Baixado', 'Data da Baixa', 'Situação', 'Conta Contábil', 'Centro de Custo',
+                 'Forma de Pagamento', 'Empresa']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, outra = (Empresa.objects.create(nome=nome, cnpj=nome, razao_social=nome, endereco='-')
+                              for nome in ('Matriz', 'Filial'))
+        for n, empresa in enumerate((cls.empresa, outra)):
+            cliente = Cliente.objects.create(codigo=f'C{n}', pessoa=Pessoa.objects.create(
+                nome='José Conceição', tipo_pessoa='fisica', cpf_cnpj=str(n), empresa=empresa))
+            ContasReceber.objects.create(
+                numero_documento=f'NF-{n}', cliente=cliente, data_emissao=datetime.date(2025, 3, 1),
+                data_vencimento=datetime.date(2025, 4, 5), valor_original=Decimal('1234.50'),
+                valor_juros=Decimal('0.75'), empresa=empresa,
+                conta_contabil=PlanoContas.objects.create(codigo=f'1.{n}', nome='Vendas', tipo='receita',
+                                                          empresa=empresa),
+                centro_custo=CentroCusto.objects.create(codigo=f'CC{n}', nome='Centro', empresa=empresa),
+                forma_pagamento=FormaPagamento.objects.create(nome='Boleto', tipo='boleto'),
+            )
+        cls.usuario = User.objects.create_superuser('usuario', password='senha')
+        cls.usuario.empresas.add(cls.empresa)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        self.url = reverse('financeiro:exportar-titulos', args=['receber'])
+
+    def test_csv(self):
+        resposta = self.client.get(self.url, {'empresa': self.empresa.pk})
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="contasreceber_', resposta['Content-Disposition'])
+        conteudo = b''.join(resposta.streaming_content).decode('utf-8')
+        self.assertTrue(conteudo.startswith('\ufeff'))
+        self.assertEqual(conteudo[1:].splitlines(), [
+            ';'.join(self.CABECALHO),
+            'NF-0;C0;José Conceição;0;01/03/2025;05/04/2025;1234,50;0,00;0,75;0,00;0,00;;Aberto;1.0;CC0;Boleto;Matriz',
+        ])
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        resposta = self.client.get(self.url, {'empresa': self.empresa.pk, 'formato': 'xlsx'})
+        self.assertEqual(resposta.status_code, 200)
+        planilha = load_workbook(io.BytesIO(b''.join(resposta.streaming_content)))
+        linhas = list(planilha['Contas a Receber'].values)
+        self.assertEqual(list(linhas[0]), self.CABECALHO)
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual(linhas[1][:7], ('NF-0', 'C0', 'José Conceição', '0', datetime.datetime(2025, 3, 1),
+                                         datetime.datetime(2025, 4, 5), 1234.5))
+        self.assertEqual(linhas[1][12], 'Aberto')
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(self.url, {'formato': 'pdf'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'empresa': 'matriz'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'vencimento_de': '05/04/2025'}).status_code, 400)
+        outro = reverse('financeiro:exportar-titulos', args=['outro'])
+        self.assertEqual(self.client.get(outro).status_code, 404)
+
+    def test_acao_do_admin(self):
+        titulo = ContasReceber.objects.get(empresa=self.empresa)
+        resposta = self.client.post(reverse('admin:financeiro_contasreceber_changelist'),
+                                    {'action': 'exportar_csv', '_selected_action': [titulo.pk]})
+        linhas = b''.join(resposta.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([linha.split(';')[0] for linha in linhas[1:]], ['NF-0'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Planos de execução exigem PostgreSQL')
+class ConsultasFinanceirasIndexadasTests(TestCase):
+    """As consultas quentes do financeiro não podem cair em varredura sequencial"""
+
+    @classmethod
+    def setUpTestData(cls):
+        criar_dados_financeiros()
+        with connection.cursor() as cursor:
+            for model in (ContasReceber, ContasPagar, MovimentacaoFinanceira):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+        cls.empresa = Empresa.objects.order_by('pk').first()
+        cls.hoje = datetime.date(2025, 6, 30)
+
+    def consultas_quentes(self):
+        """(descrição, queryset, índice que deve atender a consulta)"""
+        empresa, hoje = self.empresa, self.hoje
+        inicio_mes = hoje.replace(day=1)
+        valor_total = F('valor_original') + F('valor_juros') + F('valor_multa') - F('valor_desconto')
+        for model, prefixo, baixado in ((ContasReceber, 'cr', 'recebido'), (ContasPagar, 'cp', 'pago')):
+            nome = model.__name__
+            titulos = model.objects.filter(empresa=empresa)
+            yield (f'{nome}: abertos vencidos',
+                   titulos.filter(situacao='aberto', data_vencimento__lt=hoje).order_by('-data_vencimento')[:100],
+                   {f'{prefixo}_emp_sit_venc_idx', f'{prefixo}_aberto_emp_venc_idx'})
+            yield (f'{nome}: abertos no período',
+                   titulos.filter(situacao='aberto', data_vencimento__range=(inicio_mes, hoje))
+                   .order_by('-data_vencimento'),
+                   {f'{prefixo}_emp_sit_venc_idx', f'{prefixo}_aberto_emp_venc_idx'})
+            yield (f'{nome}: baixados recentes',
+                   titulos.filter(situacao=baixado).order_by('-data_vencimento')[:100],
+                   {f'{prefixo}_emp_sit_venc_idx'})
+            yield (f'{nome}: total em aberto por vencimento',
+                   titulos.filter(situacao='aberto', data_vencimento__gte=hoje)
+                   .values('data_vencimento').annotate(total=Sum(valor_total)),
+                   {f'{prefixo}_emp_sit_venc_idx', f'{prefixo}_aberto_emp_venc_idx'})
+        movimentacoes = MovimentacaoFinanceira.objects.filter(empresa=empresa)
+        yield ('MovimentacaoFinanceira: extrato da empresa', movimentacoes.order_by('-data')[:100],
+               {'movfin_emp_data_idx'})
+        yield ('MovimentacaoFinanceira: período',
+               movimentacoes.filter(data__range=(inicio_mes, hoje)).order_by('-data'),
+               {'movfin_emp_data_idx'})
+
+    def test_consultas_quentes_usam_indices(self):
+        for descricao, queryset, indices in self.consultas_quentes():
+            with self.subTest(descricao):
+                plano = json.loads(queryset.explain(format='json'))[0]['Plan']
+                tabela = queryset.model._meta.db_table
+                nos = list(_nos_do_plano(plano))
+                explicacao = f'{descricao}:\n{json.dumps(plano, indent=2)}'
+                # Alias: nas tabelas particionadas, Relation Name é a partição
+                self.assertFalse([no for no in nos if no['Node Type'] == 'Seq Scan'
+                                  and no.get('Alias') == tabela], explicacao)
+                self.assertTrue(indices & _indices_do_plano(nos), explicacao)
+
+
+class ApiConsultasFinanceirasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        criar_dados_financeiros(empresas=1, titulos_por_empresa=60)
+        cls.usuario = User.objects.create_user('usuario', password='senha')
+        cls.usuario.empresas.set(Empresa.objects.all())
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def percorrer(self, url, params):
+        """Segue os links ``next``; devolve as páginas e o número de consultas de cada uma"""
+        paginas, consultas = [], []
+        resposta = self.client.get(url, params)
+        while True:
+            self.assertEqual(resposta.status_code, 200)
+            paginas.append(resposta.json())
+            if not paginas[-1]['next']:
+                return paginas, consultas
+            with CaptureQueriesContext(connection) as capturadas:
+                resposta = self.client.get(paginas[-1]['next'])
+            consultas.append(len(capturadas))
+
+    def test_paginacao_por_chave_percorre_todos_os_titulos_em_ordem(self):
+        url = reverse('financeiro:contasreceber-list')
+        paginas, consultas = self.percorrer(url, {'page_size': 7})
+        ids = [titulo['id'] for pagina in paginas for titulo in pagina['results']]
+        esperado = list(ContasReceber.objects.order_by('data_vencimento', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, esperado)
+        self.assertEqual(len(set(consultas)), 1, 'o número de consultas não pode crescer com a página')
+
+        # Voltando uma página a partir da terceira
+        anterior = self.client.get(self.client.get(paginas[1]['next']).json()['previous']).json()
+        self.assertEqual(anterior['results'], paginas[1]['results'])
+
+    def test_movimentacoes_da_mais_recente_para_a_mais_antiga(self):
+        paginas, _ = self.percorrer(reverse('financeiro:movimentacaofinanceira-list'), {'page_size': 25})
+        chaves = [(m['data'], m['id']) for pagina in paginas for m in pagina['results']]
+        self.assertEqual(len(chaves), MovimentacaoFinanceira.objects.count())
+        self.assertEqual(chaves, sorted(chaves, reverse=True))
+
+    def test_campos_esparsos_limitam_colunas_e_joins(self):
+        url = reverse('financeiro:contaspagar-list')
+        with CaptureQueriesContext(connection) as capturadas:
+            resposta = self.client.get(url, {'fields': 'numero_documento,fornecedor_nome,valor_total'})
+        self.assertEqual(set(resposta.json()['results'][0]),
+                         {'numero_documento', 'fornecedor_nome', 'valor_total'})
+        sql = capturadas[-1]['sql']
+        self.assertIn('operacional_pessoa', sql)
+        self.assertNotIn('valor_pago', sql)
+        self.assertNotIn('financeiro_formapagamento', sql)
+
+        resposta = self.client.get(url, {'fields': 'numero_documento,senha'})
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_cursor_invalido(self):
+        resposta = self.client.get(reverse('financeiro:contasreceber-list'), {'cursor': 'invalido'})
+        self.assertEqual(resposta.status_code, 404)
+
+
+class BalanceteArvoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        conta = dict(tipo='receita', empresa=cls.empresa)
+        cls.receitas = PlanoContas.objects.create(codigo='3', nome='Receitas', **conta)
+        cls.vendas = PlanoContas.objects.create(codigo='3.1', nome='Vendas', pai=cls.receitas, **conta)
+        cls.produtos = PlanoContas.objects.create(codigo='3.1.1', nome='Produtos', pai=cls.vendas, **conta)
+        cls.servicos = PlanoContas.objects.create(codigo='3.2', nome='Serviços', pai=cls.receitas, **conta)
+        cls.centro = CentroCusto.objects.create(codigo='1', nome='Geral', empresa=cls.empresa)
+        cls.conta_bancaria = ContasBancarias.objects.create(
+            banco=Banco.objects.create(codigo='001', nome='Banco'), agencia='1', conta='1', digito='0',
+            tipo='corrente', empresa=cls.empresa)
+        cls.hoje = datetime.date(2025, 6, 30)
+        for conta_contabil, tipo, valor in ((cls.produtos, 'entrada', '100.00'), (cls.servicos, 'entrada', '50.00'),
+                                            (cls.vendas, 'saida', '30.00')):
+            MovimentacaoFinanceira.objects.create(
+                data=cls.hoje, tipo=tipo, valor=Decimal(valor), descricao='-', conta_contabil=conta_contabil,
+                centro_custo=cls.centro, conta_bancaria=cls.conta_bancaria, empresa=cls.empresa)
+        cliente = Cliente.objects.create(codigo='C1', pessoa=Pessoa.objects.create(
+            nome='Cliente', tipo_pessoa='fisica', cpf_cnpj='1', empresa=cls.empresa))
+        ContasReceber.objects.create(
+            numero_documento='R1', cliente=cliente, data_emissao=cls.hoje, data_vencimento=cls.hoje,
+            valor_original=Decimal('70.00'), conta_contabil=cls.produtos, centro_custo=cls.centro,
+            forma_pagamento=FormaPagamento.objects.create(nome='Pix', tipo='pix'), empresa=cls.empresa)
+
+    def test_caminho_e_nivel_mantidos_ao_mover_subarvore(self):
+        self.produtos.refresh_from_db()
+        self.assertEqual(self.produtos.caminho, f'{self.receitas.pk}/{self.vendas.pk}/{self.produtos.pk}/')
+        self.assertEqual(self.produtos.nivel, 3)
+
+        self.vendas.pai = self.servicos
+        self.vendas.save()
+        self.produtos.refresh_from_db()
+        self.assertEqual(self.produtos.caminho,
+                         f'{self.receitas.pk}/{self.servicos.pk}/{self.vendas.pk}/{self.produtos.pk}/')
+        self.assertEqual(self.produtos.nivel, 4)
+        self.assertEqual(set(self.servicos.descendentes()), {self.vendas, self.produtos})
+
+        self.servicos.pai = self.produtos
+        with self.assertRaises(ValidationError):
+            self.servicos.save()
+
+    def test_reconstruir_caminhos(self):
+        PlanoContas.objects.update(caminho='', nivel=1)
+        PlanoContas.reconstruir_caminhos()
+        self.assertEqual(dict(PlanoContas.objects.values_list('codigo', 'nivel')),
+                         {'3': 1, '3.1': 2, '3.1.1': 3, '3.2': 2})
+        self.assertEqual(self.receitas.descendentes().count(), 3)
+
+    def test_balancete_propaga_totais_em_uma_consulta(self):
+        with self.assertNumQueries(1):
+            linhas = {linha['codigo']: linha for linha in
+                      balancete('plano-contas', self.empresa.pk, self.hoje.replace(day=1), self.hoje)}
+        self.assertEqual(linhas['3']['entradas'], Decimal('150.00'))
+        self.assertEqual(linhas['3']['saldo'], Decimal('120.00'))
+        self.assertEqual(linhas['3.1']['saldo'], Decimal('70.00'))
+        self.assertEqual(linhas['3.1']['a_receber'], Decimal('70.00'))
+        self.assertEqual(linhas['3.2']['a_receber'], Decimal('0.00'))
+        self.assertEqual(linhas['3.1.1']['nivel'], 3)
+
+        centros = balancete('centros-custo', self.empresa.pk, self.hoje, self.hoje)
+        self.assertEqual(centros[0]['saldo'], Decimal('120.00'))
+
+
+class FluxoCaixaProjetadoTests(TestCase):
+    HOJE = datetime.date(2025, 6, 30)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        cls.conta = ContasBancarias.objects.create(banco=Banco.objects.create(codigo='001', nome='Banco'),
+                                                   agencia='1', conta='1', digito='0', tipo='corrente',
+                                                   saldo_inicial=Decimal('1000.00'), empresa=cls.empresa)
+        plano = PlanoContas.objects.create(codigo='1', nome='Conta', tipo='receita', empresa=cls.empresa)
+        centro = CentroCusto.objects.create(codigo='1', nome='Centro', empresa=cls.empresa)
+        cartao = FormaPagamento.objects.create(nome='Cartão', tipo='cartao_credito', prazo_recebimento=30,
+                                               taxa=Decimal('2.50'))
+        boleto = FormaPagamento.objects.create(nome='Boleto', tipo='boleto')
+        cliente = Cliente.objects.create(codigo='C1', pessoa=Pessoa.objects.create(
+            nome='Cliente', tipo_pessoa='fisica', cpf_cnpj='1', empresa=cls.empresa))
+        fornecedor = Fornecedor.objects.create(codigo='F1', pessoa=Pessoa.objects.create(
+            nome='Fornecedor', tipo_pessoa='juridica', cpf_cnpj='2', empresa=cls.empresa))
+        comuns = dict(conta_contabil=plano, centro_custo=centro, data_emissao=cls.HOJE, empresa=cls.empresa)
+
+        def dia(n):
+            return cls.HOJE + datetime.timedelta(days=n)
+
+        for vencimento, valor, forma, conta, situacao in (
+            (dia(5), '1000.00', cartao, cls.conta, 'aberto'),   # entra no dia 35, menos 2,5%
+            (dia(-10), '200.00', boleto, cls.conta, 'aberto'),  # vencido: entra hoje
+            (dia(3), '500.00', boleto, cls.conta, 'recebido'),
+            (dia(1), '100.00', boleto, None, 'aberto'),
+            (dia(95), '700.00', boleto, cls.conta, 'aberto'),   # fora do horizonte
+        ):
+            ContasReceber.objects.create(numero_documento='R', cliente=cliente, data_vencimento=vencimento,
+                                         valor_original=Decimal(valor), forma_pagamento=forma,
+                                         conta_bancaria=conta, situacao=situacao, **comuns)
+        cls.pagar = ContasPagar.objects.create(
+            numero_documento='P', fornecedor=fornecedor, data_vencimento=dia(10), valor_original=Decimal('300.00'),
+            valor_pago=Decimal('50.00'), forma_pagamento=boleto, conta_bancaria=cls.conta, **comuns)
+        MovimentacaoFinanceira.objects.create(data=dia(-1), tipo='saida', valor=Decimal('100.00'), descricao='-',
+                                              conta_contabil=plano, centro_custo=centro, conta_bancaria=cls.conta,
+                                              empresa=cls.empresa)
+
+    def test_serie_diaria_por_conta(self):
+        conta, sem_conta = projetar(self.empresa.pk, self.HOJE)
+        self.assertEqual(conta['saldo_atual'], Decimal('900.00'))
+        serie = {dia['data']: dia for dia in conta['serie']}
+        self.assertEqual(len(serie), 91)
+        self.assertEqual(serie[self.HOJE]['saldo'], Decimal('1100.00'))
+        self.assertEqual(serie[self.HOJE + datetime.timedelta(days=10)]['saidas'], Decimal('250.00'))
+        self.assertEqual(serie[self.HOJE + datetime.timedelta(days=35)]['entradas'], Decimal('975.00'))
+        self.assertEqual(conta['serie'][-1]['saldo'], Decimal('1825.00'))
+        self.assertIsNone(sem_conta['conta_bancaria'])
+        self.assertEqual(sem_conta['serie'][-1]['saldo'], Decimal('100.00'))
+
+    def test_titulos_em_cache_ate_algum_titulo_mudar(self):
+        projetar(self.empresa.pk, self.HOJE)
+        with CaptureQueriesContext(connection) as consultas:
+            projetar(self.empresa.pk, self.HOJE)
+        # Só os saldos das contas e as leituras do cache, sem ler os títulos
+        self.assertFalse([c for c in consultas
+                          if any(m._meta.db_table in c['sql'] for m in (ContasReceber, ContasPagar))])
+        self.pagar.valor_original = Decimal('1300.00')
+        self.pagar.save()
+        conta, _ = projetar(self.empresa.pk, self.HOJE)
+        self.assertEqual(conta['serie'][-1]['saldo'], Decimal('825.00'))
+
+    def test_api(self):
+        usuario = User.objects.create_user('usuario', password='senha')
+        usuario.empresas.add(self.empresa)
+        self.client.force_login(usuario)
+        url = reverse('financeiro:fluxo-caixa-projetado')
+        self.assertEqual(self.client.get(url, {'empresa': self.empresa.pk, 'dias': 1000}).status_code, 400)
+        resposta = self.client.get(url, {'empresa': self.empresa.pk, 'data': '2025-06-30', 'dias': 10})
+        self.assertEqual(resposta.status_code, 200)
+        conta = resposta.json()['contas'][0]
+        self.assertEqual(len(conta['serie']), 11)
+        self.assertEqual(conta['serie'][-1]['saldo'], '850.00')
+
+
+ZERO = Decimal('0.00')
+
+
+class BaixaEmLoteTests(TestCase):
+    HOJE = datetime.date(2025, 6, 30)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        banco = Banco.objects.create(codigo='001', nome='Banco')
+        cls.contas = [ContasBancarias.objects.create(banco=banco, agencia='1', conta=str(n), digito='0',
+                                                     tipo='corrente', empresa=cls.empresa) for n in range(2)]
+        comuns = dict(
+            conta_contabil=PlanoContas.objects.create(codigo='1', nome='Conta', tipo='receita', empresa=cls.empresa),
+            centro_custo=CentroCusto.objects.create(codigo='1', nome='Centro', empresa=cls.empresa),
+            forma_pagamento=FormaPagamento.objects.create(nome='Boleto', tipo='boleto'),
+            data_emissao=cls.HOJE, data_vencimento=cls.HOJE, empresa=cls.empresa,
+        )
+        cliente = Cliente.objects.create(codigo='C1', pessoa=Pessoa.objects.create(
+            nome='Cliente', tipo_pessoa='fisica', cpf_cnpj='1', empresa=cls.empresa))
+        fornecedor = Fornecedor.objects.create(codigo='F1', pessoa=Pessoa.objects.create(
+            nome='Fornecedor', tipo_pessoa='juridica', cpf_cnpj='2', empresa=cls.empresa))
+        ContasReceber.objects.bulk_create([
+            ContasReceber(numero_documento=f'R{i}', cliente=cliente, valor_original=Decimal('100.00'),
+                          valor_juros=Decimal('10.00'), valor_recebido=Decimal('20.00') if i == 0 else ZERO,
+                          conta_bancaria=cls.contas[i % 2], **comuns)
+            for i in range(6)
+        ] + [ContasReceber(numero_documento='RX', cliente=cliente, valor_original=Decimal('50.00'),
+                           situacao='recebido', conta_bancaria=cls.contas[0], **comuns)])
+        ContasPagar.objects.bulk_create([
+            ContasPagar(numero_documento='P1', fornecedor=fornecedor, valor_original=Decimal('40.00'),
+                        conta_bancaria=cls.contas[1], **comuns),
+            ContasPagar(numero_documento='P2', fornecedor=fornecedor, valor_original=Decimal('60.00'), **comuns),
+        ])
+
+    @override_settings(CACHES=CACHE_LOCAL)
+    def test_baixa_titulos_movimentacoes_e_saldos_de_uma_vez(self):
+        aging('receber', self.empresa.pk, self.HOJE)
+        # Consultas fixas: não dependem do número de títulos, só das contas bancárias envolvidas
+        with self.assertNumQueries(16):
+            resultado = baixar_em_lote(ContasReceber.objects.all(), data=self.HOJE)
+        self.assertEqual((resultado.titulos, resultado.valor), (6, Decimal('640.00')))
+        self.assertFalse(ContasReceber.objects.filter(situacao='aberto').exists())
+        self.assertEqual(ContasReceber.objects.get(numero_documento='R0').valor_recebido, Decimal('110.00'))
+        self.assertEqual(ContasReceber.objects.get(numero_documento='R0').data_recebimento, self.HOJE)
+        self.assertEqual(ContasReceber.objects.get(numero_documento='RX').valor_recebido, ZERO)
+
+        movimentacoes = MovimentacaoFinanceira.objects.filter(conta_receber__isnull=False)
+        self.assertEqual(movimentacoes.count(), 6)
+        self.assertEqual(movimentacoes.get(conta_receber__numero_documento='R0').valor, Decimal('90.00'))
+        self.assertEqual(saldo_em(self.contas[0].pk, self.HOJE), Decimal('310.00'))
+        self.assertEqual(saldo_em(self.contas[1].pk, self.HOJE), Decimal('330.00'))
+        self.assertEqual(verificar_saldos(), [])
+        # Os relatórios em cache enxergam a baixa
+        self.assertEqual(aging('receber', self.empresa.pk, self.HOJE)['total'], ZERO)
+
+    def test_titulos_sem_conta_bancaria(self):
+        with self.assertRaisesMessage(ValidationError, 'P2'):
+            baixar_em_lote(ContasPagar.objects.all(), data=self.HOJE)
+        self.assertEqual(ContasPagar.objects.filter(situacao='aberto').count(), 2)
+
+        resultado = baixar_em_lote(ContasPagar.objects.all(), data=self.HOJE, conta_bancaria=self.contas[0])
+        self.assertEqual(resultado.valor, Decimal('100.00'))
+        self.assertEqual(ContasPagar.objects.get(numero_documento='P2').conta_bancaria, self.contas[0])
+        self.assertEqual(SaldoContaBancaria.objects.get(conta_bancaria=self.contas[0]).total_saidas,
+                         Decimal('60.00'))
+
+    def test_acao_do_admin(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@erp.com', 'admin'))
+        selecionados = ContasReceber.objects.filter(numero_documento__in=['R1', 'R2'])
+        resposta = self.client.post(reverse('admin:financeiro_contasreceber_changelist'), {
+            'action': 'baixar_em_lote', '_selected_action': [t.pk for t in selecionados],
+        }, follow=True)
+        self.assertContains(resposta, '2 título(s) baixado(s)')
+        self.assertEqual(ContasReceber.objects.filter(situacao='recebido').count(), 3)
+
+
+def _registro_cnab(tamanho, campos):
+    """Registro de ``tamanho`` posições com ``{posição inicial (base 1): texto}``"""
+    registro = [' '] * tamanho
+    for posicao, texto in campos.items():
+        registro[posicao - 1:posicao - 1 + len(texto)] = texto
+    return ''.join(registro)
+
+
+class ConciliacaoExtratoTests(TestCase):
+    HOJE = datetime.date(2025, 6, 30)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        banco = Banco.objects.create(codigo='001', nome='Banco')
+        cls.conta, cls.outra_conta = [
+            ContasBancarias.objects.create(banco=banco, agencia='1', conta=str(n), digito='0', tipo='corrente',
+                                           empresa=cls.empresa)
+            for n in range(2)
+        ]
+        comuns = dict(
+            conta_contabil=PlanoContas.objects.create(codigo='1', nome='Conta', tipo='receita', empresa=cls.empresa),
+            centro_custo=CentroCusto.objects.create(codigo='1', nome='Centro', empresa=cls.empresa),
+            forma_pagamento=FormaPagamento.objects.create(nome='Boleto', tipo='boleto'),
+            data_emissao=cls.HOJE, empresa=cls.empresa,
+        )
+        cliente = Cliente.objects.create(codigo='C1', pessoa=Pessoa.objects.create(
+            nome='Cliente', tipo_pessoa='fisica', cpf_cnpj='1', empresa=cls.empresa))
+        fornecedor = Fornecedor.objects.create(codigo='F1', pessoa=Pessoa.objects.create(
+            nome='Fornecedor', tipo_pessoa='juridica', cpf_cnpj='2', empresa=cls.empresa))
+        ContasReceber.objects.bulk_create([
+            ContasReceber(numero_documento='R1', cliente=cliente, valor_original=Decimal('90.00'),
+                          valor_juros=Decimal('10.00'), data_vencimento=cls.HOJE, **comuns),
+            ContasReceber(numero_documento='NF-250', cliente=cliente, valor_original=Decimal('250.00'),
+                          data_vencimento=cls.HOJE - datetime.timedelta(days=30), conta_bancaria=cls.conta,
+                          **comuns),
+        ] + [
+            ContasReceber(numero_documento=f'R75-{dias}', cliente=cliente, valor_original=Decimal('75.00'),
+                          data_vencimento=cls.HOJE + datetime.timedelta(days=dias), **comuns)
+            for dias in (-1, 1)
+        ])
+        ContasPagar.objects.bulk_create([
+            ContasPagar(numero_documento='P1', fornecedor=fornecedor, valor_original=Decimal('40.00'),
+                        data_vencimento=cls.HOJE + datetime.timedelta(days=20), conta_bancaria=cls.conta, **comuns),
+            ContasPagar(numero_documento='P2', fornecedor=fornecedor, valor_original=Decimal('60.00'),
+                        data_vencimento=cls.HOJE, conta_bancaria=cls.outra_conta, **comuns),
+        ])
+        MovimentacaoFinanceira.objects.create(
+            data=cls.HOJE, tipo='entrada', valor=Decimal('30.00'), descricao='Depósito',
+            conta_contabil=comuns['conta_contabil'], centro_custo=comuns['centro_custo'],
+            conta_bancaria=cls.conta, empresa=cls.empresa,
+        )
+
+    def _ofx(self, *transacoes):
+        corpo = ''.join(
+            f'<STMTTRN>\n<TRNTYPE>OTHER\n<DTPOSTED>{data:%Y%m%d}100000[-3:BRT]\n<TRNAMT>{valor}\n'
+            f'<FITID>{n}\n<CHECKNUM>{documento}\n<MEMO>Lançamento &amp; tarifa\n</STMTTRN>\n'
+            for n, (data, valor, documento) in enumerate(transacoes)
+        )
+        return (f'OFXHEADER:100\nDATA:OFXSGML\nCHARSET:1252\n\n<OFX>\n<BANKMSGSRSV1>\n<STMTTRNRS>\n<STMTRS>\n'
+                f'<BANKTRANLIST>\n{corpo}</BANKTRANLIST>\n</STMTRS>\n</STMTTRNRS>\n</BANKMSGSRSV1>\n</OFX>\n'
+                ).encode('cp1252')
+
+    def test_concilia_por_documento_valor_e_movimentacao_lancada(self):
+        depois = self.HOJE + datetime.timedelta(days=2)
+        extrato = self._ofx(
+            (depois, '100.00', ''), (self.HOJE, '-40.00', 'P1'), (self.HOJE, '75.00', ''),
+            (self.HOJE, '-60.00', ''), (self.HOJE, '30,00', ''), (self.HOJE, '999.99', ''),
+        )
+        linhas = list(ler_extrato(extrato.splitlines(keepends=True)))
+        self.assertEqual([linha.valor for linha in linhas][:2], [Decimal('100.00'), Decimal('-40.00')])
+        self.assertEqual((linhas[0].data, linhas[0].descricao), (depois, 'Lançamento & tarifa'))
+
+        resultado = conciliar_extrato(linhas, self.conta)
+        self.assertEqual((resultado.linhas, resultado.titulos_baixados, resultado.ja_lancadas),
+                         (6, 2, 1))
+        self.assertEqual(resultado.valor_baixado, Decimal('140.00'))
+        self.assertEqual([(linha.valor, motivo[:14]) for linha, motivo in resultado.nao_conciliadas], [
+            (Decimal('75.00'), 'Mais de um tít'),
+            (Decimal('-60.00'), 'Nenhum título '),
+            (Decimal('999.99'), 'Nenhum título '),
+        ])
+
+        r1 = ContasReceber.objects.get(numero_documento='R1')
+        self.assertEqual((r1.situacao, r1.valor_recebido, r1.data_recebimento, r1.conta_bancaria),
+                         ('recebido', Decimal('100.00'), depois, self.conta))
+        self.assertEqual(ContasPagar.objects.get(numero_documento='P1').situacao, 'pago')
+        self.assertEqual(MovimentacaoFinanceira.objects.get(conta_pagar__numero_documento='P1').data, self.HOJE)
+        self.assertEqual(saldo_em(self.conta.pk, depois), Decimal('90.00'))
+        self.assertEqual(verificar_saldos(), [])
+
+        # Reimportar o mesmo extrato não baixa nem lança nada de novo
+        resultado = conciliar_extrato(ler_extrato(extrato.splitlines(keepends=True)), self.conta)
+        self.assertEqual((resultado.titulos_baixados, resultado.ja_lancadas), (0, 3))
+        self.assertEqual(MovimentacaoFinanceira.objects.count(), 3)
+
+    def test_retorno_cnab_240_e_400(self):
+        t = _registro_cnab(240, {8: '3', 14: 'T', 16: '06', 38: '00000000000000000123', 59: 'NF-250'})
+        u = _registro_cnab(240, {8: '3', 14: 'U', 16: '06', 78: '000000000025000', 138: '30062025',
+                                 146: '01072025'})
+        nao_liquidado = _registro_cnab(240, {8: '3', 14: 'U', 16: '02', 78: '000000000001000'})
+        header = _registro_cnab(240, {8: '0'})
+        arquivo = '\r\n'.join([header, t, u, t, nao_liquidado]).encode()
+        linhas = list(ler_extrato(arquivo.splitlines(keepends=True)))
+        self.assertEqual(len(linhas), 1)
+        self.assertEqual((linhas[0].data, linhas[0].valor, linhas[0].documento, linhas[0].identificador),
+                         (datetime.date(2025, 7, 1), Decimal('250.00'), 'NF-250', '00000000000000000123'))
+
+        resultado = conciliar_extrato(linhas, self.conta)
+        self.assertEqual(resultado.titulos_baixados, 1)
+        self.assertEqual(ContasReceber.objects.get(numero_documento='NF-250').situacao, 'recebido')
+
+        detalhe = _registro_cnab(400, {1: '1', 71: '000000000456', 109: '06', 111: '300625', 117: 'R1',
+                                       254: '0000000010000', 296: '000000'})
+        linhas = list(ler_extrato([_registro_cnab(400, {1: '0'}).encode(), detalhe.encode()]))
+        self.assertEqual((linhas[0].data, linhas[0].valor, linhas[0].documento), (self.HOJE, Decimal('100.00'), 'R1'))
+
+        with self.assertRaisesMessage(ValueError, 'Formato de extrato não reconhecido'):
+            list(ler_extrato([b'data;valor\n']))
+
+    def test_valor_divergente_do_titulo_do_documento(self):
+        linhas = list(ler_extrato(self._ofx((self.HOJE, '-45.00', 'P1')).splitlines(keepends=True)))
+        resultado = conciliar_extrato(linhas, self.conta)
+        self.assertEqual(resultado.titulos_baixados, 0)
+        self.assertEqual(resultado.nao_conciliadas[0][1], 'Título P1 com saldo 40.00 diferente do valor.')
+
+    def test_api(self):
+        usuario = User.objects.create_user('usuario', password='senha')
+        usuario.empresas.add(self.empresa)
+        self.client.force_login(usuario)
+        url = reverse('financeiro:importar-extrato')
+        resposta = self.client.post(url, {
+            'conta_bancaria': self.conta.pk,
+            'arquivo': SimpleUploadedFile('extrato.ofx',
+                                          self._ofx((self.HOJE, '100.00', ''), (self.HOJE, '1.00', ''))),
+        })
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual((dados['titulos_baixados'], dados['valor_baixado'], dados['total_nao_conciliadas']),
+                         (1, '100.00', 1))
+        self.assertEqual(dados['nao_conciliadas'][0]['linha'], 18)
+
+        resposta = self.client.post(url, {
+            'conta_bancaria': self.conta.pk, 'arquivo': SimpleUploadedFile('extrato.csv', b'data;valor\n'),
+        })
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('arquivo', resposta.json())
+
+
+class ArquivoTitulosTests(TestCase):
+    ANTIGO = datetime.date(2022, 3, 10)
+    RECENTE = datetime.date.today()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        conta = ContasBancarias.objects.create(banco=Banco.objects.create(codigo='001', nome='Banco'), agencia='1',
+                                               conta='1', digito='0', tipo='corrente', empresa=cls.empresa)
+        comuns = dict(
+            cliente=Cliente.objects.create(codigo='C1', pessoa=Pessoa.objects.create(
+                nome='Cliente', tipo_pessoa='fisica', cpf_cnpj='1', empresa=cls.empresa)),
+            conta_contabil=PlanoContas.objects.create(codigo='1', nome='Conta', tipo='receita', empresa=cls.empresa),
+            centro_custo=CentroCusto.objects.create(codigo='1', nome='Centro', empresa=cls.empresa),
+            forma_pagamento=FormaPagamento.objects.create(nome='Boleto', tipo='boleto'),
+            valor_original=Decimal('100.00'), conta_bancaria=conta, empresa=cls.empresa,
+        )
+        for documento, vencimento in (('A1', cls.ANTIGO), ('A2', cls.ANTIGO), ('AB', cls.ANTIGO),
+                                      ('R1', cls.RECENTE)):
+            ContasReceber.objects.create(numero_documento=documento, data_emissao=vencimento,
+                                         data_vencimento=vencimento, **comuns)
+        baixar_em_lote(ContasReceber.objects.exclude(numero_documento='AB'), data=cls.RECENTE)
+        cls.antigos = list(ContasReceber.objects.filter(numero_documento__in=['A1', 'A2'])
+                           .order_by('pk').values_list('pk', flat=True))
+
+    def test_move_encerrados_antigos_e_religa_movimentacoes(self):
+        resultado = arquivar_titulos(ContasReceber, datetime.date(2024, 1, 1), lote=1)
+        self.assertEqual((resultado.titulos, resultado.movimentacoes), (2, 2))
+        self.assertEqual(sorted(ContasReceber.objects.values_list('numero_documento', flat=True)), ['AB', 'R1'])
+        self.assertEqual(list(ContasReceberArquivada.objects.order_by('pk').values_list('pk', flat=True)),
+                         self.antigos)
+        self.assertEqual(ContasReceberArquivada.objects.get(pk=self.antigos[0]).valor_recebido, Decimal('100.00'))
+        movimentacoes = MovimentacaoFinanceira.objects.filter(conta_receber_arquivada__isnull=False)
+        self.assertEqual(sorted(movimentacoes.values_list('conta_receber_arquivada_id', flat=True)), self.antigos)
+        self.assertFalse(movimentacoes.filter(conta_receber__isnull=False).exists())
+        self.assertEqual(arquivar_titulos(ContasReceber, datetime.date(2024, 1, 1)).titulos, 0)
+
+    def test_comando_e_leitura_pelo_historico(self):
+        call_command('arquivar_titulos', meses=24, tipo=['receber'], stdout=io.StringIO())
+        self.assertEqual(ContasReceberArquivada.objects.count(), 2)
+
+        antigos = titulos_do_periodo(ContasReceber, datetime.date(2022, 1, 1), datetime.date(2022, 12, 31))
+        self.assertIs(antigos.model, ContasReceberHistorico)
+        self.assertEqual(antigos.filter(data_vencimento__year=2022).count(), 3)
+        self.assertIs(titulos_do_periodo(ContasReceber, datetime.date(2025, 1, 1)).model, ContasReceber)
+        self.assertIs(titulos_do_periodo(ContasReceber).model, ContasReceber)
+
+        usuario = User.objects.create_user('usuario', password='senha')
+        usuario.empresas.add(self.empresa)
+        self.client.force_login(usuario)
+        url = reverse('financeiro:contasreceber-list')
+        resposta = self.client.get(url, {'vencimento_de': '2022-01-01', 'vencimento_ate': '2022-12-31'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(sorted(titulo['numero_documento'] for titulo in resposta.json()['results']),
+                         ['A1', 'A2', 'AB'])
+        self.assertEqual(len(self.client.get(url).json()['results']), 2)
+
+    def test_excluir_empresa_nao_altera_a_view_do_historico(self):
+        empresa = Empresa.objects.create(nome='Outra', cnpj='2', razao_social='Outra', endereco='-')
+        empresa.delete()
+        self.assertEqual(ContasReceberHistorico.objects.count(), 4)
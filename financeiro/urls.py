@@ -1,11 +1,23 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from . import views
+
 app_name = 'financeiro'
 
 # Router para ViewSets da API REST
 router = DefaultRouter()
+router.register('contas-receber', views.ContasReceberViewSet)
+router.register('contas-pagar', views.ContasPagarViewSet)
+router.register('movimentacoes', views.MovimentacaoFinanceiraViewSet)
 
 urlpatterns = [
+    path('contas-bancarias/<int:pk>/saldo/', views.SaldoContaBancariaView.as_view(),
+         name='conta-bancaria-saldo'),
+    path('aging/<str:tipo>/', views.AgingView.as_view(), name='aging'),
+    path('balancete/<str:arvore>/', views.BalanceteView.as_view(), name='balancete'),
+    path('fluxo-caixa-projetado/', views.FluxoCaixaProjetadoView.as_view(), name='fluxo-caixa-projetado'),
+    path('extratos/importar/', views.ImportacaoExtratoView.as_view(), name='importar-extrato'),
+    path('exportar/<str:tipo>/', views.ExportacaoTitulosView.as_view(), name='exportar-titulos'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,3 +1,291 @@
-from django.shortcuts import render
+from decimal import Decimal
 
-# Create your views here.
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import viewsets
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.api import CamposEsparsosMixin, PaginacaoPorChave
+from core.multiempresa import exigir_empresa
+from .arquivo import ARQUIVOS, titulos_do_periodo
+from .conciliacao import TOLERANCIA_DIAS, conciliar_extrato
+from .exportacao import FORMATOS
+from .extratos import LEITORES, ler_extrato
+from .models import ContasBancarias, ContasPagar, ContasReceber, MovimentacaoFinanceira
+from .projecao import DIAS_PADRAO, MAX_DIAS, projetar
+from .relatorios import ARVORES, TITULOS, aging, balancete
+from .saldos import saldo_em
+from .serializers import ContasPagarSerializer, ContasReceberSerializer, MovimentacaoFinanceiraSerializer
+
+MAX_PENDENCIAS_RESPOSTA = 100
+
+
+def _data_parametro(request, nome='data'):
+    """Lê uma data ``AAAA-MM-DD`` da query string; padrão é hoje"""
+    valor = request.query_params.get(nome)
+    if not valor:
+        return timezone.localdate()
+    try:
+        data = parse_date(valor)
+    except ValueError:
+        data = None
+    if data is None:
+        raise ValidationError({nome: 'Data inválida, use o formato AAAA-MM-DD.'})
+    return data
+
+
+def _periodo(request, nome):
+    """(``?<nome>_de``, ``?<nome>_ate``) como datas; ``None`` no que não foi informado"""
+    return tuple(_data_parametro(request, f'{nome}_{limite}') if request.query_params.get(f'{nome}_{limite}')
+                 else None for limite in ('de', 'ate'))
+
+
+def _decimais_como_texto(linha):
+    return {chave: str(valor) if isinstance(valor, Decimal) else valor for chave, valor in linha.items()}
+
+
+class SaldoContaBancariaView(APIView):
+    """Saldo de uma conta bancária ao final de uma data (``?data=AAAA-MM-DD``, padrão hoje)"""
+
+    def get(self, request, pk):
+        data = _data_parametro(request)
+        try:
+            saldo = saldo_em(pk, data)
+        except ContasBancarias.DoesNotExist:
+            raise NotFound('Conta bancária não encontrada.')
+        return Response({'conta_bancaria': pk, 'data': data, 'saldo': str(saldo)})
+
+
+class AgingView(APIView):
+    """Títulos em aberto por faixa de vencimento.
+
+    Parâmetros: ``tipo`` (receber ou pagar), ``empresa`` (id), ``data`` (data base,
+    padrão hoje) e ``agrupar=pessoa`` para detalhar por cliente/fornecedor.
+    """
+
+    def get(self, request, tipo):
+        if tipo not in TITULOS:
+            raise NotFound('Tipo de título inválido.')
+        empresa = request.query_params.get('empresa')
+        if not empresa or not empresa.isdigit():
+            raise ValidationError({'empresa': 'Informe o id da empresa.'})
+        exigir_empresa(empresa)
+        data = _data_parametro(request)
+        por_pessoa = request.query_params.get('agrupar') == 'pessoa'
+
+        resultado = aging(tipo, int(empresa), data, por_pessoa)
+        if por_pessoa:
+            resultado = [_decimais_como_texto(linha) for linha in resultado]
+        else:
+            resultado = _decimais_como_texto(resultado)
+        return Response({'tipo': tipo, 'empresa': int(empresa), 'data': data, 'resultado': resultado})
+
+
+class BalanceteView(APIView):
+    """Balancete do plano de contas ou dos centros de custo, com os totais propagados aos ancestrais.
+
+    Parâmetros: ``arvore`` (plano-contas ou centros-custo), ``empresa`` (id),
+    ``data_inicio`` (padrão: primeiro dia do mês) e ``data_fim`` (padrão: hoje).
+    """
+
+    def get(self, request, arvore):
+        if arvore not in ARVORES:
+            raise NotFound('Árvore inválida, use plano-contas ou centros-custo.')
+        empresa = request.query_params.get('empresa')
+        if not empresa or not empresa.isdigit():
+            raise ValidationError({'empresa': 'Informe o id da empresa.'})
+        exigir_empresa(empresa)
+        data_fim = _data_parametro(request, 'data_fim')
+        if request.query_params.get('data_inicio'):
+            data_inicio = _data_parametro(request, 'data_inicio')
+        else:
+            data_inicio = data_fim.replace(day=1)
+
+        linhas = balancete(arvore, int(empresa), data_inicio, data_fim)
+        return Response({
+            'arvore': arvore, 'empresa': int(empresa), 'data_inicio': data_inicio, 'data_fim': data_fim,
+            'resultado': [_decimais_como_texto(linha) for linha in linhas],
+        })
+
+
+class FluxoCaixaProjetadoView(APIView):
+    """Posição diária projetada de cada conta bancária a partir dos títulos em aberto.
+
+    Parâmetros: ``empresa`` (id), ``data`` (início da projeção, padrão hoje) e
+    ``dias`` (horizonte, padrão 90, máximo 366).
+    """
+
+    def get(self, request):
+        empresa = request.query_params.get('empresa')
+        if not empresa or not empresa.isdigit():
+            raise ValidationError({'empresa': 'Informe o id da empresa.'})
+        exigir_empresa(empresa)
+        data = _data_parametro(request)
+        dias = request.query_params.get('dias') or str(DIAS_PADRAO)
+        if not dias.isdigit() or int(dias) > MAX_DIAS:
+            raise ValidationError({'dias': f'Informe um número de dias entre 0 e {MAX_DIAS}.'})
+
+        contas = projetar(int(empresa), data, int(dias))
+        return Response({
+            'empresa': int(empresa), 'data': data, 'dias': int(dias),
+            'contas': [
+                {**_decimais_como_texto({chave: valor for chave, valor in conta.items() if chave != 'serie'}),
+                 'serie': [_decimais_como_texto(dia) for dia in conta['serie']]}
+                for conta in contas
+            ],
+        })
+
+
+class ExportacaoTitulosView(APIView):
+    """Exporta títulos a receber/pagar em CSV ou XLSX sem carregar o queryset em memória.
+
+    Parâmetros: ``formato`` (csv ou xlsx), ``empresa``, ``situacao``,
+    ``vencimento_de`` e ``vencimento_ate``.
+    """
+
+    def get(self, request, tipo):
+        if tipo not in TITULOS:
+            raise NotFound('Tipo de título inválido.')
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            raise ValidationError({'formato': 'Formato inválido, use csv ou xlsx.'})
+
+        model, _ = TITULOS[tipo]
+        vencimento_de, vencimento_ate = _periodo(request, 'vencimento')
+        titulos = titulos_do_periodo(model, vencimento_de, vencimento_ate)
+        empresa = request.query_params.get('empresa')
+        if empresa:
+            if not empresa.isdigit():
+                raise ValidationError({'empresa': 'Informe o id da empresa.'})
+            titulos = titulos.filter(empresa_id=empresa)
+        if request.query_params.get('situacao'):
+            titulos = titulos.filter(situacao=request.query_params['situacao'])
+        if vencimento_de:
+            titulos = titulos.filter(data_vencimento__gte=vencimento_de)
+        if vencimento_ate:
+            titulos = titulos.filter(data_vencimento__lte=vencimento_ate)
+        return FORMATOS[formato](titulos)
+
+
+class ImportacaoExtratoView(APIView):
+    """Importa um extrato OFX ou arquivo de retorno CNAB 240/400 e concilia com a conta bancária.
+
+    Recebe o arquivo em ``arquivo`` (multipart), o id da ``conta_bancaria`` e,
+    opcionalmente, ``formato`` (ofx, cnab240 ou cnab400; padrão é detectar) e
+    ``tolerancia_dias`` entre o vencimento do título e a data da linha (padrão 5).
+    """
+
+    def post(self, request):
+        upload = request.FILES.get('arquivo')
+        if upload is None:
+            raise ValidationError({'arquivo': 'Envie o arquivo do extrato.'})
+        conta = str(request.data.get('conta_bancaria') or '')
+        if not conta.isdigit():
+            raise ValidationError({'conta_bancaria': 'Informe o id da conta bancária.'})
+        try:
+            conta = ContasBancarias.objects.get(pk=conta)
+        except ContasBancarias.DoesNotExist:
+            raise ValidationError({'conta_bancaria': 'Conta bancária não encontrada.'})
+        formato = request.data.get('formato') or None
+        if formato and formato not in LEITORES:
+            raise ValidationError({'formato': 'Formato inválido, use ofx, cnab240 ou cnab400.'})
+        tolerancia = str(request.data.get('tolerancia_dias') or TOLERANCIA_DIAS)
+        if not tolerancia.isdigit():
+            raise ValidationError({'tolerancia_dias': 'Informe um número de dias.'})
+
+        try:
+            resultado = conciliar_extrato(ler_extrato(upload, formato), conta, int(tolerancia), usuario=request.user)
+        except ValueError as e:
+            raise ValidationError({'arquivo': str(e)})
+
+        return Response({
+            'conta_bancaria': conta.pk,
+            'linhas': resultado.linhas,
+            'titulos_baixados': resultado.titulos_baixados,
+            'valor_baixado': str(resultado.valor_baixado),
+            'ja_lancadas': resultado.ja_lancadas,
+            'total_nao_conciliadas': len(resultado.nao_conciliadas),
+            'nao_conciliadas': [
+                {'linha': linha.linha, 'data': linha.data, 'valor': str(linha.valor), 'documento': linha.documento,
+                 'descricao': linha.descricao, 'motivo': motivo}
+                for linha, motivo in resultado.nao_conciliadas[:MAX_PENDENCIAS_RESPOSTA]
+            ],
+        })
+
+
+def _id_parametro(request, nome):
+    valor = request.query_params.get(nome)
+    if valor and not valor.isdigit():
+        raise ValidationError({nome: f'Informe o id de {nome}.'})
+    return valor
+
+
+class _ConsultaFinanceiraViewSet(CamposEsparsosMixin, viewsets.ReadOnlyModelViewSet):
+    """Base das consultas: paginação por chave, ``?fields=`` e filtros por query string.
+
+    ``filtros_id`` são filtros por id (``?empresa=1``), ``filtros_valor`` por
+    valor exato e ``filtros_data`` mapeiam ``?<nome>_de``/``?<nome>_ate`` para
+    um campo de data.
+    """
+    pagination_class = PaginacaoPorChave
+    filtros_id = ['empresa']
+    filtros_valor = []
+    filtros_data = {}
+
+    def get_queryset(self):
+        # O queryset da classe é criado na importação, fora do escopo da requisição: refeito pelo manager
+        model = type(self).queryset.model
+        if model in ARQUIVOS:
+            # Títulos: com arquivados no período de vencimento pedido, lê o histórico
+            self.queryset = titulos_do_periodo(model, *_periodo(self.request, 'vencimento'))
+        else:
+            self.queryset = model.objects.all()
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        for nome in self.filtros_id:
+            if _id_parametro(self.request, nome):
+                queryset = queryset.filter(**{f'{nome}_id': params[nome]})
+        for nome in self.filtros_valor:
+            if params.get(nome):
+                queryset = queryset.filter(**{nome: params[nome]})
+        for nome, campo in self.filtros_data.items():
+            if params.get(f'{nome}_de'):
+                queryset = queryset.filter(**{f'{campo}__gte': _data_parametro(self.request, f'{nome}_de')})
+            if params.get(f'{nome}_ate'):
+                queryset = queryset.filter(**{f'{campo}__lte': _data_parametro(self.request, f'{nome}_ate')})
+        return queryset
+
+
+class ContasReceberViewSet(_ConsultaFinanceiraViewSet):
+    """Contas a receber, por vencimento. Filtros: ``empresa``, ``cliente``, ``situacao``,
+    ``vencimento_de`` e ``vencimento_ate``."""
+    queryset = ContasReceber.objects.all()
+    serializer_class = ContasReceberSerializer
+    ordenacao_cursor = ('data_vencimento', 'id')
+    filtros_id = ['empresa', 'cliente']
+    filtros_valor = ['situacao']
+    filtros_data = {'vencimento': 'data_vencimento'}
+
+
+class ContasPagarViewSet(_ConsultaFinanceiraViewSet):
+    """Contas a pagar, por vencimento. Filtros: ``empresa``, ``fornecedor``, ``situacao``,
+    ``vencimento_de`` e ``vencimento_ate``."""
+    queryset = ContasPagar.objects.all()
+    serializer_class = ContasPagarSerializer
+    ordenacao_cursor = ('data_vencimento', 'id')
+    filtros_id = ['empresa', 'fornecedor']
+    filtros_valor = ['situacao']
+    filtros_data = {'vencimento': 'data_vencimento'}
+
+
+class MovimentacaoFinanceiraViewSet(_ConsultaFinanceiraViewSet):
+    """Movimentações financeiras, da mais recente para a mais antiga. Filtros: ``empresa``,
+    ``conta_bancaria``, ``tipo``, ``data_de`` e ``data_ate``."""
+    queryset = MovimentacaoFinanceira.objects.all()
+    serializer_class = MovimentacaoFinanceiraSerializer
+    ordenacao_cursor = ('-data', '-id')
+    filtros_id = ['empresa', 'conta_bancaria']
+    filtros_valor = ['tipo']
+    filtros_data = {'data': 'data'}
@@ -1,11 +1,70 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
 from django.utils.html import format_html
+from . import categorias
+from .busca import aplicar_busca, aplicar_busca_pessoas
+from .estoque import lancar_movimentacoes
 from .models import (
     Pessoa, Cliente, Fornecedor, Funcionario, Categoria, UnidadeMedida,
-    Produto, Estoque, MovimentacaoEstoque
+    Produto, Estoque, MovimentacaoEstoque, CustoEstoque, FechamentoEstoque, AlertaEstoque
 )
 
 
+class SubarvoreCategoriaFilter(admin.SimpleListFilter):
+    """Filtro por categoria que inclui as subcategorias, montado a partir da árvore em memória"""
+    title = 'categoria (com subcategorias)'
+    parameter_name = 'categoria_arvore'
+    campo = 'categoria'
+
+    def lookups(self, request, model_admin):
+        arvore = categorias.arvore()
+        return [(pk, f'{"— " * nivel}{arvore.nomes[pk]}') for pk, nivel in arvore.em_ordem()]
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return categorias.filtrar_por_categoria(queryset, int(self.value()), self.campo)
+        return queryset
+
+
+class CategoriaPaiFilter(SubarvoreCategoriaFilter):
+    title = 'categoria pai (com subcategorias)'
+    parameter_name = 'pai_arvore'
+    campo = 'pai'
+
+
+class AlertaEstoqueFilter(admin.SimpleListFilter):
+    """Produtos com alerta de estoque nas empresas do escopo (ver ``operacional.alertas``)"""
+    title = 'alerta de estoque'
+    parameter_name = 'alerta_estoque'
+
+    def lookups(self, request, model_admin):
+        return AlertaEstoque._meta.get_field('situacao').choices
+
+    def queryset(self, request, queryset):
+        if self.value() in dict(self.lookup_choices):
+            return queryset.filter(pk__in=AlertaEstoque.objects.filter(situacao=self.value()).values('produto_id'))
+        return queryset
+
+
+class BuscaPessoaAdminMixin:
+    """Pesquisa pelo CPF/CNPJ normalizado ou pelo nome usando os índices de Pessoa, em vez de ILIKE.
+
+    ``campos_exatos`` (ex.: o código do cliente) são verificados antes, por igualdade.
+    """
+    campo_pessoa = None
+    campos_exatos = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        for campo in self.campos_exatos:
+            exatos = queryset.filter(**{campo: search_term})
+            if exatos.exists():
+                return exatos, False
+        return aplicar_busca_pessoas(queryset, search_term, self.campo_pessoa), False
+
+
 class ClienteInline(admin.StackedInline):
     model = Cliente
     extra = 0
@@ -22,16 +81,17 @@ class FuncionarioInline(admin.StackedInline):
 
 
 @admin.register(Pessoa)
-class PessoaAdmin(admin.ModelAdmin):
+class PessoaAdmin(BuscaPessoaAdminMixin, admin.ModelAdmin):
     list_display = ['nome', 'tipo_pessoa', 'cpf_cnpj', 'telefone', 'email', 'empresa']
+    list_select_related = ['empresa']
     list_filter = ['tipo_pessoa', 'empresa', 'is_active']
-    search_fields = ['nome', 'cpf_cnpj', 'email']
-    readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
+    search_fields = ['nome', 'cpf_cnpj']
+    readonly_fields = ['documento', 'created_at', 'updated_at', 'created_by', 'updated_by']
     inlines = [ClienteInline, FornecedorInline, FuncionarioInline]
     
     fieldsets = (
         ('Informações Básicas', {
-            'fields': ('nome', 'tipo_pessoa', 'cpf_cnpj', 'rg_ie')
+            'fields': ('nome', 'tipo_pessoa', 'cpf_cnpj', 'documento', 'rg_ie')
         }),
         ('Contato', {
             'fields': ('endereco', 'telefone', 'celular', 'email')
@@ -59,10 +119,13 @@ class PessoaAdmin(admin.ModelAdmin):
 
 
 @admin.register(Cliente)
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdmin(BuscaPessoaAdminMixin, admin.ModelAdmin):
     list_display = ['codigo', 'pessoa', 'limite_credito', 'prazo_pagamento', 'data_cadastro']
+    list_select_related = ['pessoa']
     list_filter = ['data_cadastro', 'is_active']
     search_fields = ['codigo', 'pessoa__nome', 'pessoa__cpf_cnpj']
+    campo_pessoa = 'pessoa'
+    campos_exatos = ['codigo']
     readonly_fields = ['data_cadastro', 'created_at', 'updated_at', 'created_by', 'updated_by']
     
     def save_model(self, request, obj, form, change):
@@ -73,10 +136,13 @@ class ClienteAdmin(admin.ModelAdmin):
 
 
 @admin.register(Fornecedor)
-class FornecedorAdmin(admin.ModelAdmin):
+class FornecedorAdmin(BuscaPessoaAdminMixin, admin.ModelAdmin):
     list_display = ['codigo', 'pessoa', 'prazo_entrega', 'data_cadastro']
+    list_select_related = ['pessoa']
     list_filter = ['data_cadastro', 'is_active']
     search_fields = ['codigo', 'pessoa__nome', 'pessoa__cpf_cnpj']
+    campo_pessoa = 'pessoa'
+    campos_exatos = ['codigo']
     readonly_fields = ['data_cadastro', 'created_at', 'updated_at', 'created_by', 'updated_by']
     
     def save_model(self, request, obj, form, change):
@@ -89,6 +155,7 @@ class FornecedorAdmin(admin.ModelAdmin):
 @admin.register(Funcionario)
 class FuncionarioAdmin(admin.ModelAdmin):
     list_display = ['codigo', 'pessoa', 'cargo', 'setor', 'salario', 'situacao']
+    list_select_related = ['pessoa']
     list_filter = ['situacao', 'cargo', 'setor', 'data_admissao']
     search_fields = ['codigo', 'pessoa__nome', 'cargo', 'setor']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
@@ -104,7 +171,8 @@ class FuncionarioAdmin(admin.ModelAdmin):
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
     list_display = ['nome', 'pai', 'is_active']
-    list_filter = ['pai', 'is_active']
+    list_select_related = ['pai']
+    list_filter = [CategoriaPaiFilter, 'is_active']
     search_fields = ['nome', 'descricao']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
     
@@ -132,7 +200,8 @@ class UnidadeMedidaAdmin(admin.ModelAdmin):
 @admin.register(Produto)
 class ProdutoAdmin(admin.ModelAdmin):
     list_display = ['codigo', 'nome', 'categoria', 'preco_venda', 'tipo', 'controla_estoque']
-    list_filter = ['categoria', 'tipo', 'controla_estoque', 'is_active']
+    list_select_related = ['categoria']
+    list_filter = [SubarvoreCategoriaFilter, AlertaEstoqueFilter, 'tipo', 'controla_estoque', 'is_active']
     search_fields = ['codigo', 'nome', 'codigo_barras']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
     
@@ -158,6 +227,13 @@ class ProdutoAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_search_results(self, request, queryset, search_term):
+        # Usa os índices da busca de produtos em vez de ILIKE '%termo%' em três colunas
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return aplicar_busca(queryset, search_term), False
+
     def save_model(self, request, obj, form, change):
         if not change:
             obj.created_by = request.user
@@ -168,14 +244,15 @@ class ProdutoAdmin(admin.ModelAdmin):
 @admin.register(Estoque)
 class EstoqueAdmin(admin.ModelAdmin):
     list_display = ['produto', 'quantidade', 'valor_unitario', 'valor_total_display', 'localizacao', 'empresa']
+    list_select_related = ['produto', 'empresa']
     list_filter = ['empresa', 'data_validade', 'is_active']
     search_fields = ['produto__codigo', 'produto__nome', 'lote', 'localizacao']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
     
     def valor_total_display(self, obj):
         return format_html(
-            '<span style="color: blue;">R$ {:.2f}</span>',
-            obj.valor_total
+            '<span style="color: blue;">R$ {}</span>',
+            f'{obj.valor_total:.2f}'
         )
     valor_total_display.short_description = 'Valor Total'
     
@@ -188,14 +265,71 @@ class EstoqueAdmin(admin.ModelAdmin):
 
 @admin.register(MovimentacaoEstoque)
 class MovimentacaoEstoqueAdmin(admin.ModelAdmin):
-    list_display = ['produto', 'tipo', 'quantidade', 'valor_unitario', 'data_movimentacao', 'empresa']
+    list_display = ['produto', 'tipo', 'quantidade', 'valor_unitario', 'lote', 'data_movimentacao',
+                    'empresa', 'lancado_em']
+    list_select_related = ['produto', 'empresa']
     list_filter = ['tipo', 'data_movimentacao', 'empresa']
     search_fields = ['produto__codigo', 'produto__nome', 'motivo', 'numero_documento']
-    readonly_fields = ['data_movimentacao', 'created_at', 'updated_at', 'created_by', 'updated_by']
+    readonly_fields = ['data_movimentacao', 'lancado_em', 'created_at', 'updated_at', 'created_by', 'updated_by']
     date_hierarchy = 'data_movimentacao'
+    actions = ['lancar_no_estoque']
+
+    @admin.action(description='Lançar no estoque')
+    def lancar_no_estoque(self, request, queryset):
+        try:
+            total = lancar_movimentacoes(queryset.filter(lancado_em__isnull=True))
+        except ValidationError as e:
+            self.message_user(request, '; '.join(e.messages), messages.ERROR)
+        else:
+            self.message_user(request, f'{total} movimentação(ões) lançada(s) no estoque.', messages.SUCCESS)
     
     def save_model(self, request, obj, form, change):
         if not change:
             obj.created_by = request.user
         obj.updated_by = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(CustoEstoque)
+class CustoEstoqueAdmin(admin.ModelAdmin):
+    """Custo calculado pelo comando calcular_custo_estoque; somente leitura"""
+    list_display = ['produto', 'empresa', 'metodo', 'quantidade', 'custo_unitario', 'valor', 'ultima_data']
+    list_select_related = ['produto', 'empresa']
+    list_filter = ['metodo', 'empresa']
+    search_fields = ['produto__codigo', 'produto__nome']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FechamentoEstoque)
+class FechamentoEstoqueAdmin(admin.ModelAdmin):
+    """Fechamentos gerados pelo comando fechar_estoque; somente leitura"""
+    list_display = ['mes', 'produto', 'lote', 'quantidade', 'custo_unitario', 'empresa']
+    list_select_related = ['produto', 'empresa']
+    list_filter = ['mes', 'empresa']
+    search_fields = ['produto__codigo', 'produto__nome', 'lote']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AlertaEstoque)
+class AlertaEstoqueAdmin(admin.ModelAdmin):
+    """Alertas mantidos por operacional.alertas; somente leitura"""
+    list_display = ['produto', 'empresa', 'situacao', 'quantidade', 'limite', 'desde']
+    list_select_related = ['produto', 'empresa']
+    list_filter = ['situacao', 'empresa']
+    search_fields = ['produto__codigo', 'produto__nome']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,106 @@
+"""
+Alertas de estoque abaixo do mínimo e acima do máximo.
+
+O saldo de cada produto na empresa (``Estoque.quantidade`` somado entre os
+lotes) é comparado com ``Produto.estoque_minimo``/``estoque_maximo`` em uma
+única consulta agrupada, que também grava o resultado em ``AlertaEstoque``:
+insere os novos alertas, atualiza só os que mudaram e exclui os que deixaram
+de existir. Limite zero não é avaliado; produtos sem controle de estoque não
+têm alerta.
+
+- o lançamento no estoque (``operacional.estoque.lancar_movimentacoes``)
+  reavalia só os produtos e empresas lançados, na mesma transação;
+- alterar um produto reavalia o produto em todas as empresas (signal);
+- o comando ``avaliar_alertas_estoque`` reavalia tudo.
+
+Só são avaliados os produtos com linha de estoque na empresa.
+"""
+
+from dataclasses import dataclass
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import AlertaEstoque, Estoque, Produto
+
+
+@dataclass
+class ResultadoAlertas:
+    gravados: int = 0
+    removidos: int = 0
+
+
+_AVALIAR = f"""
+    WITH saldos AS (
+        SELECT e.empresa_id, e.produto_id, sum(e.quantidade) AS quantidade, p.estoque_minimo, p.estoque_maximo
+        FROM {Estoque._meta.db_table} e
+        JOIN {Produto._meta.db_table} p ON p.id = e.produto_id
+        WHERE p.controla_estoque AND (p.estoque_minimo > 0 OR p.estoque_maximo > 0) AND {{estoque}}
+        GROUP BY e.empresa_id, e.produto_id, p.estoque_minimo, p.estoque_maximo
+    ), avaliados AS (
+        SELECT empresa_id, produto_id, quantidade,
+               CASE WHEN quantidade < estoque_minimo THEN 'abaixo_minimo' ELSE 'acima_maximo' END AS situacao,
+               CASE WHEN quantidade < estoque_minimo THEN estoque_minimo ELSE estoque_maximo END AS limite
+        FROM saldos
+        WHERE (estoque_minimo > 0 AND quantidade < estoque_minimo)
+           OR (estoque_maximo > 0 AND quantidade > estoque_maximo)
+    ), removidos AS (
+        DELETE FROM {AlertaEstoque._meta.db_table} a
+        WHERE {{alerta}} AND NOT EXISTS (
+            SELECT 1 FROM avaliados v WHERE v.empresa_id = a.empresa_id AND v.produto_id = a.produto_id
+        )
+        RETURNING 1
+    ), gravados AS (
+        INSERT INTO {AlertaEstoque._meta.db_table} AS a
+            (empresa_id, produto_id, situacao, quantidade, limite, desde, atualizado_em)
+        SELECT empresa_id, produto_id, situacao, quantidade, limite, %(agora)s, %(agora)s FROM avaliados
+        ON CONFLICT (empresa_id, produto_id) DO UPDATE SET
+            situacao = excluded.situacao, quantidade = excluded.quantidade, limite = excluded.limite,
+            desde = CASE WHEN a.situacao = excluded.situacao THEN a.desde ELSE excluded.desde END,
+            atualizado_em = excluded.atualizado_em
+        WHERE (a.situacao, a.quantidade, a.limite)
+              IS DISTINCT FROM (excluded.situacao, excluded.quantidade, excluded.limite)
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM gravados), (SELECT count(*) FROM removidos)
+"""
+
+# Filtros das linhas de estoque e dos alertas reavaliados: tudo, alguns produtos ou pares (produto, empresa)
+_FILTROS = {
+    'todos': ('TRUE', 'TRUE'),
+    'produtos': ('e.produto_id = ANY(%(produtos)s)', 'a.produto_id = ANY(%(produtos)s)'),
+    # Nas chaves, os produtos sem limite saem antes de somar o estoque: um produto com milhares de lotes e sem
+    # alerta não custa a leitura dos lotes a cada lançamento
+    'chaves': (
+        f'(e.produto_id, e.empresa_id) IN (SELECT u.produto_id, u.empresa_id '
+        f'FROM unnest(%(produtos)s::bigint[], %(empresas)s::bigint[]) AS u(produto_id, empresa_id) '
+        f'JOIN {Produto._meta.db_table} l ON l.id = u.produto_id AND l.controla_estoque '
+        f'AND (l.estoque_minimo > 0 OR l.estoque_maximo > 0))',
+        '(a.produto_id, a.empresa_id) IN (SELECT * FROM unnest(%(produtos)s::bigint[], %(empresas)s::bigint[]))',
+    ),
+}
+
+
+def avaliar_alertas(chaves=None, produtos=None):
+    """Reavalia os alertas de estoque e grava só o que mudou.
+
+    ``chaves``: pares ``(produto_id, empresa_id)``; ``produtos``: ids, em
+    todas as empresas; sem nenhum dos dois, todos os produtos. Ignora o
+    escopo de empresa. Retorna ``ResultadoAlertas``.
+    """
+    parametros = {'agora': timezone.now()}
+    if chaves is not None:
+        chaves = sorted(set(chaves))
+        if not chaves:
+            return ResultadoAlertas()
+        filtro = 'chaves'
+        parametros.update(produtos=[p for p, _ in chaves], empresas=[e for _, e in chaves])
+    elif produtos is not None:
+        filtro = 'produtos'
+        parametros['produtos'] = sorted(set(produtos))
+    else:
+        filtro = 'todos'
+    estoque, alerta = _FILTROS[filtro]
+    with connection.cursor() as cursor:
+        cursor.execute(_AVALIAR.format(estoque=estoque, alerta=alerta), parametros)
+        return ResultadoAlertas(*cursor.fetchone())
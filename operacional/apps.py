@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class OperacionalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'operacional'
-    verbose_name = 'Módulo Operacional'
\ No newline at end of file
+    verbose_name = 'Módulo Operacional'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,171 @@
+"""
+Busca de produtos (código, código de barras e nome) e de pessoas (CPF/CNPJ e nome).
+
+Uma única consulta combina, com ``OR``, condições que o PostgreSQL resolve por
+índice e une num ``BitmapOr``:
+
+- código ou código de barras exatos (B-tree);
+- prefixo do código (``varchar_pattern_ops``);
+- palavras do nome/código por prefixo (full-text, GIN ``produto_busca_texto_idx``);
+- semelhança do nome por trigramas, quando a extensão ``pg_trgm`` está instalada.
+
+Os resultados são ordenados por relevância: coincidência exata, prefixo do
+código, ``ts_rank`` do texto e semelhança por trigramas. Para a latência não
+crescer com termos muito comuns ("suco" em milhares de produtos), a relevância
+é calculada só sobre os primeiros ``LIMITE_CANDIDATOS`` encontrados; quem
+digita mais palavras estreita os candidatos. Um código ou código de barras
+exato (leitor de código de barras) é respondido antes, direto pelo B-tree.
+
+Pessoas são localizadas pela coluna ``documento`` (só os dígitos do CPF/CNPJ,
+com índice único que também serve ao prefixo) quando o termo é um número, e
+pelo nome (full-text ``pessoa_busca_nome_idx`` e trigramas) nos demais casos.
+"""
+
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+
+from .categorias import filtrar_por_categoria
+from .models import Pessoa, Produto
+
+LIMITE_PADRAO = 20
+LIMITE_CANDIDATOS = 1000
+
+_extensao_trigrama = {}
+
+
+def trigrama_disponivel(alias='default'):
+    """Se a extensão pg_trgm está instalada no banco (verificado uma vez por processo)"""
+    if alias not in _extensao_trigrama:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _extensao_trigrama[alias] = cursor.fetchone() is not None
+    return _extensao_trigrama[alias]
+
+
+def _consulta_texto(termo):
+    """``SearchQuery`` com todas as palavras do termo por prefixo (``agua & min:*``)"""
+    palavras = re.findall(r'\w+', termo.lower())
+    if not palavras:
+        return None
+    return SearchQuery(' & '.join(f'{palavra}:*' for palavra in palavras), search_type='raw', config='simple')
+
+
+def _relacionado(campo, nome):
+    return f'{campo}__{nome}' if campo else nome
+
+
+def _exato(termo):
+    return Q(codigo=termo) | Q(codigo_barras=termo)
+
+
+def aplicar_busca(queryset, termo, limite_candidatos=None):
+    """Filtra ``queryset`` de produtos pelo termo e anota ``relevancia``"""
+    exato = _exato(termo)
+    condicao = exato | Q(codigo__startswith=termo)
+    relevancia = Case(
+        When(exato, then=Value(10.0)),
+        When(codigo__startswith=termo, then=Value(5.0)),
+        default=Value(0.0), output_field=FloatField(),
+    )
+
+    consulta = _consulta_texto(termo)
+    if consulta is not None:
+        # A expressão precisa ser a mesma do índice produto_busca_texto_idx
+        vetor = SearchVector('nome', 'codigo', config='simple')
+        queryset = queryset.alias(texto=vetor)
+        condicao |= Q(texto=consulta)
+        relevancia = relevancia + SearchRank(vetor, consulta)
+
+    if trigrama_disponivel(queryset.db):
+        condicao |= Q(nome__trigram_similar=termo)
+        relevancia = relevancia + TrigramSimilarity('nome', termo)
+
+    queryset = queryset.filter(condicao)
+    if limite_candidatos:
+        # Sem ordenação no subselect: o LIMIT corta o BitmapOr em vez de percorrer o índice do código
+        candidatos = queryset.order_by().values('pk')[:limite_candidatos]
+        queryset = queryset.model.objects.filter(pk__in=candidatos)
+    return queryset.annotate(relevancia=relevancia)
+
+
+def buscar_produtos(termo, limite=LIMITE_PADRAO, categoria=None, apenas_ativos=True):
+    """Lista dos produtos mais relevantes para ``termo``, opcionalmente na subárvore de ``categoria``"""
+    termo = (termo or '').strip()
+    if not termo:
+        return []
+    produtos = Produto.objects.all()
+    if apenas_ativos:
+        produtos = produtos.filter(is_active=True)
+    if categoria is not None:
+        produtos = filtrar_por_categoria(produtos, categoria)
+
+    relacionados = ('categoria', 'unidade_medida')
+    if ' ' not in termo:
+        exatos = list(produtos.filter(_exato(termo)).select_related(*relacionados).annotate(
+            relevancia=Value(10.0, output_field=FloatField())).order_by('codigo')[:limite])
+        if exatos:
+            return exatos
+    return list(aplicar_busca(produtos, termo, LIMITE_CANDIDATOS).select_related(*relacionados).order_by(
+        '-relevancia', 'nome', 'pk')[:limite])
+
+
+def documento(termo):
+    """Dígitos do termo quando ele é um CPF/CNPJ, completo ou parcial (``123.456-``); senão ``None``"""
+    if re.fullmatch(r'[\d.\-/\s]+', termo):
+        return re.sub(r'\D', '', termo) or None
+    return None
+
+
+def aplicar_busca_pessoas(queryset, termo, campo=None):
+    """Filtra pelo CPF/CNPJ ou pelo nome da pessoa e anota ``relevancia``.
+
+    ``queryset`` é de pessoas ou, com ``campo`` (ex.: ``'pessoa'``), de um model
+    com FK para Pessoa.
+    """
+    digitos = documento(termo)
+    if digitos is not None:
+        campo_documento = _relacionado(campo, 'documento')
+        # Repete a condição do índice parcial pessoa_documento_unico para o planner poder usá-lo
+        return queryset.exclude(**{campo_documento: ''}).filter(
+            **{f'{campo_documento}__startswith': digitos}
+        ).annotate(relevancia=Case(
+            When(**{campo_documento: digitos}, then=Value(10.0)),
+            default=Value(5.0), output_field=FloatField(),
+        ))
+
+    campo_nome = _relacionado(campo, 'nome')
+    condicao = Q(pk__in=[])
+    relevancia = Value(0.0, output_field=FloatField())
+    consulta = _consulta_texto(termo)
+    if consulta is not None:
+        # A expressão precisa ser a mesma do índice pessoa_busca_nome_idx
+        vetor = SearchVector(campo_nome, config='simple')
+        queryset = queryset.alias(texto_nome=vetor)
+        condicao |= Q(texto_nome=consulta)
+        relevancia = relevancia + SearchRank(vetor, consulta)
+    if trigrama_disponivel(queryset.db):
+        condicao |= Q(**{f'{campo_nome}__trigram_similar': termo})
+        relevancia = relevancia + TrigramSimilarity(campo_nome, termo)
+    return queryset.filter(condicao).annotate(relevancia=relevancia)
+
+
+def buscar_pessoas(termo, limite=LIMITE_PADRAO, empresa=None, papel=None, apenas_ativos=True):
+    """Pessoas mais relevantes para um CPF/CNPJ (com ou sem pontuação) ou parte do nome.
+
+    ``papel`` (``'cliente'``, ``'fornecedor'`` ou ``'funcionario'``) restringe às
+    pessoas com esse cadastro; o cadastro vem junto, sem consulta extra.
+    """
+    termo = (termo or '').strip()
+    if not termo:
+        return []
+    pessoas = Pessoa.objects.all()
+    if apenas_ativos:
+        pessoas = pessoas.filter(is_active=True)
+    if empresa is not None:
+        pessoas = pessoas.filter(empresa=empresa)
+    if papel is not None:
+        pessoas = pessoas.filter(**{f'{papel}__isnull': False}).select_related(papel)
+    return list(aplicar_busca_pessoas(pessoas, termo).order_by('-relevancia', 'nome', 'pk')[:limite])
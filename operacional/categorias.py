@@ -0,0 +1,109 @@
+"""
+Árvore de categorias de produtos em memória.
+
+A árvore inteira é carregada em uma consulta e mantida no processo; uma versão
+guardada no cache compartilhado do Django (incrementada no save/delete de
+``Categoria``) indica quando recarregar, inclusive nos demais workers, que a
+consultam no máximo a cada ``CATEGORIAS_VERIFICAR_A_CADA`` segundos. Com ela, "a categoria
+X e todas as suas subcategorias" é uma lista de ids, e filtrar produtos por
+uma subárvore é um único ``categoria_id IN (...)``.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+from core import versoes
+
+CHAVE_VERSAO = 'operacional:categorias:versao'
+
+_trava = threading.Lock()
+_estado = {'versao': None, 'arvore': None, 'verificado_em': 0.0}
+
+
+class ArvoreCategorias:
+    def __init__(self, categorias):
+        """``categorias``: iterável de (id, nome, pai_id)"""
+        self.nomes, self.pais, self.filhos = {}, {}, {}
+        for pk, nome, pai_id in categorias:
+            self.nomes[pk] = nome
+            self.pais[pk] = pai_id
+            self.filhos.setdefault(pai_id, []).append(pk)
+        for filhos in self.filhos.values():
+            filhos.sort(key=lambda pk: self.nomes[pk].lower())
+
+    def __contains__(self, pk):
+        return pk in self.nomes
+
+    def descendentes(self, pk, incluir_propria=True):
+        """Ids da subárvore de ``pk``"""
+        ids, vistos = [pk] if incluir_propria else [], {pk}
+        pendentes = list(self.filhos.get(pk, []))
+        while pendentes:
+            atual = pendentes.pop()
+            # Ciclo gravado fora do admin (que o impede em ``Categoria.clean``)
+            if atual in vistos:
+                continue
+            vistos.add(atual)
+            ids.append(atual)
+            pendentes.extend(self.filhos.get(atual, []))
+        return ids
+
+    def ancestrais(self, pk):
+        """Ids dos ancestrais de ``pk``, da raiz até o pai"""
+        ids, atual = [], self.pais.get(pk)
+        while atual is not None and atual not in ids:
+            ids.append(atual)
+            atual = self.pais.get(atual)
+        return ids[::-1]
+
+    def caminho(self, pk, separador=' > '):
+        return separador.join(self.nomes[i] for i in self.ancestrais(pk) + [pk])
+
+    def em_ordem(self):
+        """(id, nível) de todas as categorias em pré-ordem, para listas indentadas"""
+        pendentes = [(pk, 0) for pk in reversed(self.filhos.get(None, []))]
+        while pendentes:
+            pk, nivel = pendentes.pop()
+            yield pk, nivel
+            pendentes.extend((filho, nivel + 1) for filho in reversed(self.filhos.get(pk, [])))
+
+
+def _versao_compartilhada():
+    return versoes.versao(CHAVE_VERSAO)
+
+
+def arvore():
+    """Árvore de categorias deste processo, recarregada quando a versão compartilhada muda"""
+    agora = time.monotonic()
+    if (_estado['arvore'] is not None
+            and agora - _estado['verificado_em'] < getattr(settings, 'CATEGORIAS_VERIFICAR_A_CADA', 5)):
+        return _estado['arvore']
+    from .models import Categoria
+
+    with _trava:
+        versao = _versao_compartilhada()
+        if _estado['versao'] != versao or _estado['arvore'] is None:
+            _estado['arvore'] = ArvoreCategorias(Categoria.objects.values_list('pk', 'nome', 'pai_id'))
+            _estado['versao'] = versao
+        _estado['verificado_em'] = agora
+        return _estado['arvore']
+
+
+def descendentes(categoria, incluir_propria=True):
+    """Ids de ``categoria`` (instância ou id) e de todas as subcategorias"""
+    pk = getattr(categoria, 'pk', categoria)
+    return arvore().descendentes(pk, incluir_propria)
+
+
+def filtrar_por_categoria(queryset, categoria, campo='categoria'):
+    """Filtra ``queryset`` pela subárvore de ``categoria`` com um único ``IN``"""
+    return queryset.filter(**{f'{campo}_id__in': descendentes(categoria)})
+
+
+def invalidar():
+    """Descarta a árvore deste processo e avisa os demais incrementando a versão"""
+    versoes.incrementar(CHAVE_VERSAO)
+    with _trava:
+        _estado.update(versao=None, arvore=None, verificado_em=0.0)
@@ -0,0 +1,334 @@
+"""
+Custo do estoque: custo médio ponderado móvel e PEPS (primeiro a entrar,
+primeiro a sair).
+
+As movimentações de estoque são repassadas em ordem de ``data_movimentacao``
+(e id) em uma única leitura em fluxo (cursor do servidor). O estado de cada
+produto na empresa — quantidade, valor em estoque, custo unitário e, no PEPS,
+as camadas de custo — fica em ``CustoEstoque`` junto com a última movimentação
+processada, e cada movimentação é marcada ao entrar no custo
+(``custo_calculado_em`` e, no destino das transferências,
+``custo_destino_calculado_em``), de modo que as execuções seguintes só leem as
+pendentes. O custo unitário resultante vai para ``Estoque.valor_unitario``
+das linhas do produto na empresa, de onde sai o relatório de estoque
+valorizado (``operacional.estoque.linhas_estoque_valorizado``).
+
+- entrada e ajuste positivo: entram pelo valor unitário da movimentação (o
+  ajuste sem valor entra pelo custo atual);
+- saída e ajuste negativo: saem pelo custo médio ou consomem as camadas mais
+  antigas;
+- transferência: sai da origem pelo custo dela e entra no destino com o mesmo
+  valor (pelo valor unitário da movimentação, se a origem não estiver no
+  cálculo).
+
+Saídas sem saldo deixam o estoque negativo, valorizado pelo último custo; a
+entrada seguinte cobre a falta pelo custo dela.
+
+Os cálculos usam inteiros — quantidades em milésimos e valores com cinco
+casas —, exatos e bem mais rápidos que ``Decimal``; as camadas do PEPS ficam
+em ``array`` de inteiros, consumidas pelo início. Movimentações pendentes com
+data anterior à última processada do produto — lançamentos retroativos ou
+gravadas por uma transação confirmada depois do cálculo — só entram
+recalculando desde o início (``refazer``): o cálculo incremental as recusa.
+"""
+
+from array import array
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, F, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from core.multiempresa import sem_escopo
+from .models import CustoEstoque, Estoque, MovimentacaoEstoque
+
+METODOS = ('medio', 'peps')
+CASAS_QUANTIDADE = 3
+CASAS_VALOR = 5
+MIL = 10 ** CASAS_QUANTIDADE
+BLOCO = 10000
+
+
+def _dividir(numerador, denominador):
+    """Divisão inteira arredondada (meio para cima); ``denominador`` positivo"""
+    return (2 * numerador + denominador) // (2 * denominador)
+
+
+def _inteiro(valor, casas):
+    return int(valor.scaleb(casas))
+
+
+@dataclass
+class ResultadoValorizacao:
+    movimentacoes: int = 0
+    produtos: int = 0
+
+
+class _Custo:
+    """Estado do custo de um produto na empresa, em inteiros (milésimos e cinco casas)"""
+    __slots__ = ('peps', 'quantidade', 'valor', 'custo', 'quantidades', 'valores', 'inicio',
+                 'ultima', 'alterado')
+
+    def __init__(self, peps, quantidade=0, valor=0, custo=0, quantidades=(), valores=(), ultima=None):
+        self.peps = peps
+        self.quantidade, self.valor, self.custo = quantidade, valor, custo
+        self.quantidades, self.valores, self.inicio = array('q', quantidades), array('q', valores), 0
+        # (data, id) da última movimentação processada
+        self.ultima = ultima
+        self.alterado = False
+
+    def entrar(self, quantidade, valor):
+        custo_entrada = _dividir(valor * MIL, quantidade)
+        if self.quantidade < 0:
+            # A entrada cobre primeiro a falta deixada pelas saídas sem saldo, pelo custo dela
+            quantidade += self.quantidade
+            self.quantidade = self.valor = 0
+            if quantidade <= 0:
+                self.quantidade, self.valor = quantidade, _dividir(custo_entrada * quantidade, MIL)
+                self.custo = custo_entrada
+                return
+            valor = _dividir(custo_entrada * quantidade, MIL)
+        self.quantidade += quantidade
+        self.valor += valor
+        if self.peps:
+            self.quantidades.append(quantidade)
+            self.valores.append(valor)
+        self.custo = _dividir(self.valor * MIL, self.quantidade)
+
+    def sair(self, quantidade):
+        """Baixa a quantidade e retorna o valor que saiu"""
+        disponivel = max(min(quantidade, self.quantidade), 0)
+        if not disponivel:
+            valor = 0
+        elif self.peps:
+            valor = self._consumir(disponivel)
+        else:
+            valor = _dividir(self.valor * disponivel, self.quantidade)
+        # Sem saldo: o que falta sai pelo último custo
+        valor += _dividir(self.custo * (quantidade - disponivel), MIL)
+        self.quantidade -= quantidade
+        self.valor -= valor
+        if self.quantidade > 0:
+            self.custo = _dividir(self.valor * MIL, self.quantidade)
+        return valor
+
+    def _consumir(self, quantidade):
+        quantidades, valores, valor = self.quantidades, self.valores, 0
+        while quantidade:
+            i = self.inicio
+            if quantidades[i] <= quantidade:
+                quantidade -= quantidades[i]
+                valor += valores[i]
+                self.inicio += 1
+            else:
+                parte = _dividir(valores[i] * quantidade, quantidades[i])
+                quantidades[i] -= quantidade
+                valores[i] -= parte
+                valor += parte
+                quantidade = 0
+        if self.inicio * 2 > len(quantidades):
+            # Camadas consumidas saem do início do array quando passam da metade
+            del quantidades[:self.inicio], valores[:self.inicio]
+            self.inicio = 0
+        return valor
+
+    def camadas(self):
+        """Camadas não consumidas, em literais de array do PostgreSQL"""
+        return (f'{{{",".join(map(str, self.quantidades[self.inicio:]))}}}',
+                f'{{{",".join(map(str, self.valores[self.inicio:]))}}}')
+
+
+class _Valorizador:
+    def __init__(self, empresas, metodo, refazer):
+        self.empresas, self.metodo, self.refazer = empresas, metodo, refazer
+        self.custos = {}
+        # Ids das movimentações a marcar como calculadas, na origem e no destino
+        self.calculadas, self.calculadas_destino = array('q'), array('q')
+        self.retroativas = set()
+        self.resultado = ResultadoValorizacao()
+
+    def _no_calculo(self, empresa_id):
+        return self.empresas is None or empresa_id in self.empresas
+
+    def _carregar(self, chaves):
+        """Carrega (ou cria vazios) os custos das chaves ``(produto_id, empresa_id)`` ainda não lidos"""
+        faltantes = {chave for chave in chaves if chave not in self.custos}
+        if not faltantes:
+            return
+        peps = self.metodo == 'peps'
+        registros = CustoEstoque.objects.filter(
+            produto_id__in={p for p, _ in faltantes}, empresa_id__in={e for _, e in faltantes},
+        ).values_list('produto_id', 'empresa_id', 'quantidade', 'valor', 'custo_unitario',
+                      'camadas_quantidade', 'camadas_valor', 'ultima_data', 'ultima_movimentacao')
+        for produto, empresa, quantidade, valor, custo, quantidades, valores, data, ultima in registros:
+            if (produto, empresa) in faltantes:
+                self.custos[produto, empresa] = _Custo(
+                    peps, _inteiro(quantidade, CASAS_QUANTIDADE), _inteiro(valor, CASAS_VALOR),
+                    _inteiro(custo, CASAS_VALOR), quantidades, valores, (data, ultima),
+                )
+        for chave in faltantes:
+            self.custos.setdefault(chave, _Custo(peps))
+
+    def _custo(self, produto_id, empresa_id, posicao, calculada):
+        """Custo a atualizar com a movimentação; ``None`` se a empresa está fora ou a movimentação já entrou.
+
+        ``calculada`` é a marca da movimentação nessa empresa. Pendente com
+        posição anterior à última processada do produto, a movimentação é
+        retroativa: vai para ``retroativas``.
+        """
+        if not self._no_calculo(empresa_id) or (calculada is not None and not self.refazer):
+            return None
+        custo = self.custos[produto_id, empresa_id]
+        if custo.ultima is not None and posicao <= custo.ultima:
+            self.retroativas.add(posicao[1])
+            return None
+        custo.ultima, custo.alterado = posicao, True
+        return custo
+
+    def processar(self, bloco):
+        self._carregar({(mov[2], empresa) for mov in bloco for empresa in (mov[3], mov[4])
+                        if empresa is not None and self._no_calculo(empresa)})
+        for pk, data, produto, empresa, destino, tipo, quantidade, centavos, calculada, calculada_destino in bloco:
+            posicao = (data, pk)
+            origem = self._custo(produto, empresa, posicao, calculada)
+            if origem is not None and calculada is None:
+                self.calculadas.append(pk)
+            self.resultado.movimentacoes += origem is not None
+            if tipo == 'entrada' or (tipo == 'ajuste' and quantidade > 0):
+                if origem is not None and quantidade > 0:
+                    origem.entrar(quantidade, quantidade * centavos if centavos
+                                  else _dividir(origem.custo * quantidade, MIL))
+            elif tipo in ('saida', 'ajuste'):
+                if origem is not None and quantidade:
+                    origem.sair(abs(quantidade))
+            elif tipo == 'transferencia' and destino is not None and quantidade > 0:
+                # Origem fora do cálculo (ou calculada em uma execução anterior): vale o valor da movimentação
+                valor = origem.sair(quantidade) if origem is not None else quantidade * centavos
+                chegada = self._custo(produto, destino, posicao, calculada_destino)
+                if chegada is not None:
+                    if calculada_destino is None:
+                        self.calculadas_destino.append(pk)
+                    self.resultado.movimentacoes += origem is None
+                    chegada.entrar(quantidade, valor)
+
+    def gravar(self):
+        alterados = [(chave, custo) for chave, custo in self.custos.items() if custo.alterado]
+        self.resultado.produtos = len(alterados)
+        agora = timezone.now()
+        # Colunas em arrays e unnest: uma consulta por bloco, sem montar um objeto (ou um CASE) por produto
+        with connection.cursor() as cursor:
+            for inicio in range(0, len(alterados), BLOCO):
+                bloco = alterados[inicio:inicio + BLOCO]
+                camadas = [custo.camadas() for _, custo in bloco]
+                cursor.execute(_GRAVAR_CUSTOS, [
+                    self.metodo, agora, [p for (p, _), _ in bloco], [e for (_, e), _ in bloco],
+                    [custo.quantidade for _, custo in bloco], [custo.valor for _, custo in bloco],
+                    [custo.custo for _, custo in bloco], [q for q, _ in camadas], [v for _, v in camadas],
+                    [custo.ultima[0] for _, custo in bloco], [custo.ultima[1] for _, custo in bloco],
+                ])
+                # Custo unitário, em centavos, nas linhas de estoque do produto na empresa
+                cursor.execute(_GRAVAR_ESTOQUE, [
+                    agora, [p for (p, _), _ in bloco], [e for (_, e), _ in bloco],
+                    [_dividir(custo.custo, 10 ** (CASAS_VALOR - 2)) for _, custo in bloco],
+                ])
+            for sql, ids in ((_MARCAR, self.calculadas), (_MARCAR_DESTINO, self.calculadas_destino)):
+                for inicio in range(0, len(ids), BLOCO):
+                    cursor.execute(sql, [agora, ids[inicio:inicio + BLOCO].tolist()])
+
+
+_GRAVAR_CUSTOS = f"""
+    INSERT INTO {CustoEstoque._meta.db_table} AS c (
+        produto_id, empresa_id, metodo, quantidade, valor, custo_unitario, camadas_quantidade, camadas_valor,
+        ultima_data, ultima_movimentacao, atualizado_em
+    )
+    SELECT produto, empresa, %s, quantidade / {MIL}.0, valor / 1e{CASAS_VALOR}, custo / 1e{CASAS_VALOR},
+           camadas_quantidade::bigint[], camadas_valor::bigint[], data, ultima, %s
+    FROM unnest(%s::bigint[], %s::bigint[], %s::bigint[], %s::bigint[], %s::bigint[], %s::text[], %s::text[],
+                %s::timestamptz[], %s::bigint[])
+         AS v(produto, empresa, quantidade, valor, custo, camadas_quantidade, camadas_valor, data, ultima)
+    ON CONFLICT (empresa_id, produto_id) DO UPDATE SET
+        metodo = excluded.metodo, quantidade = excluded.quantidade, valor = excluded.valor,
+        custo_unitario = excluded.custo_unitario, camadas_quantidade = excluded.camadas_quantidade,
+        camadas_valor = excluded.camadas_valor, ultima_data = excluded.ultima_data,
+        ultima_movimentacao = excluded.ultima_movimentacao, atualizado_em = excluded.atualizado_em
+"""
+
+_MARCAR = f"""
+    UPDATE {MovimentacaoEstoque._meta.db_table} SET custo_calculado_em = %s WHERE id = ANY(%s::bigint[])
+"""
+
+_MARCAR_DESTINO = f"""
+    UPDATE {MovimentacaoEstoque._meta.db_table} SET custo_destino_calculado_em = %s WHERE id = ANY(%s::bigint[])
+"""
+
+_GRAVAR_ESTOQUE = f"""
+    UPDATE {Estoque._meta.db_table} AS e SET valor_unitario = v.centavos / 100.0, updated_at = %s
+    FROM unnest(%s::bigint[], %s::bigint[], %s::bigint[]) AS v(produto, empresa, centavos)
+    WHERE e.produto_id = v.produto AND e.empresa_id = v.empresa AND e.valor_unitario <> v.centavos / 100.0
+"""
+
+
+def _pendentes(empresas, refazer):
+    """Movimentações a ler: ao refazer, todas as das empresas; senão, só as que ainda não entraram no custo"""
+    origem, destino = Q(), Q(tipo='transferencia')
+    if empresas is not None:
+        origem &= Q(empresa_id__in=empresas)
+        destino &= Q(empresa_destino_id__in=empresas)
+    if not refazer:
+        origem &= Q(custo_calculado_em__isnull=True)
+        destino &= Q(custo_destino_calculado_em__isnull=True)
+    movimentacoes = MovimentacaoEstoque.objects.filter(produto__controla_estoque=True)
+    return movimentacoes if empresas is None and refazer else movimentacoes.filter(origem | destino)
+
+
+# Transferências envolvem a empresa de destino, fora do escopo da requisição
+@sem_escopo()
+def valorizar_estoque(empresas=None, metodo=None, refazer=False, bloco=BLOCO):
+    """Calcula o custo do estoque a partir das movimentações ainda não processadas.
+
+    ``empresas``: ids das empresas calculadas (padrão: todas); ``metodo``:
+    ``'medio'`` ou ``'peps'`` (padrão: ``settings.CUSTO_ESTOQUE_METODO``). Com
+    ``refazer``, ou quando o método muda, o custo das empresas é recalculado
+    desde a primeira movimentação. Sem ``refazer``, levanta ``ValueError`` se
+    houver movimentações retroativas. Retorna ``ResultadoValorizacao``.
+    """
+    metodo = metodo or settings.CUSTO_ESTOQUE_METODO
+    if metodo not in METODOS:
+        raise ValueError(f'Método de custo inválido: {metodo}.')
+    empresas = frozenset(empresas) if empresas is not None else None
+    calculados = CustoEstoque.objects.all()
+    if empresas is not None:
+        calculados = calculados.filter(empresa_id__in=empresas)
+
+    with transaction.atomic():
+        refazer = refazer or calculados.exclude(metodo=metodo).exists()
+        if refazer:
+            calculados.delete()
+        valorizador = _Valorizador(empresas, metodo, refazer)
+        movimentacoes = _pendentes(empresas, refazer).annotate(
+            milesimos=Cast(F('quantidade') * MIL, BigIntegerField()),
+            centavos=Cast(F('valor_unitario') * 100, BigIntegerField()),
+        ).order_by('data_movimentacao', 'pk').values_list(
+            'pk', 'data_movimentacao', 'produto_id', 'empresa_id', 'empresa_destino_id', 'tipo', 'milesimos',
+            'centavos', 'custo_calculado_em', 'custo_destino_calculado_em',
+        )
+
+        atual = []
+        for movimentacao in movimentacoes.iterator(chunk_size=bloco):
+            atual.append(movimentacao)
+            if len(atual) == bloco:
+                valorizador.processar(atual)
+                atual = []
+        if atual:
+            valorizador.processar(atual)
+        if valorizador.retroativas:
+            retroativas = sorted(valorizador.retroativas)
+            mais = f' e mais {len(retroativas) - 20}' if len(retroativas) > 20 else ''
+            raise ValueError(
+                f'{len(retroativas)} movimentação(ões) com data anterior ao último cálculo do custo (ids '
+                f'{", ".join(map(str, retroativas[:20]))}{mais}); recalcule desde o início (refazer).'
+            )
+        valorizador.gravar()
+    return valorizador.resultado
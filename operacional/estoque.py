@@ -0,0 +1,192 @@
+"""
+Lançamento das movimentações de estoque no saldo (``Estoque.quantidade``).
+
+As movimentações são consolidadas por (produto, empresa, lote) e aplicadas com
+``UPDATE ... SET quantidade = quantidade + CASE id ...`` sobre as linhas de
+estoque bloqueadas, de modo que milhares de movimentações custam poucas consultas.
+Na mesma transação, os alertas de estoque dos produtos lançados são
+reavaliados (``operacional.alertas``).
+
+- entrada: soma a quantidade;
+- saida: subtrai a quantidade;
+- ajuste: soma a quantidade informada, que pode ser negativa;
+- transferencia: subtrai na empresa de origem e soma em ``empresa_destino``.
+"""
+
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from core.multiempresa import sem_escopo
+from .alertas import avaliar_alertas
+from .models import Estoque, MovimentacaoEstoque, Produto
+
+ZERO = Decimal('0.000')
+CENTAVO = Decimal('0.01')
+TAMANHO_LOTE_SQL = 500
+
+
+def _chunks(itens, tamanho=TAMANHO_LOTE_SQL):
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+def consolidar_movimentacoes(movimentacoes):
+    """Soma as variações de quantidade por (produto_id, empresa_id, lote)"""
+    variacoes = {}
+    for mov in movimentacoes:
+        quantidade = Decimal(mov.quantidade)
+        origem = (mov.produto_id, mov.empresa_id, mov.lote)
+        if mov.tipo in ('entrada', 'ajuste'):
+            variacoes[origem] = variacoes.get(origem, ZERO) + quantidade
+        elif mov.tipo == 'saida':
+            variacoes[origem] = variacoes.get(origem, ZERO) - quantidade
+        elif mov.tipo == 'transferencia':
+            if not mov.empresa_destino_id:
+                raise ValidationError(f'Transferência {mov.pk} sem empresa de destino.')
+            destino = (mov.produto_id, mov.empresa_destino_id, mov.lote)
+            variacoes[origem] = variacoes.get(origem, ZERO) - quantidade
+            variacoes[destino] = variacoes.get(destino, ZERO) + quantidade
+        else:
+            raise ValidationError(f'Tipo de movimentação inválido: {mov.tipo}.')
+    return {chave: valor for chave, valor in variacoes.items() if valor}
+
+
+def _bloquear_estoques(chaves):
+    """Bloqueia (``FOR UPDATE``, em ordem de id) as linhas de estoque das chaves informadas"""
+    linhas = Estoque.objects.select_for_update().filter(
+        produto_id__in={p for p, _, _ in chaves},
+        empresa_id__in={e for _, e, _ in chaves},
+        lote__in={l for _, _, l in chaves},
+    ).order_by('pk').values_list('pk', 'produto_id', 'empresa_id', 'lote')
+    chaves = set(chaves)
+    return {(p, e, l): pk for pk, p, e, l in linhas if (p, e, l) in chaves}
+
+
+# Transferências alteram o estoque da empresa de destino, fora do escopo da requisição
+@sem_escopo()
+def aplicar_variacoes(variacoes, permitir_negativo=False):
+    """Aplica ``{(produto_id, empresa_id, lote): variação}`` ao estoque.
+
+    Bloqueia as linhas de estoque envolvidas (criando as que ainda não existem)
+    e atualiza as quantidades com ``quantidade = F('quantidade') + CASE id ...``,
+    uma consulta para cada bloco de linhas. Deve ser chamada dentro de uma
+    transação.
+    """
+    if not variacoes:
+        return
+
+    ids_por_chave = _bloquear_estoques(variacoes)
+    faltantes = [chave for chave in variacoes if chave not in ids_por_chave]
+    if faltantes:
+        Estoque.objects.bulk_create(
+            [Estoque(produto_id=p, empresa_id=e, lote=l) for p, e, l in faltantes],
+            ignore_conflicts=True, batch_size=1000,
+        )
+        ids_por_chave.update(_bloquear_estoques(faltantes))
+
+    variacao_por_id = sorted((ids_por_chave[chave], valor) for chave, valor in variacoes.items())
+    campo_quantidade = DecimalField(max_digits=15, decimal_places=3)
+    agora = timezone.now()
+    for bloco in _chunks(variacao_por_id):
+        # CASE simples em SQL: montar um When() por linha custaria mais que a própria consulta
+        variacao = RawSQL(
+            'CASE id ' + ' '.join(['WHEN %s THEN %s'] * len(bloco)) + ' ELSE 0 END',
+            [valor for item in bloco for valor in item],
+            output_field=campo_quantidade,
+        )
+        Estoque.objects.filter(pk__in=[pk for pk, _ in bloco]).update(
+            quantidade=F('quantidade') + variacao, updated_at=agora,
+        )
+
+    if not permitir_negativo:
+        negativos = list(Estoque.objects.filter(
+            pk__in=[pk for pk, valor in variacao_por_id if valor < 0], quantidade__lt=0,
+        ).values_list('produto__codigo', 'lote')[:10])
+        if negativos:
+            raise ValidationError(
+                'Estoque insuficiente para: ' +
+                ', '.join(f'{codigo}' + (f' (lote {lote})' if lote else '') for codigo, lote in negativos)
+            )
+
+
+def lancar_movimentacoes(movimentacoes, permitir_negativo=False):
+    """Lança no estoque, em uma única transação, movimentações ainda não lançadas.
+
+    Movimentações já lançadas são ignoradas; as de produtos que não controlam
+    estoque são apenas marcadas como lançadas. Retorna a quantidade de
+    movimentações marcadas.
+    """
+    movimentacoes = [mov for mov in movimentacoes if mov.lancado_em is None]
+    if not movimentacoes:
+        return 0
+
+    with transaction.atomic():
+        # Bloqueia as movimentações para que não sejam lançadas duas vezes
+        pendentes = set()
+        for bloco in _chunks(sorted(mov.pk for mov in movimentacoes), 5000):
+            pendentes.update(MovimentacaoEstoque.objects.select_for_update().filter(
+                pk__in=bloco, lancado_em__isnull=True,
+            ).values_list('pk', flat=True))
+        movimentacoes = [mov for mov in movimentacoes if mov.pk in pendentes]
+
+        produtos_sem_controle = set(Produto.objects.filter(
+            pk__in={mov.produto_id for mov in movimentacoes}, controla_estoque=False,
+        ).values_list('pk', flat=True))
+        variacoes = consolidar_movimentacoes(
+            mov for mov in movimentacoes if mov.produto_id not in produtos_sem_controle
+        )
+        aplicar_variacoes(variacoes, permitir_negativo)
+        avaliar_alertas(chaves=[(produto, empresa) for produto, empresa, _ in variacoes])
+
+        lancado_em = timezone.now()
+        for bloco in _chunks(sorted(pendentes), 5000):
+            MovimentacaoEstoque.objects.filter(pk__in=bloco).update(lancado_em=lancado_em)
+        for mov in movimentacoes:
+            mov.lancado_em = lancado_em
+    return len(movimentacoes)
+
+
+def lancar_pendentes(empresa=None, batch_size=5000, permitir_negativo=False):
+    """Lança todas as movimentações pendentes, uma transação a cada ``batch_size``"""
+    total, ultimo_id = 0, 0
+    while True:
+        pendentes = MovimentacaoEstoque.objects.filter(lancado_em__isnull=True, pk__gt=ultimo_id)
+        if empresa is not None:
+            pendentes = pendentes.filter(empresa=empresa)
+        lote = list(pendentes.order_by('pk').only(
+            'pk', 'produto_id', 'empresa_id', 'empresa_destino_id', 'lote', 'tipo', 'quantidade', 'lancado_em',
+        )[:batch_size])
+        if not lote:
+            return total
+        total += lancar_movimentacoes(lote, permitir_negativo)
+        ultimo_id = lote[-1].pk
+
+
+def linhas_estoque_valorizado(empresa_id):
+    """Estoque da empresa por produto, com custo médio e valor total, seguido do total geral.
+
+    Gerador usado pelos relatórios em segundo plano (``core.relatorios``); a
+    primeira linha é o cabeçalho.
+    """
+    valor = DecimalField(max_digits=20, decimal_places=5)
+    produtos = Estoque.objects.filter(empresa_id=empresa_id).values(
+        'produto__codigo', 'produto__nome', 'produto__categoria__nome', 'produto__unidade_medida__sigla',
+    ).annotate(
+        total_quantidade=Sum('quantidade'),
+        valor_total=Sum(F('quantidade') * F('valor_unitario'), output_field=valor),
+    ).order_by('produto__codigo')
+
+    yield ['Código', 'Produto', 'Categoria', 'Unidade', 'Quantidade', 'Custo Médio', 'Valor Total']
+    total = Decimal('0.00')
+    for linha in produtos.iterator():
+        quantidade, valor_total = linha['total_quantidade'], linha['valor_total'].quantize(CENTAVO)
+        custo_medio = (linha['valor_total'] / quantidade).quantize(CENTAVO) if quantidade else Decimal('0.00')
+        total += valor_total
+        yield [linha['produto__codigo'], linha['produto__nome'], linha['produto__categoria__nome'],
+               linha['produto__unidade_medida__sigla'], quantidade, custo_medio, valor_total]
+    yield ['', 'Total', '', '', '', '', total]
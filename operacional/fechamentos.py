@@ -0,0 +1,189 @@
+"""
+Posição do estoque em uma data: fechamentos mensais e movimentações desde o
+fechamento.
+
+O fechamento de um mês (``FechamentoEstoque``) guarda a quantidade de cada
+produto, empresa e lote no fim do mês, com o custo unitário do produto na
+empresa (``CustoEstoque``) vigente quando foi gerado. É montado com um único
+``INSERT ... SELECT`` a partir do fechamento anterior somado às movimentações
+do mês, que o PostgreSQL lê só na partição do mês (ver ``core.particoes``).
+Linhas com quantidade zero não são gravadas.
+
+``estoque_em`` responde a posição no fim de um dia a partir do último
+fechamento até aquela data mais as movimentações posteriores a ele — no
+máximo um mês e pouco de movimentações, lidas pelos índices por empresa e
+data, qualquer que seja a data. Antes do primeiro fechamento, soma as
+movimentações desde o início.
+
+As quantidades seguem o lançamento no estoque (``operacional.estoque``):
+entrada e ajuste somam, saída subtrai e transferência subtrai na origem e
+soma no destino. Movimentações gravadas com data em um mês já fechado exigem
+refazer os fechamentos a partir dele.
+"""
+
+import datetime
+from dataclasses import dataclass, field
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, Max, Min, Q, Sum, When
+
+from core.multiempresa import sem_escopo
+from core.particoes import primeiro_dia, somar_meses
+from .models import CustoEstoque, FechamentoEstoque, MovimentacaoEstoque, Produto
+
+
+@dataclass
+class ItemPosicao:
+    produto_id: int
+    lote: str
+    quantidade: Decimal
+    custo_unitario: Decimal
+
+    @property
+    def valor(self):
+        return (self.quantidade * self.custo_unitario).quantize(Decimal('0.01'))
+
+
+@dataclass
+class PosicaoEstoque:
+    data: datetime.date
+    # Mês do fechamento usado; None quando a posição veio só das movimentações
+    fechamento: datetime.date = None
+    itens: list = field(default_factory=list)
+
+
+def _inicio_do_mes(mes):
+    """Meia-noite do primeiro dia do mês no fuso do sistema"""
+    return datetime.datetime(mes.year, mes.month, 1, tzinfo=ZoneInfo(settings.TIME_ZONE))
+
+
+_FECHAR_MES = f"""
+    INSERT INTO {FechamentoEstoque._meta.db_table}
+        (mes, produto_id, empresa_id, lote, quantidade, custo_unitario, criado_em)
+    SELECT %(mes)s, d.produto_id, d.empresa_id, d.lote, sum(d.quantidade), coalesce(c.custo_unitario, 0), now()
+    FROM (
+        SELECT produto_id, empresa_id, lote, quantidade
+        FROM {FechamentoEstoque._meta.db_table} WHERE mes = %(anterior)s
+        UNION ALL
+        SELECT produto_id, empresa_id, lote,
+               CASE WHEN tipo IN ('saida', 'transferencia') THEN -quantidade ELSE quantidade END
+        FROM {MovimentacaoEstoque._meta.db_table}
+        WHERE data_movimentacao >= %(inicio)s AND data_movimentacao < %(fim)s
+        UNION ALL
+        SELECT produto_id, empresa_destino_id, lote, quantidade
+        FROM {MovimentacaoEstoque._meta.db_table}
+        WHERE tipo = 'transferencia' AND empresa_destino_id IS NOT NULL
+          AND data_movimentacao >= %(inicio)s AND data_movimentacao < %(fim)s
+    ) d
+    JOIN {Produto._meta.db_table} p ON p.id = d.produto_id AND p.controla_estoque
+    LEFT JOIN {CustoEstoque._meta.db_table} c ON c.empresa_id = d.empresa_id AND c.produto_id = d.produto_id
+    GROUP BY d.produto_id, d.empresa_id, d.lote, c.custo_unitario
+    HAVING sum(d.quantidade) <> 0
+"""
+
+
+@sem_escopo()
+def fechar_mes(mes):
+    """Gera (ou refaz) o fechamento do mês de todas as empresas; retorna o número de linhas.
+
+    Parte do fechamento do mês anterior; sem fechamentos anteriores, soma as
+    movimentações desde o início.
+    """
+    mes = primeiro_dia(mes)
+    anterior = somar_meses(mes, -1)
+    primeiro = not FechamentoEstoque.objects.filter(mes__lt=mes).exists()
+    with transaction.atomic(), connection.cursor() as cursor:
+        FechamentoEstoque.objects.filter(mes=mes).delete()
+        cursor.execute(_FECHAR_MES, {
+            'mes': mes, 'anterior': anterior,
+            'inicio': '-infinity' if primeiro else _inicio_do_mes(mes),
+            'fim': _inicio_do_mes(somar_meses(mes, 1)),
+        })
+        return cursor.rowcount
+
+
+@sem_escopo()
+def fechar_pendentes(ate, refazer_desde=None):
+    """Fecha, em ordem, os meses ainda não fechados até ``ate`` (inclusive).
+
+    Com ``refazer_desde``, descarta os fechamentos a partir desse mês e os
+    gera de novo. Retorna ``[(mes, linhas)]``.
+    """
+    ate = primeiro_dia(ate)
+    if refazer_desde is not None:
+        FechamentoEstoque.objects.filter(mes__gte=primeiro_dia(refazer_desde)).delete()
+    ultimo = FechamentoEstoque.objects.aggregate(ultimo=Max('mes'))['ultimo']
+    if ultimo is not None:
+        mes = somar_meses(ultimo, 1)
+    else:
+        primeira = MovimentacaoEstoque.objects.aggregate(primeira=Min('data_movimentacao'))['primeira']
+        if primeira is None:
+            return []
+        mes = primeiro_dia(primeira)
+    fechados = []
+    while mes <= ate:
+        fechados.append((mes, fechar_mes(mes)))
+        mes = somar_meses(mes, 1)
+    return fechados
+
+
+def _variacoes(empresa_id, inicio, fim, produtos):
+    """Variação de quantidade por (produto_id, lote) das movimentações da empresa no intervalo"""
+    periodo = Q(data_movimentacao__lt=fim, produto__controla_estoque=True)
+    if inicio is not None:
+        periodo &= Q(data_movimentacao__gte=inicio)
+    if produtos is not None:
+        periodo &= Q(produto_id__in=produtos)
+    variacoes = {}
+    proprias = MovimentacaoEstoque.objects.filter(periodo, empresa_id=empresa_id).values(
+        'produto_id', 'lote').annotate(variacao=Sum(Case(
+            When(tipo__in=('saida', 'transferencia'), then=-F('quantidade')), default=F('quantidade'),
+        ))).order_by()
+    recebidas = MovimentacaoEstoque.objects.filter(
+        periodo, empresa_destino_id=empresa_id, tipo='transferencia',
+    ).values('produto_id', 'lote').annotate(variacao=Sum('quantidade')).order_by()
+    for linha in [*proprias, *recebidas]:
+        chave = (linha['produto_id'], linha['lote'])
+        variacoes[chave] = variacoes.get(chave, Decimal('0.000')) + linha['variacao']
+    return variacoes
+
+
+# Transferências recebidas são gravadas na empresa de origem, fora do escopo da requisição
+@sem_escopo()
+def estoque_em(empresa_id, data, produtos=None):
+    """Posição do estoque da empresa no fim do dia ``data``; ``produtos`` restringe aos ids informados.
+
+    Retorna ``PosicaoEstoque`` com os itens de quantidade diferente de zero,
+    em ordem de produto e lote.
+    """
+    dia_seguinte = data + datetime.timedelta(days=1)
+    limite = datetime.datetime.combine(dia_seguinte, datetime.time(), tzinfo=ZoneInfo(settings.TIME_ZONE))
+    # O fechamento do mês M vale até o início de M+1
+    fechamento = FechamentoEstoque.objects.filter(
+        mes__lte=somar_meses(primeiro_dia(dia_seguinte), -1),
+    ).aggregate(ultimo=Max('mes'))['ultimo']
+
+    quantidades, custos = {}, {}
+    if fechamento is not None:
+        linhas = FechamentoEstoque.objects.filter(mes=fechamento, empresa_id=empresa_id)
+        if produtos is not None:
+            linhas = linhas.filter(produto_id__in=produtos)
+        for produto, lote, quantidade, custo in linhas.values_list('produto_id', 'lote', 'quantidade',
+                                                                   'custo_unitario'):
+            quantidades[produto, lote] = quantidade
+            custos[produto] = custo
+    inicio = _inicio_do_mes(somar_meses(fechamento, 1)) if fechamento is not None else None
+    for chave, variacao in _variacoes(empresa_id, inicio, limite, produtos).items():
+        quantidades[chave] = quantidades.get(chave, Decimal('0.000')) + variacao
+
+    sem_custo = {produto for produto, _ in quantidades if produto not in custos}
+    if sem_custo:
+        custos.update(CustoEstoque.objects.filter(empresa_id=empresa_id, produto_id__in=sem_custo)
+                      .values_list('produto_id', 'custo_unitario'))
+    return PosicaoEstoque(data=data, fechamento=fechamento, itens=[
+        ItemPosicao(produto, lote, quantidade, custos.get(produto, Decimal('0.00000')))
+        for (produto, lote), quantidade in sorted(quantidades.items()) if quantidade
+    ])
@@ -0,0 +1,375 @@
+"""
+Importação em lote de cadastros (pessoas, clientes, fornecedores e produtos) a partir de CSV.
+
+O arquivo é lido em streaming e processado em blocos: cada bloco é validado
+campo a campo (sem consultas por linha), as FKs são resolvidas por mapas em
+memória carregados uma única vez e os registros são gravados com
+``bulk_create(update_conflicts=True)`` — um upsert por ``cpf_cnpj`` ou
+``codigo``. Linhas inválidas são reportadas sem interromper a importação —
+inclusive as de empresas fora do escopo ativo e as que esbarrariam em um
+cadastro de outra empresa, que o upsert sobrescreveria.
+"""
+
+import csv
+import datetime
+import itertools
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from core.models import Empresa
+from core.multiempresa import empresas_do_escopo, sem_escopo
+from .models import Categoria, Cliente, Fornecedor, Pessoa, Produto, UnidadeMedida
+
+CHUNK_SIZE = 2000
+
+CAMPOS_PESSOA = ['nome', 'tipo_pessoa', 'cpf_cnpj', 'rg_ie', 'endereco', 'telefone', 'celular', 'email',
+                 'data_nascimento', 'observacoes']
+CAMPOS_CLIENTE = ['codigo', 'limite_credito', 'prazo_pagamento', 'vendedor']
+CAMPOS_FORNECEDOR = ['codigo', 'prazo_entrega', 'condicoes_pagamento']
+CAMPOS_PRODUTO = ['codigo', 'nome', 'descricao', 'peso', 'dimensoes', 'codigo_barras', 'preco_custo',
+                  'preco_venda', 'margem_lucro', 'estoque_minimo', 'estoque_maximo', 'controla_estoque', 'tipo']
+
+VERDADEIROS = {'1', 's', 'sim', 'true', 't', 'verdadeiro', 'x'}
+FALSOS = {'0', 'n', 'nao', 'não', 'false', 'f', 'falso'}
+
+
+@dataclass
+class ResultadoImportacao:
+    criados: int = 0
+    atualizados: int = 0
+    erros: list = field(default_factory=list)
+
+    def adicionar_erro(self, linha, mensagem):
+        self.erros.append((linha, mensagem))
+
+    @property
+    def processados(self):
+        return self.criados + self.atualizados
+
+
+def _converter(campo, valor):
+    """Normaliza formatos brasileiros (1.234,56 / 31/12/2024 / sim) e valida com o próprio campo"""
+    valor = (valor or '').strip()
+    tipo_campo = campo.get_internal_type()
+    if not valor:
+        if campo.has_default():
+            return campo.get_default()
+        valor = None if campo.null else ''
+    elif tipo_campo == 'DecimalField' and ',' in valor:
+        valor = valor.replace('.', '').replace(',', '.')
+    elif tipo_campo == 'DateField' and '/' in valor:
+        try:
+            valor = datetime.datetime.strptime(valor, '%d/%m/%Y').date()
+        except ValueError:
+            raise ValidationError('Data inválida, use DD/MM/AAAA.')
+    elif tipo_campo == 'BooleanField':
+        if valor.lower() in VERDADEIROS:
+            valor = True
+        elif valor.lower() in FALSOS:
+            valor = False
+    return campo.clean(valor, None)
+
+
+def _limpar_campos(model, nomes, linha):
+    """Converte os campos da linha; devolve (dados, erros)"""
+    dados, erros = {}, []
+    for nome in nomes:
+        if nome not in linha:
+            continue
+        campo = model._meta.get_field(nome)
+        try:
+            dados[nome] = _converter(campo, linha[nome])
+        except ValidationError as e:
+            erros.append(f'{nome}: {"; ".join(e.messages)}')
+    return dados, erros
+
+
+class _Mapas:
+    """Mapas em memória para resolver as FKs das linhas sem consultar o banco"""
+
+    def __init__(self, empresa_padrao=None):
+        self.empresa_padrao = empresa_padrao
+        self.escopo = empresas_do_escopo()
+        self.empresas = {}
+        for pk, cnpj in Empresa.objects.values_list('pk', 'cnpj'):
+            self.empresas[cnpj] = pk
+            self.empresas[str(pk)] = pk
+        self.unidades = {sigla.lower(): pk for pk, sigla in UnidadeMedida.objects.values_list('pk', 'sigla')}
+        self.categorias = {}
+        for pk, nome in Categoria.objects.values_list('pk', 'nome'):
+            # Nomes repetidos ficam ambíguos (None)
+            self.categorias[nome.lower()] = None if nome.lower() in self.categorias else pk
+
+    def empresa(self, valor):
+        valor = (valor or '').strip()
+        if not valor:
+            if self.empresa_padrao is None:
+                raise ValidationError('empresa: informe o CNPJ ou id da empresa.')
+            empresa_id = self.empresa_padrao
+        elif valor not in self.empresas:
+            raise ValidationError(f'empresa: "{valor}" não encontrada.')
+        else:
+            empresa_id = self.empresas[valor]
+        # A coluna não pode levar o cadastro para uma empresa fora do escopo de quem importa
+        if self.escopo is not None and int(empresa_id) not in self.escopo:
+            raise ValidationError(f'empresa: sem acesso à empresa "{valor or empresa_id}".')
+        return empresa_id
+
+    def categoria(self, valor):
+        chave = (valor or '').strip().lower()
+        if chave not in self.categorias:
+            raise ValidationError(f'categoria: "{valor}" não encontrada.')
+        if self.categorias[chave] is None:
+            raise ValidationError(f'categoria: "{valor}" é ambígua (mais de uma com esse nome).')
+        return self.categorias[chave]
+
+    def unidade_medida(self, valor):
+        chave = (valor or '').strip().lower()
+        if chave not in self.unidades:
+            raise ValidationError(f'unidade_medida: "{valor}" não encontrada.')
+        return self.unidades[chave]
+
+
+def _resolver(resolvedor, valor, erros):
+    try:
+        return resolvedor(valor)
+    except ValidationError as e:
+        erros.extend(e.messages)
+
+
+def _gravar_com_isolamento(gravar, itens, resultado):
+    """Grava o bloco inteiro; se o banco recusar, grava item a item para isolar as linhas com erro.
+
+    Devolve os itens gravados.
+    """
+    if not itens:
+        return []
+    try:
+        with transaction.atomic():
+            gravar(itens)
+        return itens
+    except DatabaseError as e:
+        if len(itens) == 1:
+            resultado.adicionar_erro(itens[0]['linha'], f'Erro ao gravar: {e}'.strip())
+            return []
+    gravados = []
+    for item in itens:
+        try:
+            with transaction.atomic():
+                gravar([item])
+            gravados.append(item)
+        except DatabaseError as e:
+            resultado.adicionar_erro(item['linha'], f'Erro ao gravar: {e}'.strip())
+    return gravados
+
+
+def _auditoria(usuario, criacao=True):
+    agora = timezone.now()
+    dados = {'updated_at': agora, 'updated_by': usuario}
+    if criacao:
+        dados.update(created_at=agora, created_by=usuario)
+    return dados
+
+
+class _Importador:
+    def __init__(self, tipo, empresa_padrao=None, usuario=None):
+        self.tipo = tipo
+        self.mapas = _Mapas(empresa_padrao)
+        self.usuario = usuario
+        self.resultado = ResultadoImportacao()
+
+    def validar(self, numero, linha):
+        """Converte uma linha do CSV; devolve o item a gravar ou None (erro registrado)"""
+        erros = []
+        item = {'linha': numero}
+        if self.tipo == 'produto':
+            item['produto'], erros = _limpar_campos(Produto, CAMPOS_PRODUTO, linha)
+            item['produto']['categoria_id'] = _resolver(self.mapas.categoria, linha.get('categoria'), erros)
+            item['produto']['unidade_medida_id'] = _resolver(
+                self.mapas.unidade_medida, linha.get('unidade_medida'), erros)
+            item['chave'] = item['produto'].get('codigo')
+        else:
+            item['pessoa'], erros = _limpar_campos(Pessoa, CAMPOS_PESSOA, linha)
+            item['pessoa']['empresa_id'] = _resolver(self.mapas.empresa, linha.get('empresa'), erros)
+            item['chave'] = item['pessoa'].get('cpf_cnpj')
+            if self.tipo in ('cliente', 'fornecedor'):
+                model, campos = ((Cliente, CAMPOS_CLIENTE) if self.tipo == 'cliente'
+                                 else (Fornecedor, CAMPOS_FORNECEDOR))
+                item['papel'], erros_papel = _limpar_campos(model, campos, linha)
+                erros += erros_papel
+        if erros:
+            self.resultado.adicionar_erro(numero, '; '.join(erros))
+            return None
+        return item
+
+    def importar(self, linhas, chunk_size=CHUNK_SIZE):
+        bloco = []
+        for numero, linha in linhas:
+            item = self.validar(numero, linha)
+            if item is not None:
+                bloco.append(item)
+            if len(bloco) >= chunk_size:
+                self.gravar_bloco(bloco)
+                bloco = []
+        if bloco:
+            self.gravar_bloco(bloco)
+        self.resultado.erros.sort()
+        return self.resultado
+
+    def _sem_repetidos(self, bloco, chave):
+        """Mantém a primeira ocorrência de cada chave no bloco; o upsert não aceita repetidas"""
+        vistos, unicos = {}, []
+        for item in bloco:
+            valor = item[chave] if chave == 'chave' else item['papel'].get('codigo')
+            if valor in vistos:
+                self.resultado.adicionar_erro(item['linha'], f'Registro repetido no arquivo (linha {vistos[valor]}).')
+                continue
+            vistos[valor] = item['linha']
+            unicos.append(item)
+        return unicos
+
+    def gravar_bloco(self, bloco):
+        bloco = self._sem_repetidos(bloco, 'chave')
+        if self.tipo == 'produto':
+            self.gravar_produtos(bloco)
+        elif self.tipo == 'pessoa':
+            self.gravar_pessoas(bloco)
+        else:
+            self.gravar_papeis(self._sem_repetidos(bloco, 'codigo'))
+
+    def _upsert(self, model, objetos, chave, campos):
+        model.objects.bulk_create(
+            objetos, update_conflicts=True, unique_fields=[chave],
+            update_fields=campos + ['updated_at', 'updated_by'],
+        )
+
+    def _somar(self, gravados, existentes, chave=lambda item: item['chave']):
+        atualizados = sum(1 for item in gravados if chave(item) in existentes)
+        self.resultado.criados += len(gravados) - atualizados
+        self.resultado.atualizados += atualizados
+
+    def gravar_produtos(self, bloco):
+        existentes = set(Produto.objects.filter(
+            codigo__in=[item['chave'] for item in bloco]
+        ).values_list('codigo', flat=True))
+        campos = sorted({campo for item in bloco for campo in item['produto']} - {'codigo'})
+
+        def gravar(itens):
+            self._upsert(Produto, [Produto(**item['produto'], **_auditoria(self.usuario)) for item in itens],
+                         'codigo', [campo.removesuffix('_id') for campo in campos])
+
+        self._somar(_gravar_com_isolamento(gravar, bloco, self.resultado), existentes)
+
+    def _da_mesma_empresa(self, bloco, empresas):
+        """Recusa as linhas cujo CPF/CNPJ já é de outra empresa; ``empresas`` mapeia cpf_cnpj -> empresa_id"""
+        validos = []
+        for item in bloco:
+            empresa_id = empresas.get(item['chave'])
+            if empresa_id is not None and empresa_id != item['pessoa']['empresa_id']:
+                self.resultado.adicionar_erro(
+                    item['linha'], f'CPF/CNPJ {item["chave"]} já cadastrado em outra empresa.')
+            else:
+                validos.append(item)
+        return validos
+
+    def gravar_pessoas(self, bloco):
+        # O upsert esbarra nos cadastros de todas as empresas, não só nos do escopo
+        with sem_escopo():
+            existentes = dict(Pessoa.objects.filter(
+                cpf_cnpj__in=[item['chave'] for item in bloco]
+            ).values_list('cpf_cnpj', 'empresa_id'))
+        bloco = self._da_mesma_empresa(bloco, existentes)
+        self._somar(_gravar_com_isolamento(self._gravar_pessoas, bloco, self.resultado), existentes)
+
+    def _gravar_pessoas(self, itens):
+        # A empresa só é gravada na criação: reimportar não muda o dono do cadastro
+        campos = sorted({campo for item in itens for campo in item['pessoa']} - {'cpf_cnpj', 'empresa_id'})
+        pessoas = [Pessoa(**item['pessoa'], **_auditoria(self.usuario)) for item in itens]
+        self._upsert(Pessoa, pessoas, 'cpf_cnpj', [campo.removesuffix('_id') for campo in campos])
+        return pessoas
+
+    def gravar_papeis(self, bloco):
+        """Clientes/fornecedores: grava a pessoa e, em seguida, o papel ligado a ela"""
+        model = Cliente if self.tipo == 'cliente' else Fornecedor
+
+        # Conflitos que o upsert não resolve: código de outra pessoa ou pessoa com outro código. As chaves
+        # são únicas entre as empresas, então a consulta não usa o escopo
+        with sem_escopo():
+            encontradas = list(Pessoa.objects.filter(
+                cpf_cnpj__in=[item['chave'] for item in bloco]
+            ).values_list('cpf_cnpj', 'pk', 'empresa_id'))
+            pessoas = {cpf_cnpj: pk for cpf_cnpj, pk, _ in encontradas}
+            codigo_por_pessoa = dict(
+                model.objects.filter(pessoa_id__in=pessoas.values()).values_list('pessoa_id', 'codigo')
+            )
+            pessoa_por_codigo = dict(model.objects.filter(
+                codigo__in=[item['papel'].get('codigo') for item in bloco]
+            ).values_list('codigo', 'pessoa_id'))
+
+        validos = []
+        for item in self._da_mesma_empresa(bloco, {cpf_cnpj: empresa for cpf_cnpj, _, empresa in encontradas}):
+            pessoa_id = pessoas.get(item['chave'])
+            codigo = item['papel'].get('codigo')
+            if codigo in pessoa_por_codigo and pessoa_por_codigo[codigo] != pessoa_id:
+                self.resultado.adicionar_erro(item['linha'], f'Código {codigo} já pertence a outra pessoa.')
+            elif pessoa_id in codigo_por_pessoa and codigo_por_pessoa[pessoa_id] != codigo:
+                self.resultado.adicionar_erro(
+                    item['linha'], f'Pessoa já cadastrada com o código {codigo_por_pessoa[pessoa_id]}.')
+            else:
+                validos.append(item)
+
+        campos = sorted({campo for item in validos for campo in item['papel']} - {'codigo'})
+
+        def gravar(itens):
+            pessoas = self._gravar_pessoas(itens)
+            self._upsert(model, [
+                model(pessoa_id=pessoa.pk, **item['papel'], **_auditoria(self.usuario))
+                for pessoa, item in zip(pessoas, itens)
+            ], 'codigo', campos + ['pessoa'])
+
+        self._somar(_gravar_com_isolamento(gravar, validos, self.resultado), pessoa_por_codigo,
+                    chave=lambda item: item['papel'].get('codigo'))
+
+
+OBRIGATORIOS = {
+    'pessoa': {'nome', 'tipo_pessoa', 'cpf_cnpj'},
+    'cliente': {'nome', 'tipo_pessoa', 'cpf_cnpj', 'codigo'},
+    'fornecedor': {'nome', 'tipo_pessoa', 'cpf_cnpj', 'codigo'},
+    'produto': {'codigo', 'nome', 'categoria', 'unidade_medida'},
+}
+
+
+def ler_csv(arquivo, tipo, delimitador=';'):
+    """Itera (número da linha, dicionário) de um CSV texto com cabeçalho.
+
+    Levanta ``ValueError`` se faltarem colunas obrigatórias para o ``tipo``.
+    """
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    colunas = [nome.strip().lower() for nome in leitor.fieldnames or []]
+    faltantes = OBRIGATORIOS[tipo] - set(colunas)
+    if faltantes:
+        raise ValueError(f'Colunas obrigatórias ausentes: {", ".join(sorted(faltantes))}.')
+    leitor.fieldnames = colunas
+    for linha in leitor:
+        yield leitor.line_num, linha
+
+
+def importar_csv(arquivo, tipo, empresa=None, usuario=None, delimitador=';', chunk_size=CHUNK_SIZE):
+    """Importa um CSV de ``tipo`` (pessoa, cliente, fornecedor ou produto).
+
+    ``empresa`` é a empresa usada nas linhas sem a coluna ``empresa``. Cada
+    bloco é gravado em sua própria transação.
+    """
+    if tipo not in OBRIGATORIOS:
+        raise ValueError(f'Tipo de importação inválido: {tipo}.')
+    linhas = ler_csv(arquivo, tipo, delimitador)
+    # Valida o cabeçalho antes de carregar os mapas
+    primeira = next(linhas, None)
+    empresa_id = empresa.pk if isinstance(empresa, Empresa) else empresa
+    importador = _Importador(tipo, empresa_id, usuario)
+    if primeira is None:
+        return importador.resultado
+    return importador.importar(itertools.chain([primeira], linhas), chunk_size)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from operacional.alertas import avaliar_alertas
+
+
+class Command(BaseCommand):
+    help = ('Reavalia os alertas de estoque (abaixo do mínimo e acima do máximo) de todos os produtos. '
+            'O lançamento no estoque já reavalia os produtos lançados; rode após cargas de produtos ou estoque '
+            'feitas fora do lançamento.')
+
+    def handle(self, *args, **options):
+        resultado = avaliar_alertas()
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.gravados} alerta(s) criado(s) ou atualizado(s), {resultado.removidos} removido(s).'
+        ))
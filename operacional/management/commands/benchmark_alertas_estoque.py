@@ -0,0 +1,68 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import Empresa
+from operacional.alertas import avaliar_alertas
+from operacional.models import Categoria, Estoque, Produto, UnidadeMedida
+
+
+class Command(BaseCommand):
+    help = ('Mede a avaliação dos alertas de estoque: completa e incremental (produtos de um lançamento). '
+            'Os dados gerados são descartados ao final (rollback).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=500000)
+        parser.add_argument('--lotes', type=int, default=2, help='Lotes (linhas de estoque) por produto.')
+        parser.add_argument('--lancados', type=int, default=1000,
+                            help='Produtos de cada lançamento na avaliação incremental.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            empresa, produtos = self._gerar_dados(options)
+
+            inicio = time.perf_counter()
+            completa = avaliar_alertas()
+            tempo_completa = time.perf_counter() - inicio
+
+            # Variação de estoque em alguns produtos, como um lançamento, e a reavaliação só deles
+            lancados = random.sample(produtos, options['lancados'])
+            Estoque.objects.filter(empresa=empresa, produto__in=lancados).update(quantidade=Decimal('0.000'))
+            inicio = time.perf_counter()
+            incremental = avaliar_alertas(chaves=[(produto.pk, empresa.pk) for produto in lancados])
+            tempo_incremental = time.perf_counter() - inicio
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'Produtos: {len(produtos)}  linhas de estoque: {len(produtos) * options["lotes"]}')
+        self.stdout.write(f'Completa: {completa.gravados} alertas gravados em {tempo_completa:.3f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f'Incremental: {options["lancados"]} produtos, {incremental.gravados} gravados e '
+            f'{incremental.removidos} removidos em {tempo_incremental * 1000:.1f}ms'
+        ))
+
+    def _gerar_dados(self, options):
+        empresa = Empresa.objects.create(nome='Benchmark', cnpj=f'BM{time.time_ns() % 10**12}',
+                                         razao_social='Benchmark', endereco='-')
+        categoria = Categoria.objects.create(nome='Benchmark')
+        unidade = UnidadeMedida.objects.create(nome='Benchmark', sigla=f'B{time.time_ns() % 10**8}')
+        sufixo = time.time_ns()
+        produtos = Produto.objects.bulk_create([
+            Produto(codigo=f'BENCH-{sufixo}-{i}', nome=f'Produto {i}', categoria=categoria, unidade_medida=unidade,
+                    estoque_minimo=Decimal(random.choice((0, 10, 50))),
+                    estoque_maximo=Decimal(random.choice((0, 200, 500))))
+            for i in range(options['produtos'])
+        ], batch_size=5000)
+        Estoque.objects.bulk_create([
+            Estoque(produto=produto, empresa=empresa, lote=f'L{lote}', quantidade=Decimal(random.randint(0, 300)))
+            for produto in produtos for lote in range(options['lotes'])
+        ], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Produto._meta.db_table}')
+            cursor.execute(f'ANALYZE {Estoque._meta.db_table}')
+        return empresa, produtos
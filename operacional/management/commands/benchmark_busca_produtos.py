@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from operacional.busca import buscar_produtos, trigrama_disponivel
+from operacional.models import Categoria, Produto, UnidadeMedida
+
+PALAVRAS = ['Água', 'Suco', 'Refrigerante', 'Café', 'Chá', 'Leite', 'Biscoito', 'Arroz', 'Feijão', 'Açúcar',
+            'Sabonete', 'Detergente', 'Parafuso', 'Porca', 'Arruela', 'Cabo', 'Tomada', 'Lâmpada', 'Fita', 'Cola']
+VARIANTES = ['Mineral', 'Integral', 'Natural', 'Light', 'Zero', 'Premium', 'Tradicional', 'Inox', 'Branco',
+             'Preto', 'Grande', 'Pequeno', 'Laranja', 'Uva', 'Limão', 'Morango']
+
+
+class Command(BaseCommand):
+    help = ('Mede a latência (p50/p95/p99) da busca de produtos num catálogo gerado. '
+            'Requer PostgreSQL; os dados gerados são descartados ao final (rollback).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=500_000)
+        parser.add_argument('--consultas', type=int, default=300, help='Consultas por tipo de busca.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('O benchmark de busca requer PostgreSQL.')
+        rnd = random.Random(options['seed'])
+        total = options['produtos']
+
+        with transaction.atomic():
+            sufixo = self._gerar_catalogo(total)
+            tipos = {
+                'código de barras': lambda: f'{7890000000000 + rnd.randint(1, total - 1)}',
+                'prefixo do código': lambda: f'BM{sufixo}-{rnd.randint(1, total - 1)}'[:-1],
+                'palavra inteira': lambda: rnd.choice(PALAVRAS),
+                'prefixos do nome': lambda: f'{rnd.choice(PALAVRAS)[:3]} {rnd.choice(VARIANTES)[:3]}',
+            }
+            tempos = {}
+            for tipo, gerar_termo in tipos.items():
+                tempos[tipo] = []
+                for _ in range(options['consultas']):
+                    termo = gerar_termo()
+                    inicio = time.perf_counter()
+                    list(buscar_produtos(termo))
+                    tempos[tipo].append((time.perf_counter() - inicio) * 1000)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'Produtos: {total}  trigramas: {"sim" if trigrama_disponivel() else "não"}')
+        tempos['todas'] = [amostra for amostras in tempos.values() for amostra in amostras]
+        for tipo, amostras in tempos.items():
+            p50, p95, p99 = self._percentis(amostras)
+            self.stdout.write(f'{tipo:>18}: p50 {p50:6.2f} ms  p95 {p95:6.2f} ms  p99 {p99:6.2f} ms')
+
+    def _percentis(self, amostras):
+        cortes = statistics.quantiles(amostras, n=100)
+        return cortes[49], cortes[94], cortes[98]
+
+    def _gerar_catalogo(self, total):
+        """Cria um produto pelo ORM e o replica no banco com generate_series"""
+        sufixo = time.time_ns() % 10**8
+        produto = Produto.objects.create(
+            codigo=f'BM{sufixo}-0', nome='Benchmark', codigo_barras='7890000000000',
+            categoria=Categoria.objects.create(nome=f'Benchmark {sufixo}'),
+            unidade_medida=UnidadeMedida.objects.create(nome='Benchmark', sigla=f'B{sufixo}'),
+        )
+        palavras = ', '.join(f"'{p}'" for p in PALAVRAS)
+        variantes = ', '.join(f"'{v}'" for v in VARIANTES)
+        valores = {
+            'codigo': f"'BM{sufixo}-' || g",
+            'nome': (f"(ARRAY[{palavras}])[1 + g %% {len(PALAVRAS)}] || ' ' || "
+                     f"(ARRAY[{variantes}])[1 + (g / {len(PALAVRAS)}) %% {len(VARIANTES)}] || ' ' || g"),
+            'codigo_barras': '(7890000000000 + g)::text',
+        }
+        tabela = Produto._meta.db_table
+        campos = [f.column for f in Produto._meta.concrete_fields if not f.primary_key]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {tabela} ({", ".join(campos)}) '
+                f'SELECT {", ".join(valores.get(coluna, coluna) for coluna in campos)} '
+                f'FROM {tabela}, generate_series(1, %s) AS g WHERE id = %s',
+                [total - 1, produto.pk],
+            )
+            cursor.execute(f'ANALYZE {tabela}')
+        return sufixo
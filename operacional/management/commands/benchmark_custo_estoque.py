@@ -0,0 +1,81 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Empresa
+from operacional.custos import METODOS, valorizar_estoque
+from operacional.estoque import linhas_estoque_valorizado
+from operacional.models import Categoria, Estoque, MovimentacaoEstoque, Produto, UnidadeMedida
+
+
+class Command(BaseCommand):
+    help = ('Mede o cálculo do custo do estoque: completo, incremental e o relatório de estoque valorizado. '
+            'Os dados gerados são descartados ao final (rollback).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=200000)
+        parser.add_argument('--movimentacoes', type=int, default=1000000)
+        parser.add_argument('--novas', type=int, default=10000,
+                            help='Movimentações criadas depois do cálculo completo, para o incremental.')
+        parser.add_argument('--metodo', choices=METODOS, default='medio')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            empresa, produtos = self._gerar_dados(options)
+            self._movimentar(empresa, produtos, options['movimentacoes'])
+
+            inicio = time.perf_counter()
+            completo = valorizar_estoque([empresa.pk], metodo=options['metodo'])
+            tempo_completo = time.perf_counter() - inicio
+
+            self._movimentar(empresa, produtos, options['novas'])
+            inicio = time.perf_counter()
+            incremental = valorizar_estoque([empresa.pk], metodo=options['metodo'])
+            tempo_incremental = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            linhas = sum(1 for _ in linhas_estoque_valorizado(empresa.pk)) - 2
+            tempo_relatorio = time.perf_counter() - inicio
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'Produtos: {len(produtos)}  método: {options["metodo"]}')
+        self.stdout.write(f'Completo: {completo.movimentacoes} movimentações, {completo.produtos} produtos '
+                          f'em {tempo_completo:.3f}s')
+        self.stdout.write(f'Incremental: {incremental.movimentacoes} movimentações, {incremental.produtos} '
+                          f'produtos em {tempo_incremental:.3f}s')
+        self.stdout.write(self.style.SUCCESS(f'Estoque valorizado: {linhas} produtos em {tempo_relatorio:.3f}s'))
+
+    def _gerar_dados(self, options):
+        empresa = Empresa.objects.create(nome='Benchmark', cnpj=f'BM{time.time_ns() % 10**12}',
+                                         razao_social='Benchmark', endereco='-')
+        categoria = Categoria.objects.create(nome='Benchmark')
+        unidade = UnidadeMedida.objects.create(nome='Benchmark', sigla=f'B{time.time_ns() % 10**8}')
+        sufixo = time.time_ns()
+        produtos = Produto.objects.bulk_create([
+            Produto(codigo=f'BENCH-{sufixo}-{i}', nome=f'Produto {i}', categoria=categoria,
+                    unidade_medida=unidade)
+            for i in range(options['produtos'])
+        ], batch_size=5000)
+        Estoque.objects.bulk_create([Estoque(produto=produto, empresa=empresa) for produto in produtos],
+                                    batch_size=5000)
+        return empresa, produtos
+
+    def _movimentar(self, empresa, produtos, quantidade):
+        # Duas entradas para cada saída, com custos variados
+        MovimentacaoEstoque.objects.bulk_create([
+            MovimentacaoEstoque(
+                produto=random.choice(produtos),
+                tipo=random.choice(('entrada', 'entrada', 'saida')),
+                quantidade=Decimal(random.randint(1, 100)),
+                valor_unitario=Decimal(random.randint(100, 10000)).scaleb(-2),
+                motivo='Benchmark',
+                empresa=empresa,
+            )
+            for _ in range(quantidade)
+        ], batch_size=5000)
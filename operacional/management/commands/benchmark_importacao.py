@@ -0,0 +1,59 @@
+import csv
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Empresa
+from operacional.importacao import CHUNK_SIZE, importar_csv
+from operacional.models import Categoria, UnidadeMedida
+
+
+class Command(BaseCommand):
+    help = ('Mede linhas/s da importação de CSV: uma carga inicial e uma reimportação (upsert). '
+            'Os dados gerados são descartados ao final (rollback).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=100_000)
+        parser.add_argument('--tipo', choices=['cliente', 'produto'], default='cliente')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        linhas, tipo = options['linhas'], options['tipo']
+        sufixo = time.time_ns() % 10**8
+
+        with tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as arquivo:
+            self._gerar_csv(arquivo, tipo, linhas, sufixo)
+            with transaction.atomic():
+                empresa = Empresa.objects.create(nome='Benchmark', cnpj=f'BM{sufixo}', razao_social='Benchmark',
+                                                 endereco='-')
+                Categoria.objects.create(nome=f'Benchmark {sufixo}')
+                UnidadeMedida.objects.create(nome='Benchmark', sigla=f'B{sufixo}')
+
+                for etapa in ('Carga inicial', 'Reimportação'):
+                    arquivo.seek(0)
+                    inicio = time.perf_counter()
+                    resultado = importar_csv(arquivo, tipo, empresa=empresa, chunk_size=options['chunk_size'])
+                    duracao = time.perf_counter() - inicio
+                    self.stdout.write(
+                        f'{etapa}: {resultado.criados} criados, {resultado.atualizados} atualizados, '
+                        f'{len(resultado.erros)} erros em {duracao:.2f}s'
+                    )
+                    self.stdout.write(self.style.SUCCESS(f'Vazão: {linhas / duracao:,.0f} linhas/s'))
+
+                transaction.set_rollback(True)
+
+    def _gerar_csv(self, arquivo, tipo, linhas, sufixo):
+        escritor = csv.writer(arquivo, delimiter=';')
+        if tipo == 'produto':
+            escritor.writerow(['codigo', 'nome', 'categoria', 'unidade_medida', 'preco_custo', 'preco_venda'])
+            for i in range(linhas):
+                escritor.writerow([f'BM{sufixo}-{i}', f'Produto {i}', f'Benchmark {sufixo}', f'B{sufixo}',
+                                   '10,50', '1.234,56'])
+        else:
+            escritor.writerow(['codigo', 'nome', 'tipo_pessoa', 'cpf_cnpj', 'email', 'limite_credito',
+                               'prazo_pagamento'])
+            for i in range(linhas):
+                escritor.writerow([f'B{sufixo}{i}', f'Cliente {i}', 'fisica', f'B{sufixo}{i}',
+                                   f'cliente{i}@exemplo.com', '1.000,00', '30'])
@@ -0,0 +1,71 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Empresa
+from operacional.estoque import lancar_movimentacoes
+from operacional.models import Categoria, MovimentacaoEstoque, Produto, UnidadeMedida
+
+
+class Command(BaseCommand):
+    help = ('Mede a vazão do lançamento de movimentações de estoque em lote. '
+            'Os dados gerados são descartados ao final (rollback).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movimentacoes', type=int, default=50000)
+        parser.add_argument('--produtos', type=int, default=2000)
+        parser.add_argument('--lotes', type=int, default=3, help='Lotes distintos por produto.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            movimentacoes = self._gerar_dados(options)
+            batch_size = options['batch_size']
+
+            inicio = time.perf_counter()
+            for i in range(0, len(movimentacoes), batch_size):
+                lancar_movimentacoes(movimentacoes[i:i + batch_size], permitir_negativo=True)
+            duracao = time.perf_counter() - inicio
+
+            transaction.set_rollback(True)
+
+        total = len(movimentacoes)
+        self.stdout.write(f'Movimentações: {total}  lote: {batch_size}')
+        self.stdout.write(f'Tempo: {duracao:.3f}s')
+        self.stdout.write(self.style.SUCCESS(f'Vazão: {total / duracao:,.0f} movimentações/s'))
+
+    def _gerar_dados(self, options):
+        empresas = [
+            Empresa.objects.create(nome=f'Benchmark {i}', cnpj=f'BM{i}{time.time_ns() % 10**12}',
+                                   razao_social=f'Benchmark {i}', endereco='-')
+            for i in range(2)
+        ]
+        categoria = Categoria.objects.create(nome='Benchmark')
+        unidade = UnidadeMedida.objects.create(nome='Benchmark', sigla=f'B{time.time_ns() % 10**8}')
+        sufixo = time.time_ns()
+        produtos = Produto.objects.bulk_create([
+            Produto(codigo=f'BENCH-{sufixo}-{i}', nome=f'Produto {i}', categoria=categoria,
+                    unidade_medida=unidade)
+            for i in range(options['produtos'])
+        ])
+
+        tipos = ['entrada', 'saida', 'ajuste', 'transferencia']
+        movimentacoes = MovimentacaoEstoque.objects.bulk_create([
+            MovimentacaoEstoque(
+                produto=random.choice(produtos),
+                tipo=random.choice(tipos),
+                quantidade=Decimal(random.randint(1, 100)),
+                valor_unitario=Decimal('1.00'),
+                motivo='Benchmark',
+                lote=f'L{random.randrange(options["lotes"])}',
+                empresa=empresas[0],
+                empresa_destino=empresas[1],
+            )
+            for _ in range(options['movimentacoes'])
+        ], batch_size=5000)
+        return movimentacoes
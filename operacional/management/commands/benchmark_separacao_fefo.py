@@ -0,0 +1,127 @@
+import datetime
+import queue
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from core.models import Empresa
+from operacional.models import Categoria, Estoque, MovimentacaoEstoque, Produto, UnidadeMedida
+from operacional.separacao import alocar_fefo
+
+
+class Command(BaseCommand):
+    help = ('Mede a separação FEFO com vários separadores em paralelo (uma conexão por thread) e confere que '
+            'nenhum saldo foi alocado duas vezes. Os dados precisam ser gravados para as outras conexões os '
+            'verem; são excluídos ao final.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--separadores', type=int, default=32, help='Threads alocando ao mesmo tempo.')
+        parser.add_argument('--pedidos', type=int, default=5000)
+        parser.add_argument('--produtos', type=int, default=10,
+                            help='Poucos produtos concentram os separadores nos mesmos lotes.')
+        parser.add_argument('--lotes', type=int, default=200, help='Lotes por produto.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        empresa, produtos = self._gerar_dados(options)
+        try:
+            saldo_inicial = self._saldos(empresa)
+            pedidos = queue.SimpleQueue()
+            for _ in range(options['pedidos']):
+                pedidos.put((random.choice(produtos).pk, Decimal(random.randint(1, 20))))
+
+            alocados, recusados, trava = [], [0], threading.Lock()
+
+            def separador():
+                proprios, sem_saldo = [], 0
+                try:
+                    while True:
+                        try:
+                            produto_id, quantidade = pedidos.get_nowait()
+                        except queue.Empty:
+                            break
+                        try:
+                            resultado = alocar_fefo(produto_id, empresa.pk, quantidade, motivo='Benchmark')
+                        except ValidationError:
+                            sem_saldo += 1
+                            continue
+                        proprios.extend((produto_id, item.lote, item.quantidade) for item in resultado.lotes)
+                finally:
+                    connection.close()
+                with trava:
+                    alocados.extend(proprios)
+                    recusados[0] += sem_saldo
+
+            threads = [threading.Thread(target=separador) for _ in range(options['separadores'])]
+            inicio = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            tempo = time.perf_counter() - inicio
+
+            self._conferir(empresa, saldo_inicial, alocados)
+        finally:
+            self._excluir(empresa, produtos)
+
+        atendidos = options['pedidos'] - recusados[0]
+        self.stdout.write(f'Separadores: {options["separadores"]}  produtos: {len(produtos)}  '
+                          f'lotes por produto: {options["lotes"]}')
+        self.stdout.write(f'Pedidos: {atendidos} alocados em {len(alocados)} saídas, {recusados[0]} sem saldo livre')
+        self.stdout.write(self.style.SUCCESS(
+            f'Tempo: {tempo:.3f}s  vazão: {atendidos / tempo:.0f} pedidos/s  sem alocação em dobro'
+        ))
+
+    def _saldos(self, empresa):
+        return {(produto, lote): quantidade for produto, lote, quantidade in
+                Estoque.objects.filter(empresa=empresa).values_list('produto_id', 'lote', 'quantidade')}
+
+    def _conferir(self, empresa, saldo_inicial, alocados):
+        """Saldo inicial menos o alocado deve ser o saldo final, lote a lote, e nenhum lote fica negativo"""
+        por_lote = {}
+        for produto, lote, quantidade in alocados:
+            por_lote[produto, lote] = por_lote.get((produto, lote), Decimal('0')) + quantidade
+        gravado = {(linha['produto_id'], linha['lote']): linha['total'] for linha in
+                   MovimentacaoEstoque.objects.filter(empresa=empresa, tipo='saida')
+                   .values('produto_id', 'lote').annotate(total=Sum('quantidade')).order_by()}
+        if gravado != por_lote:
+            raise CommandError('Saídas gravadas diferentes das alocações informadas aos separadores.')
+        for chave, final in self._saldos(empresa).items():
+            if final < 0 or saldo_inicial[chave] - por_lote.get(chave, 0) != final:
+                raise CommandError(f'Alocação em dobro no produto {chave[0]}, lote {chave[1]}: '
+                                   f'saldo inicial {saldo_inicial[chave]}, final {final}.')
+
+    def _gerar_dados(self, options):
+        empresa = Empresa.objects.create(nome='Benchmark', cnpj=f'BM{time.time_ns() % 10**12}',
+                                         razao_social='Benchmark', endereco='-')
+        categoria = Categoria.objects.create(nome='Benchmark')
+        unidade = UnidadeMedida.objects.create(nome='Benchmark', sigla=f'B{time.time_ns() % 10**8}')
+        sufixo = time.time_ns()
+        produtos = Produto.objects.bulk_create([
+            Produto(codigo=f'BENCH-{sufixo}-{i}', nome=f'Produto {i}', categoria=categoria, unidade_medida=unidade)
+            for i in range(options['produtos'])
+        ])
+        hoje = datetime.date.today()
+        Estoque.objects.bulk_create([
+            Estoque(produto=produto, empresa=empresa, lote=f'L{lote}', quantidade=Decimal(random.randint(20, 100)),
+                    valor_unitario=Decimal('1.00'), data_validade=hoje + datetime.timedelta(days=lote))
+            for produto in produtos for lote in range(options['lotes'])
+        ], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Estoque._meta.db_table}')
+        return empresa, produtos
+
+    def _excluir(self, empresa, produtos):
+        categoria, unidade = produtos[0].categoria, produtos[0].unidade_medida
+        MovimentacaoEstoque.objects.filter(empresa=empresa).delete()
+        empresa.delete()
+        Produto.objects.filter(pk__in=[produto.pk for produto in produtos]).delete()
+        categoria.delete()
+        unidade.delete()
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from operacional.custos import METODOS, valorizar_estoque
+
+
+class Command(BaseCommand):
+    help = ('Calcula o custo do estoque (custo médio ou PEPS) a partir das movimentações ainda não processadas '
+            'e o grava no valor unitário do estoque.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, action='append',
+                            help='Id da empresa (padrão: todas); pode ser repetido.')
+        parser.add_argument('--metodo', choices=METODOS,
+                            help=f'Método de custo. Padrão: {settings.CUSTO_ESTOQUE_METODO}.')
+        parser.add_argument('--refazer', action='store_true',
+                            help='Recalcula desde a primeira movimentação (após lançamentos retroativos).')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            resultado = valorizar_estoque(empresas=options['empresa'], metodo=options['metodo'],
+                                          refazer=options['refazer'])
+        except ValueError as erro:
+            raise CommandError(f'{erro} Rode com --refazer.')
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.movimentacoes} movimentação(ões) processada(s), custo de {resultado.produtos} '
+            f'produto(s) atualizado(s) em {time.perf_counter() - inicio:.1f}s.'
+        ))
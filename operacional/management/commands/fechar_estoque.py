@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.particoes import primeiro_dia, somar_meses
+from operacional.fechamentos import fechar_pendentes
+
+
+def _mes(valor):
+    try:
+        return datetime.datetime.strptime(valor, '%Y-%m').date()
+    except ValueError:
+        raise CommandError(f'Mês inválido "{valor}", use o formato AAAA-MM.')
+
+
+class Command(BaseCommand):
+    help = ('Gera os fechamentos mensais de estoque (posição por produto, empresa e lote no fim do mês) ainda '
+            'não gerados, até o mês anterior. Rode mensalmente, por exemplo pelo cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ate', help='Último mês a fechar (AAAA-MM). Padrão: o mês anterior.')
+        parser.add_argument('--refazer-desde', help='Refaz os fechamentos a partir do mês (AAAA-MM), '
+                                                    'após movimentações gravadas em meses já fechados.')
+
+    def handle(self, *args, **options):
+        anterior = somar_meses(primeiro_dia(timezone.localdate()), -1)
+        ate = _mes(options['ate']) if options['ate'] else anterior
+        if ate > anterior:
+            raise CommandError('Só é possível fechar meses já encerrados.')
+        refazer_desde = _mes(options['refazer_desde']) if options['refazer_desde'] else None
+
+        fechados = fechar_pendentes(ate, refazer_desde=refazer_desde)
+        for mes, linhas in fechados:
+            self.stdout.write(f'{mes:%m/%Y}: {linhas} linha(s).')
+        self.stdout.write(self.style.SUCCESS(f'{len(fechados)} mês(es) fechado(s).'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from operacional.importacao import CHUNK_SIZE, OBRIGATORIOS, importar_csv
+
+
+class Command(BaseCommand):
+    help = 'Importa pessoas, clientes, fornecedores ou produtos de um arquivo CSV (upsert por CPF/CNPJ ou código)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(OBRIGATORIOS))
+        parser.add_argument('arquivo', help='Caminho do CSV (UTF-8, com cabeçalho).')
+        parser.add_argument('--empresa', type=int,
+                            help='Id da empresa para as linhas sem a coluna "empresa".')
+        parser.add_argument('--delimitador', default=';')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Linhas gravadas por transação.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                resultado = importar_csv(
+                    arquivo, options['tipo'], empresa=options['empresa'],
+                    delimitador=options['delimitador'], chunk_size=options['chunk_size'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for linha, mensagem in resultado.erros:
+            self.stderr.write(f'Linha {linha}: {mensagem}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.criados} criado(s), {resultado.atualizados} atualizado(s), '
+            f'{len(resultado.erros)} linha(s) com erro.'
+        ))
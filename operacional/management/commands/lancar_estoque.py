@@ -0,0 +1,26 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from operacional.estoque import lancar_pendentes
+
+
+class Command(BaseCommand):
+    help = 'Lança no estoque as movimentações de estoque pendentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='Id da empresa. Padrão: todas.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Movimentações lançadas por transação.')
+        parser.add_argument('--permitir-negativo', action='store_true',
+                            help='Permite que o estoque fique negativo.')
+
+    def handle(self, *args, **options):
+        try:
+            total = lancar_pendentes(
+                empresa=options['empresa'],
+                batch_size=options['batch_size'],
+                permitir_negativo=options['permitir_negativo'],
+            )
+        except ValidationError as e:
+            raise CommandError('; '.join(e.messages))
+        self.stdout.write(self.style.SUCCESS(f'{total} movimentação(ões) lançada(s) no estoque.'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('operacional', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimentacaoestoque',
+            name='empresa_destino',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transferencias_recebidas', to='core.empresa', verbose_name='Empresa de Destino'),
+        ),
+        migrations.AddField(
+            model_name='movimentacaoestoque',
+            name='lancado_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Lançado no Estoque em'),
+        ),
+        migrations.AddField(
+            model_name='movimentacaoestoque',
+            name='lote',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Lote'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(condition=models.Q(('lancado_em__isnull', True)), fields=['id'], name='movestoque_pendentes_idx'),
+        ),
+    ]
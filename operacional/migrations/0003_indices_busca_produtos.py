@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:13
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+INDICE_TRIGRAMA = 'produto_nome_trgm_idx'
+
+
+def criar_indice_trigrama(apps, schema_editor):
+    """Índice de trigramas no nome, só onde a extensão pg_trgm está disponível.
+
+    Fica fora do Meta.indexes porque depende da extensão; a busca verifica em
+    tempo de execução se ela está instalada (operacional.busca).
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDICE_TRIGRAMA} '
+                       f'ON operacional_produto USING gin (nome gin_trgm_ops)')
+
+
+def remover_indice_trigrama(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDICE_TRIGRAMA}')
+
+
+class Migration(migrations.Migration):
+    # Índices criados com CONCURRENTLY para não bloquear escritas na tabela
+    atomic = False
+
+    dependencies = [
+        ('operacional', '0002_lancamento_estoque'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='produto',
+            index=models.Index(fields=['codigo_barras'], name='produto_cod_barras_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='produto',
+            index=models.Index(fields=['codigo'], name='produto_codigo_prefixo_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='produto',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('nome', 'codigo', config='simple'), name='produto_busca_texto_idx'),
+        ),
+        migrations.RunPython(criar_indice_trigrama, remover_indice_trigrama),
+    ]
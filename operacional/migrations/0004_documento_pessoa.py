@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:19
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+INDICE_TRIGRAMA = 'pessoa_nome_trgm_idx'
+
+
+def criar_indice_trigrama(apps, schema_editor):
+    """Índice de trigramas no nome da pessoa, só onde a extensão pg_trgm está disponível"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDICE_TRIGRAMA} '
+                       f'ON operacional_pessoa USING gin (nome gin_trgm_ops)')
+
+
+def remover_indice_trigrama(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDICE_TRIGRAMA}')
+
+
+class Migration(migrations.Migration):
+    # Índice de nome criado com CONCURRENTLY para não bloquear escritas na tabela. A coluna
+    # documento é gerada pelo banco, então as linhas existentes já são preenchidas no ALTER TABLE;
+    # CPFs/CNPJs iguais a menos da pontuação precisam ser corrigidos antes de aplicar.
+    atomic = False
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('operacional', '0003_indices_busca_produtos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pessoa',
+            name='documento',
+            field=models.GeneratedField(db_persist=True, expression=models.Func(models.F('cpf_cnpj'), models.Value('[^0-9]'), models.Value(''), models.Value('g'), function='regexp_replace'), output_field=models.CharField(max_length=18), verbose_name='Documento (só dígitos)'),
+        ),
+        AddIndexConcurrently(
+            model_name='pessoa',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('nome', config='simple'), name='pessoa_busca_nome_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pessoa',
+            constraint=models.UniqueConstraint(condition=models.Q(('documento', ''), _negated=True), fields=('documento',), name='pessoa_documento_unico', opclasses=['varchar_pattern_ops'], violation_error_message='Já existe uma pessoa com este CPF/CNPJ.'),
+        ),
+        migrations.RunPython(criar_indice_trigrama, remover_indice_trigrama),
+    ]
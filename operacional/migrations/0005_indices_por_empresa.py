@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:51
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Índices criados com CONCURRENTLY para não bloquear escritas nas tabelas
+    atomic = False
+
+
+    dependencies = [
+        ('core', '0003_empresa_usuarios'),
+        ('operacional', '0004_documento_pessoa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='estoque',
+            index=models.Index(fields=['empresa', 'produto'], include=('lote', 'quantidade', 'valor_unitario'),
+                               name='estoque_emp_produto_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['empresa', '-data_movimentacao'], name='movestoque_emp_data_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='pessoa',
+            index=models.Index(fields=['empresa', 'nome'], name='pessoa_emp_nome_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+from core.particoes import desparticionar, particionar
+
+TABELA = 'operacional_movimentacaoestoque'
+
+
+def particionar_por_mes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            particionar(cursor, TABELA)
+
+
+def desfazer_particionamento(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            desparticionar(cursor, TABELA)
+
+
+class Migration(migrations.Migration):
+    # Particionamento por mês de data_movimentacao (ver core.particoes); a chave primária no banco passa a ser
+    # (id, data_movimentacao)
+
+    dependencies = [
+        ('operacional', '0005_indices_por_empresa'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar_por_mes, desfazer_particionamento),
+    ]
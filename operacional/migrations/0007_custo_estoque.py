@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:21
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_empresa_usuarios'),
+        ('operacional', '0006_particionar_movimentacoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metodo', models.CharField(choices=[('medio', 'Custo Médio Ponderado'), ('peps', 'PEPS (primeiro a entrar, primeiro a sair)')], max_length=10, verbose_name='Método')),
+                ('quantidade', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=15, verbose_name='Quantidade')),
+                ('valor', models.DecimalField(decimal_places=5, default=Decimal('0.00000'), max_digits=20, verbose_name='Valor em Estoque')),
+                ('custo_unitario', models.DecimalField(decimal_places=5, default=Decimal('0.00000'), max_digits=20, verbose_name='Custo Unitário')),
+                ('camadas_quantidade', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None, verbose_name='Quantidades das Camadas (milésimos)')),
+                ('camadas_valor', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None, verbose_name='Valores das Camadas (centésimos de milésimo)')),
+                ('ultima_movimentacao', models.BigIntegerField(default=0, verbose_name='Última Movimentação')),
+                ('ultima_data', models.DateTimeField(blank=True, null=True, verbose_name='Data da Última Movimentação')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Empresa')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='operacional.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Custo do Estoque',
+                'verbose_name_plural': 'Custos do Estoque',
+                'ordering': ['empresa', 'produto'],
+                'unique_together': {('empresa', 'produto')},
+            },
+        ),
+    ]
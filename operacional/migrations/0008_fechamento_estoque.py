@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:26
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_empresa_usuarios'),
+        ('operacional', '0007_custo_estoque'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FechamentoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mês')),
+                ('lote', models.CharField(blank=True, max_length=50, verbose_name='Lote')),
+                ('quantidade', models.DecimalField(decimal_places=3, max_digits=15, verbose_name='Quantidade')),
+                ('custo_unitario', models.DecimalField(decimal_places=5, default=Decimal('0.00000'), max_digits=20, verbose_name='Custo Unitário')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Fechamento de Estoque',
+                'verbose_name_plural': 'Fechamentos de Estoque',
+                'ordering': ['-mes', 'empresa', 'produto'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(condition=models.Q(('tipo', 'transferencia')), fields=['empresa_destino', 'data_movimentacao'], name='movestoque_transf_dest_idx'),
+        ),
+        migrations.AddField(
+            model_name='fechamentoestoque',
+            name='empresa',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Empresa'),
+        ),
+        migrations.AddField(
+            model_name='fechamentoestoque',
+            name='produto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='operacional.produto', verbose_name='Produto'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='fechamentoestoque',
+            unique_together={('mes', 'empresa', 'produto', 'lote')},
+        ),
+    ]
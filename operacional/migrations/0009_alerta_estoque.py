@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_empresa_usuarios'),
+        ('operacional', '0008_fechamento_estoque'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('situacao', models.CharField(choices=[('abaixo_minimo', 'Abaixo do Mínimo'), ('acima_maximo', 'Acima do Máximo')], max_length=20, verbose_name='Situação')),
+                ('quantidade', models.DecimalField(decimal_places=3, max_digits=15, verbose_name='Quantidade')),
+                ('limite', models.DecimalField(decimal_places=3, max_digits=15, verbose_name='Limite')),
+                ('desde', models.DateTimeField(verbose_name='Desde')),
+                ('atualizado_em', models.DateTimeField(verbose_name='Atualizado em')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.empresa', verbose_name='Empresa')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas_estoque', to='operacional.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Alerta de Estoque',
+                'verbose_name_plural': 'Alertas de Estoque',
+                'ordering': ['empresa', 'situacao', 'produto'],
+                'indexes': [models.Index(fields=['empresa', 'situacao'], name='alertaestoque_emp_sit_idx')],
+                'unique_together': {('empresa', 'produto')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:02
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Índice criado com CONCURRENTLY para não bloquear escritas no estoque
+    atomic = False
+
+    dependencies = [
+        ('operacional', '0009_alerta_estoque'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='estoque',
+            index=models.Index(condition=models.Q(('quantidade__gt', 0)),
+                               fields=['produto', 'empresa', 'data_validade'], name='estoque_fefo_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+def descartar_custos(apps, schema_editor):
+    # As movimentações já calculadas não têm a marca: o próximo cálculo refaz o custo desde o início
+    apps.get_model('operacional', 'CustoEstoque').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operacional', '0010_estoque_fefo_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimentacaoestoque',
+            name='custo_calculado_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Custo Calculado em'),
+        ),
+        migrations.AddField(
+            model_name='movimentacaoestoque',
+            name='custo_destino_calculado_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Custo do Destino Calculado em'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(condition=models.Q(('custo_calculado_em__isnull', True)), fields=['data_movimentacao', 'id'], name='movestoque_custo_pend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(condition=models.Q(('custo_destino_calculado_em__isnull', True), ('tipo', 'transferencia')), fields=['data_movimentacao', 'id'], name='movestoque_custo_dest_pend_idx'),
+        ),
+        migrations.RunPython(descartar_custos, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,14 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Func, Q, Value
 from decimal import Decimal
-from core.models import BaseModel, Empresa
+from core.models import BaseModel, Empresa, EmpresaManager, ModeloPorEmpresa
 
 
-class Pessoa(BaseModel):
+class Pessoa(ModeloPorEmpresa, BaseModel):
     """Modelo base para Pessoas (Clientes, Fornecedores, Funcionários)"""
     nome = models.CharField(max_length=200, verbose_name='Nome')
     tipo_pessoa = models.CharField(max_length=20, choices=[
@@ -11,6 +16,11 @@ class Pessoa(BaseModel):
         ('juridica', 'Pessoa Jurídica'),
     ], verbose_name='Tipo de Pessoa')
     cpf_cnpj = models.CharField(max_length=18, unique=True, verbose_name='CPF/CNPJ')
+    # Só os dígitos do CPF/CNPJ, calculados pelo banco em todo INSERT/UPDATE (inclusive bulk_create)
+    documento = models.GeneratedField(
+        expression=Func(F('cpf_cnpj'), Value('[^0-9]'), Value(''), Value('g'), function='regexp_replace'),
+        output_field=models.CharField(max_length=18), db_persist=True, verbose_name='Documento (só dígitos)',
+    )
     rg_ie = models.CharField(max_length=20, blank=True, verbose_name='RG/IE')
     endereco = models.TextField(blank=True, verbose_name='Endereço')
     telefone = models.CharField(max_length=20, blank=True, verbose_name='Telefone')
@@ -24,12 +34,23 @@ class Pessoa(BaseModel):
         verbose_name = 'Pessoa'
         verbose_name_plural = 'Pessoas'
         ordering = ['nome']
+        constraints = [
+            # varchar_pattern_ops atende tanto a igualdade quanto o prefixo (LIKE '123%') do documento
+            models.UniqueConstraint(fields=['documento'], condition=~Q(documento=''),
+                                    opclasses=['varchar_pattern_ops'], name='pessoa_documento_unico',
+                                    violation_error_message='Já existe uma pessoa com este CPF/CNPJ.'),
+        ]
+        indexes = [
+            GinIndex(SearchVector('nome', config='simple'), name='pessoa_busca_nome_idx'),
+            # Listagens da empresa ativa, ordenadas por nome
+            models.Index(fields=['empresa', 'nome'], name='pessoa_emp_nome_idx'),
+        ]
 
     def __str__(self):
         return self.nome
 
 
-class Cliente(BaseModel):
+class Cliente(ModeloPorEmpresa, BaseModel):
     """Clientes"""
     pessoa = models.OneToOneField(Pessoa, on_delete=models.CASCADE, verbose_name='Pessoa')
     codigo = models.CharField(max_length=20, unique=True, verbose_name='Código')
@@ -39,6 +60,8 @@ class Cliente(BaseModel):
     vendedor = models.CharField(max_length=200, blank=True, verbose_name='Vendedor')
     data_cadastro = models.DateField(auto_now_add=True, verbose_name='Data de Cadastro')
 
+    objects = EmpresaManager('pessoa__empresa')
+
     class Meta:
         verbose_name = 'Cliente'
         verbose_name_plural = 'Clientes'
@@ -48,7 +71,7 @@ class Cliente(BaseModel):
         return f"{self.codigo} - {self.pessoa.nome}"
 
 
-class Fornecedor(BaseModel):
+class Fornecedor(ModeloPorEmpresa, BaseModel):
     """Fornecedores"""
     pessoa = models.OneToOneField(Pessoa, on_delete=models.CASCADE, verbose_name='Pessoa')
     codigo = models.CharField(max_length=20, unique=True, verbose_name='Código')
@@ -56,6 +79,8 @@ class Fornecedor(BaseModel):
     condicoes_pagamento = models.TextField(blank=True, verbose_name='Condições de Pagamento')
     data_cadastro = models.DateField(auto_now_add=True, verbose_name='Data de Cadastro')
 
+    objects = EmpresaManager('pessoa__empresa')
+
     class Meta:
         verbose_name = 'Fornecedor'
         verbose_name_plural = 'Fornecedores'
@@ -65,7 +90,7 @@ class Fornecedor(BaseModel):
         return f"{self.codigo} - {self.pessoa.nome}"
 
 
-class Funcionario(BaseModel):
+class Funcionario(ModeloPorEmpresa, BaseModel):
     """Funcionários"""
     pessoa = models.OneToOneField(Pessoa, on_delete=models.CASCADE, verbose_name='Pessoa')
     codigo = models.CharField(max_length=20, unique=True, verbose_name='Código')
@@ -81,6 +106,8 @@ class Funcionario(BaseModel):
         ('afastado', 'Afastado'),
     ], default='ativo', verbose_name='Situação')
 
+    objects = EmpresaManager('pessoa__empresa')
+
     class Meta:
         verbose_name = 'Funcionário'
         verbose_name_plural = 'Funcionários'
@@ -105,6 +132,16 @@ class Categoria(BaseModel):
     def __str__(self):
         return self.nome
 
+    def clean(self):
+        super().clean()
+        # Sobe pelos pais do novo pai: encontrar a própria categoria fecharia um ciclo
+        pai_id, vistos = self.pai_id, set()
+        while self.pk and pai_id is not None and pai_id not in vistos:
+            if pai_id == self.pk:
+                raise ValidationError({'pai': 'O pai não pode ser a própria categoria nem uma de suas subcategorias.'})
+            vistos.add(pai_id)
+            pai_id = Categoria._base_manager.filter(pk=pai_id).values_list('pai_id', flat=True).first()
+
 
 class UnidadeMedida(BaseModel):
     """Unidades de Medida"""
@@ -153,12 +190,19 @@ class Produto(BaseModel):
         verbose_name = 'Produto'
         verbose_name_plural = 'Produtos'
         ordering = ['codigo']
+        indexes = [
+            # Busca de produtos (operacional.busca): leitura exata do código de barras,
+            # prefixo do código e texto do nome/código
+            models.Index(fields=['codigo_barras'], name='produto_cod_barras_idx'),
+            models.Index(fields=['codigo'], name='produto_codigo_prefixo_idx', opclasses=['varchar_pattern_ops']),
+            GinIndex(SearchVector('nome', 'codigo', config='simple'), name='produto_busca_texto_idx'),
+        ]
 
     def __str__(self):
         return f"{self.codigo} - {self.nome}"
 
 
-class Estoque(BaseModel):
+class Estoque(ModeloPorEmpresa, BaseModel):
     """Controle de Estoque"""
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE, verbose_name='Produto')
     quantidade = models.DecimalField(max_digits=15, decimal_places=3, default=Decimal('0.000'),
@@ -175,6 +219,14 @@ class Estoque(BaseModel):
         verbose_name_plural = 'Estoques'
         ordering = ['produto__codigo']
         unique_together = ['produto', 'empresa', 'lote']
+        indexes = [
+            # Estoque da empresa ativa sem ler a tabela (index-only scan)
+            models.Index(fields=['empresa', 'produto'], include=['lote', 'quantidade', 'valor_unitario'],
+                         name='estoque_emp_produto_idx'),
+            # Lotes com saldo em ordem de validade, para a separação FEFO (operacional.separacao)
+            models.Index(fields=['produto', 'empresa', 'data_validade'], condition=models.Q(quantidade__gt=0),
+                         name='estoque_fefo_idx'),
+        ]
 
     def __str__(self):
         return f"{self.produto.codigo} - Qtd: {self.quantidade}"
@@ -184,8 +236,8 @@ class Estoque(BaseModel):
         return self.quantidade * self.valor_unitario
 
 
-class MovimentacaoEstoque(BaseModel):
-    """Movimentações de Estoque"""
+class MovimentacaoEstoque(ModeloPorEmpresa, BaseModel):
+    """Movimentações de Estoque; tabela particionada por mês de ``data_movimentacao`` (ver ``core.particoes``)"""
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE, verbose_name='Produto')
     tipo = models.CharField(max_length=20, choices=[
         ('entrada', 'Entrada'),
@@ -199,16 +251,134 @@ class MovimentacaoEstoque(BaseModel):
     observacoes = models.TextField(blank=True, verbose_name='Observações')
     data_movimentacao = models.DateTimeField(auto_now_add=True, verbose_name='Data de Movimentação')
     numero_documento = models.CharField(max_length=50, blank=True, verbose_name='Número do Documento')
+    lote = models.CharField(max_length=50, blank=True, verbose_name='Lote')
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name='Empresa')
+    empresa_destino = models.ForeignKey(Empresa, on_delete=models.PROTECT, null=True, blank=True,
+                                        related_name='transferencias_recebidas',
+                                        verbose_name='Empresa de Destino')
+    lancado_em = models.DateTimeField(null=True, blank=True, editable=False,
+                                      verbose_name='Lançado no Estoque em')
+    # Entrada no custo do estoque da empresa (operacional.custos); nas transferências, também no do destino
+    custo_calculado_em = models.DateTimeField(null=True, blank=True, editable=False,
+                                              verbose_name='Custo Calculado em')
+    custo_destino_calculado_em = models.DateTimeField(null=True, blank=True, editable=False,
+                                                      verbose_name='Custo do Destino Calculado em')
 
     class Meta:
         verbose_name = 'Movimentação de Estoque'
         verbose_name_plural = 'Movimentações de Estoque'
         ordering = ['-data_movimentacao']
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(lancado_em__isnull=True),
+                         name='movestoque_pendentes_idx'),
+            models.Index(fields=['empresa', '-data_movimentacao'], name='movestoque_emp_data_idx'),
+            # Transferências recebidas pela empresa em um período (operacional.fechamentos)
+            models.Index(fields=['empresa_destino', 'data_movimentacao'], condition=models.Q(tipo='transferencia'),
+                         name='movestoque_transf_dest_idx'),
+            # Movimentações ainda fora do custo do estoque
+            models.Index(fields=['data_movimentacao', 'id'], condition=models.Q(custo_calculado_em__isnull=True),
+                         name='movestoque_custo_pend_idx'),
+            models.Index(fields=['data_movimentacao', 'id'],
+                         condition=models.Q(tipo='transferencia', custo_destino_calculado_em__isnull=True),
+                         name='movestoque_custo_dest_pend_idx'),
+        ]
 
     def __str__(self):
         return f"{self.produto.codigo} - {self.tipo} - {self.quantidade}"
 
     @property
     def valor_total(self):
-        return self.quantidade * self.valor_unitario
\ No newline at end of file
+        return self.quantidade * self.valor_unitario
+
+
+class CustoEstoque(ModeloPorEmpresa):
+    """Custo do estoque de um produto na empresa, calculado a partir das movimentações (ver ``operacional.custos``).
+
+    Guarda o estado do cálculo até ``ultima_movimentacao``: quantidade, valor em
+    estoque e, no PEPS, as camadas de custo ainda não consumidas, da mais antiga
+    para a mais recente, em inteiros (como no cálculo).
+    """
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, verbose_name='Produto')
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name='Empresa')
+    metodo = models.CharField(max_length=10, choices=[
+        ('medio', 'Custo Médio Ponderado'),
+        ('peps', 'PEPS (primeiro a entrar, primeiro a sair)'),
+    ], verbose_name='Método')
+    quantidade = models.DecimalField(max_digits=15, decimal_places=3, default=Decimal('0.000'),
+                                     verbose_name='Quantidade')
+    valor = models.DecimalField(max_digits=20, decimal_places=5, default=Decimal('0.00000'),
+                                verbose_name='Valor em Estoque')
+    custo_unitario = models.DecimalField(max_digits=20, decimal_places=5, default=Decimal('0.00000'),
+                                         verbose_name='Custo Unitário')
+    camadas_quantidade = ArrayField(models.BigIntegerField(), default=list, blank=True,
+                                    verbose_name='Quantidades das Camadas (milésimos)')
+    camadas_valor = ArrayField(models.BigIntegerField(), default=list, blank=True,
+                               verbose_name='Valores das Camadas (centésimos de milésimo)')
+    ultima_movimentacao = models.BigIntegerField(default=0, verbose_name='Última Movimentação')
+    ultima_data = models.DateTimeField(null=True, blank=True, verbose_name='Data da Última Movimentação')
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+
+    class Meta:
+        verbose_name = 'Custo do Estoque'
+        verbose_name_plural = 'Custos do Estoque'
+        ordering = ['empresa', 'produto']
+        unique_together = ['empresa', 'produto']
+
+    def __str__(self):
+        return f"{self.produto_id} - {self.get_metodo_display()} - R$ {self.custo_unitario}"
+
+
+class FechamentoEstoque(ModeloPorEmpresa):
+    """Posição do estoque no fim do mês por produto, empresa e lote (ver ``operacional.fechamentos``)"""
+    mes = models.DateField(verbose_name='Mês')
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, verbose_name='Produto')
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name='Empresa')
+    lote = models.CharField(max_length=50, blank=True, verbose_name='Lote')
+    quantidade = models.DecimalField(max_digits=15, decimal_places=3, verbose_name='Quantidade')
+    custo_unitario = models.DecimalField(max_digits=20, decimal_places=5, default=Decimal('0.00000'),
+                                         verbose_name='Custo Unitário')
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+
+    class Meta:
+        verbose_name = 'Fechamento de Estoque'
+        verbose_name_plural = 'Fechamentos de Estoque'
+        ordering = ['-mes', 'empresa', 'produto']
+        # O índice da unicidade começa pelo mês: último fechamento (max) e posição da empresa no mês
+        unique_together = ['mes', 'empresa', 'produto', 'lote']
+
+    def __str__(self):
+        return f"{self.mes:%m/%Y} - {self.produto_id} - Qtd: {self.quantidade}"
+
+    @property
+    def valor_total(self):
+        return self.quantidade * self.custo_unitario
+
+
+class AlertaEstoque(ModeloPorEmpresa):
+    """Produto com estoque fora dos limites na empresa (ver ``operacional.alertas``).
+
+    Só os produtos em alerta têm linha; ``desde`` é quando a situação atual começou.
+    """
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='alertas_estoque',
+                                verbose_name='Produto')
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, verbose_name='Empresa')
+    situacao = models.CharField(max_length=20, choices=[
+        ('abaixo_minimo', 'Abaixo do Mínimo'),
+        ('acima_maximo', 'Acima do Máximo'),
+    ], verbose_name='Situação')
+    quantidade = models.DecimalField(max_digits=15, decimal_places=3, verbose_name='Quantidade')
+    limite = models.DecimalField(max_digits=15, decimal_places=3, verbose_name='Limite')
+    desde = models.DateTimeField(verbose_name='Desde')
+    atualizado_em = models.DateTimeField(verbose_name='Atualizado em')
+
+    class Meta:
+        verbose_name = 'Alerta de Estoque'
+        verbose_name_plural = 'Alertas de Estoque'
+        ordering = ['empresa', 'situacao', 'produto']
+        unique_together = ['empresa', 'produto']
+        indexes = [
+            models.Index(fields=['empresa', 'situacao'], name='alertaestoque_emp_sit_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produto_id} - {self.get_situacao_display()} - Qtd: {self.quantidade}"
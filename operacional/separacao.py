@@ -0,0 +1,137 @@
+"""
+Separação de pedidos por FEFO (primeiro a vencer, primeiro a sair).
+
+``alocar_fefo`` escolhe os lotes do produto na empresa em ordem de
+``data_validade`` (lotes sem validade por último) e grava uma saída por lote
+consumido, já lançada no estoque. A leitura usa o índice parcial
+``estoque_fefo_idx`` (produto, empresa, data_validade; só linhas com saldo) e
+bloqueia as linhas com ``FOR UPDATE SKIP LOCKED``, em blocos pequenos:
+separadores simultâneos do mesmo produto não esperam um pelo outro — cada um
+pula os lotes em uso e segue para os próximos.
+
+Com as linhas já bloqueadas, a baixa dos lotes e a gravação das saídas são
+uma única consulta (``UPDATE ... RETURNING`` alimentando o ``INSERT``), em vez
+do lançamento genérico de ``operacional.estoque``: cada separação custa três
+consultas, contando a reavaliação dos alertas (``operacional.alertas``).
+
+Consequência do ``SKIP LOCKED``: sob concorrência, um lote bloqueado por outra
+separação é pulado mesmo que ainda tenha saldo, e a ordem FEFO vale entre os
+lotes livres naquele momento. Se os lotes livres não bastam, a alocação falha
+(ou, com ``parcial=True``, aloca o que houver); tentar de novo depois que as
+outras transações terminarem resolve.
+"""
+
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .alertas import avaliar_alertas
+from .models import Estoque, MovimentacaoEstoque
+
+# Linhas de estoque lidas (e bloqueadas) por consulta
+BLOCO_LOTES = 10
+
+
+@dataclass
+class LoteAlocado:
+    lote: str
+    data_validade: object
+    quantidade: Decimal
+    movimentacao_id: int
+
+
+@dataclass
+class ResultadoAlocacao:
+    solicitado: Decimal
+    lotes: list = field(default_factory=list)
+
+    @property
+    def alocado(self):
+        return sum((item.quantidade for item in self.lotes), Decimal('0.000'))
+
+    @property
+    def completo(self):
+        return self.alocado == self.solicitado
+
+
+_BAIXAR = f"""
+    WITH baixados AS (
+        UPDATE {Estoque._meta.db_table} e
+        SET quantidade = e.quantidade - b.quantidade, updated_at = %(agora)s
+        FROM unnest(%(ids)s::bigint[], %(quantidades)s::numeric[]) AS b(id, quantidade)
+        WHERE e.id = b.id
+        RETURNING e.lote, e.valor_unitario, b.quantidade
+    )
+    INSERT INTO {MovimentacaoEstoque._meta.db_table}
+        (created_at, updated_at, created_by_id, updated_by_id, is_active, produto_id, empresa_id, tipo, quantidade,
+         valor_unitario, motivo, observacoes, data_movimentacao, numero_documento, lote, lancado_em)
+    SELECT %(agora)s, %(agora)s, %(usuario)s, %(usuario)s, TRUE, %(produto)s, %(empresa)s, 'saida', quantidade,
+           valor_unitario, %(motivo)s, '', %(agora)s, %(documento)s, lote, %(agora)s
+    FROM baixados
+    RETURNING lote, id
+"""
+
+
+def _lotes_livres(produto_id, empresa_id, data, ignorar):
+    """Próximo bloco de lotes com saldo, em ordem FEFO, bloqueados com ``SKIP LOCKED``"""
+    filtro = Q(produto_id=produto_id, empresa_id=empresa_id, quantidade__gt=0)
+    if data is not None:
+        filtro &= Q(data_validade__isnull=True) | Q(data_validade__gte=data)
+    return list(
+        Estoque.objects.select_for_update(skip_locked=True).filter(filtro).exclude(pk__in=ignorar)
+        .order_by(F('data_validade').asc(nulls_last=True), 'pk')
+        .values_list('pk', 'lote', 'data_validade', 'quantidade')[:BLOCO_LOTES]
+    )
+
+
+def alocar_fefo(produto_id, empresa_id, quantidade, motivo='Separação FEFO', numero_documento='',
+                usuario=None, parcial=False, incluir_vencidos=False):
+    """Aloca ``quantidade`` do produto na empresa pelos lotes que vencem primeiro.
+
+    Baixa os lotes e cria uma saída por lote, já lançada, com o lote e o
+    valor unitário da linha de estoque. Lotes vencidos (validade anterior a
+    hoje) só entram com ``incluir_vencidos``. Sem saldo livre suficiente,
+    levanta ``ValidationError``, a menos que ``parcial`` seja verdadeiro.
+    Retorna ``ResultadoAlocacao``.
+    """
+    quantidade = Decimal(quantidade)
+    if quantidade <= 0:
+        raise ValidationError('A quantidade a alocar deve ser maior que zero.')
+    data = None if incluir_vencidos else timezone.localdate()
+    resultado = ResultadoAlocacao(solicitado=quantidade)
+
+    with transaction.atomic():
+        escolhidos, vistos, falta = [], [], quantidade
+        while falta > 0:
+            bloco = _lotes_livres(produto_id, empresa_id, data, vistos)
+            if not bloco:
+                break
+            for pk, lote, validade, saldo in bloco:
+                vistos.append(pk)
+                retirada = min(saldo, falta)
+                escolhidos.append((pk, lote, validade, retirada))
+                falta -= retirada
+                if not falta:
+                    break
+        if falta and not parcial:
+            raise ValidationError(
+                f'Estoque livre insuficiente: faltam {falta} de {quantidade} para o produto {produto_id}.'
+            )
+        if not escolhidos:
+            return resultado
+
+        with connection.cursor() as cursor:
+            cursor.execute(_BAIXAR, {
+                'ids': [pk for pk, *_ in escolhidos], 'quantidades': [retirada for _, _, _, retirada in escolhidos],
+                'agora': timezone.now(), 'usuario': usuario.pk if usuario is not None else None,
+                'produto': produto_id, 'empresa': empresa_id, 'motivo': motivo, 'documento': numero_documento,
+            })
+            saidas = dict(cursor.fetchall())
+        avaliar_alertas(chaves=[(produto_id, empresa_id)])
+        resultado.lotes = [LoteAlocado(lote, validade, retirada, saidas[lote])
+                           for _, lote, validade, retirada in escolhidos]
+    return resultado
@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import categorias
+from .alertas import avaliar_alertas
+from .models import Categoria, Produto
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_arvore_categorias(sender, **kwargs):
+    # Só depois do commit: antes disso os outros processos recarregariam a árvore anterior
+    transaction.on_commit(categorias.invalidar)
+
+
+@receiver(post_save, sender=Produto)
+def reavaliar_alertas_do_produto(sender, instance, created, **kwargs):
+    # Mínimo, máximo ou controle de estoque podem ter mudado; produto novo ainda não tem estoque
+    if not created:
+        transaction.on_commit(lambda: avaliar_alertas(produtos=[instance.pk]))
@@ -1,3 +1,676 @@
-from django.test import TestCase
+import datetime
+import io
+import threading
+from decimal import Decimal
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import Case, F, Sum, When
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Empresa
+from core.multiempresa import escopo_empresa
+from . import categorias
+from .alertas import avaliar_alertas
+from .busca import buscar_pessoas, buscar_produtos
+from .custos import valorizar_estoque
+from .estoque import lancar_movimentacoes, lancar_pendentes
+from .fechamentos import estoque_em, fechar_pendentes
+from .importacao import importar_csv
+from .separacao import alocar_fefo
+from .models import (
+    AlertaEstoque, Categoria, Cliente, CustoEstoque, Estoque, FechamentoEstoque, MovimentacaoEstoque, Pessoa, Produto,
+    UnidadeMedida
+)
+
+
+def csv_texto(*linhas):
+    return io.StringIO('\n'.join(';'.join(linha) for linha in linhas) + '\n')
+
+
+class LancamentoEstoqueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresas = [Empresa.objects.create(nome=f'Empresa {n}', cnpj=str(n), razao_social='-', endereco='-')
+                        for n in range(2)]
+        categoria = Categoria.objects.create(nome='Categoria')
+        unidade = UnidadeMedida.objects.create(nome='Unidade', sigla='UN')
+        cls.produto = Produto.objects.create(codigo='P1', nome='Produto', categoria=categoria, unidade_medida=unidade)
+        cls.sem_controle = Produto.objects.create(codigo='S1', nome='Serviço', categoria=categoria,
+                                                  unidade_medida=unidade, controla_estoque=False)
+        Estoque.objects.create(produto=cls.produto, empresa=cls.empresas[0], lote='A', quantidade=Decimal('10'))
+
+    def movimentar(self, tipo, quantidade, lote='A', produto=None, destino=None):
+        return MovimentacaoEstoque.objects.create(
+            produto=produto or self.produto, tipo=tipo, quantidade=Decimal(quantidade), lote=lote,
+            valor_unitario=Decimal('1.00'), motivo='Teste', empresa=self.empresas[0], empresa_destino=destino,
+        )
+
+    def saldos(self):
+        return {(estoque.empresa.nome, estoque.lote): estoque.quantidade
+                for estoque in Estoque.objects.select_related('empresa')}
+
+    def test_transferencia_e_lote_novo(self):
+        movimentacoes = [
+            self.movimentar('transferencia', '4', destino=self.empresas[1]),
+            self.movimentar('entrada', '5', lote='B'),
+            self.movimentar('ajuste', '-1'),
+            self.movimentar('saida', '3', produto=self.sem_controle),
+        ]
+        self.assertEqual(lancar_movimentacoes(movimentacoes), 4)
+        # As linhas de (produto, empresa, lote) que faltavam são criadas no lançamento
+        self.assertEqual(self.saldos(), {('Empresa 0', 'A'): Decimal('5.000'), ('Empresa 1', 'A'): Decimal('4.000'),
+                                         ('Empresa 0', 'B'): Decimal('5.000')})
+        self.assertFalse(MovimentacaoEstoque.objects.filter(lancado_em__isnull=True).exists())
+
+    def test_saldo_negativo_so_com_permissao(self):
+        saida = self.movimentar('saida', '12')
+        with self.assertRaises(ValidationError):
+            lancar_movimentacoes([saida])
+        saida.refresh_from_db()
+        self.assertIsNone(saida.lancado_em)
+        self.assertEqual(self.saldos(), {('Empresa 0', 'A'): Decimal('10.000')})
+
+        self.assertEqual(lancar_movimentacoes([saida], permitir_negativo=True), 1)
+        self.assertEqual(self.saldos(), {('Empresa 0', 'A'): Decimal('-2.000')})
+
+    def test_lancamento_idempotente(self):
+        entrada = self.movimentar('entrada', '2')
+        self.assertEqual(lancar_pendentes(), 1)
+        # Instância desatualizada (lancado_em vazio na memória): a trava no banco impede o segundo lançamento
+        copia = MovimentacaoEstoque.objects.get(pk=entrada.pk)
+        copia.lancado_em = None
+        self.assertEqual(lancar_movimentacoes([copia]), 0)
+        self.assertEqual(lancar_movimentacoes([entrada]), 0)
+        self.assertEqual(lancar_pendentes(), 0)
+        self.assertEqual(self.saldos(), {('Empresa 0', 'A'): Decimal('12.000')})
+
+
+class ImportacaoCadastrosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='11222333000181', razao_social='Empresa',
+                                             endereco='-')
+        cls.outra = Empresa.objects.create(nome='Outra', cnpj='44555666000199', razao_social='Outra', endereco='-')
+        cls.categoria = Categoria.objects.create(nome='Bebidas')
+        cls.unidade = UnidadeMedida.objects.create(nome='Unidade', sigla='UN')
+
+    def test_importa_e_reimporta_clientes_com_upsert(self):
+        cabecalho = ['codigo', 'nome', 'tipo_pessoa', 'cpf_cnpj', 'limite_credito']
+        resultado = importar_csv(csv_texto(
+            cabecalho,
+            ['C1', 'Ana', 'fisica', '111', '1.500,00'],
+            ['C2', 'Bruno', 'fisica', '222', ''],
+        ), 'cliente', empresa=self.empresa)
+        self.assertEqual((resultado.criados, resultado.atualizados, resultado.erros), (2, 0, []))
+        self.assertEqual(Cliente.objects.get(codigo='C1').limite_credito, Decimal('1500.00'))
+
+        resultado = importar_csv(csv_texto(
+            cabecalho,
+            ['C1', 'Ana Maria', 'fisica', '111', '2.000,00'],
+            ['C3', 'Carla', 'fisica', '333', '0'],
+        ), 'cliente', empresa=self.empresa)
+        self.assertEqual((resultado.criados, resultado.atualizados), (1, 1))
+        cliente = Cliente.objects.select_related('pessoa').get(codigo='C1')
+        self.assertEqual(cliente.pessoa.nome, 'Ana Maria')
+        self.assertEqual(cliente.limite_credito, Decimal('2000.00'))
+        self.assertEqual(Pessoa.objects.count(), 3)
+
+    def test_cadastros_de_outra_empresa_nao_sao_alterados(self):
+        Pessoa.objects.create(nome='Ana', tipo_pessoa='fisica', cpf_cnpj='111', empresa=self.empresa)
+        with escopo_empresa(self.outra.pk):
+            resultado = importar_csv(csv_texto(
+                ['nome', 'tipo_pessoa', 'cpf_cnpj'], ['Ana Maria', 'fisica', '111'], ['Bia', 'fisica', '222'],
+            ), 'pessoa', empresa=self.outra)
+        self.assertEqual((resultado.criados, resultado.atualizados), (1, 0))
+        self.assertEqual([linha for linha, _ in resultado.erros], [2])
+        self.assertIn('outra empresa', resultado.erros[0][1])
+        pessoa = Pessoa.objects.get(cpf_cnpj='111')
+        self.assertEqual((pessoa.nome, pessoa.empresa), ('Ana', self.empresa))
+
+    def test_coluna_empresa_restrita_ao_escopo(self):
+        with escopo_empresa(self.empresa.pk):
+            resultado = importar_csv(csv_texto(
+                ['nome', 'tipo_pessoa', 'cpf_cnpj', 'empresa'],
+                ['Ana', 'fisica', '111', str(self.outra.pk)],
+                ['Bia', 'fisica', '222', self.empresa.cnpj],
+            ), 'pessoa')
+        self.assertEqual(resultado.criados, 1)
+        self.assertEqual([linha for linha, _ in resultado.erros], [2])
+        self.assertIn('sem acesso', resultado.erros[0][1])
+        self.assertFalse(Pessoa.objects.filter(cpf_cnpj='111').exists())
+
+    def test_linhas_invalidas_nao_interrompem_a_importacao(self):
+        Cliente.objects.create(codigo='C9', pessoa=Pessoa.objects.create(
+            nome='Outra', tipo_pessoa='fisica', cpf_cnpj='999', empresa=self.empresa))
+        resultado = importar_csv(csv_texto(
+            ['codigo', 'nome', 'tipo_pessoa', 'cpf_cnpj', 'email'],
+            ['C1', 'Ana', 'fisica', '111', 'ana@exemplo.com'],
+            ['C2', 'Bruno', 'alienigena', '222', ''],
+            ['C3', 'Carla', 'fisica', '333', 'invalido'],
+            ['C9', 'Duda', 'fisica', '444', ''],
+            ['C1', 'Ana', 'fisica', '555', ''],
+        ), 'cliente', empresa=self.empresa)
+        self.assertEqual(resultado.criados, 1)
+        self.assertEqual([linha for linha, _ in resultado.erros], [3, 4, 5, 6])
+        self.assertIn('tipo_pessoa', resultado.erros[0][1])
+        self.assertIn('email', resultado.erros[1][1])
+        self.assertIn('outra pessoa', resultado.erros[2][1])
+        self.assertIn('repetido', resultado.erros[3][1])
+
+    def test_importa_produtos_resolvendo_categoria_e_unidade(self):
+        resultado = importar_csv(csv_texto(
+            ['codigo', 'nome', 'categoria', 'unidade_medida', 'preco_venda', 'controla_estoque'],
+            ['P1', 'Água', 'bebidas', 'un', '2,50', 'não'],
+            ['P2', 'Suco', 'Inexistente', 'UN', '5,00', ''],
+        ), 'produto', chunk_size=1)
+        self.assertEqual(resultado.criados, 1)
+        self.assertEqual(len(resultado.erros), 1)
+        produto = Produto.objects.get(codigo='P1')
+        self.assertEqual((produto.categoria, produto.unidade_medida), (self.categoria, self.unidade))
+        self.assertEqual(produto.preco_venda, Decimal('2.50'))
+        self.assertFalse(produto.controla_estoque)
+
+    def test_colunas_obrigatorias(self):
+        with self.assertRaisesMessage(ValueError, 'cpf_cnpj'):
+            importar_csv(csv_texto(['nome', 'tipo_pessoa'], ['Ana', 'fisica']), 'pessoa')
+
+    def test_api_de_importacao(self):
+        usuario = User.objects.create_user('usuario', password='senha')
+        usuario.empresas.add(self.empresa)
+        self.client.force_login(usuario)
+        arquivo = SimpleUploadedFile('pessoas.csv', '﻿nome;tipo_pessoa;cpf_cnpj\nJoão;fisica;111\n'.encode())
+        resposta = self.client.post(reverse('operacional:importar-cadastros', args=['pessoa']),
+                                    {'arquivo': arquivo, 'empresa': self.empresa.pk})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['criados'], 1)
+        self.assertEqual(Pessoa.objects.get(cpf_cnpj='111').created_by.username, 'usuario')
+
+
+class ArvoreCategoriasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.bebidas = Categoria.objects.create(nome='Bebidas')
+        cls.sucos = Categoria.objects.create(nome='Sucos', pai=cls.bebidas)
+        cls.naturais = Categoria.objects.create(nome='Naturais', pai=cls.sucos)
+        cls.limpeza = Categoria.objects.create(nome='Limpeza')
+        unidade = UnidadeMedida.objects.create(nome='Unidade', sigla='UN')
+        for codigo, categoria in (('P1', cls.bebidas), ('P2', cls.naturais), ('P3', cls.limpeza)):
+            Produto.objects.create(codigo=codigo, nome=codigo, categoria=categoria, unidade_medida=unidade)
+
+    def setUp(self):
+        categorias.invalidar()
+
+    def test_descendentes_sem_consultas_apos_a_carga(self):
+        categorias.arvore()
+        with self.assertNumQueries(0):
+            self.assertCountEqual(categorias.descendentes(self.bebidas),
+                                  [self.bebidas.pk, self.sucos.pk, self.naturais.pk])
+            self.assertEqual(categorias.arvore().caminho(self.naturais.pk), 'Bebidas > Sucos > Naturais')
+        with self.assertNumQueries(1):
+            produtos = categorias.filtrar_por_categoria(Produto.objects.all(), self.sucos)
+            self.assertEqual([p.codigo for p in produtos], ['P2'])
+
+    def test_alteracao_invalida_a_arvore(self):
+        self.assertEqual(categorias.descendentes(self.limpeza), [self.limpeza.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sucos.pai = self.limpeza
+            self.sucos.save()
+        self.assertCountEqual(categorias.descendentes(self.limpeza),
+                              [self.limpeza.pk, self.sucos.pk, self.naturais.pk])
+
+    def test_filtro_do_admin_por_subarvore(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@erp.com', 'admin'))
+        resposta = self.client.get(reverse('admin:operacional_produto_changelist'),
+                                   {'categoria_arvore': self.bebidas.pk})
+        self.assertEqual([p.codigo for p in resposta.context['cl'].result_list], ['P1', 'P2'])
+
+    def test_ciclo_entre_categorias(self):
+        arvore = categorias.ArvoreCategorias([(1, 'A', 2), (2, 'B', 1), (3, 'C', 2)])
+        self.assertCountEqual(arvore.descendentes(1), [1, 2, 3])
+        self.assertCountEqual(arvore.descendentes(1, incluir_propria=False), [2, 3])
+        self.assertEqual(arvore.ancestrais(3), [1, 2])
+
+        self.bebidas.pai = self.naturais
+        with self.assertRaises(ValidationError) as erro:
+            self.bebidas.full_clean()
+        self.assertIn('pai', erro.exception.message_dict)
+        self.naturais.pai = self.naturais
+        with self.assertRaises(ValidationError):
+            self.naturais.full_clean()
+        self.bebidas.pai = self.limpeza
+        self.bebidas.full_clean()
+
+
+class BuscaProdutosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.bebidas = Categoria.objects.create(nome='Bebidas')
+        cls.sucos = Categoria.objects.create(nome='Sucos', pai=cls.bebidas)
+        cls.limpeza = Categoria.objects.create(nome='Limpeza')
+        unidade = UnidadeMedida.objects.create(nome='Unidade', sigla='UN')
+        for codigo, nome, barras, categoria in (
+            ('AG01', 'Água Mineral sem Gás', '7891000000011', cls.bebidas),
+            ('SU01', 'Suco de Laranja Integral', '7891000000028', cls.sucos),
+            ('SU02', 'Suco de Uva', '7891000000035', cls.sucos),
+            ('LP01', 'Detergente Laranja', '7891000000042', cls.limpeza),
+        ):
+            Produto.objects.create(codigo=codigo, nome=nome, codigo_barras=barras, categoria=categoria,
+                                   unidade_medida=unidade)
+        Produto.objects.create(codigo='SU03', nome='Suco de Caju', categoria=cls.sucos, unidade_medida=unidade,
+                               is_active=False)
+
+    def setUp(self):
+        categorias.invalidar()
+
+    def test_codigo_de_barras_exato(self):
+        self.assertEqual([p.codigo for p in buscar_produtos('7891000000028')], ['SU01'])
+
+    def test_prefixos_das_palavras_do_nome(self):
+        self.assertEqual([p.codigo for p in buscar_produtos('suc lar')], ['SU01'])
+        self.assertEqual([p.codigo for p in buscar_produtos('laranja')], ['LP01', 'SU01'])
+
+    def test_prefixo_do_codigo_tem_mais_relevancia(self):
+        self.assertEqual([p.codigo for p in buscar_produtos('SU')], ['SU01', 'SU02'])
+
+    def test_filtra_pela_subarvore_da_categoria(self):
+        self.assertEqual([p.codigo for p in buscar_produtos('laranja', categoria=self.bebidas)], ['SU01'])
+
+    def test_api_de_busca(self):
+        self.client.force_login(User.objects.create_user('usuario', password='senha'))
+        url = reverse('operacional:busca-produtos')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        resposta = self.client.get(url, {'q': 'suco', 'limite': 1})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([p['codigo'] for p in resposta.json()['resultados']], ['SU01'])
+
+    def test_busca_do_admin(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@erp.com', 'admin'))
+        resposta = self.client.get(reverse('admin:operacional_produto_changelist'), {'q': 'uva'})
+        self.assertEqual([p.codigo for p in resposta.context['cl'].result_list], ['SU02'])
+
+
+class BuscaPessoasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='11222333000181', razao_social='Empresa',
+                                             endereco='-')
+        cls.ana = Pessoa.objects.create(nome='Ana Maria Souza', tipo_pessoa='fisica', cpf_cnpj='123.456.789-09',
+                                        empresa=cls.empresa)
+        cls.mercado = Pessoa.objects.create(nome='Mercado Souza Ltda', tipo_pessoa='juridica',
+                                            cpf_cnpj='12.345.678/0001-95', empresa=cls.empresa)
+        Cliente.objects.create(pessoa=cls.ana, codigo='C1')
+
+    def test_documento_normalizado_pelo_banco(self):
+        self.ana.refresh_from_db()
+        self.assertEqual(self.ana.documento, '12345678909')
+        Pessoa.objects.bulk_create([Pessoa(nome='Bia', tipo_pessoa='fisica', cpf_cnpj='987.654.321-00',
+                                           empresa=self.empresa)])
+        self.assertEqual(Pessoa.objects.get(nome='Bia').documento, '98765432100')
+
+    def test_documento_unico_sem_pontuacao(self):
+        with self.assertRaisesMessage(ValidationError, 'Já existe uma pessoa com este CPF/CNPJ.'):
+            Pessoa(nome='Outra Ana', tipo_pessoa='fisica', cpf_cnpj='12345678909', empresa=self.empresa).full_clean()
+
+    def test_localiza_por_documento_com_ou_sem_pontuacao(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(buscar_pessoas('12345678909'), [self.ana])
+        self.assertEqual(buscar_pessoas('12.345.678/0001-95'), [self.mercado])
+        # Início do documento: o exato vem primeiro
+        self.assertEqual(buscar_pessoas('123456789'), [self.ana])
+        self.assertEqual(buscar_pessoas('12345'), [self.ana, self.mercado])
+
+    def test_localiza_por_parte_do_nome(self):
+        self.assertEqual(buscar_pessoas('souza'), [self.ana, self.mercado])
+        self.assertEqual(buscar_pessoas('merc sou'), [self.mercado])
+        self.assertEqual(buscar_pessoas('souza', papel='cliente'), [self.ana])
+
+    def test_api_de_busca(self):
+        usuario = User.objects.create_user('usuario', password='senha')
+        usuario.empresas.add(self.empresa)
+        self.client.force_login(usuario)
+        url = reverse('operacional:busca-pessoas')
+        self.assertEqual(self.client.get(url, {'q': 'ana', 'papel': 'socio'}).status_code, 400)
+        resposta = self.client.get(url, {'q': '123.456.789-09', 'papel': 'cliente'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['resultados'][0]['codigo'], 'C1')
+
+    def test_busca_do_admin(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@erp.com', 'admin'))
+        resposta = self.client.get(reverse('admin:operacional_cliente_changelist'), {'q': '12345678909'})
+        self.assertEqual([c.codigo for c in resposta.context['cl'].result_list], ['C1'])
+        resposta = self.client.get(reverse('admin:operacional_pessoa_changelist'), {'q': 'mercado'})
+        self.assertEqual(list(resposta.context['cl'].result_list), [self.mercado])
+
+
+class CustoEstoqueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresas = [Empresa.objects.create(nome=f'Empresa {i}', cnpj=str(i), razao_social='Empresa',
+                                               endereco='-') for i in range(2)]
+        cls.produto = Produto.objects.create(codigo='P1', nome='Produto', categoria=Categoria.objects.create(
+            nome='Categoria'), unidade_medida=UnidadeMedida.objects.create(nome='Unidade', sigla='UN'))
+
+    def movimentar(self, *movimentacoes):
+        for tipo, quantidade, valor, *destino in movimentacoes:
+            MovimentacaoEstoque.objects.create(
+                produto=self.produto, tipo=tipo, quantidade=Decimal(quantidade), valor_unitario=Decimal(valor),
+                motivo='Teste', empresa=self.empresas[0], empresa_destino=destino[0] if destino else None,
+            )
+        lancar_pendentes(permitir_negativo=True)
+
+    def custo(self, empresa=0):
+        return CustoEstoque.objects.get(produto=self.produto, empresa=self.empresas[empresa])
+
+    def test_custo_medio_incremental_e_gravado_no_estoque(self):
+        self.movimentar(('entrada', '10', '10.00'), ('entrada', '10', '20.00'), ('saida', '5', '0'))
+        self.assertEqual(valorizar_estoque(metodo='medio').movimentacoes, 3)
+        custo = self.custo()
+        self.assertEqual((custo.quantidade, custo.valor, custo.custo_unitario),
+                         (Decimal('15.000'), Decimal('225.00000'), Decimal('15.00000')))
+
+        self.movimentar(('entrada', '5', '30.00'))
+        resultado = valorizar_estoque(metodo='medio')
+        self.assertEqual((resultado.movimentacoes, resultado.produtos), (1, 1))
+        self.assertEqual(self.custo().custo_unitario, Decimal('18.75000'))
+        self.assertEqual(Estoque.objects.get(empresa=self.empresas[0]).valor_unitario, Decimal('18.75'))
+        self.assertEqual(valorizar_estoque(metodo='medio').produtos, 0)
+
+    def test_peps_consome_as_camadas_mais_antigas(self):
+        self.movimentar(('entrada', '10', '10.00'), ('entrada', '10', '20.00'), ('saida', '15', '0'),
+                        ('ajuste', '-2', '0'))
+        valorizar_estoque(metodo='peps')
+        custo = self.custo()
+        self.assertEqual((custo.quantidade, custo.valor), (Decimal('3.000'), Decimal('60.00000')))
+        self.assertEqual((custo.camadas_quantidade, custo.camadas_valor), ([3000], [6000000]))
+
+        # Trocar o método recalcula desde o início
+        valorizar_estoque(metodo='medio')
+        self.assertEqual(self.custo().valor, Decimal('45.00000'))
+
+    def test_transferencia_leva_o_custo_da_origem_e_falta_sai_pelo_ultimo_custo(self):
+        self.movimentar(('entrada', '4', '10.00'), ('entrada', '4', '20.00'),
+                        ('transferencia', '2', '99.00', self.empresas[1]), ('saida', '10', '0'))
+        valorizar_estoque(metodo='medio')
+        self.assertEqual((self.custo(1).quantidade, self.custo(1).valor), (Decimal('2.000'), Decimal('30.00000')))
+        self.assertEqual((self.custo().quantidade, self.custo().valor), (Decimal('-4.000'), Decimal('-60.00000')))
+
+        # A entrada cobre a falta pelo custo dela
+        self.movimentar(('entrada', '6', '12.00'))
+        valorizar_estoque(metodo='medio')
+        self.assertEqual((self.custo().quantidade, self.custo().valor, self.custo().custo_unitario),
+                         (Decimal('2.000'), Decimal('24.00000'), Decimal('12.00000')))
+
+    def test_movimentacao_retroativa_recusada_ate_refazer(self):
+        self.movimentar(('entrada', '10', '10.00'), ('transferencia', '2', '0', self.empresas[1]))
+        valorizar_estoque(metodo='medio')
+        ontem = timezone.now() - datetime.timedelta(days=1)
+        self.movimentar(('entrada', '10', '40.00'), ('transferencia', '1', '0', self.empresas[1]))
+        MovimentacaoEstoque.objects.filter(valor_unitario=Decimal('40.00')).update(data_movimentacao=ontem)
+        retroativa = MovimentacaoEstoque.objects.get(valor_unitario=Decimal('40.00'))
+
+        with self.assertRaisesMessage(ValueError, f'(ids {retroativa.pk})'):
+            valorizar_estoque(metodo='medio')
+        # Recusada também nas execuções seguintes, sem avançar o cálculo
+        with self.assertRaisesMessage(CommandError, 'Rode com --refazer.'):
+            call_command('calcular_custo_estoque', metodo='medio', stdout=io.StringIO())
+        self.assertEqual(self.custo().custo_unitario, Decimal('10.00000'))
+
+        call_command('calcular_custo_estoque', metodo='medio', refazer=True, stdout=io.StringIO())
+        self.assertEqual(self.custo().custo_unitario, Decimal('25.00000'))
+        self.assertEqual(valorizar_estoque(metodo='medio').produtos, 0)
+
+    def test_produto_com_calculo_mais_antigo_que_o_da_empresa(self):
+        outro = Produto.objects.create(codigo='P2', nome='Outro', categoria=self.produto.categoria,
+                                       unidade_medida=self.produto.unidade_medida)
+        agora = timezone.now()
+        self.movimentar(('entrada', '10', '10.00'))
+        MovimentacaoEstoque.objects.update(data_movimentacao=agora - datetime.timedelta(days=30))
+        MovimentacaoEstoque.objects.create(produto=outro, tipo='entrada', quantidade=Decimal('1'),
+                                           valor_unitario=Decimal('5.00'), motivo='Teste', empresa=self.empresas[0])
+        MovimentacaoEstoque.objects.filter(produto=outro).update(data_movimentacao=agora - datetime.timedelta(days=1))
+        valorizar_estoque(metodo='medio')
+
+        # Posterior ao cálculo do produto, embora anterior ao do outro produto da empresa
+        self.movimentar(('entrada', '10', '40.00'))
+        MovimentacaoEstoque.objects.filter(valor_unitario=Decimal('40.00')).update(
+            data_movimentacao=agora - datetime.timedelta(days=10))
+        self.assertEqual(valorizar_estoque(metodo='medio').movimentacoes, 1)
+        self.assertEqual((self.custo().quantidade, self.custo().custo_unitario),
+                         (Decimal('20.000'), Decimal('25.00000')))
+
+    def test_movimentacao_confirmada_depois_do_calculo_com_id_menor(self):
+        # Id reservado por uma transação que só confirma depois do cálculo
+        reservada = MovimentacaoEstoque.objects.create(
+            produto=self.produto, tipo='entrada', quantidade=Decimal('10'), valor_unitario=Decimal('40.00'),
+            motivo='Teste', empresa=self.empresas[0])
+        pk, data = reservada.pk, reservada.data_movimentacao
+        reservada.delete()
+        self.movimentar(('entrada', '10', '10.00'))
+        valorizar_estoque(metodo='medio')
+
+        self.movimentar(('entrada', '5', '10.00'))
+        MovimentacaoEstoque.objects.create(
+            pk=pk, produto=self.produto, tipo='entrada', quantidade=Decimal('10'), valor_unitario=Decimal('40.00'),
+            motivo='Teste', empresa=self.empresas[0])
+        MovimentacaoEstoque.objects.filter(pk=pk).update(data_movimentacao=data)
+        with self.assertRaisesMessage(ValueError, f'(ids {pk})'):
+            valorizar_estoque(metodo='medio')
+        valorizar_estoque(metodo='medio', refazer=True)
+        self.assertEqual((self.custo().quantidade, self.custo().custo_unitario),
+                         (Decimal('25.000'), Decimal('22.00000')))
+
+
+class EstoqueEmDataTests(TestCase):
+    FUSO = ZoneInfo('America/Sao_Paulo')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresas = [Empresa.objects.create(nome=f'Empresa {i}', cnpj=str(i), razao_social='Empresa',
+                                               endereco='-') for i in range(2)]
+        categoria = Categoria.objects.create(nome='Categoria')
+        unidade = UnidadeMedida.objects.create(nome='Unidade', sigla='UN')
+        cls.produtos = [Produto.objects.create(codigo=f'P{i}', nome=f'Produto {i}', categoria=categoria,
+                                               unidade_medida=unidade) for i in range(2)]
+        # (dia, produto, tipo, quantidade, lote); a transferência vai para a segunda empresa
+        for dia, produto, tipo, quantidade, lote in [
+            ((2025, 1, 10), 0, 'entrada', '10', 'A'), ((2025, 1, 31, 23), 0, 'saida', '3', 'A'),
+            ((2025, 2, 1), 1, 'entrada', '5', ''), ((2025, 2, 15), 0, 'transferencia', '2', 'A'),
+            ((2025, 3, 5), 0, 'entrada', '4', 'B'), ((2025, 3, 20), 1, 'ajuste', '-5', ''),
+        ]:
+            movimentacao = MovimentacaoEstoque.objects.create(
+                produto=cls.produtos[produto], tipo=tipo, quantidade=Decimal(quantidade),
+                valor_unitario=Decimal('1.00'), motivo='Teste', lote=lote, empresa=cls.empresas[0],
+                empresa_destino=cls.empresas[1] if tipo == 'transferencia' else None,
+            )
+            MovimentacaoEstoque.objects.filter(pk=movimentacao.pk).update(
+                data_movimentacao=datetime.datetime(*dia, tzinfo=cls.FUSO))
+
+    def somar_desde_o_inicio(self, empresa, data):
+        """Posição calculada somando todas as movimentações, para comparar"""
+        limite = datetime.datetime.combine(data + datetime.timedelta(days=1), datetime.time(), tzinfo=self.FUSO)
+        proprias = MovimentacaoEstoque.objects.filter(empresa=empresa, data_movimentacao__lt=limite).values(
+            'produto_id', 'lote').annotate(total=Sum(Case(
+                When(tipo__in=('saida', 'transferencia'), then=-F('quantidade')), default=F('quantidade'))))
+        recebidas = MovimentacaoEstoque.objects.filter(empresa_destino=empresa, data_movimentacao__lt=limite).values(
+            'produto_id', 'lote').annotate(total=Sum('quantidade'))
+        posicao = {}
+        for linha in [*proprias, *recebidas]:
+            chave = (linha['produto_id'], linha['lote'])
+            posicao[chave] = posicao.get(chave, 0) + linha['total']
+        return {chave: quantidade for chave, quantidade in posicao.items() if quantidade}
+
+    def test_fechamentos_mais_movimentacoes_iguais_a_soma_desde_o_inicio(self):
+        self.assertEqual(fechar_pendentes(datetime.date(2025, 2, 1)),
+                         [(datetime.date(2025, 1, 1), 1), (datetime.date(2025, 2, 1), 3)])
+        self.assertEqual(FechamentoEstoque.objects.get(mes='2025-01-01').quantidade, Decimal('7.000'))
+
+        janeiro, fevereiro = datetime.date(2025, 1, 1), datetime.date(2025, 2, 1)
+        for data, fechamento in [(datetime.date(2025, 1, 20), None), (datetime.date(2025, 1, 31), janeiro),
+                                 (datetime.date(2025, 2, 14), janeiro), (datetime.date(2025, 3, 25), fevereiro)]:
+            for empresa in self.empresas:
+                posicao = estoque_em(empresa.pk, data)
+                self.assertEqual(posicao.fechamento, fechamento, data)
+                self.assertEqual({(item.produto_id, item.lote): item.quantidade for item in posicao.itens},
+                                 self.somar_desde_o_inicio(empresa, data), (data, empresa))
+
+        # Já fechados: nada a fazer; refazer gera de novo a partir do mês
+        self.assertEqual(fechar_pendentes(datetime.date(2025, 2, 1)), [])
+        self.assertEqual(fechar_pendentes(datetime.date(2025, 2, 1), refazer_desde=datetime.date(2025, 2, 1)),
+                         [(datetime.date(2025, 2, 1), 3)])
+
+    def test_api(self):
+        fechar_pendentes(datetime.date(2025, 2, 1))
+        usuario = User.objects.create_user('usuario', password='senha')
+        usuario.empresas.add(self.empresas[0])
+        self.client.force_login(usuario)
+        url = reverse('operacional:estoque-em-data')
+        resposta = self.client.get(url, {'empresa': self.empresas[0].pk, 'data': '2025-03-10',
+                                         'produto': self.produtos[0].pk})
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual(dados['fechamento'], '2025-02')
+        self.assertEqual([(item['lote'], item['quantidade']) for item in dados['itens']],
+                         [('A', '5.000'), ('B', '4.000')])
+        self.assertEqual(self.client.get(url, {'empresa': self.empresas[1].pk}).status_code, 403)
+        self.assertEqual(self.client.get(url, {'empresa': self.empresas[0].pk, 'data': '31/01/2025'}).status_code,
+                         400)
+
+
+class AlertasEstoqueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        categoria = Categoria.objects.create(nome='Categoria')
+        unidade = UnidadeMedida.objects.create(nome='Unidade', sigla='UN')
+        cls.produtos = [
+            Produto.objects.create(codigo=f'P{i}', nome=f'Produto {i}', categoria=categoria, unidade_medida=unidade,
+                                   estoque_minimo=Decimal(minimo), estoque_maximo=Decimal(maximo))
+            for i, (minimo, maximo) in enumerate([('10', '0'), ('0', '5'), ('0', '0')])
+        ]
+
+    def movimentar(self, *movimentacoes):
+        for produto, tipo, quantidade, lote in movimentacoes:
+            MovimentacaoEstoque.objects.create(
+                produto=self.produtos[produto], tipo=tipo, quantidade=Decimal(quantidade),
+                valor_unitario=Decimal('1.00'), motivo='Teste', lote=lote, empresa=self.empresa,
+            )
+        lancar_pendentes()
+
+    def alertas(self):
+        return {alerta.produto.codigo: (alerta.situacao, alerta.quantidade)
+                for alerta in AlertaEstoque.objects.select_related('produto')}
+
+    def test_lancamento_reavalia_os_produtos_lancados(self):
+        self.movimentar((0, 'entrada', '3', 'A'), (0, 'entrada', '4', 'B'), (1, 'entrada', '8', ''),
+                        (2, 'entrada', '1', ''))
+        self.assertEqual(self.alertas(), {'P0': ('abaixo_minimo', Decimal('7.000')),
+                                          'P1': ('acima_maximo', Decimal('8.000'))})
+        desde = AlertaEstoque.objects.get(produto=self.produtos[1]).desde
+
+        self.movimentar((0, 'entrada', '5', 'A'), (1, 'saida', '1', ''))
+        self.assertEqual(self.alertas(), {'P1': ('acima_maximo', Decimal('7.000'))})
+        self.assertEqual(AlertaEstoque.objects.get(produto=self.produtos[1]).desde, desde)
+        self.assertEqual((avaliar_alertas().gravados, avaliar_alertas().removidos), (0, 0))
+
+        # Alterar o produto reavalia os alertas dele
+        self.produtos[1].estoque_maximo = Decimal('10')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produtos[1].save()
+        self.assertEqual(self.alertas(), {})
+
+    def test_api_e_filtro_do_admin(self):
+        self.movimentar((0, 'entrada', '3', ''), (1, 'entrada', '8', ''))
+        usuario = User.objects.create_superuser('admin', password='senha')
+        self.client.force_login(usuario)
+        resposta = self.client.get(reverse('operacional:alertas-estoque'), {'situacao': 'abaixo_minimo'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([(alerta['codigo'], alerta['quantidade'], alerta['limite'])
+                          for alerta in resposta.json()['alertas']], [('P0', '3.000', '10.000')])
+
+        resposta = self.client.get(reverse('admin:operacional_produto_changelist'), {'alerta_estoque': 'acima_maximo'})
+        self.assertEqual([produto.codigo for produto in resposta.context['cl'].result_list], ['P1'])
+
+
+class SeparacaoFefoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        cls.produto = Produto.objects.create(
+            codigo='P1', nome='Produto', categoria=Categoria.objects.create(nome='Categoria'),
+            unidade_medida=UnidadeMedida.objects.create(nome='Unidade', sigla='UN'),
+        )
+        hoje = datetime.date.today()
+        for lote, quantidade, dias in [('SEM', '50', None), ('VENCIDO', '5', -1), ('B', '4', 20), ('A', '3', 10),
+                                       ('ZERADO', '0', 1)]:
+            Estoque.objects.create(
+                produto=cls.produto, empresa=cls.empresa, lote=lote, quantidade=Decimal(quantidade),
+                valor_unitario=Decimal('2.50'),
+                data_validade=hoje + datetime.timedelta(days=dias) if dias is not None else None,
+            )
+
+    def saldos(self):
+        return dict(Estoque.objects.values_list('lote', 'quantidade'))
+
+    def test_aloca_pelos_lotes_que_vencem_primeiro(self):
+        resultado = alocar_fefo(self.produto.pk, self.empresa.pk, '10', numero_documento='PED-1')
+        self.assertEqual([(item.lote, item.quantidade) for item in resultado.lotes],
+                         [('A', Decimal('3')), ('B', Decimal('4')), ('SEM', Decimal('3'))])
+        self.assertTrue(resultado.completo)
+        self.assertEqual(self.saldos(), {'SEM': Decimal('47.000'), 'VENCIDO': Decimal('5.000'), 'B': Decimal('0.000'),
+                                         'A': Decimal('0.000'), 'ZERADO': Decimal('0.000')})
+        saidas = MovimentacaoEstoque.objects.filter(pk__in=[item.movimentacao_id for item in resultado.lotes])
+        self.assertEqual({(mov.lote, mov.tipo, mov.numero_documento, mov.lancado_em is not None) for mov in saidas},
+                         {('A', 'saida', 'PED-1', True), ('B', 'saida', 'PED-1', True),
+                          ('SEM', 'saida', 'PED-1', True)})
+
+    def test_saldo_insuficiente(self):
+        with self.assertRaises(ValidationError):
+            alocar_fefo(self.produto.pk, self.empresa.pk, '60')
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
+
+        resultado = alocar_fefo(self.produto.pk, self.empresa.pk, '60', parcial=True)
+        self.assertEqual((resultado.alocado, resultado.completo), (Decimal('57'), False))
+        resultado = alocar_fefo(self.produto.pk, self.empresa.pk, '5', incluir_vencidos=True)
+        self.assertEqual([item.lote for item in resultado.lotes], ['VENCIDO'])
+
+
+class SeparacaoFefoConcorrenteTests(TransactionTestCase):
+    def test_pula_lotes_bloqueados_por_outra_separacao(self):
+        empresa = Empresa.objects.create(nome='Empresa', cnpj='1', razao_social='Empresa', endereco='-')
+        produto = Produto.objects.create(
+            codigo='P1', nome='Produto', categoria=Categoria.objects.create(nome='Categoria'),
+            unidade_medida=UnidadeMedida.objects.create(nome='Unidade', sigla='UN'),
+        )
+        hoje = datetime.date.today()
+        for lote, dias in [('A', 1), ('B', 2)]:
+            Estoque.objects.create(produto=produto, empresa=empresa, lote=lote, quantidade=Decimal('10'),
+                                   data_validade=hoje + datetime.timedelta(days=dias))
+
+        bloqueado, liberar = threading.Event(), threading.Event()
+
+        def outra_separacao():
+            try:
+                with transaction.atomic():
+                    list(Estoque.objects.select_for_update().filter(lote='A'))
+                    bloqueado.set()
+                    liberar.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=outra_separacao)
+        thread.start()
+        try:
+            self.assertTrue(bloqueado.wait(10))
+            resultado = alocar_fefo(produto.pk, empresa.pk, '4')
+        finally:
+            liberar.set()
+            thread.join()
+        self.assertEqual([(item.lote, item.quantidade) for item in resultado.lotes], [('B', Decimal('4'))])
@@ -1,11 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from . import views
+
 app_name = 'operacional'
 
 # Router para ViewSets da API REST
 router = DefaultRouter()
 
 urlpatterns = [
+    path('produtos/busca/', views.BuscaProdutosView.as_view(), name='busca-produtos'),
+    path('pessoas/busca/', views.BuscaPessoasView.as_view(), name='busca-pessoas'),
+    path('estoque/alertas/', views.AlertasEstoqueView.as_view(), name='alertas-estoque'),
+    path('estoque/em-data/', views.EstoqueEmDataView.as_view(), name='estoque-em-data'),
+    path('importar/<str:tipo>/', views.ImportacaoCadastrosView.as_view(), name='importar-cadastros'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,3 +1,220 @@
-from django.shortcuts import render
+import io
+from decimal import Decimal
 
-# Create your views here.
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.multiempresa import exigir_empresa
+from .busca import LIMITE_PADRAO, buscar_pessoas, buscar_produtos
+from .fechamentos import estoque_em
+from .models import AlertaEstoque
+from .importacao import OBRIGATORIOS, importar_csv
+
+MAX_ERROS_RESPOSTA = 100
+MAX_RESULTADOS_BUSCA = 100
+PAPEIS_PESSOA = ('cliente', 'fornecedor', 'funcionario')
+
+
+class ImportacaoCadastrosView(APIView):
+    """Importa um CSV de pessoas, clientes, fornecedores ou produtos.
+
+    Recebe o arquivo em ``arquivo`` (multipart) e, opcionalmente, ``empresa``
+    (id usado nas linhas sem a coluna ``empresa``) e ``delimitador``.
+    """
+
+    def post(self, request, tipo):
+        if tipo not in OBRIGATORIOS:
+            raise NotFound('Tipo de importação inválido.')
+        upload = request.FILES.get('arquivo')
+        if upload is None:
+            raise ValidationError({'arquivo': 'Envie o arquivo CSV.'})
+        empresa = request.data.get('empresa')
+        if empresa:
+            if not str(empresa).isdigit():
+                raise ValidationError({'empresa': 'Informe o id da empresa.'})
+            exigir_empresa(empresa)
+        delimitador = request.data.get('delimitador') or ';'
+        if len(delimitador) != 1:
+            raise ValidationError({'delimitador': 'Informe um único caractere.'})
+
+        arquivo = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            resultado = importar_csv(
+                arquivo, tipo, empresa=int(empresa) if empresa else None, usuario=request.user,
+                delimitador=delimitador,
+            )
+        except (UnicodeDecodeError, ValueError) as e:
+            raise ValidationError({'arquivo': str(e)})
+
+        return Response({
+            'tipo': tipo,
+            'criados': resultado.criados,
+            'atualizados': resultado.atualizados,
+            'total_erros': len(resultado.erros),
+            'erros': [{'linha': linha, 'mensagem': mensagem}
+                      for linha, mensagem in resultado.erros[:MAX_ERROS_RESPOSTA]],
+        })
+
+
+def _limite_busca(request):
+    limite = request.query_params.get('limite') or str(LIMITE_PADRAO)
+    if not limite.isdigit() or int(limite) == 0:
+        raise ValidationError({'limite': 'Informe um número inteiro positivo.'})
+    return min(int(limite), MAX_RESULTADOS_BUSCA)
+
+
+def _termo_busca(request):
+    termo = request.query_params.get('q', '').strip()
+    if not termo:
+        raise ValidationError({'q': 'Informe o termo de busca.'})
+    return termo
+
+
+class BuscaProdutosView(APIView):
+    """Busca produtos por código, código de barras ou nome, do mais para o menos relevante.
+
+    Parâmetros: ``q`` (termo), ``limite`` (padrão 20, máximo 100) e ``categoria``
+    (id; inclui as subcategorias).
+    """
+
+    def get(self, request):
+        termo = _termo_busca(request)
+        limite = _limite_busca(request)
+        categoria = request.query_params.get('categoria')
+        if categoria and not categoria.isdigit():
+            raise ValidationError({'categoria': 'Informe o id da categoria.'})
+
+        produtos = buscar_produtos(termo, limite, categoria=int(categoria) if categoria else None)
+        return Response({
+            'q': termo,
+            'resultados': [
+                {
+                    'id': produto.pk,
+                    'codigo': produto.codigo,
+                    'nome': produto.nome,
+                    'codigo_barras': produto.codigo_barras,
+                    'categoria': produto.categoria.nome,
+                    'unidade_medida': produto.unidade_medida.sigla,
+                    'preco_venda': str(produto.preco_venda),
+                    'relevancia': round(produto.relevancia, 4),
+                }
+                for produto in produtos
+            ],
+        })
+
+
+class BuscaPessoasView(APIView):
+    """Localiza pessoas pelo CPF/CNPJ (com ou sem pontuação, completo ou início) ou por parte do nome.
+
+    Parâmetros: ``q`` (termo), ``limite`` (padrão 20, máximo 100), ``empresa``
+    (id) e ``papel`` (``cliente``, ``fornecedor`` ou ``funcionario``; devolve
+    também o código do cadastro).
+    """
+
+    def get(self, request):
+        termo = _termo_busca(request)
+        limite = _limite_busca(request)
+        empresa = request.query_params.get('empresa')
+        if empresa and not empresa.isdigit():
+            raise ValidationError({'empresa': 'Informe o id da empresa.'})
+        papel = request.query_params.get('papel') or None
+        if papel is not None and papel not in PAPEIS_PESSOA:
+            raise ValidationError({'papel': f'Use um destes valores: {", ".join(PAPEIS_PESSOA)}.'})
+
+        pessoas = buscar_pessoas(termo, limite, empresa=int(empresa) if empresa else None, papel=papel)
+        resultados = []
+        for pessoa in pessoas:
+            resultado = {
+                'id': pessoa.pk,
+                'nome': pessoa.nome,
+                'tipo_pessoa': pessoa.tipo_pessoa,
+                'cpf_cnpj': pessoa.cpf_cnpj,
+                'documento': pessoa.documento,
+                'relevancia': round(pessoa.relevancia, 4),
+            }
+            if papel is not None:
+                resultado['codigo'] = getattr(pessoa, papel).codigo
+            resultados.append(resultado)
+        return Response({'q': termo, 'resultados': resultados})
+
+
+class EstoqueEmDataView(APIView):
+    """Posição do estoque da empresa no fim de um dia, a partir do fechamento mensal mais próximo.
+
+    Parâmetros: ``empresa`` (id, obrigatório), ``data`` (``AAAA-MM-DD``,
+    padrão hoje) e ``produto`` (id; pode ser repetido).
+    """
+
+    def get(self, request):
+        empresa = request.query_params.get('empresa', '')
+        if not empresa.isdigit():
+            raise ValidationError({'empresa': 'Informe o id da empresa.'})
+        exigir_empresa(empresa)
+        data = request.query_params.get('data')
+        try:
+            data = parse_date(data) if data else timezone.localdate()
+        except ValueError:
+            data = None
+        if data is None:
+            raise ValidationError({'data': 'Data inválida, use o formato AAAA-MM-DD.'})
+        produtos = request.query_params.getlist('produto')
+        if not all(produto.isdigit() for produto in produtos):
+            raise ValidationError({'produto': 'Informe o id do produto.'})
+
+        posicao = estoque_em(int(empresa), data, produtos=[int(p) for p in produtos] or None)
+        itens = [
+            {
+                'produto': item.produto_id,
+                'lote': item.lote,
+                'quantidade': str(item.quantidade),
+                'custo_unitario': str(item.custo_unitario),
+                'valor': str(item.valor),
+            }
+            for item in posicao.itens
+        ]
+        return Response({
+            'empresa': int(empresa),
+            'data': posicao.data,
+            'fechamento': f'{posicao.fechamento:%Y-%m}' if posicao.fechamento else None,
+            'valor_total': str(sum((item.valor for item in posicao.itens), Decimal('0.00'))),
+            'itens': itens,
+        })
+
+
+class AlertasEstoqueView(APIView):
+    """Produtos com estoque abaixo do mínimo ou acima do máximo, nas empresas do escopo.
+
+    Parâmetros: ``empresa`` (id) e ``situacao`` (``abaixo_minimo`` ou
+    ``acima_maximo``).
+    """
+
+    def get(self, request):
+        alertas = AlertaEstoque.objects.select_related('produto').order_by('empresa_id', 'produto__codigo')
+        empresa = request.query_params.get('empresa')
+        if empresa:
+            if not empresa.isdigit():
+                raise ValidationError({'empresa': 'Informe o id da empresa.'})
+            alertas = alertas.filter(empresa_id=empresa)
+        situacao = request.query_params.get('situacao')
+        if situacao:
+            situacoes = dict(AlertaEstoque._meta.get_field('situacao').choices)
+            if situacao not in situacoes:
+                raise ValidationError({'situacao': f'Use um destes valores: {", ".join(situacoes)}.'})
+            alertas = alertas.filter(situacao=situacao)
+
+        return Response({'alertas': [
+            {
+                'produto': alerta.produto_id,
+                'codigo': alerta.produto.codigo,
+                'nome': alerta.produto.nome,
+                'empresa': alerta.empresa_id,
+                'situacao': alerta.situacao,
+                'quantidade': str(alerta.quantidade),
+                'limite': str(alerta.limite),
+                'desde': alerta.desde,
+            }
+            for alerta in alertas
+        ]})